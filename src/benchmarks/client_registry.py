@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+AWSクライアントレジストリのベンチマーク
+
+以前の構成（モジュールごとに`boto3.resource("dynamodb")`を作り、
+Bedrockクライアントはリクエストごとに作る）と、共有レジストリを比較する。
+
+- 起動時間: 新しいプロセスでクライアント群を作り終えるまでの時間（import時間は除く）
+- 初回リクエスト: 各モジュールが最初にDynamoDBを呼ぶまでのコスト（接続確立を含む）
+- リクエストごと: AIアドバイス1回あたりのBedrockクライアント取得コスト
+
+    cd src
+    uv run python -m benchmarks.client_registry
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+# srcディレクトリをパスに追加
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.local_aws import (
+    REGION,
+    configure_environment,
+    create_game_table,
+    seed_costs,
+    start_moto_server,
+)
+
+SRC_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 以前の構成: costs.py / play.py / service.py / loader.py がそれぞれリソースを作る
+LEGACY_STARTUP = """
+import time, boto3
+start = time.perf_counter()
+tables = [boto3.resource("dynamodb", region_name="{region}").Table("game") for _ in range(4)]
+boto3.client(service_name="bedrock-runtime", region_name="{region}")
+for table in tables:
+    table.get_item(Key={{"PK": "costs", "SK": "metadata"}})
+print(time.perf_counter() - start)
+"""
+
+REGISTRY_STARTUP = """
+import time
+from routers.helpers.aws_clients import get_bedrock_client, get_game_table
+start = time.perf_counter()
+tables = [get_game_table() for _ in range(4)]
+get_bedrock_client()
+for table in tables:
+    table.get_item(Key={{"PK": "costs", "SK": "metadata"}})
+print(time.perf_counter() - start)
+"""
+
+
+def measure_startup(code: str, runs: int) -> list:
+    """新しいプロセスで起動処理を実行し、所要時間（秒）を集める"""
+    timings = []
+    for _ in range(runs):
+        output = subprocess.run(
+            [sys.executable, "-c", code.format(region=REGION)],
+            cwd=SRC_DIR,
+            env=os.environ,
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        timings.append(float(output.stdout.strip().splitlines()[-1]))
+    return timings
+
+
+def measure_bedrock_client_per_request(iterations: int) -> tuple:
+    """Bedrockクライアントをリクエストごとに作る場合と共有する場合の取得コスト"""
+    import boto3
+    from routers.helpers.aws_clients import get_bedrock_client
+
+    legacy = []
+    for _ in range(iterations):
+        start_time = time.perf_counter()
+        boto3.client(service_name="bedrock-runtime", region_name=REGION)
+        legacy.append(time.perf_counter() - start_time)
+
+    get_bedrock_client()
+    shared = []
+    for _ in range(iterations):
+        start_time = time.perf_counter()
+        get_bedrock_client()
+        shared.append(time.perf_counter() - start_time)
+    return legacy, shared
+
+
+def measure_dynamodb_latency(iterations: int) -> tuple:
+    """4つの別リソースを順に使う場合と共有リソースを使う場合のget_itemレイテンシ"""
+    import boto3
+    from routers.helpers.aws_clients import get_game_table
+
+    key = {"PK": "costs", "SK": "metadata"}
+
+    legacy_tables = [boto3.resource("dynamodb", region_name=REGION).Table("game") for _ in range(4)]
+    legacy = []
+    for i in range(iterations):
+        start_time = time.perf_counter()
+        legacy_tables[i % 4].get_item(Key=key)
+        legacy.append(time.perf_counter() - start_time)
+
+    shared_table = get_game_table()
+    shared = []
+    for _ in range(iterations):
+        start_time = time.perf_counter()
+        shared_table.get_item(Key=key)
+        shared.append(time.perf_counter() - start_time)
+    return legacy, shared
+
+
+def describe(label: str, timings: list):
+    ms = [t * 1000 for t in timings]
+    print(
+        f"  {label:<9} median={statistics.median(ms):>8.2f}ms "
+        f"mean={statistics.mean(ms):>8.2f}ms max={max(ms):>8.2f}ms (n={len(ms)})"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="AWSクライアントレジストリのベンチマーク")
+    parser.add_argument("--startup-runs", type=int, default=5, help="起動時間の計測回数")
+    parser.add_argument("--iterations", type=int, default=50, help="リクエストごとの計測回数")
+    args = parser.parse_args()
+
+    server, endpoint_url = start_moto_server()
+    try:
+        configure_environment(endpoint_url)
+        seed_costs(create_game_table(endpoint_url))
+
+        print("起動時間（クライアント生成 + 各モジュールの初回DynamoDB呼び出し）")
+        describe("legacy", measure_startup(LEGACY_STARTUP, args.startup_runs))
+        describe("registry", measure_startup(REGISTRY_STARTUP, args.startup_runs))
+
+        print("Bedrockクライアント取得（AIアドバイス1回あたり）")
+        legacy, shared = measure_bedrock_client_per_request(args.iterations)
+        describe("legacy", legacy)
+        describe("registry", shared)
+
+        print("DynamoDB get_item（ウォームアップなし、モジュールを跨いで呼び出し）")
+        legacy, shared = measure_dynamodb_latency(args.iterations)
+        describe("legacy", legacy)
+        describe("registry", shared)
+    finally:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+DynamoDB非同期アクセス層の負荷ベンチマーク
+
+moto serverをローカルのDynamoDB代替として起動し、多数の並行クライアントから
+`/costs`と`/play/games`を叩いてレイテンシのp50/p99を計測する。
+旧実装（イベントループ上で同期呼び出し）と現在のスレッドプール実装を比較する。
+
+    cd src
+    uv run python -m benchmarks.dynamodb_load --clients 200 --latency-ms 5
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+# srcディレクトリをパスに追加
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.local_aws import (
+    add_latency,
+    configure_environment,
+    create_game_table,
+    seed_costs,
+    start_moto_server,
+)
+
+BENCH_USER_ID = "bench-user"
+
+
+class BlockingTable:
+    """旧実装と同じく、イベントループ上でboto3を直接呼ぶTable"""
+
+    def __init__(self, table):
+        self._table = table
+
+    async def query(self, **kwargs):
+        return self._table.query(**kwargs)
+
+    async def get_item(self, **kwargs):
+        return self._table.get_item(**kwargs)
+
+    async def put_item(self, **kwargs):
+        return self._table.put_item(**kwargs)
+
+    async def update_item(self, **kwargs):
+        return self._table.update_item(**kwargs)
+
+
+def percentile(values, p: float) -> float:
+    """最近傍法によるパーセンタイル"""
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(p / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+async def run_clients(app, clients: int, requests_per_client: int, token: str) -> dict:
+    """並行クライアントを走らせてレイテンシを集計"""
+    import httpx
+
+    latencies = []
+    errors = 0
+    paths = ["/costs", "/play/games"]
+    headers = {"Authorization": f"Bearer {token}"}
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+
+        async def worker(worker_id: int):
+            nonlocal errors
+            for i in range(requests_per_client):
+                path = paths[(worker_id + i) % len(paths)]
+                start_time = time.perf_counter()
+                response = await client.get(path, headers=headers)
+                latencies.append((time.perf_counter() - start_time) * 1000)
+                if response.status_code != 200:
+                    errors += 1
+
+        start_time = time.perf_counter()
+        await asyncio.gather(*(worker(n) for n in range(clients)))
+        elapsed = time.perf_counter() - start_time
+
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "elapsed_s": elapsed,
+        "throughput_rps": len(latencies) / elapsed,
+        "p50_ms": percentile(latencies, 50),
+        "p99_ms": percentile(latencies, 99),
+    }
+
+
+def print_result(label: str, result: dict):
+    print(
+        f"{label:<10} requests={result['requests']:<6} errors={result['errors']:<4} "
+        f"rps={result['throughput_rps']:>8.1f} "
+        f"p50={result['p50_ms']:>8.1f}ms p99={result['p99_ms']:>8.1f}ms"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="DynamoDB非同期アクセス層の負荷ベンチマーク")
+    parser.add_argument("--clients", type=int, default=200, help="並行クライアント数")
+    parser.add_argument("--requests", type=int, default=5, help="クライアントごとのリクエスト数")
+    parser.add_argument("--latency-ms", type=float, default=5.0, help="DynamoDB呼び出しごとに加える疑似ネットワーク遅延")
+    args = parser.parse_args()
+
+    server, endpoint_url = start_moto_server()
+    try:
+        configure_environment(endpoint_url)
+        table = create_game_table(endpoint_url)
+        seed_costs(table)
+        table.put_item(
+            Item={
+                "PK": f"user#{BENCH_USER_ID}",
+                "SK": "game#bench-game",
+                "struct": {},
+                "funds": 0,
+                "current_month": 0,
+                "scenarioes": "個人ブログ",
+                "is_finished": False,
+                "created_at": "2025-01-01T00:00:00",
+            }
+        )
+
+        import jwt
+        from main import app
+        from routers import costs, play
+
+        token = jwt.encode({"sub": BENCH_USER_ID}, "bench-secret-key-for-local-only-00", algorithm="HS256")
+        async_tables = {costs: costs.table, play: play.table}
+        for module, async_table in async_tables.items():
+            add_latency(async_table.sync_table, args.latency_ms)
+
+        print(
+            f"clients={args.clients} requests/client={args.requests} "
+            f"latency={args.latency_ms}ms endpoint={endpoint_url}"
+        )
+
+        for module, async_table in async_tables.items():
+            module.table = BlockingTable(async_table.sync_table)
+        print_result("blocking", asyncio.run(run_clients(app, args.clients, args.requests, token)))
+
+        for module, async_table in async_tables.items():
+            module.table = async_table
+        print_result("async", asyncio.run(run_clients(app, args.clients, args.requests, token)))
+    finally:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+負荷試験用のBedrock Runtimeの代替
+
+`invoke_model`・`invoke_model_with_response_stream`だけを持ち、最初のトークンまでの待ちと
+トークンごとの待ちを`time.sleep`で模す（アプリと同じくスレッドから呼ばれる前提）。
+応答はAnthropic Messages形式なので、`routers/helpers/bedrock.py`の読み取り処理をそのまま通る。
+"""
+import io
+import json
+import threading
+import time
+
+DEFAULT_TEXT = "その構成、単一AZで本番を運用するつもり？ まずは冗長化とコストの見直しから始めよう。"
+
+
+class FakeEventStream:
+    """`invoke_model_with_response_stream`の`body`（イベントの反復とclose）"""
+
+    def __init__(self, events: list, first_token_seconds: float, token_seconds: float):
+        self._events = events
+        self._first_token_seconds = first_token_seconds
+        self._token_seconds = token_seconds
+        self.closed = False
+
+    def __iter__(self):
+        time.sleep(self._first_token_seconds)
+        for event in self._events:
+            if self.closed:
+                return
+            payload = json.loads(event["chunk"]["bytes"])
+            if payload.get("type") == "content_block_delta":
+                time.sleep(self._token_seconds)
+            yield event
+
+    def close(self):
+        self.closed = True
+
+
+class FakeBedrockClient:
+    """トークン数と待ち時間を指定できるBedrock Runtimeの代替"""
+
+    def __init__(
+        self,
+        first_token_ms: float = 300,
+        token_ms: float = 10,
+        output_tokens: int = 40,
+        input_tokens: int = 800,
+        text: str = DEFAULT_TEXT,
+    ):
+        self.first_token_seconds = first_token_ms / 1000
+        self.token_seconds = token_ms / 1000
+        self.output_tokens = output_tokens
+        self.input_tokens = input_tokens
+        self.text = text
+        self.invocations = 0
+        self._lock = threading.Lock()
+
+    def _count(self):
+        with self._lock:
+            self.invocations += 1
+
+    def _tokens(self) -> list:
+        # 本文をoutput_tokens個の差分に分ける
+        size = max(1, -(-len(self.text) // self.output_tokens))
+        return [self.text[i:i + size] for i in range(0, len(self.text), size)]
+
+    def invoke_model(self, body, modelId, accept=None, contentType=None):
+        self._count()
+        time.sleep(self.first_token_seconds + self.token_seconds * len(self._tokens()))
+        response_body = {
+            "content": [{"type": "text", "text": self.text}],
+            "usage": {"input_tokens": self.input_tokens, "output_tokens": self.output_tokens},
+        }
+        return {"body": io.BytesIO(json.dumps(response_body, ensure_ascii=False).encode("utf-8"))}
+
+    def invoke_model_with_response_stream(self, body, modelId, accept=None, contentType=None):
+        self._count()
+        payloads = [{"type": "message_start", "message": {"usage": {"input_tokens": self.input_tokens}}}]
+        payloads += [
+            {"type": "content_block_delta", "delta": {"type": "text_delta", "text": token}}
+            for token in self._tokens()
+        ]
+        payloads += [
+            {"type": "message_delta", "usage": {"output_tokens": self.output_tokens}},
+            {"type": "message_stop"},
+        ]
+        events = [{"chunk": {"bytes": json.dumps(payload, ensure_ascii=False).encode("utf-8")}} for payload in payloads]
+        return {"body": FakeEventStream(events, self.first_token_seconds, self.token_seconds)}
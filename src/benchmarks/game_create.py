@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""
+ゲーム作成の書き込みレイテンシのベンチマーク
+
+moto serverをローカルのDynamoDB代替として起動し、以下を比較する。
+
+- two-puts: 以前の実装（ゲームとサンドボックスを順に`put_item`）
+- transact: ゲーム・サンドボックス・ポインタを1回の`TransactWriteItems`
+- idempotent: 上記に冪等キーの記録を加えたもの
+- replay: 同じ冪等キーでの再試行（書き込みが弾かれ、記録済みレスポンスを読んで返す）
+
+motoの`TransactWriteItems`はロールバック用にテーブル全体を複製するので、
+作成ごとに計測外でテーブルを空に戻す。実際のDynamoDBとの差は往復数（round_trips）で見る。
+
+    cd src
+    uv run python -m benchmarks.game_create --iterations 200 --latency-ms 5
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+import uuid
+from datetime import datetime
+
+# srcディレクトリをパスに追加
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.local_aws import (
+    add_latency,
+    configure_environment,
+    create_game_table,
+    start_moto_server,
+)
+from benchmarks.dynamodb_load import percentile
+
+BENCH_USER_ID = "bench-user"
+
+
+def new_items():
+    game_id = str(uuid.uuid4())
+    now = datetime.now().isoformat()
+    game_item = {
+        "PK": f"user#{BENCH_USER_ID}",
+        "SK": f"game#{game_id}",
+        "game_name": "bench",
+        "struct": None,
+        "funds": 0,
+        "current_month": 0,
+        "scenarioes": "個人ブログ",
+        "is_finished": False,
+        "created_at": now,
+    }
+    sandbox_item = {
+        "PK": f"user#{BENCH_USER_ID}",
+        "SK": f"sandbox#{uuid.uuid4()}",
+        "struct": None,
+        "is_published": False,
+        "created_at": now,
+    }
+    response = {"user_id": BENCH_USER_ID, "game_id": game_id, "created_at": now}
+    return game_item, sandbox_item, response
+
+
+class RoundTripCounter:
+    """DynamoDBへのリクエスト回数を数える"""
+
+    def __init__(self, sync_table):
+        self.count = 0
+        sync_table.meta.client.meta.events.register(
+            "before-send.dynamodb", self._count, unique_id="benchmark-round-trips"
+        )
+
+    def _count(self, **kwargs):
+        self.count += 1
+
+
+def clear_table(sync_table):
+    """前回の作成分を消す（motoはトランザクションごとにテーブル全体を複製するため、計測外で小さく保つ）"""
+    items = sync_table.scan(ProjectionExpression="PK, SK")["Items"]
+    with sync_table.batch_writer() as batch:
+        for item in items:
+            batch.delete_item(Key={"PK": item["PK"], "SK": item["SK"]})
+
+
+async def measure(create, iterations: int, sync_table, counter: RoundTripCounter, cleanup: bool = True):
+    """1回ずつ順に作成して、所要時間（ミリ秒）と1回あたりの往復数を集める"""
+    latencies = []
+    round_trips = 0
+    for i in range(iterations):
+        before = counter.count
+        start_time = time.perf_counter()
+        await create(i)
+        latencies.append((time.perf_counter() - start_time) * 1000)
+        round_trips += counter.count - before
+        if cleanup:
+            clear_table(sync_table)
+    return latencies, round_trips / iterations
+
+
+def print_result(label: str, latencies: list, round_trips: float):
+    print(
+        f"{label:<11} n={len(latencies):<5} round_trips={round_trips:<4.1f} "
+        f"mean={statistics.mean(latencies):>7.2f}ms "
+        f"p50={percentile(latencies, 50):>7.2f}ms p99={percentile(latencies, 99):>7.2f}ms"
+    )
+
+
+async def run(table, iterations: int):
+    from routers.helpers.games import put_new_game, request_fingerprint
+
+    sync_table = table.sync_table
+    counter = RoundTripCounter(sync_table)
+
+    async def two_puts(i):
+        game_item, sandbox_item, _ = new_items()
+        await table.put_item(Item=game_item)
+        await table.put_item(Item=sandbox_item)
+
+    async def transact(i):
+        game_item, sandbox_item, response = new_items()
+        await put_new_game(table, BENCH_USER_ID, game_item, sandbox_item, response)
+
+    fingerprint = request_fingerprint({"scenarioes": "個人ブログ", "game_name": "bench"})
+
+    async def create_idempotent(key):
+        game_item, sandbox_item, response = new_items()
+        await put_new_game(
+            table, BENCH_USER_ID, game_item, sandbox_item, response,
+            idempotency_key=key, fingerprint=fingerprint,
+        )
+
+    async def idempotent(i):
+        await create_idempotent(f"bench-{i}")
+
+    async def replay(i):
+        await create_idempotent("bench-replay")
+
+    for label, create in (
+        ("two-puts", two_puts),
+        ("transact", transact),
+        ("idempotent", idempotent),
+    ):
+        print_result(label, *await measure(create, iterations, sync_table, counter))
+
+    # 同じキーの再試行（最初の1回は計測外で作成しておく）
+    await create_idempotent("bench-replay")
+    print_result("replay", *await measure(replay, iterations, sync_table, counter, cleanup=False))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ゲーム作成の書き込みレイテンシのベンチマーク")
+    parser.add_argument("--iterations", type=int, default=200, help="方式ごとの作成回数")
+    parser.add_argument("--latency-ms", type=float, default=5.0, help="DynamoDB呼び出しごとに加える疑似ネットワーク遅延")
+    args = parser.parse_args()
+
+    server, endpoint_url = start_moto_server()
+    try:
+        configure_environment(endpoint_url)
+        create_game_table(endpoint_url)
+
+        from routers.helpers.aws_clients import get_game_table
+        from routers.helpers.dynamodb import AsyncTable
+
+        sync_table = get_game_table()
+        add_latency(sync_table, args.latency_ms)
+        print(f"iterations={args.iterations} latency={args.latency_ms}ms endpoint={endpoint_url}")
+        asyncio.run(run(AsyncTable(sync_table), args.iterations))
+    finally:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
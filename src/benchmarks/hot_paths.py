@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+"""
+コスト計算・structまわりのホットパスのマイクロベンチマーク
+
+対象の関数ごとに、大きさの違うstruct（`struct_normalize.make_struct`で生成）で
+
+- ウォームアップのあと、1サンプルが`--min-sample-ms`以上になるようループ回数を決めて`--repeats`回計測する
+  （計測中はtimeitと同じくGCを止める）
+- 1回あたりの中央値とIQR（四分位範囲）を出す
+- 大きさに対する伸び方（log-logの傾き。1なら線形、2なら2乗）を出す
+
+`--baseline`を指定すると保存済みの結果と比べ、中央値が`--tolerance`を超えて遅くなり、
+かつIQRが重ならない（今回の第1四分位がベースラインの第3四分位より遅い）項目を
+悪化として表示して終了コード1で終わる。ベースラインは計測したマシンに依存するので、
+比べる環境で`--save-baseline`で取り直しておく。
+
+    cd src
+    uv run python -m benchmarks.hot_paths --sizes 100 1000 10000 --repeats 15
+    uv run python -m benchmarks.hot_paths --only find_resource_types calculate_final_cost
+    uv run python -m benchmarks.hot_paths --baseline benchmarks/baselines/hot_paths.json
+    uv run python -m benchmarks.hot_paths --save-baseline benchmarks/baselines/hot_paths.json
+"""
+import argparse
+import json
+import math
+import os
+import platform
+import statistics
+import sys
+import timeit
+from datetime import datetime
+from pathlib import Path
+
+# srcディレクトリをパスに追加
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.struct_normalize import make_struct
+
+HELPERS_DIR = Path(__file__).resolve().parent.parent / "routers" / "helpers"
+NUM_REQUESTS = 100000
+# 傾きがこれを超えたら線形より悪い伸び方として印を付ける
+SUPERLINEAR_EXPONENT = 1.15
+
+
+def load_costs_db() -> dict:
+    """同梱のコストJSON（`/costs`が返すのと同じ形）"""
+    with open(HELPERS_DIR / "costs" / "dynamodb_costs.json", encoding="utf-8") as f:
+        return json.load(f)["costs"]
+
+
+def build_cases() -> dict:
+    """
+    関数名 → (入力を作る関数, 入力を受け取って計測対象を呼ぶ関数)。
+
+    入力は計測の外で作る（Decimalの変換などの準備は計測に含めない）。
+    """
+    # routers.*はimport時にboto3クライアントを作るのでリージョンだけ補う（AWSには接続しない）
+    os.environ.setdefault("REGION", "ap-northeast-1")
+    os.environ.setdefault("AWS_DEFAULT_REGION", "ap-northeast-1")
+    from models.scenario import convert_decimal_to_int
+    from routers.costs import calculate_final_cost, find_resource_types
+    from routers.helpers.loader import convert_to_dynamodb_format
+    from routers.play import convert_struct_for_cost_calculation
+
+    costs_db = load_costs_db()
+    return {
+        "find_resource_types": (make_struct, lambda struct: list(find_resource_types(struct))),
+        "calculate_final_cost": (make_struct, lambda struct: calculate_final_cost(struct, costs_db, NUM_REQUESTS)),
+        "convert_struct_for_cost_calculation": (make_struct, convert_struct_for_cost_calculation),
+        # DynamoDBから読んだstruct（数値がDecimal）を戻す
+        "convert_decimal_to_int": (
+            lambda size: convert_to_dynamodb_format(make_struct(size)),
+            convert_decimal_to_int,
+        ),
+        "convert_to_dynamodb_format": (make_struct, convert_to_dynamodb_format),
+    }
+
+
+def measure(func, arg, repeats: int, warmup: int, min_sample_ms: float) -> list:
+    """1回あたりの所要時間（マイクロ秒）を`repeats`サンプル集める"""
+    timer = timeit.Timer(lambda: func(arg))
+    for _ in range(warmup):
+        func(arg)
+
+    # 1サンプルがmin_sample_ms以上になるループ回数（タイマーの分解能と呼び出しの揺れを均す）
+    loops = 1
+    while True:
+        if timer.timeit(loops) * 1000 >= min_sample_ms:
+            break
+        loops *= 2
+    return [seconds / loops * 1e6 for seconds in timer.repeat(repeat=repeats, number=loops)]
+
+
+def summarize(samples: list, size: int) -> dict:
+    q1, median, q3 = statistics.quantiles(samples, n=4, method="inclusive")
+    return {
+        "size": size,
+        "samples": len(samples),
+        "median_us": median,
+        "q1_us": q1,
+        "q3_us": q3,
+        "iqr_us": q3 - q1,
+        "min_us": min(samples),
+        "ns_per_component": median * 1000 / size,
+    }
+
+
+def scaling_exponent(points: list) -> float:
+    """log(大きさ)に対するlog(中央値)の回帰直線の傾き"""
+    if len(points) < 2:
+        return math.nan
+    slope, _ = statistics.linear_regression(
+        [math.log(point["size"]) for point in points],
+        [math.log(point["median_us"]) for point in points],
+    )
+    return slope
+
+
+def run_suite(names: list, sizes: list, repeats: int, warmup: int, min_sample_ms: float) -> dict:
+    cases = build_cases()
+    results = {}
+    for name in names:
+        make_input, func = cases[name]
+        points = []
+        for size in sizes:
+            samples = measure(func, make_input(size), repeats, warmup, min_sample_ms)
+            points.append(summarize(samples, size))
+        results[name] = {"points": points, "scaling_exponent": scaling_exponent(points)}
+    return results
+
+
+def compare_with_baseline(results: dict, baseline: dict, tolerance: float) -> list:
+    """
+    ベースラインより遅くなった項目を返す。
+
+    中央値が`tolerance`を超えて遅く、かつ今回の第1四分位がベースラインの第3四分位より遅いものだけを
+    悪化とする（揺れの範囲が重なるものは数えない）。
+    """
+    regressions = []
+    for name, result in results.items():
+        base_points = {point["size"]: point for point in baseline.get("functions", {}).get(name, {}).get("points", [])}
+        for point in result["points"]:
+            base = base_points.get(point["size"])
+            if base is None:
+                continue
+            if point["median_us"] > base["median_us"] * (1 + tolerance) and point["q1_us"] > base["q3_us"]:
+                regressions.append(
+                    f"{name} size={point['size']}: {base['median_us']:.1f} → {point['median_us']:.1f}us "
+                    f"(+{point['median_us'] / base['median_us'] - 1:.0%})"
+                )
+    return regressions
+
+
+def print_results(results: dict):
+    for name, result in results.items():
+        print(name)
+        for point in result["points"]:
+            print(
+                f"  size={point['size']:<6} median={point['median_us']:>10.1f}us "
+                f"IQR={point['iqr_us']:>8.1f}us ({point['iqr_us'] / point['median_us']:>5.1%}) "
+                f"{point['ns_per_component']:>7.1f}ns/component"
+            )
+        exponent = result["scaling_exponent"]
+        mark = "  ⚠️ 線形より悪い伸び方" if exponent > SUPERLINEAR_EXPONENT else ""
+        print(f"  scaling exponent={exponent:.2f}{mark}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="コスト計算・structまわりのホットパスのマイクロベンチマーク")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 10000], help="structのコンポーネント数")
+    parser.add_argument("--only", nargs="+", default=None, help="計測する関数（未指定ならすべて）")
+    parser.add_argument("--repeats", type=int, default=15, help="大きさごとのサンプル数")
+    parser.add_argument("--warmup", type=int, default=3, help="計測前の呼び出し回数")
+    parser.add_argument("--min-sample-ms", type=float, default=20, help="1サンプルの最短時間")
+    parser.add_argument("--output", default=None, help="結果のJSONの出力先")
+    parser.add_argument("--baseline", default=None, help="比べるベースラインのJSON")
+    parser.add_argument("--save-baseline", default=None, help="結果をベースラインとして保存するパス")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="悪化とみなす中央値の増加の割合（0.1なら10%%）")
+    args = parser.parse_args()
+
+    names = list(build_cases())
+    if args.only:
+        unknown = set(args.only) - set(names)
+        if unknown:
+            parser.error(f"未知の関数: {', '.join(sorted(unknown))}（{', '.join(names)}）")
+        names = args.only
+
+    results = run_suite(names, sorted(args.sizes), args.repeats, args.warmup, args.min_sample_ms)
+    print_results(results)
+
+    output = {
+        "functions": results,
+        "config": {
+            "sizes": sorted(args.sizes),
+            "repeats": args.repeats,
+            "warmup": args.warmup,
+            "min_sample_ms": args.min_sample_ms,
+        },
+        "environment": {
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "recorded_at": datetime.now().isoformat(timespec="seconds"),
+        },
+    }
+    for path in (args.output, args.save_baseline):
+        if path:
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+            Path(path).write_text(json.dumps(output, ensure_ascii=False, indent=2) + "\n", encoding="utf-8")
+            print(f"wrote {path}")
+
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text(encoding="utf-8"))
+        regressions = compare_with_baseline(results, baseline, args.tolerance)
+        if regressions:
+            print(f"⚠️  ベースラインより{args.tolerance:.0%}を超えて遅くなりました:")
+            for regression in regressions:
+                print(f"   {regression}")
+            sys.exit(1)
+        print(f"✅ ベースラインとの差は許容範囲内です（{args.tolerance:.0%}）")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+シナリオアイテムの読み込み（属性値 → Scenarioモデル）のベンチマーク
+
+同梱のシナリオJSONを格納する形（低レベルクライアントが返す属性値）にし、次の2つを比べる。
+
+- resource: boto3のresource層と同じTypeDeserializer（数値はDecimal）+ `convert_decimal_to_int` + `Scenario(**item)`
+- fast: `FastReadTable`と同じ`decode_item`（数値はint・float）+ `Scenario(**item)`
+
+`--months`でrequestsを水増しすると、長いシナリオでの差を見られる。
+
+    cd src
+    uv run python -m benchmarks.item_decode --months 12 120
+"""
+import argparse
+import copy
+import os
+import statistics
+import sys
+import time
+
+# srcディレクトリをパスに追加
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from boto3.dynamodb.types import TypeDeserializer, TypeSerializer
+
+from models.scenario import Scenario, convert_decimal_to_int
+from routers.helpers.attribute_values import decode_item
+from routers.helpers.loader import parse_data_file
+
+SCENARIO_FILE = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    "routers", "helpers", "scenarios", "corporate_site_scenario.json",
+)
+
+
+def make_wire_item(months: int) -> dict:
+    """requestsを`months`件に揃えたシナリオアイテムを、低レベルクライアントの形式で作る"""
+    item = parse_data_file(SCENARIO_FILE)
+    requests = item["requests"]
+    item["requests"] = [
+        dict(copy.deepcopy(requests[index % len(requests)]), month=index + 1) for index in range(months)
+    ]
+    item["end_month"] = months
+    serializer = TypeSerializer()
+    return {key: serializer.serialize(value) for key, value in item.items()}
+
+
+def median_ms(function, iterations: int) -> float:
+    latencies = []
+    for _ in range(iterations):
+        start_time = time.perf_counter()
+        function()
+        latencies.append((time.perf_counter() - start_time) * 1000)
+    return statistics.median(latencies)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="シナリオアイテムの読み込みのベンチマーク")
+    parser.add_argument("--months", type=int, nargs="+", default=[12, 120], help="シナリオのrequestsの件数")
+    parser.add_argument("--iterations", type=int, default=200, help="計測ごとの繰り返し回数")
+    args = parser.parse_args()
+
+    deserializer = TypeDeserializer()
+
+    for months in args.months:
+        wire = make_wire_item(months)
+
+        def resource():
+            item = {key: deserializer.deserialize(value) for key, value in wire.items()}
+            return Scenario(**convert_decimal_to_int(item))
+
+        def fast():
+            return Scenario(**decode_item(wire))
+
+        assert resource() == fast()
+        resource_ms = median_ms(resource, args.iterations)
+        fast_ms = median_ms(fast, args.iterations)
+        print(
+            f"months={months:<4} resource={resource_ms:>7.3f}ms fast={fast_ms:>7.3f}ms "
+            f"({resource_ms / fast_ms:.1f}x)"
+        )
+
+
+if __name__ == "__main__":
+    main()
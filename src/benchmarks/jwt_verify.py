@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+トークン検証のベンチマーク
+
+1リクエストあたりのトークン処理の時間を比べる（JWKSは事前に取得済み）。
+
+- unverified: これまでの`jwt.decode(..., verify_signature=False)`
+- verified (cold): 初めてのトークン（RS256の署名検証を含む）
+- verified (repeat): 検証済みトークン（LRUの参照のみ）
+
+    cd src
+    uv run python -m benchmarks.jwt_verify --iterations 20000
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+# srcディレクトリをパスに追加
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import jwt
+from cryptography.hazmat.primitives.asymmetric import rsa
+from jwt.algorithms import RSAAlgorithm
+
+from routers.helpers.jwt_verifier import CognitoJwtVerifier, JwksCache, VerifiedTokenCache
+
+ISSUER = "https://cognito-idp.ap-northeast-1.amazonaws.com/ap-northeast-1_bench"
+APP_CLIENT_ID = "bench-client"
+
+
+def median_us(function, iterations: int) -> float:
+    latencies = []
+    for _ in range(iterations):
+        start_time = time.perf_counter()
+        function()
+        latencies.append((time.perf_counter() - start_time) * 1_000_000)
+    return statistics.median(latencies)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="トークン検証のベンチマーク")
+    parser.add_argument("--iterations", type=int, default=20000, help="計測ごとの繰り返し回数")
+    args = parser.parse_args()
+
+    private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    jwk = dict(RSAAlgorithm.to_jwk(private_key.public_key(), as_dict=True), kid="bench", alg="RS256")
+    now = int(time.time())
+
+    def sign(index: int) -> str:
+        claims = {
+            "sub": f"user-{index}", "iss": ISSUER, "aud": APP_CLIENT_ID, "token_use": "id",
+            "iat": now, "exp": now + 3600,
+        }
+        return jwt.encode(claims, private_key, algorithm="RS256", headers={"kid": "bench"})
+
+    verifier = CognitoJwtVerifier(
+        ISSUER,
+        APP_CLIENT_ID,
+        JwksCache("local", fetch=lambda url: {"keys": [jwk]}),
+        VerifiedTokenCache(args.iterations + 1),
+    )
+    token = sign(0)
+    verifier.verify(token)
+    cold_tokens = iter([sign(index) for index in range(1, args.iterations + 1)])
+
+    results = {
+        "unverified": median_us(lambda: jwt.decode(token, options={"verify_signature": False}), args.iterations),
+        "verified (cold)": median_us(lambda: verifier.verify(next(cold_tokens)), args.iterations),
+        "verified (repeat)": median_us(lambda: verifier.verify(token), args.iterations),
+    }
+    for name, latency in results.items():
+        print(f"{name:<18} {latency:>8.2f}µs")
+
+
+if __name__ == "__main__":
+    main()
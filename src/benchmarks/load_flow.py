@@ -0,0 +1,324 @@
+#!/usr/bin/env python3
+"""
+ユーザーの一連の操作を再現するエンドツーエンドの負荷試験
+
+moto server（または`--endpoint-url`のDynamoDB Local）とBedrockの代替（`fake_bedrock.py`）に向けて
+アプリをプロセス内で動かし、仮想ユーザーごとに次の流れを繰り返す。
+
+    ゲーム作成 → structの更新 → レポート → AIアドバイス（一括 / ストリーム）
+
+手順ごとと全体のスループット・レイテンシのパーセンタイルをJSONに書き出し、
+`--baseline`を指定すると保存済みの結果と比べて、許容幅（`--tolerance`）を超えて悪化した項目を
+表示して終了コード1で終わる。ベースラインは計測したマシンに依存するので、
+比べる環境で`--save-baseline`で取り直しておく。
+
+    cd src
+    uv run python -m benchmarks.load_flow --users 50 --flows 4 --output /tmp/load_flow.json
+    uv run python -m benchmarks.load_flow --baseline benchmarks/baselines/load_flow.json
+    uv run python -m benchmarks.load_flow --save-baseline benchmarks/baselines/load_flow.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+# srcディレクトリをパスに追加
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.dynamodb_load import percentile
+
+STEPS = ("create", "update", "report", "advice")
+ADVICE_MODES = ("invoke", "stream")
+SCENARIO_NAME = "個人ブログ"
+PERCENTILES = (50, 90, 99)
+# ベースラインと比べる項目（レイテンシは大きいほど、スループットは小さいほど悪化）
+COMPARED_LATENCIES = ("p50_ms", "p99_ms")
+
+
+def build_struct(variant: int) -> dict:
+    """フロントエンドと同じ形式のstruct（variantが違えばリソース数も違う）"""
+    computes = [
+        {"id": f"web-{index}", "type": "ec2", "subnetId": f"subnet-{index % 2}", "position": {"x": index * 40, "y": 80}}
+        for index in range(1 + variant % 4)
+    ]
+    if variant % 3 == 0:
+        computes.append({"id": "worker", "type": "lambda"})
+    return {
+        "vpc": {"id": "vpc-1", "cidr": "10.0.0.0/16"},
+        "availabilityZones": [{"id": "az-a"}, {"id": "az-c"}],
+        # サブネット数はvariantごとに変える（アドバイスのキャッシュのキーは構成の形だけで決まるため）
+        "subnets": [{"id": f"subnet-{index}", "type": "public_subnet"} for index in range(2 + variant)],
+        "computes": computes,
+        "databases": [{"id": "db-1", "type": "rds"}] if variant % 2 == 0 else [],
+    }
+
+
+class FlowRecorder:
+    """手順ごとのレイテンシ（ミリ秒）とエラー数を集める"""
+
+    def __init__(self):
+        self.latencies = {step: [] for step in STEPS}
+        self.errors = {step: 0 for step in STEPS}
+        self.flow_latencies = []
+        self.failed_flows = 0
+
+    def record(self, step: str, elapsed_ms: float, ok: bool):
+        self.latencies[step].append(elapsed_ms)
+        if not ok:
+            self.errors[step] += 1
+
+
+async def run_flow(client, user_id: str, token: str, variant: int, advice_mode: str, recorder: FlowRecorder):
+    """1ユーザーの一連の操作を1回行う（途中で失敗したらその回は打ち切る）"""
+    headers = {"Authorization": f"Bearer {token}"}
+    flow_start = time.perf_counter()
+
+    async def step(name, method, path, **kwargs):
+        start_time = time.perf_counter()
+        try:
+            response = await client.request(method, path, headers=headers, **kwargs)
+            if name == "advice" and advice_mode == "stream":
+                # ストリームは最後のイベントまで読んだ時点を完了とする
+                body = response.text
+                ok = response.status_code == 200 and "event: done" in body
+            else:
+                ok = response.status_code == 200
+        except Exception:
+            response, ok = None, False
+        recorder.record(name, (time.perf_counter() - start_time) * 1000, ok)
+        return response if ok else None
+
+    created = await step("create", "POST", "/play/create", json={"scenarioes": SCENARIO_NAME, "game_name": user_id})
+    if created is None:
+        recorder.failed_flows += 1
+        return
+    game_id = created.json()["game_id"]
+
+    advice_path = f"/play/ai/{game_id}" + ("/stream" if advice_mode == "stream" else "")
+    for name, method, path, kwargs in (
+        ("update", "PUT", f"/play/{game_id}", {"json": {"data": build_struct(variant)}}),
+        ("report", "POST", f"/play/report/{game_id}", {}),
+        ("advice", "POST", advice_path, {}),
+    ):
+        if await step(name, method, path, **kwargs) is None:
+            recorder.failed_flows += 1
+            return
+    recorder.flow_latencies.append((time.perf_counter() - flow_start) * 1000)
+
+
+def summarize_latencies(latencies: list) -> dict:
+    if not latencies:
+        return {"count": 0}
+    summary = {"count": len(latencies), "mean_ms": statistics.mean(latencies), "max_ms": max(latencies)}
+    summary.update({f"p{p}_ms": percentile(latencies, p) for p in PERCENTILES})
+    return summary
+
+
+async def run_load(
+    app,
+    users: int,
+    flows_per_user: int,
+    advice_mode: str = "invoke",
+    unique_structs: int = 0,
+    think_ms: float = 0,
+) -> dict:
+    """
+    仮想ユーザーを並行に走らせ、結果（JSONに書き出せるdict）を返す。
+
+    `unique_structs`はstructの種類数（0ならすべて別。少ないほどアドバイスのキャッシュが効く）。
+    """
+    import httpx
+    import jwt
+
+    recorder = FlowRecorder()
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://load", timeout=None) as client:
+
+        async def virtual_user(user_index: int):
+            user_id = f"load-user-{user_index}"
+            # USERPOOL_ID未設定のアプリは署名を検証しない
+            token = jwt.encode({"sub": user_id}, "load-test-secret-key-for-local-only", algorithm="HS256")
+            for flow_index in range(flows_per_user):
+                variant = user_index * flows_per_user + flow_index
+                if unique_structs:
+                    variant %= unique_structs
+                await run_flow(client, user_id, token, variant, advice_mode, recorder)
+                if think_ms:
+                    await asyncio.sleep(think_ms / 1000)
+
+        start_time = time.perf_counter()
+        await asyncio.gather(*(virtual_user(index) for index in range(users)))
+        elapsed = time.perf_counter() - start_time
+
+    requests = sum(len(latencies) for latencies in recorder.latencies.values())
+    return {
+        "summary": {
+            "flows": len(recorder.flow_latencies),
+            "failed_flows": recorder.failed_flows,
+            "requests": requests,
+            "errors": sum(recorder.errors.values()),
+            "elapsed_s": elapsed,
+            "throughput_flows_per_s": len(recorder.flow_latencies) / elapsed,
+            "throughput_rps": requests / elapsed,
+            "flow": summarize_latencies(recorder.flow_latencies),
+        },
+        "steps": {
+            step: {**summarize_latencies(recorder.latencies[step]), "errors": recorder.errors[step]}
+            for step in STEPS
+        },
+    }
+
+
+def compare_with_baseline(result: dict, baseline: dict, tolerance: float) -> list:
+    """
+    ベースラインより`tolerance`（0.2なら20%）を超えて悪化した項目を返す。
+
+    レイテンシは手順ごと・全体のp50/p99、スループットはリクエスト数/秒を比べる。
+    エラーはベースラインになくても1件あれば悪化とする。
+    """
+    regressions = []
+
+    def check_latencies(label: str, current: dict, base: dict):
+        for key in COMPARED_LATENCIES:
+            if key in current and base.get(key):
+                if current[key] > base[key] * (1 + tolerance):
+                    regressions.append(
+                        f"{label} {key}: {base[key]:.1f} → {current[key]:.1f}ms "
+                        f"(+{current[key] / base[key] - 1:.0%})"
+                    )
+
+    for step, current in result["steps"].items():
+        base = baseline.get("steps", {}).get(step, {})
+        check_latencies(step, current, base)
+        if current.get("errors", 0) > base.get("errors", 0):
+            regressions.append(f"{step} errors: {base.get('errors', 0)} → {current['errors']}")
+    check_latencies("flow", result["summary"]["flow"], baseline.get("summary", {}).get("flow", {}))
+
+    base_rps = baseline.get("summary", {}).get("throughput_rps")
+    current_rps = result["summary"]["throughput_rps"]
+    if base_rps and current_rps < base_rps * (1 - tolerance):
+        regressions.append(f"throughput_rps: {base_rps:.1f} → {current_rps:.1f} ({current_rps / base_rps - 1:.0%})")
+    return regressions
+
+
+def print_result(result: dict):
+    summary = result["summary"]
+    print(
+        f"flows={summary['flows']} failed={summary['failed_flows']} requests={summary['requests']} "
+        f"errors={summary['errors']} elapsed={summary['elapsed_s']:.2f}s "
+        f"rps={summary['throughput_rps']:.1f} flows/s={summary['throughput_flows_per_s']:.1f}"
+    )
+    for label, latency in [*result["steps"].items(), ("flow", summary["flow"])]:
+        if not latency.get("count"):
+            continue
+        print(
+            f"  {label:<7} n={latency['count']:<5} mean={latency['mean_ms']:>8.1f}ms "
+            + " ".join(f"p{p}={latency[f'p{p}_ms']:>8.1f}ms" for p in PERCENTILES)
+        )
+
+
+def prepare_table(endpoint_url: str):
+    """gameテーブルを用意し（なければ作成）、シナリオとコストを投入する"""
+    from botocore.exceptions import ClientError
+
+    from benchmarks.local_aws import HELPERS_DIR, create_game_table, seed_costs
+    from routers.helpers.aws_clients import get_game_table
+    from routers.helpers.loader import load_directory_to_dynamodb
+
+    try:
+        create_game_table(endpoint_url)
+    except ClientError as e:
+        if e.response["Error"]["Code"] != "ResourceInUseException":
+            raise
+    table = get_game_table()
+    load_directory_to_dynamodb(HELPERS_DIR / "scenarios", table=table)
+    seed_costs(table)
+    return table
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ユーザーの一連の操作を再現するエンドツーエンドの負荷試験")
+    parser.add_argument("--users", type=int, default=20, help="並行する仮想ユーザー数")
+    parser.add_argument("--flows", type=int, default=3, help="ユーザーごとの繰り返し回数")
+    parser.add_argument("--advice", choices=ADVICE_MODES, default="invoke", help="AIアドバイスの呼び出し方")
+    parser.add_argument("--unique-structs", type=int, default=0, help="structの種類数（0ならすべて別）")
+    parser.add_argument("--think-ms", type=float, default=0, help="流れの合間の待ち時間")
+    parser.add_argument("--latency-ms", type=float, default=5.0, help="DynamoDB呼び出しごとに加える疑似ネットワーク遅延")
+    parser.add_argument("--bedrock-first-token-ms", type=float, default=300, help="Bedrockの代替の最初のトークンまでの時間")
+    parser.add_argument("--bedrock-token-ms", type=float, default=10, help="Bedrockの代替のトークンごとの時間")
+    parser.add_argument("--endpoint-url", default=None, help="DynamoDB Localなどのエンドポイント（未指定ならmoto serverを起動）")
+    parser.add_argument("--output", default=None, help="結果のJSONの出力先")
+    parser.add_argument("--baseline", default=None, help="比べるベースラインのJSON")
+    parser.add_argument("--save-baseline", default=None, help="結果をベースラインとして保存するパス")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="悪化とみなす割合（0.25なら25%%）")
+    args = parser.parse_args()
+
+    from benchmarks.local_aws import add_latency, configure_environment, start_moto_server
+
+    server = None
+    endpoint_url = args.endpoint_url
+    if endpoint_url is None:
+        server, endpoint_url = start_moto_server(serialize=True)
+    try:
+        configure_environment(endpoint_url)
+        os.environ.pop("USERPOOL_ID", None)
+        os.environ["METRICS_ENABLED"] = "false"
+        table = prepare_table(endpoint_url)
+
+        from benchmarks.fake_bedrock import FakeBedrockClient
+        from main import app
+        from routers import costs, play
+        from routers.helpers.aws_clients import get_dynamodb_client
+
+        bedrock = FakeBedrockClient(first_token_ms=args.bedrock_first_token_ms, token_ms=args.bedrock_token_ms)
+        play.get_bedrock_client = lambda: bedrock
+        add_latency(table, args.latency_ms)
+        add_latency(costs.table.sync_table, args.latency_ms)
+        add_latency(get_dynamodb_client(), args.latency_ms)
+
+        config = {key: value for key, value in vars(args).items() if key not in ("output", "baseline", "save_baseline")}
+        print(f"endpoint={endpoint_url} " + " ".join(f"{key}={value}" for key, value in config.items()))
+
+        async def run():
+            # アプリの起動処理（シナリオ・フィードの読み込み）も本番と同じく先に済ませる
+            async with app.router.lifespan_context(app):
+                return await run_load(app, args.users, args.flows, args.advice, args.unique_structs, args.think_ms)
+
+        result = asyncio.run(run())
+        result["config"] = config
+        result["environment"] = {
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "recorded_at": datetime.now().isoformat(timespec="seconds"),
+        }
+        result["bedrock_invocations"] = bedrock.invocations
+        print_result(result)
+    finally:
+        if server is not None:
+            server.stop()
+
+    for path in (args.output, args.save_baseline):
+        if path:
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+            Path(path).write_text(json.dumps(result, ensure_ascii=False, indent=2) + "\n", encoding="utf-8")
+            print(f"wrote {path}")
+
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text(encoding="utf-8"))
+        regressions = compare_with_baseline(result, baseline, args.tolerance)
+        if regressions:
+            print(f"⚠️  ベースラインより{args.tolerance:.0%}を超えて悪化しました:")
+            for regression in regressions:
+                print(f"   {regression}")
+            sys.exit(1)
+        print(f"✅ ベースラインとの差は許容範囲内です（{args.tolerance:.0%}）")
+
+
+if __name__ == "__main__":
+    main()
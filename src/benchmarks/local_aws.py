@@ -0,0 +1,129 @@
+"""
+ベンチマーク用のローカルAWS環境
+
+moto serverをDynamoDBの代替として起動し、アプリと同じ`game`テーブルを用意する。
+アプリのモジュールはimport時にboto3リソースを作るので、
+`configure_environment`はアプリをimportする前に呼ぶこと。
+"""
+import json
+import logging
+import os
+import socket
+import threading
+import time
+from pathlib import Path
+
+import boto3
+from moto.server import ThreadedMotoServer
+
+REGION = "ap-northeast-1"
+HELPERS_DIR = Path(__file__).resolve().parent.parent / "routers" / "helpers"
+
+
+def find_free_port() -> int:
+    """空いているローカルポートを取得"""
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def serialize_moto_dynamodb():
+    """
+    moto serverのDynamoDBのリクエストを1つずつ処理させる。
+
+    motoのTransactWriteItemsは失敗時の巻き戻し用にテーブル全体をdeepcopyするので、
+    他のスレッドの書き込みと重なると`dictionary changed size during iteration`で500を返す
+    （botocoreの再試行で成功はするが、そのぶんレイテンシが揺れる）。実際のDynamoDBにはない挙動。
+    """
+    from moto.dynamodb.responses import DynamoHandler
+
+    call_action = DynamoHandler.call_action
+    if getattr(call_action, "serialized", False):
+        return
+    lock = threading.Lock()
+
+    def serialized_call_action(self):
+        with lock:
+            return call_action(self)
+
+    serialized_call_action.serialized = True
+    DynamoHandler.call_action = serialized_call_action
+
+
+def start_moto_server(port: int = None, serialize: bool = False) -> tuple:
+    """
+    moto serverを起動して(サーバー, エンドポイントURL)を返す。
+
+    トランザクションを並行して書き込む場合は`serialize=True`にする（`serialize_moto_dynamodb`）。
+    """
+    port = port or find_free_port()
+    if serialize:
+        serialize_moto_dynamodb()
+    # moto内部のwerkzeugがリクエストごとにアクセスログを出すので抑止する
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    server = ThreadedMotoServer(ip_address="127.0.0.1", port=port, verbose=False)
+    server.start()
+    return server, f"http://127.0.0.1:{port}"
+
+
+def configure_environment(endpoint_url: str):
+    """アプリがローカルのDynamoDBに繋がるよう環境変数を設定"""
+    os.environ["REGION"] = REGION
+    os.environ["AWS_DEFAULT_REGION"] = REGION
+    os.environ["AWS_ACCESS_KEY_ID"] = "testing"
+    os.environ["AWS_SECRET_ACCESS_KEY"] = "testing"
+    os.environ["AWS_ENDPOINT_URL_DYNAMODB"] = endpoint_url
+
+
+def create_game_table(endpoint_url: str):
+    """アプリと同じキー構成（ギャラリー用GSIを含む）のgameテーブルを作成"""
+    from routers.helpers.share_gallery import GALLERY_ATTRIBUTE_DEFINITIONS, gallery_index_definition
+
+    dynamodb = boto3.resource("dynamodb", region_name=REGION, endpoint_url=endpoint_url)
+    table = dynamodb.create_table(
+        TableName="game",
+        KeySchema=[
+            {"AttributeName": "PK", "KeyType": "HASH"},
+            {"AttributeName": "SK", "KeyType": "RANGE"},
+        ],
+        AttributeDefinitions=[
+            {"AttributeName": "PK", "AttributeType": "S"},
+            {"AttributeName": "SK", "AttributeType": "S"},
+            *GALLERY_ATTRIBUTE_DEFINITIONS,
+        ],
+        GlobalSecondaryIndexes=[gallery_index_definition()],
+        BillingMode="PAY_PER_REQUEST",
+    )
+    table.wait_until_exists()
+    return table
+
+
+def seed_costs(table):
+    """同梱のコストJSONをテーブルに投入"""
+    from routers.helpers.loader import convert_to_dynamodb_format
+
+    with open(HELPERS_DIR / "costs" / "dynamodb_costs.json", "r", encoding="utf-8") as f:
+        costs_data = json.load(f)
+
+    table.put_item(
+        Item={
+            "PK": "costs",
+            "SK": "metadata",
+            "costs": convert_to_dynamodb_format(costs_data.get("costs", {})),
+        }
+    )
+
+
+def add_latency(table, latency_ms: float):
+    """実際のネットワーク往復を模して、各DynamoDB呼び出しに遅延を加える（Tableか低レベルクライアント）"""
+    if latency_ms <= 0:
+        return
+
+    def sleep_before_send(**kwargs):
+        time.sleep(latency_ms / 1000)
+
+    client = getattr(table.meta, "client", table)
+    # 共有クライアントに複数回登録しても遅延が重ならないようunique_idを付ける
+    client.meta.events.register(
+        "before-send.dynamodb", sleep_before_send, unique_id="benchmark-latency"
+    )
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+レポート生成でのシナリオ解決と月のリクエスト数の集計のベンチマーク
+
+シナリオ数・月数を変えて、1回のレポートでシナリオと月の合計を求める時間を比べる
+（DynamoDBとの往復は含まない。従来方式はこれに加えて毎回シナリオ一覧を読み込んでいた）。
+
+- legacy: シナリオ一覧を名前の部分一致で走査 → IDでシナリオを取得 → requestsを走査して月の合計
+- indexed: ゲームのscenario_idと、読み込み時に集計した(scenario_id, 月)の合計を参照
+
+    cd src
+    uv run python -m benchmarks.report_game --scenarios 10 1000 --months 12 120
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+# srcディレクトリをパスに追加
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from routers.helpers.scenario_repository import ScenarioIndex
+
+
+def make_items(scenarios: int, months: int) -> list:
+    return [
+        {
+            "scenario_id": f"scenario-{index:05d}",
+            "name": f"シナリオ {index:05d}",
+            "end_month": months,
+            "current_month": 0,
+            "features": [],
+            "requests": [
+                {
+                    "month": month,
+                    "feature": [{"feature_id": f"f{feature}", "request": 100 * feature} for feature in range(4)],
+                    "funds": 1000,
+                    "description": "",
+                }
+                for month in range(months)
+            ],
+        }
+        for index in range(scenarios)
+    ]
+
+
+def legacy_lookup(index: ScenarioIndex, scenario_name: str, current_month: int) -> int:
+    """以前のreport_gameと同じ手順（一覧の走査・IDでの再取得・requestsの走査）"""
+    scenarios = list(index.summaries)
+    target = None
+    for scenario in scenarios:
+        if scenario_name in scenario.name or scenario.name in scenario_name:
+            target = scenario
+            break
+    detail = index.scenarios[target.scenario_id]
+    month_requests = 0
+    for request_data in [request.model_dump() for request in detail.requests]:
+        if request_data.get("month") == current_month:
+            for feature in request_data.get("feature", []):
+                if isinstance(feature, dict) and "request" in feature:
+                    month_requests += feature["request"]
+            break
+    return month_requests
+
+
+def indexed_lookup(index: ScenarioIndex, scenario_id: str, current_month: int) -> int:
+    if scenario_id not in index.scenarios:
+        raise KeyError(scenario_id)
+    return index.month_requests.get((scenario_id, current_month), 0)
+
+
+def median_us(function, iterations: int) -> float:
+    latencies = []
+    for _ in range(iterations):
+        start_time = time.perf_counter()
+        function()
+        latencies.append((time.perf_counter() - start_time) * 1_000_000)
+    return statistics.median(latencies)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="レポート生成のシナリオ解決のベンチマーク")
+    parser.add_argument("--scenarios", type=int, nargs="+", default=[10, 1000], help="シナリオ数")
+    parser.add_argument("--months", type=int, nargs="+", default=[12, 120], help="シナリオの月数")
+    parser.add_argument("--iterations", type=int, default=200, help="計測ごとの繰り返し回数")
+    args = parser.parse_args()
+
+    for scenarios in args.scenarios:
+        for months in args.months:
+            index = ScenarioIndex(make_items(scenarios, months), "bench")
+            # 一覧の末尾のシナリオの最終月（従来方式で最も走査が長い）
+            last = index.summaries[-1]
+            month = months - 1
+
+            assert legacy_lookup(index, last.name, month) == indexed_lookup(index, last.scenario_id, month)
+            legacy_us = median_us(lambda: legacy_lookup(index, last.name, month), args.iterations)
+            indexed_us = median_us(lambda: indexed_lookup(index, last.scenario_id, month), args.iterations)
+            print(
+                f"scenarios={scenarios:<5} months={months:<4} legacy={legacy_us:>10.1f}µs "
+                f"indexed={indexed_us:>6.2f}µs ({legacy_us / indexed_us:,.0f}x)"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+共有構成のフィードのベンチマーク
+
+ギャラリーの件数を変えて、次の時間を比べる（DynamoDBとの往復は含まない）。
+
+- read: メモリ上のスナップショットを返す（フィードの読み込み1回分）
+- upsert: 公開・コピー1件を上位の並びにだけ反映する（差分更新）
+- rebuild: 全件から上位を選び直す（差分更新をしない場合の1件ごとの更新）
+
+    cd src
+    uv run python -m benchmarks.share_feeds --entries 1000 100000
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+# srcディレクトリをパスに追加
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from routers.helpers.share_feeds import FEED_RANKS, ShareFeeds, entry_key, to_feed_entry
+
+
+def make_item(index: int) -> dict:
+    return {
+        "user_id": f"user-{index % 997}",
+        "sandbox_id": f"box-{index:07d}",
+        "title": f"構成 {index}",
+        "description": None,
+        "published_at": f"2025-07-12T10:00:00.{index:07d}",
+        "copy_count": random.randint(0, 1000),
+        "cost_per_feature": random.uniform(1, 100),
+        "is_public": True,
+    }
+
+
+def build_feeds(entries: int, size: int) -> ShareFeeds:
+    feeds = ShareFeeds(table=None, size=size, refresh_seconds=float("inf"), clock=lambda: 0.0)
+    for index in range(entries):
+        entry = to_feed_entry(make_item(index))
+        feeds._entries[entry_key(entry["user_id"], entry["sandbox_id"])] = entry
+    for name in FEED_RANKS:
+        feeds._rebuild(name)
+    feeds._loaded_at = 0.0
+    return feeds
+
+
+def median_us(function, iterations: int) -> float:
+    latencies = []
+    for _ in range(iterations):
+        start_time = time.perf_counter()
+        function()
+        latencies.append((time.perf_counter() - start_time) * 1_000_000)
+    return statistics.median(latencies)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="共有構成のフィードのベンチマーク")
+    parser.add_argument("--entries", type=int, nargs="+", default=[1000, 100000], help="ギャラリーの件数")
+    parser.add_argument("--size", type=int, default=50, help="フィードの件数")
+    parser.add_argument("--iterations", type=int, default=200, help="計測ごとの繰り返し回数")
+    args = parser.parse_args()
+
+    random.seed(0)
+    for entries in args.entries:
+        feeds = build_feeds(entries, args.size)
+        counter = iter(range(entries, entries * 10))
+
+        read_us = median_us(lambda: feeds.get("recent"), args.iterations)
+        upsert_us = median_us(lambda: feeds.on_published(make_item(next(counter))), args.iterations)
+        rebuild_us = median_us(lambda: [feeds._rebuild(name) for name in FEED_RANKS], max(5, args.iterations // 20))
+        print(
+            f"entries={entries:<7} read={read_us:>6.2f}µs upsert={upsert_us:>8.1f}µs "
+            f"rebuild={rebuild_us:>10.1f}µs ({rebuild_us / upsert_us:,.0f}x)"
+        )
+
+
+if __name__ == "__main__":
+    main()
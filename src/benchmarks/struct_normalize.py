@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+"""
+structのコスト計算用変換のベンチマーク
+
+以前の手書きループ版と、マッピング表による`StructNormalizer`を、
+数万コンポーネントのstructで比較する（結果が一致することも確認する）。
+
+    cd src
+    uv run python -m benchmarks.struct_normalize --components 50000
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+# srcディレクトリをパスに追加
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+COMPUTE_TYPES = ["ec2", "lambda", "ecs", "fargate"]
+DATABASE_TYPES = ["rds", "dynamo_db", "aurora"]
+NETWORK_TYPES = ["nat_gateway", "alb", "internet_gateway"]
+SUBNET_TYPES = ["public_subnet", "private_subnet"]
+
+
+def legacy_convert_struct(struct_data):
+    """以前の実装（コレクションごとの手書きループ）"""
+    if not struct_data:
+        return {}
+
+    converted = {}
+
+    # 既にシンプルな形式の場合はそのまま返す
+    if all(
+        isinstance(v, (dict, int, float)) and not isinstance(v, list)
+        for v in struct_data.values()
+    ):
+        # トップレベルがサービス名の場合
+        if any(
+            key.lower()
+            in [
+                "ec2",
+                "rds",
+                "s3",
+                "lambda",
+                "vpc",
+                "nat_gateway",
+                "elastic_ip",
+                "dynamo_db",
+            ]
+            for key in struct_data.keys()
+        ):
+            return struct_data
+
+    # 複雑な構造の場合は変換処理を実行
+    try:
+        # VPCの処理
+        if "vpc" in struct_data:
+            converted["vpc"] = {"quantity": 1}
+
+        # Availability Zonesの処理
+        if "availabilityZones" in struct_data:
+            az_count = len(struct_data["availabilityZones"])
+            if az_count > 0:
+                converted["availability_zone"] = {"quantity": az_count}
+
+        # Subnetsの処理
+        if "subnets" in struct_data:
+            subnet_types = {}
+            for subnet in struct_data["subnets"]:
+                subnet_type = subnet.get("type", "subnet")
+                if subnet_type in subnet_types:
+                    subnet_types[subnet_type] += 1
+                else:
+                    subnet_types[subnet_type] = 1
+
+            for subnet_type, count in subnet_types.items():
+                converted[subnet_type] = {"quantity": count}
+
+        # Networksの処理
+        if "networks" in struct_data:
+            network_types = {}
+            for network in struct_data["networks"]:
+                network_type = network.get("type", "network")
+                if network_type in network_types:
+                    network_types[network_type] += 1
+                else:
+                    network_types[network_type] = 1
+
+            for network_type, count in network_types.items():
+                converted[network_type] = {"quantity": count}
+
+        # Computesの処理
+        if "computes" in struct_data:
+            compute_types = {}
+            elastic_ip_count = 0
+
+            for compute in struct_data["computes"]:
+                compute_type = compute.get("type", "compute")
+                if compute_type in compute_types:
+                    compute_types[compute_type] += 1
+                else:
+                    compute_types[compute_type] = 1
+
+                # Elastic IPの数もカウント
+                if "elasticIpId" in compute:
+                    elastic_ip_count += 1
+
+            for compute_type, count in compute_types.items():
+                converted[compute_type] = {"quantity": count}
+
+            if elastic_ip_count > 0:
+                converted["elastic_ip"] = {"quantity": elastic_ip_count}
+
+        # Databasesの処理
+        if "databases" in struct_data:
+            database_types = {}
+            for database in struct_data["databases"]:
+                database_type = database.get("type", "database")
+                if database_type in database_types:
+                    database_types[database_type] += 1
+                else:
+                    database_types[database_type] = 1
+
+            for database_type, count in database_types.items():
+                converted[database_type] = {"quantity": count}
+
+        # 配列形式の場合の処理
+        if isinstance(struct_data, list):
+            for item in struct_data:
+                if isinstance(item, dict):
+                    sub_converted = legacy_convert_struct(item)
+                    for key, value in sub_converted.items():
+                        if key in converted:
+                            if isinstance(converted[key], dict) and isinstance(
+                                value, dict
+                            ):
+                                converted[key]["quantity"] = converted[key].get(
+                                    "quantity", 0
+                                ) + value.get("quantity", 0)
+                        else:
+                            converted[key] = value
+
+        return converted if converted else struct_data
+
+    except Exception as e:
+        print(f"struct変換エラー: {e}")
+        return struct_data if isinstance(struct_data, dict) else {}
+
+
+def make_struct(components: int, seed: int = 0) -> dict:
+    """指定数のコンポーネントを持つstructを作る（computesが半分、残りを他のコレクションに分ける）"""
+    rng = random.Random(seed)
+    subnets = [
+        {"id": f"subnet-{i}", "type": rng.choice(SUBNET_TYPES), "position": {"x": i, "y": 0}}
+        for i in range(max(1, components // 10))
+    ]
+    computes = []
+    for i in range(components // 2):
+        compute = {
+            "id": f"compute-{i}",
+            "type": rng.choice(COMPUTE_TYPES),
+            "subnetId": rng.choice(subnets)["id"],
+            "position": {"x": i, "y": 1},
+        }
+        if rng.random() < 0.2:
+            compute["elasticIpId"] = f"eip-{i}"
+        computes.append(compute)
+    rest = components - len(subnets) - len(computes)
+    return {
+        "vpc": {"id": "vpc-1"},
+        "availabilityZones": [{"id": "az-a"}, {"id": "az-c"}],
+        "subnets": subnets,
+        "networks": [{"id": f"network-{i}", "type": rng.choice(NETWORK_TYPES)} for i in range(rest // 2)],
+        "computes": computes,
+        "databases": [{"id": f"db-{i}", "type": rng.choice(DATABASE_TYPES)} for i in range(rest - rest // 2)],
+    }
+
+
+def measure(convert, struct, iterations: int) -> list:
+    """変換1回あたりの所要時間（ミリ秒）を集める"""
+    latencies = []
+    for _ in range(iterations):
+        start_time = time.perf_counter()
+        convert(struct)
+        latencies.append((time.perf_counter() - start_time) * 1000)
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description="structのコスト計算用変換のベンチマーク")
+    parser.add_argument("--components", type=int, nargs="+", default=[1000, 10000, 50000], help="structのコンポーネント数")
+    parser.add_argument("--iterations", type=int, default=50, help="方式ごとの変換回数")
+    args = parser.parse_args()
+
+    from routers.helpers.struct_normalizer import get_struct_normalizer
+
+    normalizer = get_struct_normalizer()
+    for components in args.components:
+        struct = make_struct(components)
+        legacy = legacy_convert_struct(struct)
+        current = normalizer.normalize(struct)
+        assert legacy == current, "以前の実装と結果が一致しません"
+
+        results = {}
+        for label, convert in (("legacy", legacy_convert_struct), ("normalizer", normalizer.normalize)):
+            latencies = measure(convert, struct, args.iterations)
+            results[label] = statistics.median(latencies)
+            print(
+                f"components={components:<6} {label:<10} "
+                f"p50={results[label]:>7.3f}ms min={min(latencies):>7.3f}ms"
+            )
+        print(f"components={components:<6} speedup=x{results['legacy'] / results['normalizer']:.2f}")
+
+
+if __name__ == "__main__":
+    main()
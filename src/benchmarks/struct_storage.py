@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+structの保存形式のベンチマーク
+
+従来のMap形式と圧縮形式（zlib）を、コンポーネント数の違うstructで比較する。
+
+- サイズ: DynamoDBでのおおよその属性サイズと、1回の書き込み・読み込みの消費キャパシティ
+  （WCU = 1KB単位、RCU = 強い整合性の読み込みで4KB単位）
+- marshal: boto3のresource層と同じTypeSerializer / TypeDeserializerでの変換時間
+  （圧縮形式は圧縮・展開の時間を含む）
+- round trip: moto server相手の`put_item` + `get_item`（`--skip-round-trip`で省略）
+
+    cd src
+    uv run python -m benchmarks.struct_storage --components 100 1000 5000
+"""
+import argparse
+import math
+import os
+import statistics
+import sys
+import time
+
+# srcディレクトリをパスに追加
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from boto3.dynamodb.types import Binary, TypeDeserializer, TypeSerializer
+
+from benchmarks.struct_normalize import make_struct
+
+ITEM_SIZE_LIMIT = 400 * 1024
+
+
+def median_ms(function, iterations: int) -> float:
+    latencies = []
+    for _ in range(iterations):
+        start_time = time.perf_counter()
+        function()
+        latencies.append((time.perf_counter() - start_time) * 1000)
+    return statistics.median(latencies)
+
+
+def measure_marshal(stored_value, iterations: int) -> tuple:
+    """(書き込み時の変換, 読み込み時の変換)のミリ秒"""
+    from routers.helpers.struct_codec import decode_struct, encode_struct, is_encoded
+
+    serializer = TypeSerializer()
+    deserializer = TypeDeserializer()
+    wire = serializer.serialize(stored_value)
+
+    if is_encoded(stored_value):
+        struct = decode_struct(stored_value)
+
+        def write():
+            serializer.serialize(Binary(encode_struct(struct)))
+
+        def read():
+            decode_struct(deserializer.deserialize(wire))
+    else:
+        def write():
+            serializer.serialize(stored_value)
+
+        def read():
+            deserializer.deserialize(wire)
+
+    return median_ms(write, iterations), median_ms(read, iterations)
+
+
+def measure_round_trip(table, stored_value, iterations: int) -> float:
+    """put_item + get_item 1往復ずつのミリ秒"""
+    from routers.helpers.struct_codec import decode_item_struct
+
+    key = {"PK": "user#bench", "SK": "game#bench"}
+
+    def round_trip():
+        table.put_item(Item={**key, "struct": stored_value})
+        decode_item_struct(table.get_item(Key=key, ConsistentRead=True)["Item"])
+
+    return median_ms(round_trip, iterations)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="structの保存形式のベンチマーク")
+    parser.add_argument("--components", type=int, nargs="+", default=[100, 1000, 5000], help="structのコンポーネント数")
+    parser.add_argument("--iterations", type=int, default=20, help="計測ごとの繰り返し回数")
+    parser.add_argument("--skip-round-trip", action="store_true", help="moto serverでの往復計測を省略")
+    args = parser.parse_args()
+
+    table = None
+    server = None
+    if not args.skip_round_trip:
+        from benchmarks.local_aws import configure_environment, create_game_table, start_moto_server
+
+        server, endpoint_url = start_moto_server()
+        configure_environment(endpoint_url)
+        table = create_game_table(endpoint_url)
+
+    from routers.helpers.struct_codec import encode_struct_for_storage, estimate_attribute_size
+    from routers.helpers.attribute_values import to_dynamodb_value
+
+    try:
+        for components in args.components:
+            struct = to_dynamodb_value(make_struct(components))
+            for storage_format in ("map", "zlib"):
+                stored_value = encode_struct_for_storage(struct, storage_format)
+                size = estimate_attribute_size(stored_value)
+                write_ms, read_ms = measure_marshal(stored_value, args.iterations)
+                line = (
+                    f"components={components:<5} {storage_format:<4} size={size:>9,}B "
+                    f"WCU={math.ceil(size / 1024):<4} RCU={math.ceil(size / 4096):<4} "
+                    f"marshal write={write_ms:>7.2f}ms read={read_ms:>7.2f}ms"
+                )
+                if size > ITEM_SIZE_LIMIT:
+                    line += "  (400KBの上限超過)"
+                elif table is not None:
+                    line += f" round_trip={measure_round_trip(table, stored_value, args.iterations):>7.2f}ms"
+                print(line)
+    finally:
+        if server is not None:
+            server.stop()
+
+
+if __name__ == "__main__":
+    main()
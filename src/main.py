@@ -1,11 +1,42 @@
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+import logging
+from fastapi import Depends, FastAPI, Response
 import uvicorn
 from fastapi.middleware.cors import CORSMiddleware
 from routers import play
 from routers import share
 from routers import costs
+from routers.extractor import verify_admin_token
+from routers.helpers.metrics import CONTENT_TYPE, MetricsMiddleware, registry, track_in_flight
+from routers.helpers.profiling import ProfilingMiddleware
+from routers.helpers.service import scenario_service
+from settings import get_MetricsSettings, get_ProfilingSettings
 
-app = FastAPI()
+logger = logging.getLogger(__name__)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # シナリオを起動時に読み込んでおく（失敗しても初回参照時に再試行される）
+    try:
+        await scenario_service.repository.load()
+    except Exception:
+        logger.exception("起動時のシナリオ読み込みに失敗しました")
+    # フィードも起動時に作っておく（失敗しても参照時にバックグラウンドで再試行される）
+    try:
+        await share.share_feeds.load()
+    except Exception:
+        logger.exception("起動時のフィード読み込みに失敗しました")
+    yield
+
+
+metrics_settings = get_MetricsSettings()
+
+# 処理中のリクエスト数はルーティング後に数える（件数と処理時間はMetricsMiddleware）
+app = FastAPI(
+    lifespan=lifespan,
+    dependencies=[Depends(track_in_flight)] if metrics_settings.ENABLED else [],
+)
 
 origins = [
     "http://localhost:5173",
@@ -20,6 +51,13 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+if get_ProfilingSettings().ENABLED:
+    app.add_middleware(ProfilingMiddleware)
+
+if metrics_settings.ENABLED:
+    # CORSより外側に置き、プリフライトも含めて記録する
+    app.add_middleware(MetricsMiddleware)
+
 
 @app.get("/health")
 def health_check():
@@ -31,6 +69,14 @@ def health_health_check():
     return {"message": "Hello!"}
 
 
+@app.get("/metrics", include_in_schema=False, dependencies=[Depends(verify_admin_token)])
+def metrics():
+    """Prometheusのテキスト形式でメトリクスを返す（X-Admin-Tokenが必要）"""
+    if not metrics_settings.ENABLED:
+        return Response(status_code=404)
+    return Response(registry.render(), media_type=CONTENT_TYPE)
+
+
 app.include_router(play.play_router)
 app.include_router(share.share_router)
 app.include_router(costs.costs_router)
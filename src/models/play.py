@@ -1,5 +1,5 @@
-from pydantic import BaseModel
-from typing import Optional, Dict, List, Any
+from pydantic import BaseModel, Field, model_validator
+from typing import Optional, Dict, List, Any, Literal
 
 class ScenarioSummary(BaseModel):
     scenario_id: str
@@ -9,6 +9,10 @@ class ScenarioSummary(BaseModel):
     feature_count: int
     created_at: str
 
+class ScenarioSummaryPage(BaseModel):
+    items: List[ScenarioSummary]
+    next_cursor: Optional[str] = None
+
 class ScenarioDetail(BaseModel):
     scenario: str
     requests: Dict[str, str]
@@ -49,6 +53,29 @@ class UpdateGameRequest(BaseModel):
 class UpdateGameRequest(BaseModel):
     data: dict
 
+class JsonPatchOperation(BaseModel):
+    """JSON Patch（RFC 6902）の1操作"""
+    op: Literal["add", "remove", "replace", "move", "copy", "test"]
+    path: str
+    value: Any = None
+    from_: Optional[str] = Field(None, alias="from")
+
+    @model_validator(mode="after")
+    def check_required_members(self):
+        if self.op in ("add", "replace", "test") and "value" not in self.model_fields_set:
+            raise ValueError(f"{self.op}にはvalueの指定が必要です")
+        if self.op in ("move", "copy") and self.from_ is None:
+            raise ValueError(f"{self.op}にはfromの指定が必要です")
+        return self
+
+class PatchGameResponse(BaseModel):
+    message: str
+    mode: str  # partial: 変更箇所だけを更新 / full: struct全体を書き戻し
+    revision: int
+
+class SimulateScenarioRequest(BaseModel):
+    struct_data: dict
+
 class GetStructResponse(BaseModel):
     struct: Optional[dict] = None
 
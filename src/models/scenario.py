@@ -68,6 +68,26 @@ class CostCalculationResult(BaseModel):
     features_used: List[str]
     description: str
 
+class MonthlySimulation(BaseModel):
+    """月別シミュレーション結果モデル"""
+    month: int
+    total_requests: int
+    budget: float
+    calculated_cost: float
+    budget_remaining: float
+    is_over_budget: bool
+    is_defined: bool
+
+class ScenarioSimulationResult(BaseModel):
+    """シナリオ全期間のシミュレーション結果モデル"""
+    scenario_id: str
+    end_month: int
+    monthly_cost: float
+    per_request_cost: float
+    total_cost: float
+    first_over_budget_month: Optional[int] = None
+    months: List[MonthlySimulation]
+
 def convert_decimal_to_int(obj):
     """Decimal型をintに変換するヘルパー関数"""
     if isinstance(obj, dict):
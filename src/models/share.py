@@ -4,16 +4,25 @@ from typing import Optional, Dict, List
 class SharedStructure(BaseModel):
     user_id: str
     sandbox_id: str
+    title: str
+    description: Optional[str] = None
     struct: dict
     is_public: bool = True
+    published_at: str
     created_at: str
+    copy_count: int = 0
+    cost_per_feature: Optional[float] = None
 
 class SharedStructureSummary(BaseModel):
+    """ギャラリーの一覧の1件（structは含めない）"""
     user_id: str
     sandbox_id: str
-    struct: dict
-    is_published: bool
-    created_at: str
+    title: str
+    description: Optional[str] = None
+    published_at: str
+    copy_count: int = 0
+    # リソース1つあたりの月額固定費（リソースのない構成はNone）
+    cost_per_feature: Optional[float] = None
 
 class CreateSharedStructureRequest(BaseModel):
     title: str
@@ -25,8 +34,12 @@ class UpdateSharedStructureRequest(BaseModel):
     struct: dict
 
 class SharedStructuresResponse(BaseModel):
+    """ギャラリーの1ページ（次ページは`next_cursor`を`cursor`に指定）"""
     structures: List[SharedStructureSummary]
-    total_count: int
-    page: int
     page_size: int
     has_next: bool
+    next_cursor: Optional[str] = None
+
+class CopySharedStructureResponse(BaseModel):
+    sandbox_id: str
+    copied_from: str
@@ -1,104 +1,131 @@
 from fastapi import APIRouter, HTTPException, Depends
 from pydantic import BaseModel
-import boto3
+from typing import List
 from boto3.dynamodb.conditions import Key, Attr
 import uuid
+from collections import Counter
 from decimal import Decimal
-from routers.extractor import extract_user_id_without_verification
+from routers.extractor import extract_user_id_without_verification, verify_admin_token
+from routers.helpers.dynamodb import AsyncTable
+from routers.helpers.aws_clients import get_game_table
+from routers.helpers.cost_catalog import CostCatalogCache
+from routers.helpers.cost_engine import collect_resource_types, compile_catalog
 
-from settings import get_DynamoDbSettings
+from settings import get_CostCacheSettings
 
 costs_router = APIRouter()
 
-settings = get_DynamoDbSettings()
+table = AsyncTable(get_game_table())
 
-REGION = settings.REGION
 
-dynamodb = boto3.resource(
-    "dynamodb",
-    region_name=REGION,
+async def fetch_cost_catalog() -> dict:
+    """DynamoDBからコストカタログを取得"""
+    response = await table.query(
+        KeyConditionExpression=Key("PK").eq("costs") & Key("SK").begins_with("metadata")
+    )
+    items = response.get("Items", [])
+    return items[0].get("costs", {}) if items else {}
+
 
+cost_cache_settings = get_CostCacheSettings()
+cost_catalog = CostCatalogCache(
+    fetch_cost_catalog,
+    ttl_seconds=cost_cache_settings.TTL_SECONDS,
+    stale_seconds=cost_cache_settings.STALE_SECONDS,
 )
 
-table_name = "game"
-table = dynamodb.Table(table_name)
+# 一括計算で受け付けるコスト行列の最大セル数
+MAX_BATCH_CELLS = 1_000_000
 
 class CostCalculationRequest(BaseModel):
     struct_data: dict
     num_requests: int = 1000
 
+class BatchCostCalculationRequest(BaseModel):
+    structs: List[dict]
+    num_requests: List[int]
+
 
 
 def calculate_final_cost(struct_data: dict, costs_db: dict, num_requests: int) -> float:
     """
     インフラ構成と料金DBから、月額固定費とリクエスト変動費を考慮した最終コストを計算する。
     """
-    monthly_cost = 0.0
-    per_request_cost = 0.0
-
-    for resource_type in find_resource_types(struct_data):
-        if resource_type in costs_db:
-            resource_info = costs_db[resource_type]
-            cost = float(resource_info.get("cost", 0))
-            billing_type = resource_info.get("type")
-
-            if billing_type == "per_month":
-                monthly_cost += cost
-            elif billing_type == "per_request":
-                per_request_cost += cost
-    
-    final_cost = monthly_cost + (per_request_cost * num_requests)
-    return final_cost
+    return compile_catalog(costs_db).evaluate_struct(struct_data, num_requests).final_cost
 
 @costs_router.get("/costs")
 async def get_costs():
-    response = table.query(
-        KeyConditionExpression=Key("PK").eq("costs") & Key("SK").begins_with("metadata")
-    )
-    formatted_data = response.get("Items", [{}])[0].get("costs", {})
+    formatted_data = await cost_catalog.get()
 
     return formatted_data
 
+@costs_router.get("/costs/cache")
+async def get_cost_cache_stats():
+    """コストカタログキャッシュのヒット/ミス統計"""
+    return cost_catalog.stats()
+
+@costs_router.post("/costs/cache/invalidate", dependencies=[Depends(verify_admin_token)])
+async def invalidate_cost_cache():
+    """コストカタログキャッシュを破棄（loader.py --load-costs から呼ばれる）"""
+    cost_catalog.invalidate()
+    return {"message": "Cost cache invalidated"}
+
 @costs_router.post("/calculate")
 async def calculate_cost(request: CostCalculationRequest):
-    response = table.query(
-        KeyConditionExpression=Key("PK").eq("costs") & Key("SK").begins_with("metadata")
-    )
-    items = response.get("Items", [])
-    
-    if not items:
-        raise HTTPException(status_code=404, detail="Cost data not found")
-    
-    costs_db = items[0].get("costs", {})
+    costs_db = await cost_catalog.get()
     
     if not costs_db:
         raise HTTPException(status_code=404, detail="Cost data not found")
     
-    final_cost = calculate_final_cost(request.struct_data, costs_db, request.num_requests)
-    resource_types = list(find_resource_types(request.struct_data))
-    
-    monthly_cost = sum(float(costs_db.get(t, {}).get("cost", 0)) for t in resource_types if costs_db.get(t, {}).get("type") == "per_month")
-    request_cost = sum(float(costs_db.get(t, {}).get("cost", 0)) for t in resource_types if costs_db.get(t, {}).get("type") == "per_request") * request.num_requests
+    # structは1回だけ走査し、その結果から合計と内訳をまとめて計算する
+    resource_types = collect_resource_types(request.struct_data)
+    breakdown = compile_catalog(costs_db).evaluate(Counter(resource_types), request.num_requests)
     
     return {
-        "final_cost": final_cost,
+        "final_cost": breakdown.final_cost,
         "num_requests": request.num_requests,
         "resource_types": resource_types,
         "breakdown": {
-            "monthly_cost": monthly_cost,
-            "request_cost": request_cost
+            "monthly_cost": breakdown.monthly_cost,
+            "request_cost": breakdown.request_cost
         }
     }
 
 
+@costs_router.post("/calculate/batch")
+async def calculate_cost_batch(request: BatchCostCalculationRequest):
+    """複数のstruct × 複数のリクエスト数のコストを行列としてまとめて計算"""
+    if not request.structs or not request.num_requests:
+        raise HTTPException(status_code=400, detail="structs and num_requests must not be empty")
+    if len(request.structs) * len(request.num_requests) > MAX_BATCH_CELLS:
+        raise HTTPException(status_code=400, detail=f"Batch too large (max {MAX_BATCH_CELLS} cells)")
+
+    costs_db = await cost_catalog.get()
+
+    if not costs_db:
+        raise HTTPException(status_code=404, detail="Cost data not found")
+
+    result = compile_catalog(costs_db).evaluate_batch(request.structs, request.num_requests)
+
+    return {
+        "num_requests": request.num_requests,
+        "cost_matrix": result.cost_matrix.tolist(),
+        "breakdowns": [
+            {
+                "monthly_cost": monthly_cost,
+                "per_request_cost": per_request_cost,
+                "resource_counts": dict(resource_counts),
+            }
+            for monthly_cost, per_request_cost, resource_counts in zip(
+                result.monthly_costs.tolist(),
+                result.per_request_costs.tolist(),
+                result.resource_counts,
+            )
+        ],
+    }
+
+
 
 def find_resource_types(data):
     """structデータからリソースタイプを抽出するヘルパー関数"""
-    if isinstance(data, dict):
-        if "type" in data:
-            yield data["type"]
-        for value in data.values():
-            yield from find_resource_types(value)
-    elif isinstance(data, list):
-        for item in data:
-            yield from find_resource_types(item)
\ No newline at end of file
+    return iter(collect_resource_types(data))
@@ -1,11 +1,31 @@
+import hmac
 import jwt
 from fastapi import Request, HTTPException
 
-def extract_user_id_without_verification(request: Request) -> str:
+from routers.helpers.jwt_verifier import get_jwt_verifier
+from settings import get_AdminSettings
+
+def get_bearer_token(request: Request) -> str:
     auth_header = request.headers.get("Authorization")
     if not auth_header or not auth_header.lower().startswith("bearer "):
         raise HTTPException(status_code=401, detail="Invalid Authorization header")
-    token = auth_header.split()[1]
+    parts = auth_header.split()
+    if len(parts) != 2:
+        raise HTTPException(status_code=401, detail="Invalid Authorization header")
+    return parts[1]
+
+def extract_user_id(request: Request) -> str:
+    """
+    Cognitoのトークンを検証してsubを返す。
+    USERPOOL_ID未設定（ローカル開発・テスト）のときは署名を検証せずにデコードする。
+    """
+    verifier = get_jwt_verifier()
+    if verifier is None:
+        return extract_user_id_without_verification(request)
+    return verifier.verify(get_bearer_token(request))["sub"]
+
+def extract_user_id_without_verification(request: Request) -> str:
+    token = get_bearer_token(request)
 
     try:
         payload = jwt.decode(token, options={"verify_signature": False})
@@ -14,4 +34,20 @@ def extract_user_id_without_verification(request: Request) -> str:
     user_id = payload.get("sub")
     if not user_id:
         raise HTTPException(status_code=401, detail="sub claim missing")
-    return user_id
\ No newline at end of file
+    return user_id
+
+def is_admin_token_valid(provided: str) -> bool:
+    """
+    管理用のトークン（X-Admin-Token）が正しいか。
+
+    ADMIN_TOKEN未設定なら拒否する（ADMIN_ALLOW_UNAUTHENTICATED=trueのローカル開発時だけ素通し）。
+    """
+    settings = get_AdminSettings()
+    if not settings.ADMIN_TOKEN:
+        return settings.ALLOW_UNAUTHENTICATED
+    return hmac.compare_digest(provided, settings.ADMIN_TOKEN)
+
+def verify_admin_token(request: Request) -> None:
+    """管理用エンドポイントのトークンを検証"""
+    if not is_admin_token_valid(request.headers.get("X-Admin-Token", "")):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
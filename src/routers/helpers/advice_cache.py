@@ -0,0 +1,373 @@
+"""
+AIアドバイスのキャッシュ
+
+同じ（または座標やIDの名前だけが違う）構成へのアドバイスは同じになるので、
+正規化したstructのハッシュ・モデルID・プロンプトのバージョンをキーにして
+Bedrockの応答を使い回す。正規化ではIDを捨てずに内容とつながりから決まるラベルに付け替えるので、
+配線の違う構成は別のキーになり、プロンプト（正規形から作る）に他のユーザーのIDは入らない。
+
+- 1段目: プロセス内のLRU + TTL
+- 2段目（任意）: DynamoDB（PK=advice_cache, SK=キー）。プロセス間・再起動後も共有される
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, NamedTuple, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# 配置など、アドバイスの内容に関係しないフィールド
+VOLATILE_STRUCT_KEYS = frozenset((
+    "position", "x", "y", "width", "height", "created_at", "updated_at",
+    "createdAt", "updatedAt",
+))
+# struct内に見つからないIDへの参照（参照があること自体は残す）
+EXTERNAL_REFERENCE = "<external>"
+# 参照をたどって各リソースの署名を作り直す回数（構成のつながりを何段先まで見分けるか）
+TOPOLOGY_ROUNDS = 3
+
+
+def _is_reference_key(key: str) -> bool:
+    return key != "id" and key.endswith("Id")
+
+
+def _is_reference_list_key(key: str) -> bool:
+    return key.endswith("Ids")
+
+
+def _is_node(value) -> bool:
+    return isinstance(value, dict) and isinstance(value.get("id"), (str, int)) and not isinstance(value.get("id"), bool)
+
+
+def _collect_nodes(value, nodes: list) -> None:
+    """`id`を持つ要素（リソース）を出現順に集める"""
+    if isinstance(value, dict):
+        if _is_node(value):
+            nodes.append(value)
+        for child in value.values():
+            _collect_nodes(child, nodes)
+    elif isinstance(value, list):
+        for child in value:
+            _collect_nodes(child, nodes)
+
+
+def _strip_node(value, is_root: bool = True):
+    """リソース自身の内容（ID・参照先・配置を除き、入れ子のリソースは含めない）"""
+    if isinstance(value, dict):
+        if not is_root and _is_node(value):
+            return None
+        stripped = {}
+        for key, child in value.items():
+            if key in VOLATILE_STRUCT_KEYS or key == "id":
+                continue
+            if _is_reference_list_key(key) and isinstance(child, list):
+                stripped[key] = len(child)
+            elif _is_reference_key(key):
+                stripped[key] = bool(child)
+            else:
+                stripped[key] = _strip_node(child, is_root=False)
+        return stripped
+    if isinstance(value, list):
+        return sorted((_strip_node(child, is_root=False) for child in value), key=_canonical_json)
+    return value
+
+
+def _node_references(value, is_root: bool = True) -> list:
+    """リソースから出ている参照（キー, 参照先ID）。入れ子のリソースの参照は含めない"""
+    references = []
+    if isinstance(value, dict):
+        if not is_root and _is_node(value):
+            return references
+        for key, child in value.items():
+            if _is_reference_list_key(key) and isinstance(child, list):
+                references.extend((key, target) for target in child if isinstance(target, (str, int)))
+            elif _is_reference_key(key) and isinstance(child, (str, int)) and not isinstance(child, bool):
+                references.append((key, child))
+            else:
+                references.extend(_node_references(child, is_root=False))
+    elif isinstance(value, list):
+        for child in value:
+            references.extend(_node_references(child, is_root=False))
+    return references
+
+
+def _digest(value) -> str:
+    return hashlib.sha256(_canonical_json(value).encode("utf-8")).hexdigest()
+
+
+def canonical_labels(struct) -> Dict[object, str]:
+    """
+    リソースのID → 内容とつながりだけから決まる正規のラベル（`ec2-1`など）。
+
+    各リソースの署名を自身の内容から作り、参照する側・される側の署名を取り込んで
+    `TOPOLOGY_ROUNDS`回作り直す。ラベルは種類ごとに署名の順で振るので、元のIDや並び順には依存せず、
+    配線（どのサブネットを参照しているかなど）が違えば別のラベルの付き方になる。
+    """
+    nodes = []
+    _collect_nodes(struct, nodes)
+    ids = [node["id"] for node in nodes]
+    index_by_id = {}
+    for index, node_id in enumerate(ids):
+        index_by_id.setdefault(node_id, index)
+    edges = [
+        [(key, index_by_id.get(target)) for key, target in _node_references(node)]
+        for node in nodes
+    ]
+    incoming = [[] for _ in nodes]
+    for source, node_edges in enumerate(edges):
+        for key, target in node_edges:
+            if target is not None:
+                incoming[target].append((key, source))
+
+    signatures = [_digest(_strip_node(node)) for node in nodes]
+    for _ in range(TOPOLOGY_ROUNDS):
+        signatures = [
+            _digest([
+                signatures[index],
+                sorted([key, signatures[target] if target is not None else EXTERNAL_REFERENCE]
+                       for key, target in edges[index]),
+                sorted([key, signatures[source]] for key, source in incoming[index]),
+            ])
+            for index in range(len(nodes))
+        ]
+
+    labels = {}
+    counts: Dict[str, int] = {}
+    # 署名が同じもの（入れ替えても同じ構成）は出現順で振る
+    for index in sorted(range(len(nodes)), key=lambda index: (signatures[index], index)):
+        node_id = ids[index]
+        if node_id in labels:
+            continue
+        kind = str(nodes[index].get("type") or "resource")
+        counts[kind] = counts.get(kind, 0) + 1
+        labels[node_id] = f"{kind}-{counts[kind]}"
+    return labels
+
+
+def _relabel(value, labels: Dict[object, str]):
+    if isinstance(value, dict):
+        normalized = {}
+        for key, child in value.items():
+            if key in VOLATILE_STRUCT_KEYS:
+                continue
+            if key == "id" and _is_node(value):
+                normalized[key] = labels[child]
+            elif _is_reference_list_key(key) and isinstance(child, list):
+                normalized[key] = sorted(_reference_label(target, labels) for target in child)
+            elif _is_reference_key(key):
+                normalized[key] = _reference_label(child, labels) if child else child
+            else:
+                normalized[key] = _relabel(child, labels)
+        return normalized
+    if isinstance(value, list):
+        return sorted((_relabel(child, labels) for child in value), key=_canonical_json)
+    return value
+
+
+def _reference_label(target, labels: Dict[object, str]) -> str:
+    if isinstance(target, (str, int)) and not isinstance(target, bool) and target in labels:
+        return labels[target]
+    return EXTERNAL_REFERENCE
+
+
+def normalize_struct(struct):
+    """
+    structをアドバイスの内容に関係する部分だけの正規形にする。
+
+    - 配置などのフィールドは取り除く
+    - リソースのIDと参照（`subnetId`など`Id`/`Ids`で終わるキー）は、内容とつながりから決まる
+      正規のラベル（`canonical_labels`）に付け替える。元のIDは残らず、配線の違いは残る
+    - リストは要素の正規形でソートする（並び順の違いは同じ構成とみなす）
+
+    キャッシュしたアドバイスを別のユーザーに返せるよう、プロンプトもこの正規形から作る。
+    """
+    return _relabel(struct, canonical_labels(struct))
+
+
+def advice_cache_key(struct: dict, model_id: str, prompt_version: str) -> str:
+    """正規化したstruct・モデルID・プロンプトのバージョンからキャッシュキーを作る"""
+    canonical = _canonical_json({
+        "model_id": model_id,
+        "prompt_version": prompt_version,
+        "struct": normalize_struct(struct or {}),
+    })
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def _canonical_json(value) -> str:
+    return json.dumps(value, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str)
+
+
+class CachedAdvice(NamedTuple):
+    """キャッシュされたアドバイスと、生成にかかった推定コスト（USD）"""
+    advice: str
+    cost_usd: float
+
+
+class DynamoAdviceStore:
+    """アドバイスキャッシュの2段目（DynamoDB）。期限はDynamoDBのTTL属性`expires_at`でも消える"""
+
+    PARTITION_KEY = "advice_cache"
+
+    def __init__(self, table, ttl_seconds: float, clock: Callable[[], float] = time.time):
+        self._table = table
+        self.ttl_seconds = ttl_seconds
+        self._clock = clock
+
+    async def get(self, key: str) -> Optional[CachedAdvice]:
+        response = await self._table.get_item(Key={"PK": self.PARTITION_KEY, "SK": key})
+        item = response.get("Item")
+        # TTLによる削除は遅れることがあるので期限は自分でも確認する
+        if not item or int(item.get("expires_at", 0)) <= self._clock():
+            return None
+        return CachedAdvice(advice=item["advice"], cost_usd=float(item.get("cost_usd", 0)))
+
+    async def put(self, key: str, value: CachedAdvice):
+        await self._table.put_item(Item={
+            "PK": self.PARTITION_KEY,
+            "SK": key,
+            "advice": value.advice,
+            # DynamoDBはfloatを受け付けないので文字列で保存する
+            "cost_usd": str(value.cost_usd),
+            "expires_at": int(self._clock() + self.ttl_seconds),
+        })
+
+
+class AdviceCache:
+    """アドバイスのLRU + TTLキャッシュ（任意でDynamoDBの2段目を持つ）"""
+
+    def __init__(
+        self,
+        max_entries: int,
+        ttl_seconds: float,
+        store: Optional[DynamoAdviceStore] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._store = store
+        self._clock = clock
+        self._entries: "OrderedDict[str, Tuple[float, CachedAdvice]]" = OrderedDict()
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self.memory_hits = 0
+        self.store_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+        self.store_errors = 0
+        self.spend_avoided_usd = 0.0
+        self.spend_usd = 0.0
+
+    async def get(self, key: str) -> Optional[CachedAdvice]:
+        """キャッシュからアドバイスを取得（なければNone）。ヒットした分は節約額に数える"""
+        value = self._get_memory(key)
+        if value is not None:
+            self.memory_hits += 1
+            self.spend_avoided_usd += value.cost_usd
+            return value
+
+        if self._store is not None:
+            try:
+                value = await self._store.get(key)
+            except Exception:
+                self.store_errors += 1
+                logger.exception("アドバイスキャッシュ（DynamoDB）の読み込みに失敗しました")
+                value = None
+            if value is not None:
+                self.store_hits += 1
+                self.spend_avoided_usd += value.cost_usd
+                self._put_memory(key, value)
+                return value
+
+        self.misses += 1
+        return None
+
+    async def put(self, key: str, value: CachedAdvice):
+        """生成したアドバイスを保存"""
+        self.spend_usd += value.cost_usd
+        self._put_memory(key, value)
+        if self._store is not None:
+            try:
+                await self._store.put(key, value)
+            except Exception:
+                self.store_errors += 1
+                logger.exception("アドバイスキャッシュ（DynamoDB）への保存に失敗しました")
+
+    async def get_or_create(
+        self, key: str, create: Callable[[], Awaitable[CachedAdvice]]
+    ) -> Tuple[CachedAdvice, bool]:
+        """
+        キャッシュにあればそれを、なければ`create()`で生成して保存したものを返す。
+        同じキーの生成が実行中なら相乗りする。戻り値は(アドバイス, キャッシュから返したか)。
+        """
+        value = await self.get(key)
+        if value is not None:
+            return value, True
+
+        loop = asyncio.get_running_loop()
+        inflight = self._inflight.get(key)
+        if inflight is not None and not inflight.done() and inflight.get_loop() is loop:
+            value = await asyncio.shield(inflight)
+            self.coalesced += 1
+            self.spend_avoided_usd += value.cost_usd
+            return value, True
+
+        task = loop.create_task(self._create(key, create))
+        self._inflight[key] = task
+        return await asyncio.shield(task), False
+
+    def invalidate(self):
+        """プロセス内のキャッシュを破棄（DynamoDBの2段目はTTLで消える）"""
+        self._entries.clear()
+        self._inflight.clear()
+
+    def stats(self) -> dict:
+        """監視用のヒット率と節約額"""
+        hits = self.memory_hits + self.store_hits
+        lookups = hits + self.misses
+        return {
+            "hits": hits,
+            "memory_hits": self.memory_hits,
+            "store_hits": self.store_hits,
+            "misses": self.misses,
+            "hit_rate": hits / lookups if lookups else 0.0,
+            # 同じキーの生成中に届き、その結果を共有したリクエスト数
+            "coalesced": self.coalesced,
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "evictions": self.evictions,
+            "store_enabled": self._store is not None,
+            "store_errors": self.store_errors,
+            "bedrock_spend_usd": round(self.spend_usd, 6),
+            "bedrock_spend_avoided_usd": round(self.spend_avoided_usd, 6),
+        }
+
+    async def _create(self, key: str, create: Callable[[], Awaitable[CachedAdvice]]) -> CachedAdvice:
+        try:
+            value = await create()
+            await self.put(key, value)
+            return value
+        finally:
+            if self._inflight.get(key) is asyncio.current_task():
+                del self._inflight[key]
+
+    def _get_memory(self, key: str) -> Optional[CachedAdvice]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at <= self._clock():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def _put_memory(self, key: str, value: CachedAdvice):
+        self._entries[key] = (self._clock() + self.ttl_seconds, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
@@ -0,0 +1,80 @@
+"""
+DynamoDBの属性値とPythonの値の変換
+
+boto3のresource層は読み込んだ数値をすべてDecimalにするため、これまでは
+さらに`convert_decimal_to_int`で全体をたどり直していた。ここでは低レベルクライアントの
+属性値（`{"N": "12"}`など）を1回の走査でint・float・str・dict・listに直接変換する。
+"""
+from decimal import Decimal
+from typing import Any
+
+from boto3.dynamodb.types import Binary, TypeSerializer
+
+_serializer = TypeSerializer()
+
+
+def _decode_number(raw: str):
+    try:
+        return int(raw)
+    except ValueError:
+        return float(raw)
+
+
+def decode_attribute_value(value: dict) -> Any:
+    """属性値1つをPythonの値にする（数値は整数ならint、それ以外はfloat）"""
+    (tag, raw), = value.items()
+    if tag == "S":
+        return raw
+    if tag == "N":
+        return _decode_number(raw)
+    if tag == "M":
+        return {key: decode_attribute_value(item) for key, item in raw.items()}
+    if tag == "L":
+        return [decode_attribute_value(item) for item in raw]
+    if tag == "BOOL":
+        return raw
+    if tag == "NULL":
+        return None
+    if tag == "B":
+        return Binary(raw)
+    if tag == "SS":
+        return set(raw)
+    if tag == "NS":
+        return {_decode_number(item) for item in raw}
+    if tag == "BS":
+        return {Binary(item) for item in raw}
+    raise TypeError(f"未対応の属性型です: {tag}")
+
+
+def decode_item(item: dict) -> dict:
+    """低レベルクライアントのアイテムをPythonのdictにする"""
+    return {key: decode_attribute_value(value) for key, value in item.items()}
+
+
+def serialize_value(value: Any) -> dict:
+    """Pythonの値を低レベルクライアントの属性値にする（floatも受け付ける）"""
+    return _serializer.serialize(to_dynamodb_value(value))
+
+
+def to_dynamodb_value(value: Any) -> Any:
+    """boto3のresource層に渡せるよう、floatをDecimalに変換する"""
+    if isinstance(value, bool) or value is None:
+        return value
+    if isinstance(value, float):
+        return Decimal(str(value))
+    if isinstance(value, dict):
+        return {key: to_dynamodb_value(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [to_dynamodb_value(item) for item in value]
+    return value
+
+
+def from_dynamodb_value(value: Any) -> Any:
+    """`to_dynamodb_value`の逆。resource層が返したDecimalを整数ならint、それ以外はfloatにする"""
+    if isinstance(value, Decimal):
+        return int(value) if value == value.to_integral_value() else float(value)
+    if isinstance(value, dict):
+        return {key: from_dynamodb_value(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [from_dynamodb_value(item) for item in value]
+    return value
@@ -0,0 +1,69 @@
+"""
+AWSクライアントの共有レジストリ
+
+アプリ全体で1つのboto3セッションを持ち、DynamoDB・Bedrockのクライアントを
+一度だけ作って使い回す。これにより認証情報の解決やサービスモデルの読み込みは
+起動時に1回で済み、HTTPコネクションプール（keep-alive）も共有される。
+"""
+import threading
+from functools import lru_cache
+
+import boto3
+from botocore.config import Config
+
+from settings import get_AwsClientSettings, get_BedrockSettings, get_DynamoDbSettings
+
+# boto3のセッションはスレッドセーフではないので、クライアント生成は直列化する
+_lock = threading.Lock()
+
+
+def build_client_config(read_timeout: float = None) -> Config:
+    """コネクションプール・keep-alive・リトライを設定したbotocoreのConfig"""
+    settings = get_AwsClientSettings()
+    return Config(
+        max_pool_connections=settings.MAX_POOL_CONNECTIONS,
+        tcp_keepalive=True,
+        connect_timeout=settings.CONNECT_TIMEOUT,
+        read_timeout=read_timeout or settings.READ_TIMEOUT,
+        retries={"mode": settings.RETRY_MODE, "max_attempts": settings.MAX_ATTEMPTS},
+    )
+
+
+@lru_cache()
+def get_boto3_session() -> boto3.session.Session:
+    """アプリ共通のboto3セッション"""
+    region = get_DynamoDbSettings().REGION or None
+    return boto3.session.Session(region_name=region)
+
+
+@lru_cache()
+def get_dynamodb_resource():
+    """共有のDynamoDBリソース"""
+    with _lock:
+        return get_boto3_session().resource("dynamodb", config=build_client_config())
+
+
+@lru_cache()
+def get_dynamodb_client():
+    """共有の低レベルDynamoDBクライアント（型変換なし）"""
+    with _lock:
+        return get_boto3_session().client("dynamodb", config=build_client_config())
+
+
+@lru_cache()
+def get_bedrock_client():
+    """共有のBedrock Runtimeクライアント"""
+    settings = get_AwsClientSettings()
+    region = get_BedrockSettings().BEDROCK_REGION or None
+    with _lock:
+        return get_boto3_session().client(
+            "bedrock-runtime",
+            region_name=region,
+            config=build_client_config(read_timeout=settings.BEDROCK_READ_TIMEOUT),
+        )
+
+
+@lru_cache()
+def get_game_table():
+    """gameテーブル（共有リソース上のTable）"""
+    return get_dynamodb_resource().Table("game")
@@ -0,0 +1,211 @@
+"""
+BedrockによるAIアドバイス生成
+
+プロンプトの組み立てと、`invoke_model`（一括）/`invoke_model_with_response_stream`
+（ストリーミング）の呼び出しをまとめる。boto3の呼び出しはブロッキングなので、
+どちらもスレッドで実行してイベントループを止めない。
+"""
+import asyncio
+import json
+import logging
+import threading
+import time
+from typing import AsyncIterator, NamedTuple, Optional
+
+from routers.helpers.metrics import record_bedrock_invocation
+from settings import get_AdviceCacheSettings
+
+logger = logging.getLogger(__name__)
+
+ADVICE_MODEL_ID = "us.anthropic.claude-sonnet-4-20250514-v1:0"
+ADVICE_MAX_TOKENS = 500
+# プロンプトを変えたら上げる（アドバイスキャッシュのキーに含まれる）
+ADVICE_PROMPT_VERSION = "2"
+
+
+class AdviceResult(NamedTuple):
+    """アドバイス本文と消費トークン数"""
+    text: str
+    input_tokens: int
+    output_tokens: int
+
+
+def estimate_invocation_cost(input_tokens: int, output_tokens: int) -> float:
+    """消費トークン数からBedrockの呼び出しコスト（USD）を見積もる"""
+    settings = get_AdviceCacheSettings()
+    return (
+        input_tokens * settings.INPUT_PRICE_PER_1K + output_tokens * settings.OUTPUT_PRICE_PER_1K
+    ) / 1000
+
+
+def build_advice_prompt(struct: dict) -> str:
+    """構成データからアドバイス用のプロンプトを作る"""
+    struct_json = json.dumps(struct, indent=2, ensure_ascii=False)
+    return f"""
+        あなたはAWS Bedrockのマジエキスパートです。
+        今からマジで構造見せるから、ガチで“危機感持って”厳しくアドバイスをください：
+
+        {struct_json}
+
+        - 無駄ってことない？
+        - この設計、お前最後に見直したのいつ？
+        - セキュリティとか可用性、甘く見てるんじゃない？
+        - レイテンシ最適化とか、Guardrails使ってる？
+        - リトリーバルやファインチューンの戦略、甘いって。
+        - ここ直さないとあとで地獄見るぞ。
+
+        親友としてガチで叱って、でも腹落ちするように助けてくれ。
+        ヤバいくらい“刺さる”口調で頼む。
+        """
+
+
+def build_advice_body(prompt: str) -> str:
+    """Anthropic Messages形式のリクエストボディ"""
+    return json.dumps(
+        {
+            "messages": [{"role": "user", "content": prompt}],
+            "max_tokens": ADVICE_MAX_TOKENS,
+            "temperature": 0.1,
+            "top_p": 0.9,
+            "anthropic_version": "bedrock-2023-05-31",
+        }
+    )
+
+
+async def invoke_advice(client, struct: dict) -> AdviceResult:
+    """アドバイスを一括で生成する"""
+    body = build_advice_body(build_advice_prompt(struct))
+
+    def invoke():
+        response = client.invoke_model(
+            body=body,
+            modelId=ADVICE_MODEL_ID,
+            accept="application/json",
+            contentType="application/json",
+        )
+        return json.loads(response.get("body").read())
+
+    start_time = time.perf_counter()
+    try:
+        # Bedrockの応答待ちでイベントループを止めないようスレッドで実行
+        response_body = await asyncio.to_thread(invoke)
+    except Exception:
+        record_bedrock_invocation("invoke", time.perf_counter() - start_time, "error")
+        raise
+    usage = response_body.get("usage", {})
+    result = AdviceResult(
+        text=response_body["content"][0]["text"],
+        input_tokens=usage.get("input_tokens", 0),
+        output_tokens=usage.get("output_tokens", 0),
+    )
+    record_bedrock_invocation(
+        "invoke", time.perf_counter() - start_time, "success", result.input_tokens, result.output_tokens
+    )
+    return result
+
+
+def decode_stream_event(event: dict) -> dict:
+    """レスポンスストリームの1イベントをJSONとして読む（chunk以外は空dict）"""
+    chunk = event.get("chunk")
+    if not chunk:
+        return {}
+    return json.loads(chunk["bytes"])
+
+
+def extract_text_delta(event: dict) -> str:
+    """レスポンスストリームの1イベントからテキストの差分を取り出す（なければ空文字）"""
+    return _text_delta(decode_stream_event(event))
+
+
+def _text_delta(payload: dict) -> str:
+    if payload.get("type") != "content_block_delta":
+        return ""
+    delta = payload.get("delta", {})
+    if delta.get("type") != "text_delta":
+        return ""
+    return delta.get("text", "")
+
+
+async def stream_advice(
+    client, struct: dict, usage: Optional[dict] = None
+) -> AsyncIterator[str]:
+    """
+    アドバイスをトークン（テキスト差分）が届くたびに返す。
+
+    ストリームの読み取りは専用スレッドで行い、差分はキュー経由でイベントループに渡す。
+    呼び出し側が途中でやめた場合（クライアント切断など）は上流のストリームを閉じる。
+    `usage`を渡すと、ストリーム中に届いた消費トークン数（input_tokens/output_tokens）を書き込む。
+    """
+    usage = {} if usage is None else usage
+    body = build_advice_body(build_advice_prompt(struct))
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue()
+    stopped = threading.Event()
+    upstream = {}
+    done = object()
+
+    def put(item):
+        try:
+            loop.call_soon_threadsafe(queue.put_nowait, item)
+        except RuntimeError:
+            # 呼び出し側のイベントループがすでに閉じている
+            pass
+
+    def close_upstream():
+        stream = upstream.pop("stream", None)
+        if stream is not None:
+            try:
+                stream.close()
+            except Exception:
+                logger.warning("Bedrockのレスポンスストリームを閉じられませんでした", exc_info=True)
+
+    def produce():
+        try:
+            response = client.invoke_model_with_response_stream(
+                body=body,
+                modelId=ADVICE_MODEL_ID,
+                accept="application/json",
+                contentType="application/json",
+            )
+            upstream["stream"] = response["body"]
+            for event in upstream["stream"]:
+                if stopped.is_set():
+                    break
+                payload = decode_stream_event(event)
+                if payload.get("type") == "message_start":
+                    usage.update(payload.get("message", {}).get("usage", {}))
+                elif payload.get("type") == "message_delta":
+                    usage.update(payload.get("usage", {}))
+                text = _text_delta(payload)
+                if text:
+                    put(text)
+        except Exception as e:
+            if not stopped.is_set():
+                put(e)
+        finally:
+            if stopped.is_set():
+                close_upstream()
+            put(done)
+
+    start_time = time.perf_counter()
+    outcome = "cancelled"
+    producer = loop.run_in_executor(None, produce)
+    try:
+        while True:
+            item = await queue.get()
+            if item is done:
+                outcome = "success"
+                break
+            if isinstance(item, Exception):
+                outcome = "error"
+                raise item
+            yield item
+    finally:
+        record_bedrock_invocation(
+            "stream", time.perf_counter() - start_time, outcome,
+            usage.get("input_tokens", 0), usage.get("output_tokens", 0),
+        )
+        if not producer.done():
+            # 読み取り中のスレッドはストリームを閉じることで解放する
+            stopped.set()
+            close_upstream()
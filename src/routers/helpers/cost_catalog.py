@@ -0,0 +1,109 @@
+"""
+コストカタログ（PK=costs, SK=metadata）のインプロセスキャッシュ
+
+コストデータは月に一度変わるかどうかなので、リクエストごとにDynamoDBへ
+問い合わせる代わりにTTL付きで保持する。TTLを過ぎても猶予期間内なら
+古い値を即座に返しつつ、裏で再取得する（stale-while-revalidate）。
+"""
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class CostCatalogCache:
+    """コストカタログのTTLキャッシュ"""
+
+    def __init__(
+        self,
+        fetch: Callable[[], Awaitable[dict]],
+        ttl_seconds: float,
+        stale_seconds: float,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self._fetch = fetch
+        self.ttl_seconds = ttl_seconds
+        self.stale_seconds = stale_seconds
+        self._clock = clock
+        self._value: Optional[dict] = None
+        self._loaded_at = 0.0
+        self._inflight: Optional[asyncio.Task] = None
+        self._generation = 0
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.refreshes = 0
+        self.refresh_errors = 0
+        self.invalidations = 0
+
+    async def get(self) -> dict:
+        """コストカタログを取得（必要に応じてDynamoDBから再取得）"""
+        if self._value is not None:
+            age = self._clock() - self._loaded_at
+            if age < self.ttl_seconds:
+                self.hits += 1
+                return self._value
+            if age < self.ttl_seconds + self.stale_seconds:
+                # 古い値を返しつつバックグラウンドで更新
+                self.stale_hits += 1
+                self._start_refresh()
+                return self._value
+
+        self.misses += 1
+        return await self._start_refresh()
+
+    def invalidate(self):
+        """キャッシュを破棄し、次回のget()で必ず再取得させる"""
+        self._value = None
+        self._loaded_at = 0.0
+        self._inflight = None
+        self._generation += 1
+        self.invalidations += 1
+
+    def stats(self) -> dict:
+        """監視用のヒット/ミス統計"""
+        lookups = self.hits + self.stale_hits + self.misses
+        return {
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits + self.stale_hits) / lookups if lookups else 0.0,
+            "refreshes": self.refreshes,
+            "refresh_errors": self.refresh_errors,
+            "invalidations": self.invalidations,
+            "cached": self._value is not None,
+            "age_seconds": self._clock() - self._loaded_at if self._value is not None else None,
+            "ttl_seconds": self.ttl_seconds,
+            "stale_seconds": self.stale_seconds,
+        }
+
+    def _start_refresh(self) -> asyncio.Task:
+        """再取得タスクを開始（実行中のものがあれば相乗りする）"""
+        loop = asyncio.get_running_loop()
+        inflight = self._inflight
+        if inflight is not None and not inflight.done() and inflight.get_loop() is loop:
+            return inflight
+
+        self._inflight = loop.create_task(self._refresh())
+        return self._inflight
+
+    async def _refresh(self) -> dict:
+        generation = self._generation
+        try:
+            value = await self._fetch()
+        except Exception:
+            self.refresh_errors += 1
+            if self._value is None:
+                raise
+            logger.exception("コストカタログの再取得に失敗しました。古い値を使い続けます")
+            return self._value
+
+        self.refreshes += 1
+        # 空のカタログはキャッシュしない（投入直後にすぐ反映させるため）。
+        # 取得中にinvalidate()された場合も、無効化前の値なので保存しない
+        if value and generation == self._generation:
+            self._value = value
+            self._loaded_at = self._clock()
+        return value
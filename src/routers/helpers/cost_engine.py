@@ -0,0 +1,149 @@
+"""
+コスト計算エンジン
+
+料金DB（コストカタログ）はリソースタイプごとの(月額, リクエスト単価)に一度だけ
+変換しておき、structは1回の反復走査でリソースタイプを集めてから数で掛け合わせる。
+"""
+from collections import Counter
+from typing import Dict, List, Mapping, NamedTuple, Sequence, Tuple
+
+import numpy as np
+
+
+class BatchCostResult(NamedTuple):
+    """一括コスト計算結果"""
+    cost_matrix: np.ndarray  # (struct数, リクエスト数の候補数)
+    monthly_costs: np.ndarray  # structごとの月額固定費
+    per_request_costs: np.ndarray  # structごとの1リクエストあたりの変動費
+    resource_counts: List[Counter]
+
+
+class CostBreakdown(NamedTuple):
+    """コスト計算結果"""
+    final_cost: float
+    monthly_cost: float
+    request_cost: float
+
+
+def collect_resource_types(data) -> List[str]:
+    """
+    structを1回だけ走査し、`type`の値を出現順（行きがけ順）に集める。
+
+    再帰の代わりに子要素のイテレータを明示的なスタックに積むので、深さに制限はない。
+    structはJSON・DynamoDB由来のdict/listなので、型は完全一致で判定する（スカラー値には降りない）。
+    """
+    resource_types = []
+    append = resource_types.append
+    stack = [iter((data,))]
+    push = stack.append
+    pop = stack.pop
+    while stack:
+        for child in stack[-1]:
+            child_type = type(child)
+            if child_type is dict:
+                if "type" in child:
+                    append(child["type"])
+                push(iter(child.values()))
+                break
+            if child_type is list:
+                push(iter(child))
+                break
+        else:
+            pop()
+    return resource_types
+
+
+class CompiledCatalog:
+    """リソースタイプごとの料金を数値に変換済みのコストカタログ"""
+
+    def __init__(self, costs_db: Mapping[str, dict]):
+        self.rates: Dict[str, Tuple[float, float]] = {}
+        self._rate_matrix = None
+        self._resource_index: Dict[str, int] = {}
+        for resource_type, resource_info in costs_db.items():
+            cost = float(resource_info.get("cost", 0))
+            billing_type = resource_info.get("type")
+            if billing_type == "per_month":
+                self.rates[resource_type] = (cost, 0.0)
+            elif billing_type == "per_request":
+                self.rates[resource_type] = (0.0, cost)
+            else:
+                self.rates[resource_type] = (0.0, 0.0)
+
+    def evaluate(self, counts: Mapping[str, int], num_requests: int) -> CostBreakdown:
+        """リソース数から月額固定費・リクエスト変動費・合計を計算"""
+        monthly_cost = 0.0
+        per_request_cost = 0.0
+        rates = self.rates
+        for resource_type, count in counts.items():
+            rate = rates.get(resource_type)
+            if rate is not None:
+                monthly_cost += rate[0] * count
+                per_request_cost += rate[1] * count
+
+        request_cost = per_request_cost * num_requests
+        return CostBreakdown(
+            final_cost=monthly_cost + request_cost,
+            monthly_cost=monthly_cost,
+            request_cost=request_cost,
+        )
+
+    @property
+    def rate_matrix(self) -> np.ndarray:
+        """(リソースタイプ数, 2)の料金行列。列は[月額, リクエスト単価]"""
+        if self._rate_matrix is None:
+            self._resource_index = {
+                resource_type: position for position, resource_type in enumerate(self.rates)
+            }
+            self._rate_matrix = np.array(list(self.rates.values()), dtype=np.float64).reshape(-1, 2)
+        return self._rate_matrix
+
+    def count_matrix(self, resource_counts: Sequence[Mapping[str, int]]) -> np.ndarray:
+        """structごとのリソース数を(struct数, リソースタイプ数)の行列にする"""
+        rate_matrix = self.rate_matrix
+        index = self._resource_index
+        counts = np.zeros((len(resource_counts), rate_matrix.shape[0]), dtype=np.float64)
+        for row, struct_counts in enumerate(resource_counts):
+            for resource_type, count in struct_counts.items():
+                column = index.get(resource_type)
+                if column is not None:
+                    counts[row, column] = count
+        return counts
+
+    def evaluate_batch(self, structs: Sequence, volumes: Sequence[int]) -> BatchCostResult:
+        """
+        複数のstructと複数のリクエスト数の全組み合わせのコストを一度に計算する。
+
+        cost = counts(N×R) @ rates(R×2) @ [[1...1], [v1...vM]](2×M)
+        """
+        resource_counts = [Counter(collect_resource_types(struct)) for struct in structs]
+        struct_rates = self.count_matrix(resource_counts) @ self.rate_matrix
+        volume_matrix = np.vstack([
+            np.ones(len(volumes), dtype=np.float64),
+            np.asarray(volumes, dtype=np.float64),
+        ])
+        return BatchCostResult(
+            cost_matrix=struct_rates @ volume_matrix,
+            monthly_costs=struct_rates[:, 0],
+            per_request_costs=struct_rates[:, 1],
+            resource_counts=resource_counts,
+        )
+
+    def evaluate_struct(self, struct_data, num_requests: int) -> CostBreakdown:
+        """structから直接コストを計算"""
+        return self.evaluate(Counter(collect_resource_types(struct_data)), num_requests)
+
+
+_last_compiled: Tuple[object, CompiledCatalog] = (None, None)
+
+
+def compile_catalog(costs_db: Mapping[str, dict]) -> CompiledCatalog:
+    """コストカタログを変換（キャッシュから同じdictが渡される限り再変換しない）"""
+    global _last_compiled
+    source, compiled = _last_compiled
+    if source is costs_db:
+        return compiled
+
+    compiled = CompiledCatalog(costs_db)
+    _last_compiled = (costs_db, compiled)
+    return compiled
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+既存のgameテーブルにギャラリー用GSIを追加するスクリプト
+
+オンデマンドキャパシティのテーブルを前提にする（プロビジョンドの場合はコンソールなどで
+ProvisionedThroughputを指定して追加する）。追加済みなら何もしない。
+GSIのバックフィル中（INDEX_STATUSがCREATING）もテーブルへの読み書きは続けられる。
+
+GSIの射影はあとから変えられないので、作成済みのGSIの射影が`SUMMARY_ATTRIBUTES`と違う
+（`copy_count`・`cost_per_feature`を射影していない古いGSIなど）場合はエラーにする。
+その場合はGSIを削除し、削除が終わってからこのスクリプトを実行し直す。
+"""
+import argparse
+import os
+import sys
+from typing import Optional
+
+# 親ディレクトリをパスに追加
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from routers.helpers.share_gallery import GALLERY_ATTRIBUTE_DEFINITIONS, gallery_index_definition
+
+
+class GalleryIndexProjectionError(Exception):
+    """作成済みのGSIの射影が現在の定義と違う（作り直しが必要）"""
+
+    def __init__(self, index_name: str, missing: list, table_name: str):
+        self.index_name = index_name
+        self.missing = missing
+        self.table_name = table_name
+        super().__init__(f"GSI {index_name} に射影されていない属性があります: {', '.join(missing)}")
+
+
+def projection_missing_attributes(index: dict, definition: dict) -> list:
+    """定義が射影する属性のうち、作成済みのGSIが射影していないもの（ALLなら空）"""
+    projection = index.get("Projection", {})
+    if projection.get("ProjectionType") == "ALL":
+        return []
+    existing = set(projection.get("NonKeyAttributes", []))
+    return [name for name in definition["Projection"]["NonKeyAttributes"] if name not in existing]
+
+
+def create_gallery_index(client, table_name: str = "game", index_name: Optional[str] = None) -> bool:
+    """
+    GSIを追加する（追加した場合はTrue、同じ射影で作成済みならFalse）。
+
+    射影の足りないGSIが作成済みならGalleryIndexProjectionErrorを送出する。
+    """
+    definition = gallery_index_definition(index_name)
+    description = client.describe_table(TableName=table_name)["Table"]
+    existing = {index["IndexName"]: index for index in description.get("GlobalSecondaryIndexes", [])}
+    if definition["IndexName"] in existing:
+        missing = projection_missing_attributes(existing[definition["IndexName"]], definition)
+        if missing:
+            raise GalleryIndexProjectionError(definition["IndexName"], missing, table_name)
+        return False
+
+    client.update_table(
+        TableName=table_name,
+        AttributeDefinitions=GALLERY_ATTRIBUTE_DEFINITIONS,
+        GlobalSecondaryIndexUpdates=[{"Create": definition}],
+    )
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description="gameテーブルにギャラリー用GSIを追加する")
+    parser.add_argument("--table", default="game", help="テーブル名")
+    parser.add_argument("--index-name", default=None, help="GSI名（未指定ならSHARE_GALLERY_INDEX_NAME）")
+    args = parser.parse_args()
+
+    from routers.helpers.loader import get_dynamodb_connection
+
+    client = get_dynamodb_connection().meta.client
+    try:
+        created = create_gallery_index(client, args.table, args.index_name)
+    except GalleryIndexProjectionError as e:
+        # 射影は変更できないので、削除してから作り直す（作り直すまでフィード・ギャラリーは使えない）
+        print(f"❌ {e}")
+        print("   GSIの射影は変更できないため、削除してから作り直してください:")
+        print(
+            f"   aws dynamodb update-table --table-name {e.table_name} "
+            f"--global-secondary-index-updates '[{{\"Delete\": {{\"IndexName\": \"{e.index_name}\"}}}}]'"
+        )
+        print("   削除の完了（describe-tableのGlobalSecondaryIndexesから消える）を待ってから、このスクリプトを再実行します")
+        sys.exit(1)
+    if created:
+        print("✅ ギャラリー用GSIの作成を開始しました（完了までdescribe-tableのIndexStatusで確認できます）")
+    else:
+        print("ℹ️  ギャラリー用GSIは作成済みです")
+
+
+if __name__ == "__main__":
+    main()
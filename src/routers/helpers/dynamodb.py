@@ -0,0 +1,155 @@
+"""
+DynamoDBの非同期アクセス層
+
+boto3は同期APIしか持たないため、イベントループ上で直接呼び出すと
+1回のラウンドトリップの間すべてのリクエストが止まってしまう。
+ここでは呼び出しを有界スレッドプールへ逃がし、Tableと同じAPIを
+awaitで使えるようにする。
+"""
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache, partial
+
+from boto3.dynamodb.conditions import ConditionExpressionBuilder
+
+from routers.helpers.attribute_values import decode_item, serialize_value
+from routers.helpers.metrics import record_dynamodb_operation
+from settings import get_DynamoDbSettings
+
+
+@lru_cache()
+def get_dynamodb_executor() -> ThreadPoolExecutor:
+    """DynamoDB呼び出し用の共有スレッドプールを取得"""
+    settings = get_DynamoDbSettings()
+    return ThreadPoolExecutor(
+        max_workers=settings.MAX_WORKERS,
+        thread_name_prefix="dynamodb",
+    )
+
+
+class AsyncTable:
+    """boto3のTableをawait可能にするラッパー"""
+
+    def __init__(self, table, executor: ThreadPoolExecutor = None):
+        self._table = table
+        self._executor = executor
+
+    @property
+    def name(self) -> str:
+        return self._table.name
+
+    @property
+    def sync_table(self):
+        """ラップしている同期Table（batch_writerなど用）"""
+        return self._table
+
+    async def _run(self, method, **kwargs):
+        executor = self._executor or get_dynamodb_executor()
+        loop = asyncio.get_running_loop()
+        start_time = time.perf_counter()
+        succeeded = False
+        try:
+            response = await loop.run_in_executor(executor, partial(method, **kwargs))
+            succeeded = True
+            return response
+        finally:
+            record_dynamodb_operation(
+                getattr(method, "__name__", "unknown"), time.perf_counter() - start_time, succeeded
+            )
+
+    async def query(self, **kwargs) -> dict:
+        return await self._run(self._table.query, **kwargs)
+
+    async def scan(self, **kwargs) -> dict:
+        return await self._run(self._table.scan, **kwargs)
+
+    async def get_item(self, **kwargs) -> dict:
+        return await self._run(self._table.get_item, **kwargs)
+
+    async def put_item(self, **kwargs) -> dict:
+        return await self._run(self._table.put_item, **kwargs)
+
+    async def update_item(self, **kwargs) -> dict:
+        return await self._run(self._table.update_item, **kwargs)
+
+    async def delete_item(self, **kwargs) -> dict:
+        return await self._run(self._table.delete_item, **kwargs)
+
+    async def transact_write_items(self, **kwargs) -> dict:
+        """Tableと同じ高レベル形式（Python型）のままトランザクション書き込みを行う"""
+        return await self._run(self._table.meta.client.transact_write_items, **kwargs)
+
+
+# 読み込み結果のうち、属性値を含むキー
+_RESPONSE_ITEM_KEYS = ("Item", "Attributes", "LastEvaluatedKey")
+
+
+class FastReadTable(AsyncTable):
+    """
+    読み込み（query・scan・get_item）だけを低レベルクライアントで行うAsyncTable。
+
+    引数はTableと同じ形式（`Key("PK").eq(...)`などの条件やPythonの値）で受け取り、
+    結果はDecimalを経由せずにint・floatなどのPythonの値で返す。書き込みはTableのまま。
+    """
+
+    def __init__(self, table, client, executor: ThreadPoolExecutor = None):
+        super().__init__(table, executor)
+        # Tableのmeta.clientはresource層の型変換が登録されているので、別の素のクライアントを使う
+        self._client = client
+
+    def _build_request(self, kwargs: dict) -> dict:
+        params = dict(kwargs, TableName=self.name)
+        names = dict(params.pop("ExpressionAttributeNames", None) or {})
+        values = {
+            placeholder: serialize_value(value)
+            for placeholder, value in (params.pop("ExpressionAttributeValues", None) or {}).items()
+        }
+
+        builder = ConditionExpressionBuilder()
+        for name, is_key_condition in (
+            ("KeyConditionExpression", True),
+            ("FilterExpression", False),
+            ("ConditionExpression", False),
+        ):
+            condition = params.get(name)
+            if condition is None or isinstance(condition, str):
+                continue
+            built = builder.build_expression(condition, is_key_condition=is_key_condition)
+            params[name] = built.condition_expression
+            names.update(built.attribute_name_placeholders)
+            values.update(
+                (placeholder, serialize_value(value))
+                for placeholder, value in built.attribute_value_placeholders.items()
+            )
+
+        for name in ("Key", "ExclusiveStartKey"):
+            if name in params:
+                params[name] = {key: serialize_value(value) for key, value in params[name].items()}
+        if names:
+            params["ExpressionAttributeNames"] = names
+        if values:
+            params["ExpressionAttributeValues"] = values
+        return params
+
+    @staticmethod
+    def _decode_response(response: dict) -> dict:
+        if "Items" in response:
+            response["Items"] = [decode_item(item) for item in response["Items"]]
+        for name in _RESPONSE_ITEM_KEYS:
+            if name in response:
+                response[name] = decode_item(response[name])
+        return response
+
+    async def _read(self, method, kwargs: dict) -> dict:
+        response = await self._run(method, **self._build_request(kwargs))
+        return self._decode_response(response)
+
+    async def query(self, **kwargs) -> dict:
+        return await self._read(self._client.query, kwargs)
+
+    async def scan(self, **kwargs) -> dict:
+        return await self._read(self._client.scan, kwargs)
+
+    async def get_item(self, **kwargs) -> dict:
+        return await self._read(self._client.get_item, kwargs)
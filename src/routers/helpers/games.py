@@ -0,0 +1,379 @@
+"""
+ゲームアイテムのアクセスパターン
+
+進行中のゲームは、ユーザーごとのポインタアイテム（PK=user#<id>, SK=active_game）で引く。
+ポインタはゲームの作成・終了と同じトランザクションで書き換える（終了時は`game_id`をnullにする）ので、
+進行中のゲームの取得は過去のゲーム数に関係なくキー指定の読み込みだけで済む。
+
+ポインタ導入前からのユーザーは、初回だけ従来どおりクエリで探してポインタを作る。
+
+ゲームの作成はゲーム・サンドボックス・ポインタ（・冪等キーの記録）を1回の
+TransactWriteItemsで書き込む。同じ`Idempotency-Key`での再試行には最初のレスポンスを返す。
+
+structの部分更新（JSON Patch）は、変更箇所だけを書き換えるUpdateExpressionにできれば
+1回の`update_item`で済ませ、できなければ読み込んで適用した全体を書き戻す。
+全体の書き戻しは`struct_revision`（structを書き換えるたびに1増える）を条件にする。
+
+ゲームには作成時に解決した`scenario_id`を保存し、レポートはそれで直接シナリオを引く。
+`scenario_id`のない（導入前の）ゲームは、初回のレポートでシナリオ名から解決して書き足す。
+
+structは圧縮形式（`struct_codec.py`）で保存されている場合があるので、ここから返すゲームは
+元の値に戻してから返す。
+"""
+import hashlib
+import json
+import logging
+import time
+from datetime import datetime
+from typing import Optional
+
+from boto3.dynamodb.conditions import Attr, Key
+from botocore.exceptions import ClientError
+
+from fastapi import HTTPException
+
+from routers.helpers.json_patch import apply_patch, build_partial_update
+from routers.helpers.pagination import iter_query_pages
+from routers.helpers.struct_codec import decode_item_struct, encode_struct_for_storage
+from settings import get_StructStorageSettings
+
+logger = logging.getLogger(__name__)
+
+ACTIVE_GAME_SK = "active_game"
+IDEMPOTENCY_SK_PREFIX = "idempotency#"
+# 冪等キーの記録を保持する秒数（DynamoDBのTTL属性`expires_at`でも消える）
+IDEMPOTENCY_TTL_SECONDS = 24 * 60 * 60
+MAX_IDEMPOTENCY_KEY_LENGTH = 128
+# 全体の書き戻しが並行する更新と衝突したときに読み直す回数
+PATCH_MAX_ATTEMPTS = 3
+
+
+def user_pk(user_id: str) -> str:
+    return f"user#{user_id}"
+
+
+def game_sk(game_id: str) -> str:
+    return f"game#{game_id}"
+
+
+def active_game_pointer(user_id: str, game_id: Optional[str]) -> dict:
+    """進行中のゲームを指すポインタアイテム（進行中のゲームがなければgame_idはNone）"""
+    return {
+        "PK": user_pk(user_id),
+        "SK": ACTIVE_GAME_SK,
+        "game_id": game_id,
+        "updated_at": datetime.now().isoformat(),
+    }
+
+
+def request_fingerprint(payload: dict) -> str:
+    """リクエスト内容のハッシュ（同じ冪等キーが別の内容で使われていないかの確認用）"""
+    canonical = json.dumps(payload, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def validate_idempotency_key(idempotency_key: str):
+    if not 0 < len(idempotency_key) <= MAX_IDEMPOTENCY_KEY_LENGTH or not idempotency_key.isprintable():
+        raise HTTPException(
+            status_code=400,
+            detail=f"Idempotency-Keyは{MAX_IDEMPOTENCY_KEY_LENGTH}文字以内の印字可能な文字列で指定してください",
+        )
+
+
+async def get_idempotent_response(
+    table, user_id: str, idempotency_key: str, fingerprint: str
+) -> Optional[dict]:
+    """
+    同じ冪等キーで記録済みのレスポンスを返す（なければNone）。
+    キーが別の内容のリクエストで使われていた場合は422。
+    """
+    item = (await table.get_item(
+        Key={"PK": user_pk(user_id), "SK": IDEMPOTENCY_SK_PREFIX + idempotency_key},
+        ConsistentRead=True,
+    )).get("Item")
+    if item is None or int(item.get("expires_at", 0)) <= time.time():
+        return None
+    if item.get("fingerprint") != fingerprint:
+        raise HTTPException(status_code=422, detail="Idempotency-Keyが別の内容のリクエストで使われています")
+    return json.loads(item["response"])
+
+
+# put_new_gameのトランザクションでのポインタの位置（キャンセル理由の照合に使う）
+POINTER_ITEM_INDEX = 2
+
+
+async def put_new_game(
+    table,
+    user_id: str,
+    game_item: dict,
+    sandbox_item: dict,
+    response: dict,
+    idempotency_key: Optional[str] = None,
+    fingerprint: Optional[str] = None,
+) -> dict:
+    """
+    ゲーム・サンドボックス・ポインタを1トランザクションで書き込み、レスポンスを返す。
+
+    冪等キーがある場合はレスポンスも同じトランザクションで記録する。初回の作成を
+    1往復で済ませるため事前の確認はせず、記録済みのキー（再試行や並行リクエスト）で
+    書き込みが弾かれたときだけ記録済みのレスポンスを読んで返す。
+    """
+    game_id = game_item["SK"].replace("game#", "", 1)
+    transact_items = [
+        {
+            "Put": {
+                "TableName": table.name,
+                "Item": game_item,
+                "ConditionExpression": "attribute_not_exists(PK)",
+            }
+        },
+        {
+            "Put": {
+                "TableName": table.name,
+                "Item": sandbox_item,
+                "ConditionExpression": "attribute_not_exists(PK)",
+            }
+        },
+        {"Put": {"TableName": table.name, "Item": active_game_pointer(user_id, game_id)}},
+    ]
+    if idempotency_key:
+        transact_items.append({
+            "Put": {
+                "TableName": table.name,
+                "Item": {
+                    "PK": user_pk(user_id),
+                    "SK": IDEMPOTENCY_SK_PREFIX + idempotency_key,
+                    "fingerprint": fingerprint,
+                    "response": json.dumps(response, ensure_ascii=False, default=str),
+                    "expires_at": int(time.time() + IDEMPOTENCY_TTL_SECONDS),
+                },
+                "ConditionExpression": "attribute_not_exists(PK) OR expires_at <= :now",
+                "ExpressionAttributeValues": {":now": int(time.time())},
+            }
+        })
+
+    try:
+        await table.transact_write_items(TransactItems=transact_items)
+        return response
+    except ClientError as e:
+        if not idempotency_key or e.response["Error"]["Code"] != "TransactionCanceledException":
+            raise
+        reasons = [reason.get("Code") for reason in e.response.get("CancellationReasons", [])]
+        if len(reasons) < len(transact_items):
+            raise
+        if "TransactionConflict" in (reasons[POINTER_ITEM_INDEX], reasons[-1]):
+            # 同じキーのリクエストが同時に書き込んでいる（ポインタか冪等キーのアイテムで競合）
+            raise HTTPException(status_code=409, detail="同じIdempotency-Keyのリクエストを処理中です")
+        if reasons[-1] != "ConditionalCheckFailed":
+            raise
+
+    replayed = await get_idempotent_response(table, user_id, idempotency_key, fingerprint)
+    if replayed is None:
+        raise HTTPException(status_code=409, detail="同じIdempotency-Keyのリクエストを処理中です")
+    return replayed
+
+
+async def get_active_game(table, user_id: str, projection: Optional[str] = None) -> Optional[dict]:
+    """
+    進行中のゲームアイテムを取得（なければNone）。
+
+    `projection`を指定すると、その属性だけを読む（PK・SK・is_finishedは常に含める）。
+    """
+    pointer = (await table.get_item(
+        Key={"PK": user_pk(user_id), "SK": ACTIVE_GAME_SK},
+        ProjectionExpression="game_id",
+    )).get("Item")
+    if pointer is None:
+        return await _find_legacy_active_game(table, user_id, projection)
+    if not pointer.get("game_id"):
+        return None
+
+    get_kwargs = {"Key": {"PK": user_pk(user_id), "SK": game_sk(pointer["game_id"])}}
+    if projection:
+        get_kwargs.update(_projection_kwargs(projection))
+    game = (await table.get_item(**get_kwargs)).get("Item")
+    if game is None or game.get("is_finished"):
+        # ポインタと実体がずれている（手動で消した等）場合は進行中のゲームなしとみなす
+        return None
+    return decode_item_struct(game)
+
+
+async def finish_game(table, user_id: str, game_id: str) -> bool:
+    """
+    ゲームを終了し、ポインタが同じゲームを指していれば空にする（1トランザクション）。
+    進行中のゲームが見つからなければFalse。
+    """
+    game_key = {"PK": user_pk(user_id), "SK": game_sk(game_id)}
+    update = {
+        "Update": {
+            "TableName": table.name,
+            "Key": game_key,
+            "UpdateExpression": "SET is_finished = :finished, finished_at = :now",
+            "ConditionExpression": "attribute_exists(PK) AND is_finished = :active",
+            "ExpressionAttributeValues": {
+                ":finished": True,
+                ":active": False,
+                ":now": datetime.now().isoformat(),
+            },
+        }
+    }
+    clear_pointer = {
+        "Update": {
+            "TableName": table.name,
+            "Key": {"PK": user_pk(user_id), "SK": ACTIVE_GAME_SK},
+            "UpdateExpression": "SET game_id = :none, updated_at = :now",
+            "ConditionExpression": "game_id = :game_id",
+            "ExpressionAttributeValues": {
+                ":none": None,
+                ":game_id": game_id,
+                ":now": update["Update"]["ExpressionAttributeValues"][":now"],
+            },
+        }
+    }
+
+    try:
+        await table.transact_write_items(TransactItems=[update, clear_pointer])
+        return True
+    except ClientError as e:
+        if e.response["Error"]["Code"] != "TransactionCanceledException":
+            raise
+        reasons = [reason.get("Code") for reason in e.response.get("CancellationReasons", [])]
+        if reasons and reasons[0] == "ConditionalCheckFailed":
+            return False
+
+    # ポインタが別のゲームを指している（または存在しない）ので、ゲームだけを終了する
+    try:
+        await table.update_item(
+            Key=game_key,
+            UpdateExpression=update["Update"]["UpdateExpression"],
+            ConditionExpression=update["Update"]["ConditionExpression"],
+            ExpressionAttributeValues=update["Update"]["ExpressionAttributeValues"],
+        )
+        return True
+    except ClientError as e:
+        if e.response["Error"]["Code"] == "ConditionalCheckFailedException":
+            return False
+        raise
+
+
+async def get_game_item(table, user_id: str, game_id: str) -> Optional[dict]:
+    """ゲームをキー指定で取得（structは元の値に戻して返す）"""
+    response = await table.get_item(Key={"PK": user_pk(user_id), "SK": game_sk(game_id)})
+    return decode_item_struct(response.get("Item"))
+
+
+async def set_game_scenario_id(table, user_id: str, game_id: str, scenario_id: str) -> None:
+    """解決したscenario_idをゲームに書き足す（失敗してもレポートは続ける）"""
+    try:
+        await table.update_item(
+            Key={"PK": user_pk(user_id), "SK": game_sk(game_id)},
+            UpdateExpression="SET scenario_id = :scenario_id",
+            ConditionExpression="attribute_exists(PK) AND attribute_not_exists(scenario_id)",
+            ExpressionAttributeValues={":scenario_id": scenario_id},
+        )
+    except ClientError as e:
+        if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+            logger.warning("ゲームにscenario_idを保存できませんでした: %s", game_id, exc_info=True)
+
+
+async def patch_game_struct(table, user_id: str, game_id: str, operations: list) -> dict:
+    """
+    ゲームのstructにJSON Patchを適用し、`{"mode": "partial" | "full", "revision": 数}`を返す。
+    ゲームがなければ404、パッチが不正なら422、`test`の不一致や更新の競合は409。
+    """
+    key = {"PK": user_pk(user_id), "SK": game_sk(game_id)}
+    # 圧縮形式のstructはパス単位で書き換えられないので、最初から全体を書き戻す
+    partial = None
+    if get_StructStorageSettings().FORMAT == "map":
+        partial = build_partial_update(operations)
+    if partial is not None:
+        try:
+            response = await table.update_item(
+                Key=key,
+                UpdateExpression=partial["UpdateExpression"] + " ADD struct_revision :revision_step",
+                ConditionExpression=partial["ConditionExpression"],
+                ExpressionAttributeNames=partial["ExpressionAttributeNames"],
+                ExpressionAttributeValues={**partial["ExpressionAttributeValues"], ":revision_step": 1},
+                ReturnValues="UPDATED_NEW",
+            )
+            return {"mode": "partial", "revision": int(response["Attributes"]["struct_revision"])}
+        except ClientError as e:
+            # 条件の不一致（パスがない・testの不一致・ゲームがない）や、structの実体と合わないパスは
+            # 全体を読んで適用し直し、正確なエラーを返す
+            if e.response["Error"]["Code"] not in ("ConditionalCheckFailedException", "ValidationException"):
+                raise
+
+    for _ in range(PATCH_MAX_ATTEMPTS):
+        item = (await table.get_item(
+            Key=key,
+            ProjectionExpression="#struct, struct_revision",
+            ExpressionAttributeNames={"#struct": "struct"},
+            ConsistentRead=True,
+        )).get("Item")
+        if item is None:
+            raise HTTPException(status_code=404, detail="ゲームが見つかりません")
+
+        # 作成直後のゲームはstructがnullなので空のオブジェクトとして扱う
+        struct = apply_patch(decode_item_struct(item).get("struct") or {}, operations)
+        revision = item.get("struct_revision")
+        if revision is None:
+            condition = "attribute_not_exists(struct_revision)"
+            values = {":struct": encode_struct_for_storage(struct), ":revision_step": 1}
+        else:
+            condition = "struct_revision = :revision"
+            values = {":struct": encode_struct_for_storage(struct), ":revision_step": 1, ":revision": revision}
+        try:
+            await table.update_item(
+                Key=key,
+                UpdateExpression="SET #struct = :struct ADD struct_revision :revision_step",
+                ConditionExpression=condition,
+                ExpressionAttributeNames={"#struct": "struct"},
+                ExpressionAttributeValues=values,
+            )
+            return {"mode": "full", "revision": int(revision or 0) + 1}
+        except ClientError as e:
+            if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+                raise
+
+    raise HTTPException(status_code=409, detail="ゲームが同時に更新されたため、パッチを適用できませんでした")
+
+
+async def _find_legacy_active_game(table, user_id: str, projection: Optional[str]) -> Optional[dict]:
+    """ポインタのないユーザーの進行中ゲームを従来のクエリで探し、ポインタを作る"""
+    query_kwargs = {
+        "KeyConditionExpression": Key("PK").eq(user_pk(user_id)) & Key("SK").begins_with("game#"),
+        "FilterExpression": Attr("is_finished").eq(False),
+    }
+    game = None
+    async for response in iter_query_pages(table, **query_kwargs):
+        items = response.get("Items", [])
+        if items:
+            game = items[0]
+            break
+
+    # 進行中のゲームがない場合も空のポインタを作り、次回からクエリしないようにする
+    game_id = game["SK"].replace("game#", "", 1) if game else None
+    try:
+        await table.put_item(
+            Item=active_game_pointer(user_id, game_id),
+            # 並行して作られたポインタは上書きしない
+            ConditionExpression="attribute_not_exists(PK)",
+        )
+    except ClientError as e:
+        if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+            logger.warning("進行中ゲームのポインタを作成できませんでした: user=%s", user_id, exc_info=True)
+
+    if game and projection:
+        attributes = {"PK", "SK", "is_finished", *(name.strip() for name in projection.split(","))}
+        game = {key: value for key, value in game.items() if key in attributes}
+    return decode_item_struct(game)
+
+
+def _projection_kwargs(projection: str) -> dict:
+    """属性名を予約語と衝突しないようプレースホルダーに置き換えた射影指定"""
+    names = ["PK", "SK", "is_finished", *(name.strip() for name in projection.split(","))]
+    placeholders = {f"#p{i}": name for i, name in enumerate(dict.fromkeys(names))}
+    return {
+        "ProjectionExpression": ", ".join(placeholders),
+        "ExpressionAttributeNames": placeholders,
+    }
@@ -0,0 +1,253 @@
+"""
+JSON Patch（RFC 6902）の適用と、DynamoDBの部分更新への変換
+
+`build_partial_update`は操作列を`#struct`配下のドキュメントパスに対する
+SET / REMOVE と条件式に変換する。変換できない操作（move・copy、配列の途中への挿入、
+重なり合うパスなど）を含む場合はNoneを返すので、呼び出し側は`apply_patch`で
+全体を書き換える。
+"""
+import copy
+from typing import Any, List, Optional, Sequence, Union
+
+from fastapi import HTTPException
+
+from routers.helpers.attribute_values import to_dynamodb_value
+
+# DynamoDBの式（UpdateExpression・ConditionExpressionそれぞれ）の長さの上限
+MAX_EXPRESSION_LENGTH = 4096
+
+Token = Union[str, int]
+
+
+def parse_pointer(pointer: str) -> List[str]:
+    """JSON Pointer（RFC 6901）をトークンのリストにする（`~1`は`/`、`~0`は`~`）"""
+    if pointer == "":
+        return []
+    if not pointer.startswith("/"):
+        raise HTTPException(status_code=422, detail=f"パスは'/'で始めてください: {pointer}")
+    return [token.replace("~1", "/").replace("~0", "~") for token in pointer[1:].split("/")]
+
+
+def is_array_index(token: str) -> bool:
+    return token == "0" or (token.isdigit() and token.isascii() and not token.startswith("0"))
+
+
+def _invalid(detail: str):
+    raise HTTPException(status_code=422, detail=detail)
+
+
+def _list_index(container: list, token: str, path: str, allow_end: bool = False) -> int:
+    if token == "-" and allow_end:
+        return len(container)
+    if not is_array_index(token):
+        _invalid(f"配列のインデックスが正しくありません: {path}")
+    index = int(token)
+    if index > len(container) or (index == len(container) and not allow_end):
+        _invalid(f"配列の範囲外です: {path}")
+    return index
+
+
+def _resolve(document: Any, tokens: Sequence[str], path: str) -> Any:
+    node = document
+    for token in tokens:
+        if isinstance(node, dict):
+            if token not in node:
+                _invalid(f"パスが存在しません: {path}")
+            node = node[token]
+        elif isinstance(node, list):
+            node = node[_list_index(node, token, path)]
+        else:
+            _invalid(f"パスが存在しません: {path}")
+    return node
+
+
+def _add(document: Any, tokens: Sequence[str], value: Any, path: str) -> Any:
+    if not tokens:
+        return value
+    parent = _resolve(document, tokens[:-1], path)
+    if isinstance(parent, dict):
+        parent[tokens[-1]] = value
+    elif isinstance(parent, list):
+        parent.insert(_list_index(parent, tokens[-1], path, allow_end=True), value)
+    else:
+        _invalid(f"追加先がオブジェクトや配列ではありません: {path}")
+    return document
+
+
+def _remove(document: Any, tokens: Sequence[str], path: str) -> Any:
+    """値を取り除いて返す"""
+    if not tokens:
+        _invalid("ドキュメント全体は削除できません")
+    parent = _resolve(document, tokens[:-1], path)
+    if isinstance(parent, dict):
+        if tokens[-1] not in parent:
+            _invalid(f"パスが存在しません: {path}")
+        return parent.pop(tokens[-1])
+    if isinstance(parent, list):
+        return parent.pop(_list_index(parent, tokens[-1], path))
+    _invalid(f"パスが存在しません: {path}")
+
+
+def apply_patch(document: Any, operations: Sequence[dict]) -> Any:
+    """
+    ドキュメントに操作列を順に適用した結果を返す（元のドキュメントは変更しない）。
+    不正な操作は422、`test`の不一致は409。
+    """
+    document = copy.deepcopy(document)
+    for operation in operations:
+        op = operation["op"]
+        path = operation["path"]
+        tokens = parse_pointer(path)
+        if op == "add":
+            document = _add(document, tokens, to_dynamodb_value(operation.get("value")), path)
+        elif op == "remove":
+            _remove(document, tokens, path)
+        elif op == "replace":
+            _resolve(document, tokens, path)
+            if tokens:
+                _remove(document, tokens, path)
+            document = _add(document, tokens, to_dynamodb_value(operation.get("value")), path)
+        elif op in ("move", "copy"):
+            from_path = operation.get("from")
+            if from_path is None:
+                _invalid(f"{op}にはfromの指定が必要です")
+            from_tokens = parse_pointer(from_path)
+            if op == "move":
+                if tokens[:len(from_tokens)] == from_tokens and len(tokens) > len(from_tokens):
+                    _invalid(f"自分の子孫には移動できません: {path}")
+                value = _remove(document, from_tokens, from_path) if from_tokens else document
+            else:
+                value = copy.deepcopy(_resolve(document, from_tokens, from_path))
+            document = _add(document, tokens, value, path)
+        elif op == "test":
+            if _resolve(document, tokens, path) != to_dynamodb_value(operation.get("value")):
+                raise HTTPException(status_code=409, detail=f"testが一致しません: {path}")
+        else:
+            _invalid(f"未対応の操作です: {op}")
+    return document
+
+
+class _ExpressionBuilder:
+    """属性名・値のプレースホルダーを払い出す"""
+
+    def __init__(self, root: str):
+        self.names = {"#struct": root}
+        self._name_placeholders = {}
+        self.values = {}
+
+    def path(self, tokens: Sequence[Token]) -> str:
+        parts = ["#struct"]
+        for token in tokens:
+            if isinstance(token, int):
+                parts[-1] += f"[{token}]"
+                continue
+            placeholder = self._name_placeholders.get(token)
+            if placeholder is None:
+                placeholder = f"#n{len(self._name_placeholders)}"
+                self._name_placeholders[token] = placeholder
+                self.names[placeholder] = token
+            parts.append(placeholder)
+        return ".".join(parts)
+
+    def value(self, value: Any) -> str:
+        placeholder = f":v{len(self.values)}"
+        self.values[placeholder] = value
+        return placeholder
+
+    def is_type(self, tokens: Sequence[Token], attribute_type: str) -> str:
+        """`attribute_type`の条件（型の値は同じプレースホルダーを使い回す）"""
+        placeholder = f":type_{attribute_type}"
+        self.values[placeholder] = attribute_type
+        return f"attribute_type({self.path(tokens)}, {placeholder})"
+
+
+def _overlaps(a: Sequence[Token], b: Sequence[Token]) -> bool:
+    shorter = min(len(a), len(b))
+    return tuple(a[:shorter]) == tuple(b[:shorter])
+
+
+def _typed_tokens(tokens: Sequence[str]) -> List[Token]:
+    """配列のインデックスらしいトークンを整数にする（実体が配列でなければDynamoDBが拒否する）"""
+    return [int(token) if is_array_index(token) else token for token in tokens]
+
+
+def build_partial_update(operations: Sequence[dict], root: str = "struct") -> Optional[dict]:
+    """
+    操作列を`update_item`の引数（UpdateExpression・ConditionExpressionなど）に変換する。
+    部分更新で表せない場合はNone。
+
+    - add: オブジェクトのメンバーはSET、配列末尾（`-`）は`list_append`（親の型を条件にする）
+    - replace: 存在を条件にSET
+    - remove: 存在を条件にREMOVE（配列要素は、その配列への唯一の操作のときだけ）
+    - test: スカラー値の比較を条件にする（先行する更新と重ならない場合だけ）
+    """
+    builder = _ExpressionBuilder(root)
+    set_clauses, remove_clauses, conditions = [], [], []
+    updated_paths: List[List[Token]] = []
+    shifted_lists: List[List[Token]] = []
+
+    for operation in operations:
+        op = operation["op"]
+        tokens = parse_pointer(operation["path"])
+        if not tokens:
+            return None
+        typed = _typed_tokens(tokens)
+        if any(_overlaps(typed, path) for path in updated_paths):
+            return None
+        if any(typed[:len(parent)] == parent for parent in shifted_lists):
+            return None
+
+        if op == "test":
+            value = operation.get("value")
+            if isinstance(value, (dict, list)):
+                return None
+            conditions.append(f"{builder.path(typed)} = {builder.value(to_dynamodb_value(value))}")
+            continue
+
+        if op == "add":
+            value = to_dynamodb_value(operation.get("value"))
+            if tokens[-1] == "-":
+                list_path = builder.path(typed[:-1])
+                conditions.append(builder.is_type(typed[:-1], "L"))
+                set_clauses.append(f"{list_path} = list_append({list_path}, {builder.value([value])})")
+                updated_paths.append(typed[:-1])
+                continue
+            if isinstance(typed[-1], int):
+                # 配列の途中への挿入は表せない
+                return None
+            # 親がオブジェクトでなければ（structがnullの場合など）全体の書き戻しに回す
+            conditions.append(builder.is_type(typed[:-1], "M"))
+            set_clauses.append(f"{builder.path(typed)} = {builder.value(value)}")
+        elif op == "replace":
+            document_path = builder.path(typed)
+            conditions.append(f"attribute_exists({document_path})")
+            set_clauses.append(f"{document_path} = {builder.value(to_dynamodb_value(operation.get('value')))}")
+        elif op == "remove":
+            document_path = builder.path(typed)
+            conditions.append(f"attribute_exists({document_path})")
+            remove_clauses.append(document_path)
+            if isinstance(typed[-1], int):
+                # 後ろの要素が詰められるので、同じ配列への他の操作とは順序が変わる
+                if any(path[:len(typed) - 1] == typed[:-1] for path in updated_paths):
+                    return None
+                shifted_lists.append(typed[:-1])
+        else:
+            return None
+        updated_paths.append(typed)
+
+    clauses = []
+    if set_clauses:
+        clauses.append("SET " + ", ".join(set_clauses))
+    if remove_clauses:
+        clauses.append("REMOVE " + ", ".join(remove_clauses))
+    update_expression = " ".join(clauses)
+    condition_expression = " AND ".join(["attribute_exists(PK)", *conditions])
+    if not update_expression or max(len(update_expression), len(condition_expression)) > MAX_EXPRESSION_LENGTH:
+        return None
+
+    return {
+        "UpdateExpression": update_expression,
+        "ConditionExpression": condition_expression,
+        "ExpressionAttributeNames": builder.names,
+        "ExpressionAttributeValues": builder.values,
+    }
@@ -0,0 +1,214 @@
+"""
+Cognitoが発行したJWTの検証
+
+- JWKS（公開鍵の一覧）はメモリにキャッシュし、`JWKS_REFRESH_SECONDS`を過ぎたら
+  検証を止めずにバックグラウンドで取り直す。
+- 知らない`kid`のトークンが来たら（鍵のローテーション直後など）その場で取り直す。
+  でたらめな`kid`で何度も取りに行かないよう、取り直しは`JWKS_MIN_REFETCH_SECONDS`に1回まで。
+- 検証済みのトークンは`exp`まで上限付きのLRUに入れておき、同じトークンの2回目以降は
+  署名の検証を省く（辞書の参照1回なので、署名を検証しないデコードより速い）。
+"""
+import logging
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Callable, Optional
+
+import jwt
+import requests
+from fastapi import HTTPException
+
+from settings import get_CognitoSettings
+
+logger = logging.getLogger(__name__)
+
+# Cognitoのトークンの種類（IDトークンはaud、アクセストークンはclient_idにアプリクライアントIDが入る）
+TOKEN_USES = ("id", "access")
+
+
+def fetch_jwks(url: str, timeout: float = 5.0) -> dict:
+    """JWKSを取得する"""
+    response = requests.get(url, timeout=timeout)
+    response.raise_for_status()
+    return response.json()
+
+
+class JwksCache:
+    """kidごとの公開鍵のキャッシュ（期限切れはバックグラウンドで、kidの不一致はその場で取り直す）"""
+
+    def __init__(
+        self,
+        url: str,
+        refresh_seconds: float = 3600,
+        min_refetch_seconds: float = 60,
+        fetch: Callable[[str], dict] = fetch_jwks,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.url = url
+        self.refresh_seconds = refresh_seconds
+        self.min_refetch_seconds = min_refetch_seconds
+        self._fetch = fetch
+        self._clock = clock
+        self._keys = {}
+        self._fetched_at = None
+        self._lock = threading.Lock()
+        self._refreshing = False
+        self.fetch_count = 0
+
+    def _load(self) -> None:
+        jwks = self._fetch(self.url)
+        keys = {}
+        for jwk in jwks.get("keys", []):
+            try:
+                keys[jwk["kid"]] = jwt.PyJWK(jwk)
+            except (KeyError, jwt.PyJWKError):
+                logger.warning("JWKSの鍵を読み込めませんでした: %s", jwk.get("kid"))
+        self._keys = keys
+        self._fetched_at = self._clock()
+        self.fetch_count += 1
+
+    def _refresh_in_background(self) -> None:
+        try:
+            with self._lock:
+                self._load()
+        except Exception:
+            # 取り直しに失敗しても手元の鍵で検証を続け、次の参照で再試行する
+            logger.exception("JWKSのバックグラウンド更新に失敗しました")
+        finally:
+            self._refreshing = False
+
+    def get_key(self, kid: str) -> Optional[jwt.PyJWK]:
+        """kidの公開鍵を返す（取り直しても見つからなければNone）"""
+        if self._fetched_at is None:
+            with self._lock:
+                if self._fetched_at is None:
+                    self._load()
+        elif self._clock() - self._fetched_at >= self.refresh_seconds and not self._refreshing:
+            self._refreshing = True
+            threading.Thread(target=self._refresh_in_background, name="jwks-refresh", daemon=True).start()
+
+        key = self._keys.get(kid)
+        if key is not None:
+            return key
+
+        with self._lock:
+            key = self._keys.get(kid)
+            if key is None and self._clock() - self._fetched_at >= self.min_refetch_seconds:
+                self._load()
+                key = self._keys.get(kid)
+        return key
+
+
+class VerifiedTokenCache:
+    """検証済みトークンの上限付きLRU（各トークンのexpを過ぎたら使わない）"""
+
+    def __init__(self, max_entries: int = 10000, clock: Callable[[], float] = time.time):
+        self.max_entries = max_entries
+        self._clock = clock
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, token: str) -> Optional[dict]:
+        entry = self._entries.get(token)
+        if entry is None:
+            return None
+        claims, expires_at = entry
+        with self._lock:
+            if self._clock() >= expires_at:
+                self._entries.pop(token, None)
+                return None
+            if token in self._entries:
+                self._entries.move_to_end(token)
+        return claims
+
+    def put(self, token: str, claims: dict) -> None:
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[token] = (claims, claims["exp"])
+            self._entries.move_to_end(token)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+class CognitoJwtVerifier:
+    """CognitoのIDトークン・アクセストークンを検証し、クレームを返す"""
+
+    def __init__(
+        self,
+        issuer: str,
+        app_client_id: str,
+        jwks: JwksCache,
+        token_cache: VerifiedTokenCache,
+        leeway: float = 0,
+    ):
+        self.issuer = issuer
+        self.app_client_id = app_client_id
+        self.jwks = jwks
+        self.token_cache = token_cache
+        self.leeway = leeway
+
+    def verify(self, token: str) -> dict:
+        claims = self.token_cache.get(token)
+        if claims is not None:
+            return claims
+
+        try:
+            kid = jwt.get_unverified_header(token).get("kid")
+        except jwt.InvalidTokenError:
+            raise HTTPException(status_code=401, detail="Invalid JWT format")
+        try:
+            key = self.jwks.get_key(kid) if kid else None
+        except Exception:
+            logger.exception("JWKSを取得できませんでした")
+            raise HTTPException(status_code=503, detail="Token verification keys unavailable")
+        if key is None:
+            raise HTTPException(status_code=401, detail="Unknown signing key")
+
+        try:
+            claims = jwt.decode(
+                token,
+                key,
+                algorithms=["RS256"],
+                issuer=self.issuer,
+                leeway=self.leeway,
+                options={"require": ["exp", "iat", "iss", "sub", "token_use"], "verify_aud": False},
+            )
+        except jwt.ExpiredSignatureError:
+            raise HTTPException(status_code=401, detail="Token has expired")
+        except jwt.InvalidTokenError:
+            raise HTTPException(status_code=401, detail="Invalid token")
+
+        token_use = claims.get("token_use")
+        client_id = claims.get("aud") if token_use == "id" else claims.get("client_id")
+        if token_use not in TOKEN_USES or client_id != self.app_client_id:
+            raise HTTPException(status_code=401, detail="Invalid token audience")
+
+        self.token_cache.put(token, claims)
+        return claims
+
+
+@lru_cache()
+def get_jwt_verifier() -> Optional[CognitoJwtVerifier]:
+    """設定からCognitoの検証器を作る（USERPOOL_ID未設定ならNone）"""
+    settings = get_CognitoSettings()
+    if not settings.USERPOOL_ID:
+        logger.warning("USERPOOL_IDが未設定のため、トークンの署名を検証しません")
+        return None
+    issuer = f"https://cognito-idp.{settings.REGION}.amazonaws.com/{settings.USERPOOL_ID}"
+    jwks = JwksCache(
+        settings.JWKS_URL or f"{issuer}/.well-known/jwks.json",
+        refresh_seconds=settings.JWKS_REFRESH_SECONDS,
+        min_refetch_seconds=settings.JWKS_MIN_REFETCH_SECONDS,
+    )
+    return CognitoJwtVerifier(
+        issuer,
+        settings.APP_CLIENT_ID,
+        jwks,
+        VerifiedTokenCache(settings.TOKEN_CACHE_SIZE),
+        leeway=settings.LEEWAY_SECONDS,
+    )
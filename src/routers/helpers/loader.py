@@ -3,8 +3,13 @@
 シナリオJSONファイルをDynamoDBに格納するスクリプト
 """
 import json
+import hashlib
+import time
 import boto3
+import requests
 import uuid
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
 from decimal import Decimal
 from pathlib import Path
 import argparse
@@ -16,7 +21,10 @@ from boto3.dynamodb.conditions import Key
 # 親ディレクトリをパスに追加
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
 
-from settings import get_DynamoDbSettings
+from routers.helpers.aws_clients import get_dynamodb_resource
+
+# 内容ハッシュの計算から除外する属性（内容が同じでも書き込むたびに変わるもの）
+HASH_EXCLUDED_ATTRIBUTES = ("created_at", "updated_at", "content_hash")
 
 def convert_to_dynamodb_format(obj):
     """PythonオブジェクトをDynamoDB形式に変換"""
@@ -31,14 +39,51 @@ def convert_to_dynamodb_format(obj):
     else:
         return obj
 
+def compute_content_hash(item: dict) -> str:
+    """アイテムの内容ハッシュ（キー順・数値表現に依存しない）"""
+    content = {k: v for k, v in item.items() if k not in HASH_EXCLUDED_ATTRIBUTES}
+    canonical = json.dumps(content, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def build_scenario_item(scenario_data: dict) -> dict:
+    """シナリオJSONから格納するアイテムを作る（requestsも含む）"""
+    scenario_id = scenario_data.get('scenario_id', str(uuid.uuid4()))
+    now = datetime.now().isoformat()
+    item = {
+        'PK': 'scenario',
+        'SK': scenario_id,
+        'scenario_id': scenario_id,
+        'name': scenario_data.get('name', ''),
+        'end_month': convert_to_dynamodb_format(scenario_data.get('end_month', 0)),
+        'current_month': convert_to_dynamodb_format(scenario_data.get('current_month', 0)),
+        'features': convert_to_dynamodb_format(scenario_data.get('features', [])),
+        'requests': convert_to_dynamodb_format(scenario_data.get('requests', [])),
+        'created_at': now,
+        'updated_at': now
+    }
+    item['content_hash'] = compute_content_hash(item)
+    return item
+
+
+def build_costs_item(costs_data: dict) -> dict:
+    """コストJSONから格納するアイテムを作る"""
+    now = datetime.now().isoformat()
+    item = {
+        'PK': 'costs',
+        'SK': 'metadata',
+        'costs': convert_to_dynamodb_format(costs_data.get('costs', {})),
+        'created_at': now,
+        'updated_at': now
+    }
+    item['content_hash'] = compute_content_hash(item)
+    return item
+
+
 def get_dynamodb_connection():
     """DynamoDB接続を取得"""
     try:
-        settings = get_DynamoDbSettings()
-        return boto3.resource(
-            "dynamodb",
-            region_name=settings.REGION,
-        )
+        return get_dynamodb_resource()
     except Exception:
         # 設定ファイルが使えない場合はデフォルト値を使用
         return boto3.resource(
@@ -67,25 +112,13 @@ def load_scenario_to_dynamodb(scenario_file_path):
         print(f"エラー: JSONファイルの解析に失敗しました: {e}")
         return False
     
-    scenario_id = scenario_data.get('scenario_id', str(uuid.uuid4()))
+    main_item = build_scenario_item(scenario_data)
+    scenario_id = main_item['scenario_id']
     
     print(f"シナリオ '{scenario_data.get('name', 'Unknown')}' (ID: {scenario_id}) を読み込み中...")
     
     try:
         # シナリオデータを格納（requestsも含む）
-        main_item = {
-            'PK': 'scenario',
-            'SK': scenario_id,
-            'scenario_id': scenario_id,
-            'name': scenario_data.get('name', ''),
-            'end_month': convert_to_dynamodb_format(scenario_data.get('end_month', 0)),
-            'current_month': convert_to_dynamodb_format(scenario_data.get('current_month', 0)),
-            'features': convert_to_dynamodb_format(scenario_data.get('features', [])),
-            'requests': convert_to_dynamodb_format(scenario_data.get('requests', [])),
-            'created_at': datetime.now().isoformat(),
-            'updated_at': datetime.now().isoformat()
-        }
-        
         table.put_item(Item=main_item)
         print(f"✅ シナリオデータを格納しました")
         
@@ -171,21 +204,12 @@ def load_costs_to_dynamodb(costs_file_path: str) -> bool:
     
     try:
         # コストデータを格納
-        costs_item = {
-            'PK': 'costs',
-            'SK': 'metadata',
-            'costs': convert_to_dynamodb_format(costs_data.get('costs', {})),
-            'created_at': datetime.now().isoformat(),
-            'updated_at': datetime.now().isoformat()
-        }
+        costs_item = build_costs_item(costs_data)
         
         table.put_item(Item=costs_item)
         print(f"✅ コストデータを格納しました")
         
         print(f"\n🎉 コストデータの読み込みが完了しました！")
-        
-        # 現在のシナリオ一覧も表示
-        list_scenarios_in_dynamodb()
         return True
         
     except Exception as e:
@@ -193,6 +217,140 @@ def load_costs_to_dynamodb(costs_file_path: str) -> bool:
         return False
 
 
+def parse_data_file(file_path) -> dict:
+    """シナリオまたはコストのJSONファイルを読み込み、格納するアイテムを作る（トップレベルに`costs`があればコスト）"""
+    with open(file_path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    if 'costs' in data:
+        return build_costs_item(data)
+    return build_scenario_item(data)
+
+
+# `max_workers`未指定のとき、解析プロセス1つあたりに割り当てるファイル数の目安
+FILES_PER_PARSE_PROCESS = 20
+
+
+def parse_data_file_safely(file_path) -> tuple:
+    """`parse_data_file`の結果を(パス, アイテム, エラー)で返す（別プロセスで呼べるようモジュールの関数にする）"""
+    try:
+        return file_path, parse_data_file(file_path), None
+    except (OSError, ValueError) as e:
+        return file_path, None, e
+
+
+def fetch_stored_hashes(table, partition_key: str) -> dict:
+    """パーティション内の各アイテムの(内容ハッシュ, 作成日時)をSKごとに返す（本体は読まない）"""
+    stored = {}
+    query_kwargs = {
+        'KeyConditionExpression': Key('PK').eq(partition_key),
+        'ProjectionExpression': 'SK, content_hash, created_at',
+    }
+    while True:
+        response = table.query(**query_kwargs)
+        for item in response.get('Items', []):
+            stored[item['SK']] = (item.get('content_hash'), item.get('created_at'))
+        if 'LastEvaluatedKey' not in response:
+            return stored
+        query_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+
+def load_directory_to_dynamodb(directory, table=None, max_workers: int = None) -> dict:
+    """
+    ディレクトリ配下のシナリオ・コストJSONをまとめて読み込む。
+
+    ファイルの解析（JSONの読み込みとDecimal変換・内容ハッシュの計算）はCPUを使うので、
+    `ProcessPoolExecutor`で複数プロセスに分けて行う
+    （`max_workers`が1、または未指定でファイルが少なければこのプロセスで解析する）。
+    格納済みの内容ハッシュと同じアイテムは書き込まず、変更のあったアイテムだけを`batch_writer`でまとめて書き込む（作成日時は引き継ぐ）。
+    """
+    start_time = time.perf_counter()
+    table = table or get_dynamodb_connection().Table("game")
+    files = sorted(Path(directory).rglob('*.json'))
+    if max_workers is None:
+        # プロセスの起動（importを含む）は数百ms掛かるので、ファイルが少なければプロセスを増やさない
+        max_workers = min(os.cpu_count() or 1, len(files) // FILES_PER_PARSE_PROCESS)
+    workers = max(1, min(max_workers, len(files)))
+
+    if workers == 1:
+        parsed = [parse_data_file_safely(file_path) for file_path in files]
+    else:
+        # スレッド（boto3の接続プールなど）を持ったプロセスをforkしないようspawnで起動する
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as executor:
+            chunksize = max(1, len(files) // (workers * 4))
+            parsed = list(executor.map(parse_data_file_safely, files, chunksize=chunksize))
+    parse_seconds = time.perf_counter() - start_time
+
+    items = {}
+    failed = []
+    for file_path, item, error in parsed:
+        if error is not None:
+            print(f"❌ エラー: '{file_path}' を読み込めませんでした: {error}")
+            failed.append(str(file_path))
+            continue
+        key = (item['PK'], item['SK'])
+        if key in items:
+            print(f"⚠️  '{file_path}' は {item['PK']}/{item['SK']} を上書きします")
+        items[key] = item
+
+    stored = {}
+    for partition_key in sorted({pk for pk, _ in items}):
+        for sk, value in fetch_stored_hashes(table, partition_key).items():
+            stored[(partition_key, sk)] = value
+
+    changed = []
+    for key, item in items.items():
+        stored_hash, created_at = stored.get(key, (None, None))
+        if stored_hash == item['content_hash']:
+            continue
+        if created_at:
+            item['created_at'] = created_at
+        changed.append(item)
+
+    with table.batch_writer(overwrite_by_pkeys=['PK', 'SK']) as batch:
+        for item in changed:
+            batch.put_item(Item=item)
+
+    elapsed = time.perf_counter() - start_time
+    result = {
+        'files': len(files),
+        'written': len(changed),
+        'skipped': len(items) - len(changed),
+        'failed': failed,
+        'costs_changed': any(item['PK'] == 'costs' for item in changed),
+        'workers': workers,
+        'parse_seconds': parse_seconds,
+        'elapsed_seconds': elapsed,
+        'items_per_second': len(items) / elapsed if elapsed > 0 else 0.0,
+    }
+    print(
+        f"✅ {result['files']}ファイル: 書き込み{result['written']}件 / 変更なし{result['skipped']}件 / "
+        f"失敗{len(failed)}件 (解析{parse_seconds * 1000:.1f}ms・{workers}プロセス, 全体{elapsed * 1000:.1f}ms, "
+        f"{result['items_per_second']:.0f} items/sec)"
+    )
+    return result
+
+
+def notify_cost_cache_invalidation(invalidate_url: str = None) -> bool:
+    """起動中のAPIにコストカタログキャッシュの破棄を通知"""
+    invalidate_url = invalidate_url or os.getenv("COST_CACHE_INVALIDATE_URL")
+    if not invalidate_url:
+        print("ℹ️  キャッシュ破棄の通知先が未設定のため、APIにはTTL経過後に反映されます")
+        return False
+
+    try:
+        response = requests.post(
+            invalidate_url,
+            headers={"X-Admin-Token": os.getenv("ADMIN_TOKEN", "")},
+            timeout=5,
+        )
+        response.raise_for_status()
+        print(f"✅ コストキャッシュを破棄しました: {invalidate_url}")
+        return True
+    except requests.RequestException as e:
+        print(f"⚠️  コストキャッシュの破棄通知に失敗しました: {e}")
+        return False
+
+
 def list_costs_in_dynamodb():
     """DynamoDB内のコストデータを表示"""
     dynamodb = get_dynamodb_connection()
@@ -258,22 +416,33 @@ def main():
     parser = argparse.ArgumentParser(description='シナリオJSONファイルをDynamoDBに格納')
     parser.add_argument('--load', type=str, help='読み込むシナリオJSONファイルのパス')
     parser.add_argument('--load-costs', type=str, help='読み込むコストJSONファイルのパス')
+    parser.add_argument('--load-dir', type=str, help='配下のシナリオ・コストJSONをまとめて読み込むディレクトリ（変更のないものは書き込まない）')
+    parser.add_argument('--workers', type=int, help='--load-dirでファイルを解析するプロセス数（未指定ならファイル数に応じてCPU数まで、1ならこのプロセスで解析）')
     parser.add_argument('--list', action='store_true', help='DynamoDB内のシナリオ一覧を表示')
     parser.add_argument('--list-costs', action='store_true', help='DynamoDB内のコストデータを表示')
     parser.add_argument('--delete', type=str, help='削除するシナリオID')
     parser.add_argument('--delete-costs', action='store_true', help='コストデータを削除')
+    parser.add_argument('--invalidate-url', type=str, help='コスト更新後に叩くキャッシュ破棄URL（例: http://localhost:8080/costs/cache/invalidate）')
     
     args = parser.parse_args()
     
     if args.load:
-        success = load_scenario_to_dynamodb(args.load)
-        if success:
-            print("\n📋 現在のシナリオ一覧:")
-            list_scenarios_in_dynamodb()
+        load_scenario_to_dynamodb(args.load)
+    elif args.load_dir:
+        try:
+            result = load_directory_to_dynamodb(args.load_dir, max_workers=args.workers)
+        except Exception as e:
+            print(f"❌ エラー: DynamoDBへの書き込みに失敗しました: {e}")
+            sys.exit(1)
+        if result['costs_changed']:
+            notify_cost_cache_invalidation(args.invalidate_url)
+        if result['failed']:
+            sys.exit(1)
     elif args.load_costs:
         success = load_costs_to_dynamodb(args.load_costs)
         if success:
             print("✅ コストデータの読み込みが完了しました")
+            notify_cost_cache_invalidation(args.invalidate_url)
     elif args.list:
         list_scenarios_in_dynamodb()
     elif args.list_costs:
@@ -287,10 +456,12 @@ def main():
         success = delete_costs_from_dynamodb()
         if success:
             print("✅ コストデータの削除が完了しました")
+            notify_cost_cache_invalidation(args.invalidate_url)
     else:
         print("使用方法:")
         print("  シナリオを読み込む: python loader.py --load scenarios/personal_blog_scenario.json")
         print("  コストを読み込む: python loader.py --load-costs costs/dynamodb_costs.json")
+        print("  まとめて読み込む: python loader.py --load-dir .")
         print("  シナリオ一覧表示: python loader.py --list")
         print("  コスト一覧表示: python loader.py --list-costs")
         print("  シナリオを削除: python loader.py --delete scenario-id")
@@ -0,0 +1,256 @@
+"""
+アプリケーションのメトリクス（Prometheusのテキスト形式）
+
+- HTTP: ルート（`/play/{game_id}`のようなテンプレート）ごとのリクエスト数・レイテンシのヒストグラム
+  と処理中の数（`MetricsMiddleware`。処理中の数はルーティング後に依存関係`track_in_flight`で加算する）
+- DynamoDB: `AsyncTable`のオペレーションごとの呼び出し数と所要時間（スレッドプールの待ち時間を含む）
+- Bedrock: 呼び出し方（一括 / ストリーム）ごとの呼び出し数・所要時間・消費トークン数
+
+依存ライブラリを増やさないよう、カウンター・ゲージ・ヒストグラムはここで最小限に実装する。
+記録は辞書の参照とロック1回の加算だけで、テキストへの整形は`/metrics`の取得時にまとめて行う。
+"""
+import threading
+import time
+from bisect import bisect_left
+from typing import Iterable, Tuple
+
+from fastapi import Request
+
+# レイテンシ用のバケット（秒）
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# どのルートにも一致しなかったリクエストのラベル（パスをそのまま使うと系列が増え続ける）
+UNMATCHED_ROUTE = "<unmatched>"
+
+# track_in_flightが加算したラベルを、MetricsMiddlewareが減算するためにscopeへ残すキー
+IN_FLIGHT_SCOPE_KEY = "metrics.in_flight_labels"
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    """ラベルの値の組ごとに値を持つメトリクスの基底クラス"""
+
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, label_names: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _header(self) -> list:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+    def _snapshot(self) -> list:
+        with self._lock:
+            return sorted(self._values.items())
+
+    def reset(self) -> None:
+        with self._lock:
+            self._values.clear()
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, *label_values: str, amount: float = 1) -> None:
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def value(self, *label_values: str) -> float:
+        return self._values.get(label_values, 0)
+
+    def render(self) -> list:
+        lines = self._header()
+        for label_values, value in self._snapshot():
+            lines.append(f"{self.name}{_format_labels(self.label_names, label_values)} {_format_value(value)}")
+        return lines
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, *label_values: str, amount: float = 1) -> None:
+        self.inc(*label_values, amount=-amount)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, label_names: Iterable[str] = (), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, label_names)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, *label_values: str, value: float) -> None:
+        # バケットごとの件数（累積ではない）を1つだけ加算し、累積はrenderで計算する
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(label_values)
+            if state is None:
+                state = self._values[label_values] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def count(self, *label_values: str) -> int:
+        state = self._values.get(label_values)
+        return state[2] if state else 0
+
+    def _snapshot(self) -> list:
+        with self._lock:
+            return sorted((key, (list(state[0]), state[1], state[2])) for key, state in self._values.items())
+
+    def render(self) -> list:
+        lines = self._header()
+        for label_values, (bucket_counts, total, count) in self._snapshot():
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), bucket_counts):
+                cumulative += bucket_count
+                labels = _format_labels(self.label_names, label_values, f'le="{_format_value(float(bound))}"')
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.label_names, label_values)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    """メトリクスをまとめてテキスト形式にする"""
+
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    def reset(self) -> None:
+        for metric in self._metrics:
+            metric.reset()
+
+
+registry = MetricsRegistry()
+
+http_requests_total = registry.register(Counter(
+    "http_requests_total", "HTTPリクエスト数", ("method", "route", "status"),
+))
+http_request_duration_seconds = registry.register(Histogram(
+    "http_request_duration_seconds", "HTTPリクエストの処理時間（秒）", ("method", "route"),
+))
+http_requests_in_flight = registry.register(Gauge(
+    "http_requests_in_flight", "処理中のHTTPリクエスト数", ("method", "route"),
+))
+dynamodb_operations_total = registry.register(Counter(
+    "dynamodb_operations_total", "DynamoDBのオペレーション呼び出し数", ("operation", "outcome"),
+))
+dynamodb_operation_duration_seconds = registry.register(Histogram(
+    "dynamodb_operation_duration_seconds", "DynamoDBのオペレーションの所要時間（秒、スレッドプールの待ちを含む）",
+    ("operation",),
+))
+bedrock_invocations_total = registry.register(Counter(
+    "bedrock_invocations_total", "Bedrockの呼び出し数", ("mode", "outcome"),
+))
+bedrock_invocation_duration_seconds = registry.register(Histogram(
+    "bedrock_invocation_duration_seconds", "Bedrockの呼び出しの所要時間（秒、ストリームは最後のトークンまで）",
+    ("mode",), buckets=(0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0),
+))
+bedrock_tokens_total = registry.register(Counter(
+    "bedrock_tokens_total", "Bedrockの消費トークン数", ("mode", "direction"),
+))
+
+
+def record_dynamodb_operation(operation: str, duration: float, succeeded: bool) -> None:
+    dynamodb_operations_total.inc(operation, "success" if succeeded else "error")
+    dynamodb_operation_duration_seconds.observe(operation, value=duration)
+
+
+def record_bedrock_invocation(
+    mode: str, duration: float, outcome: str, input_tokens: int = 0, output_tokens: int = 0
+) -> None:
+    """Bedrockの呼び出し1回を記録する（outcome: success / error / cancelled）"""
+    bedrock_invocations_total.inc(mode, outcome)
+    bedrock_invocation_duration_seconds.observe(mode, value=duration)
+    if input_tokens:
+        bedrock_tokens_total.inc(mode, "input", amount=input_tokens)
+    if output_tokens:
+        bedrock_tokens_total.inc(mode, "output", amount=output_tokens)
+
+
+def route_label(scope) -> str:
+    """ルーティング後のscopeからルートのテンプレートを取り出す（一致しなければUNMATCHED_ROUTE）"""
+    route = scope.get("route")
+    return getattr(route, "path", None) or UNMATCHED_ROUTE
+
+
+async def track_in_flight(request: Request) -> None:
+    """
+    処理中のリクエスト数をルートごとに加算するアプリ全体の依存関係。
+
+    ミドルウェアの時点ではまだルートが決まっていないため、加算はルーティング後に動く依存関係で行う。
+    減算は`MetricsMiddleware`がレスポンス（ストリーミングの本文を含む）を送り終えてから行う
+    （yieldの依存関係の後処理は、FastAPIのバージョンによってはストリーミングの本文より先に動く）。
+    """
+    labels = (request.method, route_label(request.scope))
+    http_requests_in_flight.inc(*labels)
+    request.scope[IN_FLIGHT_SCOPE_KEY] = labels
+
+
+class MetricsMiddleware:
+    """
+    HTTPリクエストの件数と処理時間をルートごとに記録するASGIミドルウェア。
+
+    ルートのラベルはルーティング時にStarletteが`scope["route"]`に入れたものを使うので、
+    パスの照合を二重に行わない。どのルートにも一致しなかったリクエストはUNMATCHED_ROUTEにまとめる。
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = {"code": 500}
+
+        async def send_with_status(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        start_time = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            # ストリーミングレスポンスは本文を送り終えるまでを処理時間とする
+            method, route = scope["method"], route_label(scope)
+            http_request_duration_seconds.observe(method, route, value=time.perf_counter() - start_time)
+            http_requests_total.inc(method, route, str(status["code"]))
+            in_flight_labels = scope.get(IN_FLIGHT_SCOPE_KEY)
+            if in_flight_labels is not None:
+                http_requests_in_flight.dec(*in_flight_labels)
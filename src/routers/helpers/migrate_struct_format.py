@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+ゲーム・サンドボックスのstructを指定の保存形式（map / zlib）に書き換えるスクリプト
+
+structの内容は変えないので`struct_revision`は進めず、読み込んだ時点から
+structが更新されていたアイテム（`struct_revision`が変わっている）は飛ばす。
+飛ばしたアイテムはもう一度実行すれば変換される。
+"""
+import argparse
+import os
+import sys
+
+from boto3.dynamodb.conditions import Attr
+from botocore.exceptions import ClientError
+
+# 親ディレクトリをパスに追加
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from routers.helpers.struct_codec import (
+    STORAGE_FORMATS,
+    decode_struct,
+    encode_struct_for_storage,
+    estimate_attribute_size,
+    is_encoded,
+)
+
+
+def iter_struct_items(table):
+    """structを持ちうるアイテム（ゲーム・サンドボックス）をスキャンする"""
+    scan_kwargs = {
+        "FilterExpression": Attr("SK").begins_with("game#") | Attr("SK").begins_with("sandbox#"),
+        "ProjectionExpression": "PK, SK, #struct, struct_revision",
+        "ExpressionAttributeNames": {"#struct": "struct"},
+    }
+    while True:
+        response = table.scan(**scan_kwargs)
+        yield from response.get("Items", [])
+        if "LastEvaluatedKey" not in response:
+            return
+        scan_kwargs["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+
+
+def migrate_struct_format(table, target_format: str, dry_run: bool = False) -> dict:
+    """structを`target_format`に書き換え、件数とおおよそのバイト数を返す"""
+    if target_format not in STORAGE_FORMATS:
+        raise ValueError(f"未対応のstruct形式です: {target_format}")
+
+    stats = {"scanned": 0, "converted": 0, "unchanged": 0, "conflicts": 0, "bytes_before": 0, "bytes_after": 0}
+    for item in iter_struct_items(table):
+        stats["scanned"] += 1
+        value = item.get("struct")
+        current_format = "zlib" if is_encoded(value) else "map"
+        if value is None or current_format == target_format:
+            stats["unchanged"] += 1
+            continue
+
+        converted = encode_struct_for_storage(decode_struct(value), target_format)
+        stats["bytes_before"] += estimate_attribute_size(value)
+        stats["bytes_after"] += estimate_attribute_size(converted)
+        if dry_run:
+            stats["converted"] += 1
+            continue
+
+        revision = item.get("struct_revision")
+        update_kwargs = {
+            "Key": {"PK": item["PK"], "SK": item["SK"]},
+            "UpdateExpression": "SET #struct = :struct",
+            "ExpressionAttributeNames": {"#struct": "struct"},
+            "ExpressionAttributeValues": {":struct": converted},
+        }
+        if revision is None:
+            update_kwargs["ConditionExpression"] = "attribute_exists(PK) AND attribute_not_exists(struct_revision)"
+        else:
+            update_kwargs["ConditionExpression"] = "struct_revision = :revision"
+            update_kwargs["ExpressionAttributeValues"][":revision"] = revision
+        try:
+            table.update_item(**update_kwargs)
+            stats["converted"] += 1
+        except ClientError as e:
+            if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+                raise
+            stats["conflicts"] += 1
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ゲーム・サンドボックスのstructの保存形式を書き換える")
+    parser.add_argument("--to", choices=STORAGE_FORMATS, required=True, help="変換後の保存形式")
+    parser.add_argument("--dry-run", action="store_true", help="書き込まずに件数とサイズだけを表示")
+    args = parser.parse_args()
+
+    from routers.helpers.loader import get_dynamodb_connection
+
+    table = get_dynamodb_connection().Table("game")
+    stats = migrate_struct_format(table, args.to, dry_run=args.dry_run)
+    prefix = "（dry-run）" if args.dry_run else ""
+    print(
+        f"✅ {prefix}{stats['scanned']}件を確認: 変換{stats['converted']}件 / 対象外{stats['unchanged']}件 / "
+        f"競合{stats['conflicts']}件"
+    )
+    if stats["bytes_before"]:
+        print(
+            f"   struct合計: {stats['bytes_before']:,} → {stats['bytes_after']:,} bytes "
+            f"({stats['bytes_after'] / stats['bytes_before']:.1%})"
+        )
+    if stats["conflicts"]:
+        print("⚠️  変換中に更新されたアイテムがあります。もう一度実行してください")
+
+
+if __name__ == "__main__":
+    main()
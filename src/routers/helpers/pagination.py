@@ -0,0 +1,63 @@
+"""
+DynamoDBのページング用ヘルパー
+
+`LastEvaluatedKey`はbase64url(JSON)のカーソル文字列としてクライアントに返し、
+次のリクエストで受け取ったカーソルを`ExclusiveStartKey`に戻す。
+"""
+import base64
+import binascii
+import json
+from typing import AsyncIterator, Optional, Tuple
+
+from fastapi import HTTPException
+
+
+def encode_cursor(last_evaluated_key: Optional[dict]) -> Optional[str]:
+    """LastEvaluatedKeyをカーソル文字列にする（最後のページならNone）"""
+    if not last_evaluated_key:
+        return None
+    raw = json.dumps(last_evaluated_key, separators=(",", ":"), sort_keys=True)
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(
+    cursor: Optional[str],
+    partition_key: str,
+    partition_key_name: str = "PK",
+    key_names: Tuple[str, ...] = ("PK", "SK"),
+) -> Optional[dict]:
+    """
+    カーソル文字列をExclusiveStartKeyに戻す。
+
+    別パーティションのキーを指定されないよう、`partition_key_name`の属性（GSIならGSIのパーティションキー）が
+    `partition_key`と一致することも確認する。キーの属性はクエリするテーブル・GSIのキースキーマ
+    （`key_names`。GSIならGSIのキーとテーブルのキー）とちょうど一致しなければならず、
+    過不足があるカーソルはDynamoDBのValidationExceptionで500にならないよう400にする。
+    """
+    if not cursor:
+        return None
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        key = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+    except (ValueError, binascii.Error, UnicodeError):
+        raise HTTPException(status_code=400, detail="カーソルの形式が正しくありません")
+
+    if (
+        not isinstance(key, dict)
+        or set(key) != set(key_names)
+        or key.get(partition_key_name) != partition_key
+        or not all(isinstance(value, str) for value in key.values())
+    ):
+        raise HTTPException(status_code=400, detail="カーソルの形式が正しくありません")
+    return key
+
+
+async def iter_query_pages(table, **query_kwargs) -> AsyncIterator[dict]:
+    """LastEvaluatedKeyをたどりながら、queryの結果をページ単位で返す"""
+    while True:
+        response = await table.query(**query_kwargs)
+        yield response
+        last_key = response.get("LastEvaluatedKey")
+        if not last_key:
+            return
+        query_kwargs["ExclusiveStartKey"] = last_key
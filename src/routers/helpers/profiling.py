@@ -0,0 +1,255 @@
+"""
+リクエスト単位のプロファイリング（オプトイン）
+
+`PROFILING_ENABLED=true`のときだけミドルウェアを入れ、次のリクエストをプロファイルする。
+
+- `X-Profile: 1`ヘッダー付きのリクエスト（`X-Admin-Token`も必要）
+- `PROFILING_PATH_PREFIXES`に前方一致するリクエストのうち`PROFILING_SAMPLE_RATE`の割合
+
+プロファイラは`PROFILING_MODE`で選ぶ。
+
+- sample（デフォルト）: 別スレッドからイベントループのスレッドのスタックを一定間隔で読む統計的プロファイラ。
+  対象リクエストのタスクが実行中ならそのスタックを、awaitで止まっていればawait中のコルーチンの連なり
+  （末尾に`<awaiting>`）を記録するので、DynamoDB・Bedrockの待ち時間とCPU時間を分けて見られる。
+  `<id>.folded`（flamegraph.pl・speedscopeで読める折りたたみスタック）と`<id>.txt`（集計）を保存する。
+  CPUを使い続ける処理の間はGILの切り替え間隔（5ms）ごとにしか読めないので、`PROFILING_INTERVAL_MS`は目安。
+- cprofile: cProfileによる決定的プロファイラ。`<id>.prof`（pstats・snakevizで読める）と`<id>.txt`を保存する。
+  同じスレッドで動く他のリクエストの処理も含まれ、呼び出しごとのオーバーヘッドで細かい関数ほど遅く見える。
+
+同時にプロファイルするのは1リクエストだけで、実行中は他のリクエストを素通しする。
+無効時はミドルウェア自体を入れないので、リクエストごとのオーバーヘッドはない。
+"""
+import asyncio
+import cProfile
+import io
+import logging
+import os
+import pstats
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import datetime
+from typing import Optional
+
+from routers.extractor import is_admin_token_valid
+from settings import get_ProfilingSettings
+
+logger = logging.getLogger(__name__)
+
+PROFILING_MODES = ("sample", "cprofile")
+AWAITING_FRAME = "<awaiting>"
+# 集計（.txt）に出す関数の数
+SUMMARY_TOP_N = 25
+
+
+def _frame_label(code) -> str:
+    # 折りたたみスタックはフレームを;で区切り、行末の空白の後がサンプル数
+    label = f"{code.co_qualname} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+    return label.replace(";", ":")
+
+
+class StackSampler:
+    """
+    1つのタスクのスタックを一定間隔で記録する統計的プロファイラ。
+
+    サンプリングは別スレッドで行い、`root_code`（プロファイル開始を呼んだ関数）より上のフレームは記録しない。
+    """
+
+    def __init__(self, task: asyncio.Task, thread_id: int, root_code, interval: float):
+        self.task = task
+        self.thread_id = thread_id
+        self.root_code = root_code
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profiling-sampler", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+        self._thread.join()
+
+    def _trim(self, codes: list) -> list:
+        for index, code in enumerate(codes):
+            if code is self.root_code:
+                return codes[index + 1:]
+        return codes
+
+    def _running_stack(self) -> Optional[list]:
+        frame = sys._current_frames().get(self.thread_id)
+        codes = []
+        while frame is not None:
+            codes.append(frame.f_code)
+            frame = frame.f_back
+        codes.reverse()
+        if self.root_code not in codes:
+            # イベントループが他のタスクを実行中か、何もしていない
+            return None
+        return [_frame_label(code) for code in self._trim(codes)]
+
+    def _awaiting_stack(self) -> list:
+        codes = []
+        awaitable = self.task.get_coro()
+        while awaitable is not None:
+            frame = getattr(awaitable, "cr_frame", None)
+            if frame is None:
+                break
+            codes.append(frame.f_code)
+            awaitable = getattr(awaitable, "cr_await", None)
+        return [_frame_label(code) for code in self._trim(codes)] + [AWAITING_FRAME]
+
+    def sample(self) -> None:
+        try:
+            stack = self._running_stack()
+            if stack is None:
+                stack = self._awaiting_stack()
+        except Exception:
+            # 読み取り中にフレームが入れ替わった場合などは、そのサンプルだけ捨てる
+            return
+        self.stacks[";".join(stack)] += 1
+        self.samples += 1
+
+    def _run(self) -> None:
+        while not self._stopped.wait(self.interval):
+            self.sample()
+
+    def folded(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+    def summary(self) -> str:
+        """自己時間・累積時間の上位の関数（サンプル数の割合）"""
+        own = Counter()
+        total = Counter()
+        for stack, count in self.stacks.items():
+            frames = stack.split(";")
+            own[frames[-1]] += count
+            for frame in set(frames):
+                total[frame] += count
+
+        samples = self.samples or 1
+        lines = [f"samples: {self.samples} (interval {self.interval * 1000:g}ms)", "", "self:"]
+        lines += [f"  {count / samples:6.1%} {count:6d}  {frame}" for frame, count in own.most_common(SUMMARY_TOP_N)]
+        lines += ["", "total:"]
+        lines += [f"  {count / samples:6.1%} {count:6d}  {frame}" for frame, count in total.most_common(SUMMARY_TOP_N)]
+        return "\n".join(lines) + "\n"
+
+
+def _safe_path(path: str) -> str:
+    return re.sub(r"[^A-Za-z0-9_-]+", "_", path).strip("_")[:60] or "root"
+
+
+class ProfilingMiddleware:
+    """対象のリクエストをプロファイルし、結果をファイルに保存するASGIミドルウェア"""
+
+    def __init__(self, app):
+        self.app = app
+        self.settings = get_ProfilingSettings()
+        if self.settings.MODE not in PROFILING_MODES:
+            raise ValueError(f"未対応のプロファイルモードです: {self.settings.MODE}")
+        # 同時にプロファイルするのは1リクエストだけ（cProfileは同時に1つしか有効にできない）
+        self._lock = threading.Lock()
+
+    def _requested_by_header(self, scope) -> bool:
+        headers = dict(scope.get("headers") or [])
+        if headers.get(b"x-profile") != b"1":
+            return False
+        return is_admin_token_valid(headers.get(b"x-admin-token", b"").decode("latin-1"))
+
+    def should_profile(self, scope) -> bool:
+        if self._requested_by_header(scope):
+            return True
+        sample_rate = self.settings.SAMPLE_RATE
+        if sample_rate <= 0:
+            return False
+        path = scope.get("path", "")
+        if not any(path.startswith(prefix) for prefix in self.settings.PATH_PREFIXES):
+            return False
+        return random.random() < sample_rate
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.should_profile(scope):
+            await self.app(scope, receive, send)
+            return
+        if not self._lock.acquire(blocking=False):
+            await self.app(scope, receive, send)
+            return
+        try:
+            await self._profile(scope, receive, send)
+        finally:
+            self._lock.release()
+
+    async def _profile(self, scope, receive, send):
+        profile_id = f"{datetime.now():%Y%m%d-%H%M%S}-{scope['method']}-{_safe_path(scope['path'])}-{uuid.uuid4().hex[:8]}"
+
+        async def send_with_profile_id(message):
+            if message["type"] == "http.response.start":
+                message = dict(message, headers=list(message.get("headers", [])) + [
+                    (b"x-profile-id", profile_id.encode("latin-1")),
+                ])
+            await send(message)
+
+        if self.settings.MODE == "cprofile":
+            profiler = cProfile.Profile()
+            start_time = time.perf_counter()
+            profiler.enable()
+            try:
+                await self.app(scope, receive, send_with_profile_id)
+            finally:
+                profiler.disable()
+                await asyncio.to_thread(
+                    self._write_cprofile, profile_id, scope, profiler, time.perf_counter() - start_time
+                )
+            return
+
+        sampler = StackSampler(
+            asyncio.current_task(),
+            threading.get_ident(),
+            ProfilingMiddleware._profile.__code__,
+            self.settings.INTERVAL_MS / 1000,
+        )
+        start_time = time.perf_counter()
+        sampler.start()
+        try:
+            await self.app(scope, receive, send_with_profile_id)
+        finally:
+            sampler.stop()
+            await asyncio.to_thread(
+                self._write_samples, profile_id, scope, sampler, time.perf_counter() - start_time
+            )
+
+    def _header(self, scope, elapsed: float) -> str:
+        return f"{scope['method']} {scope['path']}\nwall: {elapsed * 1000:.1f}ms\nmode: {self.settings.MODE}\n"
+
+    def _write(self, profile_id: str, suffix: str, content) -> str:
+        os.makedirs(self.settings.OUTPUT_DIR, exist_ok=True)
+        path = os.path.join(self.settings.OUTPUT_DIR, profile_id + suffix)
+        mode = "wb" if isinstance(content, bytes) else "w"
+        with open(path, mode, **({} if mode == "wb" else {"encoding": "utf-8"})) as f:
+            f.write(content)
+        return path
+
+    def _write_samples(self, profile_id: str, scope, sampler: StackSampler, elapsed: float) -> None:
+        try:
+            self._write(profile_id, ".folded", sampler.folded())
+            self._write(profile_id, ".txt", self._header(scope, elapsed) + sampler.summary())
+            logger.info("プロファイルを保存しました: %s (%d samples)", profile_id, sampler.samples)
+        except OSError:
+            logger.exception("プロファイルを保存できませんでした: %s", profile_id)
+
+    def _write_cprofile(self, profile_id: str, scope, profiler: cProfile.Profile, elapsed: float) -> None:
+        try:
+            os.makedirs(self.settings.OUTPUT_DIR, exist_ok=True)
+            profiler.dump_stats(os.path.join(self.settings.OUTPUT_DIR, profile_id + ".prof"))
+            report = io.StringIO()
+            pstats.Stats(profiler, stream=report).sort_stats("cumulative").print_stats(SUMMARY_TOP_N)
+            self._write(profile_id, ".txt", self._header(scope, elapsed) + report.getvalue())
+            logger.info("プロファイルを保存しました: %s", profile_id)
+        except OSError:
+            logger.exception("プロファイルを保存できませんでした: %s", profile_id)
@@ -0,0 +1,246 @@
+"""
+シナリオのインメモリリポジトリ
+
+シナリオは起動時（またはバージョン変更時）に一度だけ全件読み込み、
+以下の辞書インデックスを作っておく。以降の参照はすべてメモリ上のO(1)で済む。
+
+- scenario_id -> Scenario
+- feature_id -> (Scenario, Feature)
+- (scenario_id, month) -> MonthlyRequest
+- (scenario_id, month) -> その月に定義されたリクエスト数の合計
+- シナリオ名 -> scenario_id
+- scenario_id -> 月0〜end_month-1の総リクエスト数・資金の配列
+"""
+import asyncio
+import hashlib
+import logging
+import time
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+from boto3.dynamodb.conditions import Key
+
+from models.scenario import Scenario, ScenarioSummary, Feature, MonthlyRequest
+from routers.helpers.pagination import iter_query_pages
+
+logger = logging.getLogger(__name__)
+
+
+def compute_scenario_version(items: List[dict]) -> str:
+    """シナリオアイテムのSKと更新日時からバージョン文字列を作る"""
+    digest = hashlib.sha256()
+    for sk, updated_at in sorted(
+        (str(item.get('SK', '')), str(item.get('updated_at', ''))) for item in items
+    ):
+        digest.update(f"{sk}\0{updated_at}\n".encode("utf-8"))
+    return digest.hexdigest()
+
+
+class MonthlySeries(NamedTuple):
+    """シナリオの月ごとの系列（インデックスが月）"""
+    total_requests: np.ndarray
+    funds: np.ndarray
+    defined: np.ndarray  # シナリオに明示的に定義されている月か
+
+
+def build_monthly_series(scenario: Scenario) -> MonthlySeries:
+    """
+    月0〜end_month-1の総リクエスト数と資金の配列を作る。
+    定義のない月は直前に定義された月の値を引き継ぐ。
+    """
+    months = [
+        month_request for month_request in scenario.requests or []
+        if 0 <= month_request.month < scenario.end_month
+    ]
+    length = max(scenario.end_month, 0)
+    total_requests = np.zeros(length, dtype=np.int64)
+    funds = np.zeros(length, dtype=np.int64)
+    defined = np.zeros(length, dtype=bool)
+    for month_request in months:
+        if defined[month_request.month]:
+            continue
+        defined[month_request.month] = True
+        total_requests[month_request.month] = sum(
+            feature.request or 0 for feature in month_request.feature
+        )
+        funds[month_request.month] = month_request.funds
+
+    # 直前の定義済み月のインデックスで埋める（先頭が未定義なら0のまま）
+    last_defined = np.maximum.accumulate(np.where(defined, np.arange(length), -1))
+    has_previous = last_defined >= 0
+    total_requests[has_previous] = total_requests[last_defined[has_previous]]
+    funds[has_previous] = funds[last_defined[has_previous]]
+    return MonthlySeries(total_requests=total_requests, funds=funds, defined=defined)
+
+
+class ScenarioIndex:
+    """ある時点の全シナリオと、その参照用インデックス"""
+
+    def __init__(self, items: List[dict], version: str):
+        self.version = version
+        self.scenarios: Dict[str, Scenario] = {}
+        self.features: Dict[str, Tuple[Scenario, Feature]] = {}
+        self.months: Dict[Tuple[str, int], MonthlyRequest] = {}
+        self.month_requests: Dict[Tuple[str, int], int] = {}
+        self.names: Dict[str, str] = {}
+        self.created_at: Dict[str, str] = {}
+        self.series: Dict[str, MonthlySeries] = {}
+        self.summaries: List[ScenarioSummary] = []
+
+        for item in items:
+            # FastReadTableで読んだアイテムは数値がint・floatなので、そのままモデルにする
+            scenario = Scenario(
+                scenario_id=item.get('scenario_id', ''),
+                name=item.get('name', ''),
+                end_month=item.get('end_month', 0),
+                current_month=item.get('current_month', 0),
+                features=item.get('features', []),
+                requests=item.get('requests', []),
+            )
+            scenario_id = scenario.scenario_id
+            self.scenarios[scenario_id] = scenario
+            self.created_at[scenario_id] = item.get('created_at', '')
+
+            for feature in scenario.features:
+                # 複数シナリオに同じIDがある場合は、従来どおり先に見つかった方を優先
+                self.features.setdefault(feature.id, (scenario, feature))
+
+            self.names.setdefault(scenario.name, scenario_id)
+
+            for month_request in scenario.requests or []:
+                key = (scenario_id, month_request.month)
+                if key in self.months:
+                    continue
+                self.months[key] = month_request
+                self.month_requests[key] = sum(feature.request or 0 for feature in month_request.feature)
+            self.series[scenario_id] = build_monthly_series(scenario)
+
+            self.summaries.append(ScenarioSummary(
+                scenario_id=scenario_id,
+                name=scenario.name,
+                end_month=scenario.end_month,
+                current_month=scenario.current_month,
+                feature_count=len(scenario.features),
+                created_at=self.created_at[scenario_id],
+            ))
+
+
+    def resolve_scenario_id(self, reference: str) -> Optional[str]:
+        """
+        ゲームに保存されたシナリオの参照（scenario_idまたはシナリオ名）からscenario_idを引く。
+        どちらにも一致しなければ、以前のレポートと同じく名前の部分一致（双方向）で探す。
+        """
+        if reference in self.scenarios:
+            return reference
+        scenario_id = self.names.get(reference)
+        if scenario_id is not None:
+            return scenario_id
+        if not reference:
+            return None
+        for summary in self.summaries:
+            if reference in summary.name or summary.name in reference:
+                return summary.scenario_id
+        return None
+
+
+class ScenarioRepository:
+    """全シナリオをメモリに保持し、バージョンが変わったときだけ再読み込みする"""
+
+    def __init__(
+        self,
+        table,
+        check_interval_seconds: float,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self._table = table
+        self.check_interval_seconds = check_interval_seconds
+        self._clock = clock
+        self._index: Optional[ScenarioIndex] = None
+        self._checked_at = 0.0
+        self._inflight: Optional[asyncio.Task] = None
+        self.loads = 0
+        self.version_checks = 0
+
+    @property
+    def version(self) -> Optional[str]:
+        return self._index.version if self._index else None
+
+    @property
+    def current_index(self) -> Optional[ScenarioIndex]:
+        """読み込み済みのインデックス（未読み込みなら読み込まずにNone）"""
+        return self._index
+
+    async def load(self) -> ScenarioIndex:
+        """DynamoDBから全シナリオを読み込み、インデックスを作り直す"""
+        items = await self._query_all()
+        index = ScenarioIndex(items, compute_scenario_version(items))
+        self._index = index
+        self._checked_at = self._clock()
+        self.loads += 1
+        return index
+
+    async def get_index(self) -> ScenarioIndex:
+        """現在のインデックスを取得（未読み込みなら読み込む）"""
+        if self._index is None:
+            return await self._start(self.load)
+
+        if self._clock() - self._checked_at >= self.check_interval_seconds:
+            # バージョン確認は裏で行い、呼び出し側は現在のインデックスを使う
+            self._start(self._check_version)
+        return self._index
+
+    def invalidate(self):
+        """保持しているインデックスを破棄し、次回の参照で読み込み直させる"""
+        self._index = None
+        self._inflight = None
+
+    async def get_scenario(self, scenario_id: str) -> Optional[Scenario]:
+        return (await self.get_index()).scenarios.get(scenario_id)
+
+    async def get_feature(self, feature_id: str) -> Optional[Tuple[Scenario, Feature]]:
+        return (await self.get_index()).features.get(feature_id)
+
+    async def get_month(self, scenario_id: str, month: int) -> Optional[MonthlyRequest]:
+        return (await self.get_index()).months.get((scenario_id, month))
+
+    async def list_summaries(self) -> List[ScenarioSummary]:
+        return list((await self.get_index()).summaries)
+
+    def _start(self, job) -> asyncio.Task:
+        loop = asyncio.get_running_loop()
+        inflight = self._inflight
+        if inflight is not None and not inflight.done() and inflight.get_loop() is loop:
+            return inflight
+
+        self._inflight = loop.create_task(job())
+        return self._inflight
+
+    async def _check_version(self) -> ScenarioIndex:
+        """SKと更新日時だけを取得してバージョンを比べ、変わっていれば再読み込み"""
+        self.version_checks += 1
+        try:
+            items = await self._query_all(ProjectionExpression="SK, updated_at")
+        except Exception:
+            logger.exception("シナリオのバージョン確認に失敗しました")
+            self._checked_at = self._clock()
+            return self._index
+
+        if self._index is not None and compute_scenario_version(items) == self._index.version:
+            self._checked_at = self._clock()
+            return self._index
+        try:
+            return await self.load()
+        except Exception:
+            # 読み込めなければ次の確認まで現在のインデックスを使い続ける（リクエストごとに読み直さない）
+            logger.exception("シナリオの再読み込みに失敗しました")
+            self._checked_at = self._clock()
+            return self._index
+
+    async def _query_all(self, **kwargs) -> List[dict]:
+        """PK=scenarioの全アイテムをページングしながら取得"""
+        items = []
+        async for response in iter_query_pages(
+            self._table, KeyConditionExpression=Key("PK").eq("scenario"), **kwargs
+        ):
+            items.extend(response.get('Items', []))
+        return items
@@ -5,48 +5,36 @@ import sys
 import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
 
-import boto3
-from boto3.dynamodb.conditions import Key, Attr
+from boto3.dynamodb.conditions import Attr
 from fastapi import HTTPException
 from typing import List, Optional
 from models.scenario import (
     Scenario, ScenarioSummary, Feature, MonthlyRequest, 
     FeatureDetail, MonthData, CostCalculationResult,
-    convert_decimal_to_int
+    MonthlySimulation, ScenarioSimulationResult
 )
-from settings import get_DynamoDbSettings
+from settings import get_ScenarioCacheSettings
+from routers.helpers.dynamodb import FastReadTable
+from routers.helpers.aws_clients import get_dynamodb_client, get_dynamodb_resource, get_game_table
+from routers.helpers.scenario_repository import ScenarioRepository
 
 class ScenarioService:
     """シナリオ管理サービス"""
     
     def __init__(self):
-        settings = get_DynamoDbSettings()
-        self.dynamodb = boto3.resource(
-            "dynamodb",
-            region_name=settings.REGION,
+        self.dynamodb = get_dynamodb_resource()
+        # 読み込みは低レベルクライアントで、Decimalを経由せずにPythonの値で受け取る
+        self.table = FastReadTable(get_game_table(), get_dynamodb_client())
+        # シナリオはメモリ上のインデックスから引く
+        self.repository = ScenarioRepository(
+            self.table,
+            check_interval_seconds=get_ScenarioCacheSettings().VERSION_CHECK_SECONDS,
         )
-        self.table = self.dynamodb.Table("game")
     
     async def get_all_scenarios(self) -> List[ScenarioSummary]:
         """全シナリオの一覧を取得"""
         try:
-            response = self.table.query(
-                KeyConditionExpression=Key("PK").eq("scenario")
-            )
-            
-            scenarios = []
-            for item in response.get('Items', []):
-                scenario_summary = ScenarioSummary(
-                    scenario_id=item.get('scenario_id', ''),
-                    name=item.get('name', ''),
-                    end_month=int(item.get('end_month', 0)),
-                    current_month=int(item.get('current_month', 0)),
-                    feature_count=len(item.get('features', [])),
-                    created_at=item.get('created_at', '')
-                )
-                scenarios.append(scenario_summary)
-            
-            return scenarios
+            return await self.repository.list_summaries()
             
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"シナリオ取得エラー: {str(e)}")
@@ -54,31 +42,13 @@ class ScenarioService:
     async def get_scenario_by_id(self, scenario_id: str, include_requests: bool = True) -> Scenario:
         """指定されたシナリオの詳細を取得"""
         try:
-            # メインシナリオデータを取得
-            response = self.table.get_item(
-                Key={
-                    'PK': 'scenario',
-                    'SK': scenario_id
-                }
-            )
-            
-            item = response.get('Item')
-            if not item:
+            scenario = await self.repository.get_scenario(scenario_id)
+            if not scenario:
                 raise HTTPException(status_code=404, detail="シナリオが見つかりません")
             
-            # Decimal型をintに変換
-            item = convert_decimal_to_int(item)
-            
-            scenario_data = {
-                'scenario_id': item.get('scenario_id', ''),
-                'name': item.get('name', ''),
-                'end_month': item.get('end_month', 0),
-                'current_month': item.get('current_month', 0),
-                'features': item.get('features', []),
-                'requests': item.get('requests', []) if include_requests else []
-            }
-            
-            return Scenario(**scenario_data)
+            if not include_requests:
+                return scenario.model_copy(update={'requests': []})
+            return scenario
             
         except HTTPException:
             raise
@@ -88,39 +58,20 @@ class ScenarioService:
     async def get_month_data(self, scenario_id: str, month: int) -> MonthData:
         """指定された月のシナリオデータを取得"""
         try:
-            # シナリオデータを取得
-            response = self.table.get_item(
-                Key={
-                    'PK': 'scenario',
-                    'SK': scenario_id
-                }
-            )
-            
-            item = response.get('Item')
-            if not item:
+            index = await self.repository.get_index()
+            if scenario_id not in index.scenarios:
                 raise HTTPException(status_code=404, detail="シナリオが見つかりません")
             
-            # Decimal型をintに変換
-            item = convert_decimal_to_int(item)
-            
-            # 指定された月のリクエストデータを検索
-            requests = item.get('requests', [])
-            month_request = None
-            
-            for request in requests:
-                if request.get('month') == month:
-                    month_request = request
-                    break
-            
+            month_request = index.months.get((scenario_id, month))
             if not month_request:
                 raise HTTPException(status_code=404, detail=f"月 {month} のデータが見つかりません")
             
             return MonthData(
                 scenario_id=scenario_id,
-                month=month_request.get('month', 0),
-                feature=month_request.get('feature', []),
-                funds=month_request.get('funds', 0),
-                description=month_request.get('description', '')
+                month=month_request.month,
+                feature=month_request.feature,
+                funds=month_request.funds,
+                description=month_request.description
             )
             
         except HTTPException:
@@ -128,29 +79,51 @@ class ScenarioService:
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"月データ取得エラー: {str(e)}")
     
+    async def resolve_scenario_id(self, reference: str) -> str:
+        """シナリオIDまたはシナリオ名からscenario_idを取得"""
+        try:
+            index = await self.repository.get_index()
+            scenario_id = index.resolve_scenario_id(reference)
+            if scenario_id is None:
+                raise HTTPException(status_code=404, detail=f"シナリオが見つかりません: {reference}")
+            return scenario_id
+
+        except HTTPException:
+            raise
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"シナリオ取得エラー: {str(e)}")
+
+    async def get_month_total_requests(self, scenario_id: str, month: int) -> int:
+        """指定された月に定義されたリクエスト数の合計を取得（定義のない月は0）"""
+        try:
+            index = await self.repository.get_index()
+            if scenario_id not in index.scenarios:
+                raise HTTPException(status_code=404, detail="シナリオが見つかりません")
+            return index.month_requests.get((scenario_id, month), 0)
+
+        except HTTPException:
+            raise
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"月データ取得エラー: {str(e)}")
+
     async def get_feature_by_id(self, feature_id: str) -> FeatureDetail:
         """指定されたフィーチャーの詳細を取得"""
         try:
-            # 全シナリオを検索してフィーチャーを探す
-            response = self.table.query(
-                KeyConditionExpression=Key("PK").eq("scenario")
+            index = await self.repository.get_index()
+            found = index.features.get(feature_id)
+            if not found:
+                raise HTTPException(status_code=404, detail="フィーチャーが見つかりません")
+            
+            scenario, feature = found
+            return FeatureDetail(
+                feature_id=feature.id,
+                scenario_id=scenario.scenario_id,
+                type=feature.type,
+                feature=feature.feature,
+                required=feature.required,
+                created_at=index.created_at.get(scenario.scenario_id, '')
             )
             
-            for item in response.get('Items', []):
-                features = item.get('features', [])
-                for feature in features:
-                    if feature.get('id') == feature_id:
-                        return FeatureDetail(
-                            feature_id=feature.get('id', ''),
-                            scenario_id=item.get('scenario_id', ''),
-                            type=feature.get('type', ''),
-                            feature=feature.get('feature', ''),
-                            required=feature.get('required', []),
-                            created_at=item.get('created_at', '')
-                        )
-            
-            raise HTTPException(status_code=404, detail="フィーチャーが見つかりません")
-            
         except HTTPException:
             raise
         except Exception as e:
@@ -188,13 +161,10 @@ class ScenarioService:
                     continue
             
             # コスト計算APIを呼び出し（内部的に）
-            from routers.costs import calculate_final_cost
+            from routers.costs import calculate_final_cost, cost_catalog
             
-            # コストデータを取得
-            costs_response = self.table.query(
-                KeyConditionExpression=Key("PK").eq("costs") & Key("SK").begins_with("metadata")
-            )
-            costs_db = costs_response.get("Items", [{}])[0].get("costs", {})
+            # コストデータを取得（共有キャッシュ経由）
+            costs_db = await cost_catalog.get()
             
             if not costs_db:
                 raise HTTPException(status_code=404, detail="コストデータが見つかりません")
@@ -218,5 +188,64 @@ class ScenarioService:
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"コスト計算エラー: {str(e)}")
 
+    async def simulate_scenario_cost(self, scenario_id: str, struct_data: dict) -> ScenarioSimulationResult:
+        """structをシナリオの全期間（月0〜end_month-1）に当てはめたコストをまとめて計算"""
+        try:
+            index = await self.repository.get_index()
+            scenario = index.scenarios.get(scenario_id)
+            if not scenario:
+                raise HTTPException(status_code=404, detail="シナリオが見つかりません")
+            series = index.series[scenario_id]
+            
+            from routers.costs import cost_catalog
+            from routers.helpers.cost_engine import compile_catalog
+            
+            costs_db = await cost_catalog.get()
+            if not costs_db:
+                raise HTTPException(status_code=404, detail="コストデータが見つかりません")
+            
+            # struct1件 × 全月のリクエスト数を1回の行列計算で評価
+            result = compile_catalog(costs_db).evaluate_batch([struct_data], series.total_requests)
+            costs = result.cost_matrix[0]
+            budgets = series.funds.astype(float)
+            remaining = budgets - costs
+            over_budget = costs > budgets
+            first_over_budget_month = int(over_budget.argmax()) if over_budget.any() else None
+            
+            months = [
+                MonthlySimulation(
+                    month=month,
+                    total_requests=total_requests,
+                    budget=budget,
+                    calculated_cost=cost,
+                    budget_remaining=budget_remaining,
+                    is_over_budget=is_over_budget,
+                    is_defined=is_defined,
+                )
+                for month, (total_requests, budget, cost, budget_remaining, is_over_budget, is_defined) in enumerate(zip(
+                    series.total_requests.tolist(),
+                    budgets.tolist(),
+                    costs.tolist(),
+                    remaining.tolist(),
+                    over_budget.tolist(),
+                    series.defined.tolist(),
+                ))
+            ]
+            
+            return ScenarioSimulationResult(
+                scenario_id=scenario_id,
+                end_month=scenario.end_month,
+                monthly_cost=float(result.monthly_costs[0]),
+                per_request_cost=float(result.per_request_costs[0]),
+                total_cost=float(costs.sum()),
+                first_over_budget_month=first_over_budget_month,
+                months=months,
+            )
+            
+        except HTTPException:
+            raise
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"シミュレーションエラー: {str(e)}")
+
 # シングルトンインスタンス
 scenario_service = ScenarioService()
@@ -0,0 +1,254 @@
+"""
+共有された構成のフィード（新着・コピー数順・安い順）
+
+ギャラリーは最も読まれるページなので、フィードは読み込み時に計算せず、
+フィードごとの上位`SHARE_FEED_SIZE`件のスナップショット（JSONの本文とETag）をメモリに持っておく。
+
+- recent: 公開の新しい順
+- copied: コピー数の多い順（同数なら新しい順）
+- cheapest: リソース1つあたりの月額固定費（`cost_per_feature`）の安い順（リソースのない構成は載らない）
+
+フィードの読み込みはスナップショットを返すだけで、DynamoDBには問い合わせない。
+
+- このプロセスでの公開・コピー・取り消しは、その場で該当するフィードの上位の並びだけを更新する
+- 他のプロセスでの変更は、`SHARE_FEED_REFRESH_SECONDS`ごとにギャラリー用GSIを読み直して取り込む
+  （読み直しは参照を止めずにバックグラウンドで行う）
+
+ETagは本文のハッシュなので、同じ内容ならプロセスをまたいでも同じになり、`If-None-Match`に304を返せる。
+`version`は本文が変わるたびに1増えるプロセス内の番号（`X-Feed-Version`ヘッダー）。
+"""
+import asyncio
+import hashlib
+import heapq
+import json
+import logging
+import time
+from collections import Counter
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from routers.helpers.cost_engine import collect_resource_types, compile_catalog
+from routers.helpers.share_gallery import iter_gallery_items
+from routers.helpers.struct_normalizer import get_struct_normalizer
+
+logger = logging.getLogger(__name__)
+
+# フィードの本文に含める属性
+FEED_ITEM_ATTRIBUTES = (
+    "user_id", "sandbox_id", "title", "description", "published_at", "copy_count", "cost_per_feature",
+)
+
+
+def _recent_rank(entry: dict) -> tuple:
+    return (entry["published_at"],)
+
+
+def _copied_rank(entry: dict) -> tuple:
+    return (entry["copy_count"], entry["published_at"])
+
+
+def _cheapest_rank(entry: dict) -> Optional[tuple]:
+    cost = entry["cost_per_feature"]
+    return None if cost is None else (-cost, entry["published_at"])
+
+
+# フィード名 → 順位のキー（大きいほど上。Noneならそのフィードには載らない）
+FEED_RANKS: Dict[str, Callable[[dict], Optional[tuple]]] = {
+    "recent": _recent_rank,
+    "copied": _copied_rank,
+    "cheapest": _cheapest_rank,
+}
+
+
+class FeedSnapshot(NamedTuple):
+    """フィード1つ分の、そのまま返せる状態"""
+    body: bytes
+    etag: str
+    version: int
+
+
+def estimate_cost_per_feature(struct: dict, costs_db: dict) -> Optional[float]:
+    """
+    リソース1つあたりの月額固定費（公開時に計算して保存する）。
+
+    リソースはマッピング表で数え、数えられなければ`type`を持つ要素を数える。リソースがなければNone。
+    """
+    counts = get_struct_normalizer().count(struct) or Counter(collect_resource_types(struct))
+    total = sum(counts.values())
+    if not total:
+        return None
+    return compile_catalog(costs_db).evaluate(counts, 0).monthly_cost / total
+
+
+def entry_key(user_id: str, sandbox_id: str) -> Tuple[str, str]:
+    return (user_id, sandbox_id)
+
+
+def to_feed_entry(item: dict) -> dict:
+    """GSIのアイテム（または公開・コピー後のアイテム）からフィードの1件を作る"""
+    cost = item.get("cost_per_feature")
+    return {
+        "user_id": item["user_id"],
+        "sandbox_id": item["sandbox_id"],
+        "title": item.get("title") or "",
+        "description": item.get("description"),
+        "published_at": item.get("published_at") or "",
+        "copy_count": int(item.get("copy_count") or 0),
+        "cost_per_feature": float(cost) if cost is not None else None,
+    }
+
+
+class ShareFeeds:
+    """フィードのスナップショットをメモリに持ち、公開・コピーのたびに差分で更新する"""
+
+    def __init__(
+        self,
+        table,
+        size: int,
+        refresh_seconds: float,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self._table = table
+        self.size = size
+        self.refresh_seconds = refresh_seconds
+        self._clock = clock
+        # ギャラリーに載っている全件（キー → フィードの1件）
+        self._entries: Dict[Tuple[str, str], dict] = {}
+        # フィードごとの上位size件（順位の高い順）
+        self._tops: Dict[str, List[dict]] = {name: [] for name in FEED_RANKS}
+        self._snapshots: Dict[str, FeedSnapshot] = {}
+        self._loaded_at: Optional[float] = None
+        # 読み直し中にこのプロセスで反映した変更（読み直した結果に適用し直す）
+        self._changes_during_load: Optional[list] = None
+        self._inflight: Optional[asyncio.Task] = None
+        self.loads = 0
+        self.load_errors = 0
+
+    @property
+    def loaded(self) -> bool:
+        return self._loaded_at is not None
+
+    def get(self, name: str) -> Optional[FeedSnapshot]:
+        """
+        フィードのスナップショットを返す（未読み込みならNone）。
+
+        DynamoDBには問い合わせず、読み直しの時期を過ぎていればバックグラウンドで読み直す。
+        """
+        if self._loaded_at is None or self._clock() - self._loaded_at >= self.refresh_seconds:
+            self._start_load()
+        return self._snapshots.get(name)
+
+    async def load(self) -> None:
+        """ギャラリー用GSIを全件読み直し、すべてのフィードを作り直す"""
+        self._changes_during_load = []
+        try:
+            entries = {}
+            async for item in iter_gallery_items(self._table):
+                entry = to_feed_entry(item)
+                entries[entry_key(entry["user_id"], entry["sandbox_id"])] = entry
+            for key, entry in self._changes_during_load:
+                if entry is None:
+                    entries.pop(key, None)
+                else:
+                    entries[key] = entry
+        finally:
+            self._changes_during_load = None
+
+        self._entries = entries
+        for name in FEED_RANKS:
+            self._rebuild(name)
+        self._loaded_at = self._clock()
+        self.loads += 1
+
+    def on_published(self, item: dict) -> None:
+        """公開（再公開・内容の更新を含む）を反映する。ギャラリーに載せない公開は取り消しとして扱う"""
+        if not item.get("is_public", True):
+            self.on_unpublished(item["user_id"], item["sandbox_id"])
+            return
+        entry = to_feed_entry(item)
+        key = entry_key(entry["user_id"], entry["sandbox_id"])
+        self._entries[key] = entry
+        if self._changes_during_load is not None:
+            self._changes_during_load.append((key, entry))
+        for name in FEED_RANKS:
+            self._upsert(name, entry)
+
+    def on_copied(self, item: dict) -> None:
+        """コピー後のコピー元（`copy_count`は加算後）を反映する"""
+        self.on_published(item)
+
+    def on_unpublished(self, user_id: str, sandbox_id: str) -> None:
+        """公開の取り消しを反映する"""
+        key = entry_key(user_id, sandbox_id)
+        if self._changes_during_load is not None:
+            self._changes_during_load.append((key, None))
+        if self._entries.pop(key, None) is None:
+            return
+        for name, top in self._tops.items():
+            if any(entry_key(entry["user_id"], entry["sandbox_id"]) == key for entry in top):
+                # 上位から外れた分は、手元の全件から補う
+                self._rebuild(name)
+
+    def stats(self) -> dict:
+        return {
+            "loaded": self.loaded,
+            "entries": len(self._entries),
+            "loads": self.loads,
+            "load_errors": self.load_errors,
+            "age_seconds": self._clock() - self._loaded_at if self._loaded_at is not None else None,
+            "versions": {name: snapshot.version for name, snapshot in self._snapshots.items()},
+        }
+
+    def _upsert(self, name: str, entry: dict) -> None:
+        """1件の変更をフィードの上位に反映する（全件は並べ直さない）"""
+        rank = FEED_RANKS[name]
+        key = entry_key(entry["user_id"], entry["sandbox_id"])
+        top = self._tops[name]
+        previous = next((other for other in top if entry_key(other["user_id"], other["sandbox_id"]) == key), None)
+        entry_rank = rank(entry)
+
+        if previous is not None and len(top) == self.size and (entry_rank is None or entry_rank < rank(previous)):
+            # 上位にいた1件の順位が下がった場合は、上位の外の次点に抜かれうるので手元の全件から作り直す
+            self._rebuild(name)
+            return
+
+        remaining = top if previous is None else [other for other in top if other is not previous]
+        if entry_rank is not None and (len(remaining) < self.size or entry_rank > rank(remaining[-1])):
+            remaining = sorted(remaining + [entry], key=rank, reverse=True)[:self.size]
+        elif previous is None:
+            return
+        self._publish(name, remaining)
+
+    def _rebuild(self, name: str) -> None:
+        rank = FEED_RANKS[name]
+        ranked = [entry for entry in self._entries.values() if rank(entry) is not None]
+        self._publish(name, heapq.nlargest(self.size, ranked, key=rank))
+
+    def _publish(self, name: str, top: List[dict]) -> None:
+        """上位の並びからスナップショットを作る（本文が変わったときだけversionを進める）"""
+        self._tops[name] = top
+        items = [{attribute: entry[attribute] for attribute in FEED_ITEM_ATTRIBUTES} for entry in top]
+        body = json.dumps(
+            {"feed": name, "items": items}, ensure_ascii=False, separators=(",", ":")
+        ).encode("utf-8")
+        current = self._snapshots.get(name)
+        if current is not None and current.body == body:
+            return
+        etag = f'"{name}-{hashlib.sha256(body).hexdigest()[:16]}"'
+        self._snapshots[name] = FeedSnapshot(body, etag, current.version + 1 if current else 1)
+
+    def _start_load(self) -> asyncio.Task:
+        loop = asyncio.get_running_loop()
+        inflight = self._inflight
+        if inflight is not None and not inflight.done() and inflight.get_loop() is loop:
+            return inflight
+
+        self._inflight = loop.create_task(self._load_in_background())
+        return self._inflight
+
+    async def _load_in_background(self) -> None:
+        try:
+            await self.load()
+        except Exception:
+            # 失敗しても手元のスナップショットを返し続け、次の参照で再試行する
+            self.load_errors += 1
+            logger.exception("フィードの読み直しに失敗しました")
@@ -0,0 +1,283 @@
+"""
+構成の共有（サンドボックスの公開）とギャラリー
+
+サンドボックス（PK=user#<id>, SK=sandbox#<sandbox_id>）を公開すると、同じアイテムに
+ギャラリー用GSIのキー（`gallery_pk`=`gallery`, `published_at`）とサマリー属性を書き込む。
+
+- GSIは`gallery_pk`を持つアイテムだけが載るスパースインデックスで、`is_public=false`（リンクを知っている人だけ）
+  の公開や公開の取り消しでは`gallery_pk`を消してギャラリーから外す
+- GSIの射影はサマリー属性だけ（INCLUDE）なので、一覧の読み込みにstructは含まれない
+- 一覧は`published_at`の新しい順のQueryで、`LastEvaluatedKey`をカーソルにして`ExclusiveStartKey`から続きを読む。
+  何ページ目でも読むのはそのページの件数分だけ（オフセット分を読み飛ばさない）
+
+`published_at`は最初の公開時刻のまま変えない（再公開や内容の更新でギャラリー内の順番が動かない）。
+
+公開中の構成をコピーすると、コピーしたユーザーのサンドボックスの作成と元の`copy_count`の加算を
+1トランザクションで行う。`copy_count`と`cost_per_feature`（公開時のリソース1つあたりの月額固定費）も
+GSIに射影し、フィード（`share_feeds.py`）はGSIだけから作る。
+"""
+import logging
+import uuid
+from datetime import datetime, timezone
+from typing import Optional
+
+from boto3.dynamodb.conditions import Key
+from botocore.exceptions import ClientError
+from fastapi import HTTPException
+
+from routers.helpers.attribute_values import from_dynamodb_value, to_dynamodb_value
+from routers.helpers.games import user_pk
+from routers.helpers.pagination import decode_cursor, encode_cursor, iter_query_pages
+from routers.helpers.struct_codec import decode_item_struct, encode_struct_for_storage
+from settings import get_ShareSettings
+
+logger = logging.getLogger(__name__)
+
+GALLERY_PK_ATTRIBUTE = "gallery_pk"
+GALLERY_SK_ATTRIBUTE = "published_at"
+GALLERY_PARTITION = "gallery"
+# GSIに射影する（一覧で返す）属性。キー属性は常に射影される
+SUMMARY_ATTRIBUTES = ("user_id", "sandbox_id", "title", "description", "copy_count", "cost_per_feature")
+
+
+def sandbox_sk(sandbox_id: str) -> str:
+    return f"sandbox#{sandbox_id}"
+
+
+def gallery_index_definition(index_name: Optional[str] = None) -> dict:
+    """ギャラリー用GSIの定義（CreateTable・UpdateTableのGlobalSecondaryIndexesの要素）"""
+    return {
+        "IndexName": index_name or get_ShareSettings().GALLERY_INDEX_NAME,
+        "KeySchema": [
+            {"AttributeName": GALLERY_PK_ATTRIBUTE, "KeyType": "HASH"},
+            {"AttributeName": GALLERY_SK_ATTRIBUTE, "KeyType": "RANGE"},
+        ],
+        "Projection": {"ProjectionType": "INCLUDE", "NonKeyAttributes": list(SUMMARY_ATTRIBUTES)},
+    }
+
+
+GALLERY_ATTRIBUTE_DEFINITIONS = [
+    {"AttributeName": GALLERY_PK_ATTRIBUTE, "AttributeType": "S"},
+    {"AttributeName": GALLERY_SK_ATTRIBUTE, "AttributeType": "S"},
+]
+
+
+def _is_condition_failed(error: ClientError) -> bool:
+    return error.response["Error"]["Code"] == "ConditionalCheckFailedException"
+
+
+async def _update_sandbox(table, user_id: str, sandbox_id: str, **update_kwargs) -> dict:
+    """存在するサンドボックスだけを更新する（なければ404）"""
+    try:
+        return await table.update_item(
+            Key={"PK": user_pk(user_id), "SK": sandbox_sk(sandbox_id)},
+            ConditionExpression="attribute_exists(PK)",
+            **update_kwargs,
+        )
+    except ClientError as e:
+        if _is_condition_failed(e):
+            raise HTTPException(status_code=404, detail="サンドボックスが見つかりません")
+        raise
+
+
+async def update_sandbox_struct(
+    table, user_id: str, sandbox_id: str, struct: dict, cost_per_feature: Optional[float] = None
+) -> dict:
+    """
+    サンドボックスのstructを書き換える（公開中なら共有している内容も変わる）。
+
+    `cost_per_feature`も同じ更新で書き直すので、公開中の構成のサマリーもstructと食い違わない。
+    更新後のアイテム（structは元の値に戻し、数値はint・floatにしたもの）を返す。
+    """
+    response = await _update_sandbox(
+        table,
+        user_id,
+        sandbox_id,
+        UpdateExpression=(
+            "SET #struct = :struct, cost_per_feature = :cost_per_feature, updated_at = :now "
+            "ADD struct_revision :one"
+        ),
+        ExpressionAttributeNames={"#struct": "struct"},
+        ExpressionAttributeValues={
+            ":struct": encode_struct_for_storage(struct),
+            ":cost_per_feature": to_dynamodb_value(cost_per_feature),
+            ":now": datetime.now().isoformat(),
+            ":one": 1,
+        },
+        ReturnValues="ALL_NEW",
+    )
+    return decode_item_struct(from_dynamodb_value(response["Attributes"]))
+
+
+async def publish_sandbox(
+    table,
+    user_id: str,
+    sandbox_id: str,
+    title: str,
+    struct: dict,
+    description: Optional[str] = None,
+    is_public: bool = True,
+    cost_per_feature: Optional[float] = None,
+) -> dict:
+    """
+    サンドボックスをstructごと公開する。
+
+    `is_public`ならギャラリー用GSIのキーを書き込み、そうでなければ消す（リンクでだけ見られる）。
+    `cost_per_feature`はリソースがない構成ならNone（安い順のフィードには載らない）。
+    更新後のアイテム（structは元の値に戻し、数値はDecimalからint・floatにしたもの）を返す。
+    """
+    set_clauses = [
+        "#struct = :struct",
+        "title = :title",
+        "description = :description",
+        "user_id = :user_id",
+        "sandbox_id = :sandbox_id",
+        "is_published = :true",
+        "is_public = :is_public",
+        "cost_per_feature = :cost_per_feature",
+        "copy_count = if_not_exists(copy_count, :zero)",
+        f"{GALLERY_SK_ATTRIBUTE} = if_not_exists({GALLERY_SK_ATTRIBUTE}, :now)",
+        "updated_at = :now",
+    ]
+    values = {
+        ":struct": encode_struct_for_storage(struct),
+        ":title": title,
+        ":description": description,
+        ":user_id": user_id,
+        ":sandbox_id": sandbox_id,
+        ":true": True,
+        ":is_public": is_public,
+        ":cost_per_feature": to_dynamodb_value(cost_per_feature),
+        ":zero": 0,
+        ":now": datetime.now(timezone.utc).isoformat(),
+        ":one": 1,
+    }
+    if is_public:
+        set_clauses.append(f"{GALLERY_PK_ATTRIBUTE} = :gallery")
+        values[":gallery"] = GALLERY_PARTITION
+        update_expression = "SET " + ", ".join(set_clauses) + " ADD struct_revision :one"
+    else:
+        update_expression = (
+            "SET " + ", ".join(set_clauses) + f" REMOVE {GALLERY_PK_ATTRIBUTE} ADD struct_revision :one"
+        )
+
+    response = await _update_sandbox(
+        table,
+        user_id,
+        sandbox_id,
+        UpdateExpression=update_expression,
+        ExpressionAttributeNames={"#struct": "struct"},
+        ExpressionAttributeValues=values,
+        ReturnValues="ALL_NEW",
+    )
+    # 書き込みはresource層なので、ALL_NEWの数値はDecimalで返ってくる
+    return decode_item_struct(from_dynamodb_value(response["Attributes"]))
+
+
+async def unpublish_sandbox(table, user_id: str, sandbox_id: str) -> None:
+    """公開を取り消す（ギャラリー用GSIのキーを消すので、一覧からもすぐに外れる）"""
+    await _update_sandbox(
+        table,
+        user_id,
+        sandbox_id,
+        UpdateExpression=f"SET is_published = :false, updated_at = :now REMOVE {GALLERY_PK_ATTRIBUTE}",
+        ExpressionAttributeValues={":false": False, ":now": datetime.now().isoformat()},
+    )
+
+
+async def get_shared_structure(table, user_id: str, sandbox_id: str) -> dict:
+    """公開中のサンドボックスを取得する（非公開・存在しなければ404）"""
+    response = await table.get_item(Key={"PK": user_pk(user_id), "SK": sandbox_sk(sandbox_id)})
+    item = response.get("Item")
+    if not item or not item.get("is_published"):
+        raise HTTPException(status_code=404, detail="共有された構成が見つかりません")
+    return decode_item_struct(item)
+
+
+async def list_gallery(table, limit: int, cursor: Optional[str] = None) -> dict:
+    """
+    ギャラリーを公開の新しい順に1ページ読む。
+
+    返り値は`items`（サマリー属性だけのアイテム）と`next_cursor`（最後のページならNone）。
+    """
+    query_kwargs = {
+        "IndexName": get_ShareSettings().GALLERY_INDEX_NAME,
+        "KeyConditionExpression": Key(GALLERY_PK_ATTRIBUTE).eq(GALLERY_PARTITION),
+        "ProjectionExpression": ", ".join(SUMMARY_ATTRIBUTES + (GALLERY_SK_ATTRIBUTE,)),
+        "ScanIndexForward": False,
+        "Limit": limit,
+    }
+    start_key = decode_cursor(
+        cursor,
+        partition_key=GALLERY_PARTITION,
+        partition_key_name=GALLERY_PK_ATTRIBUTE,
+        key_names=(GALLERY_PK_ATTRIBUTE, GALLERY_SK_ATTRIBUTE, "PK", "SK"),
+    )
+    if start_key:
+        query_kwargs["ExclusiveStartKey"] = start_key
+
+    response = await table.query(**query_kwargs)
+    return {
+        "items": response.get("Items", []),
+        "next_cursor": encode_cursor(response.get("LastEvaluatedKey")),
+    }
+
+
+async def iter_gallery_items(table):
+    """ギャラリー用GSIの全アイテム（サマリー属性と`published_at`）をページ単位で読む"""
+    async for response in iter_query_pages(
+        table,
+        IndexName=get_ShareSettings().GALLERY_INDEX_NAME,
+        KeyConditionExpression=Key(GALLERY_PK_ATTRIBUTE).eq(GALLERY_PARTITION),
+        ProjectionExpression=", ".join(SUMMARY_ATTRIBUTES + (GALLERY_SK_ATTRIBUTE,)),
+    ):
+        for item in response.get("Items", []):
+            yield item
+
+
+async def copy_shared_structure(table, owner_id: str, sandbox_id: str, user_id: str) -> dict:
+    """
+    公開中の構成を`user_id`の新しいサンドボックスにコピーし、元の`copy_count`を1増やす。
+
+    返り値はコピー元の更新後のサマリー属性と、作成したサンドボックスのID（`copied_sandbox_id`）。
+    """
+    source = await get_shared_structure(table, owner_id, sandbox_id)
+    copied_sandbox_id = str(uuid.uuid4())
+    source_key = {"PK": user_pk(owner_id), "SK": sandbox_sk(sandbox_id)}
+    try:
+        await table.transact_write_items(TransactItems=[
+            {
+                "Put": {
+                    "TableName": table.name,
+                    "Item": {
+                        "PK": user_pk(user_id),
+                        "SK": sandbox_sk(copied_sandbox_id),
+                        "struct": encode_struct_for_storage(source.get("struct")),
+                        "is_published": False,
+                        "copied_from": f"{owner_id}/{sandbox_id}",
+                        "created_at": datetime.now().isoformat(),
+                    },
+                    "ConditionExpression": "attribute_not_exists(PK)",
+                }
+            },
+            {
+                "Update": {
+                    "TableName": table.name,
+                    "Key": source_key,
+                    "UpdateExpression": "ADD copy_count :one",
+                    "ConditionExpression": "is_published = :true",
+                    "ExpressionAttributeValues": {":one": 1, ":true": True},
+                }
+            },
+        ])
+    except ClientError as e:
+        if e.response["Error"]["Code"] != "TransactionCanceledException":
+            raise
+        # コピー元の読み込み後に公開が取り消された
+        raise HTTPException(status_code=404, detail="共有された構成が見つかりません")
+
+    summary = {name: source.get(name) for name in SUMMARY_ATTRIBUTES + (GALLERY_SK_ATTRIBUTE,)}
+    summary["copy_count"] = (source.get("copy_count") or 0) + 1
+    summary["is_public"] = bool(source.get(GALLERY_PK_ATTRIBUTE))
+    summary["copied_sandbox_id"] = copied_sandbox_id
+    return summary
@@ -0,0 +1,86 @@
+"""
+ゲーム・サンドボックスのstructの保存形式
+
+- map: DynamoDBのネストしたMap（従来の形式）
+- zlib: 先頭1バイトの形式バージョン + zlib圧縮したJSONのBinary属性
+
+`STRUCT_STORAGE_FORMAT=zlib`にすると書き込みが圧縮形式になる。読み込みは
+どちらの形式でも同じ値（`FastReadTable`で読んだMap形式と同じく、数値はint・float）に戻るので、
+移行中は両方が混在してよい。
+既存のアイテムは`migrate_struct_format.py`で変換する。
+"""
+import json
+import zlib
+from decimal import Decimal
+from typing import Any, Optional
+
+from boto3.dynamodb.types import Binary
+
+from routers.helpers.attribute_values import from_dynamodb_value, to_dynamodb_value
+from settings import get_StructStorageSettings
+
+STORAGE_FORMATS = ("map", "zlib")
+FORMAT_VERSION_ZLIB_JSON = 1
+
+
+def encode_struct(struct: Any, level: int = 6) -> bytes:
+    """structを圧縮形式のバイト列にする"""
+    raw = json.dumps(from_dynamodb_value(struct), separators=(",", ":"), ensure_ascii=False)
+    return bytes([FORMAT_VERSION_ZLIB_JSON]) + zlib.compress(raw.encode("utf-8"), level)
+
+
+def is_encoded(value: Any) -> bool:
+    return isinstance(value, (Binary, bytes, bytearray))
+
+
+def decode_struct(value: Any) -> Any:
+    """保存されているstructを元の値に戻す（Map形式やnullはそのまま返す）"""
+    if not is_encoded(value):
+        return value
+    data = bytes(value.value if isinstance(value, Binary) else value)
+    if not data or data[0] != FORMAT_VERSION_ZLIB_JSON:
+        raise ValueError(f"未対応のstruct形式です: {data[:1].hex()}")
+    return json.loads(zlib.decompress(data[1:]))
+
+
+def encode_struct_for_storage(struct: Any, storage_format: Optional[str] = None) -> Any:
+    """設定の保存形式に合わせて、書き込むstructの値を作る（nullはどちらの形式でもnull）"""
+    settings = get_StructStorageSettings()
+    storage_format = storage_format or settings.FORMAT
+    if storage_format not in STORAGE_FORMATS:
+        raise ValueError(f"未対応のstruct形式です: {storage_format}")
+    if struct is None:
+        return None
+    if storage_format == "map":
+        return to_dynamodb_value(struct)
+    return Binary(encode_struct(struct, settings.COMPRESSION_LEVEL))
+
+
+def decode_item_struct(item: Optional[dict]) -> Optional[dict]:
+    """アイテムの`struct`属性を元の値に戻す（アイテムを書き換えて返す）"""
+    if item is not None and is_encoded(item.get("struct")):
+        item["struct"] = decode_struct(item["struct"])
+    return item
+
+
+def estimate_attribute_size(value: Any) -> int:
+    """
+    DynamoDBでの属性値のおおよそのバイト数（キャパシティ計算の目安）。
+    文字列はUTF-8の長さ、数値は有効桁2桁ごとに1バイト+1、Map・Listは3バイト+要素ごとに1バイト。
+    """
+    if value is None or isinstance(value, bool):
+        return 1
+    if isinstance(value, str):
+        return len(value.encode("utf-8"))
+    if isinstance(value, (int, float, Decimal)):
+        digits = len(Decimal(str(value)).normalize().as_tuple().digits)
+        return (digits + 1) // 2 + 1
+    if is_encoded(value):
+        return len(value.value if isinstance(value, Binary) else value)
+    if isinstance(value, dict):
+        return 3 + sum(
+            1 + len(key.encode("utf-8")) + estimate_attribute_size(item) for key, item in value.items()
+        )
+    if isinstance(value, (list, tuple)):
+        return 3 + sum(1 + estimate_attribute_size(item) for item in value)
+    return len(str(value).encode("utf-8"))
@@ -0,0 +1,137 @@
+"""
+structのコスト計算用への変換（リソース数の集計）
+
+フロントエンドのstruct（`subnets`・`computes`などのコレクション）を、マッピング表
+（`config/struct_mapping.json`、`STRUCT_MAPPING_PATH`で差し替え可能）に従って
+`{リソースタイプ: {"quantity": 数}}`にまとめる。コレクションは1回ずつだけ走査し、
+`Counter`で数える。新しいコレクションや派生リソースはマッピング表に書き足すだけでよい。
+
+マッピング表の形式:
+
+- `simple_services`: トップレベルのキーがこれらのサービス名なら、変換済みとみなしてそのまま返す
+- `collections`: コレクション名 -> 数え方
+    - `{"count": "presence", "resource": "vpc"}`: キーがあれば1つ
+    - `{"count": "length", "resource": "availability_zone"}`: 要素数
+    - `{"type_field": "type", "default_type": "compute", "derived": {"elasticIpId": "elastic_ip"}}`:
+      要素ごとに`type_field`の値（なければ`default_type`）を1つ数え、`derived`のキーを持つ要素は
+      対応するリソースも1つ数える（`count`の省略時はこの数え方）
+"""
+import json
+from collections import Counter
+from functools import lru_cache
+from pathlib import Path
+from typing import Mapping, NamedTuple, Optional, Tuple
+
+from settings import get_StructMappingSettings
+
+DEFAULT_MAPPING_PATH = Path(__file__).resolve().parents[2] / "config" / "struct_mapping.json"
+
+COUNT_MODES = ("items", "presence", "length")
+
+
+class CollectionRule(NamedTuple):
+    """1つのコレクションの数え方"""
+    name: str
+    count: str
+    resource: Optional[str]
+    type_field: str
+    default_type: str
+    derived: Tuple[Tuple[str, str], ...]
+
+
+def compile_collection_rule(name: str, spec: Mapping) -> CollectionRule:
+    """マッピング表の1エントリを検証して数え方に変換"""
+    count = spec.get("count", "items")
+    if count not in COUNT_MODES:
+        raise ValueError(f"コレクション'{name}'のcountが不正です: {count}")
+    if count != "items" and not spec.get("resource"):
+        raise ValueError(f"コレクション'{name}'にはresourceの指定が必要です")
+    return CollectionRule(
+        name=name,
+        count=count,
+        resource=spec.get("resource"),
+        type_field=spec.get("type_field", "type"),
+        default_type=spec.get("default_type", name),
+        derived=tuple(spec.get("derived", {}).items()),
+    )
+
+
+class StructNormalizer:
+    """マッピング表から作ったstructの変換器"""
+
+    def __init__(self, mapping: Mapping):
+        self.simple_services = frozenset(name.lower() for name in mapping.get("simple_services", []))
+        self.rules = tuple(
+            compile_collection_rule(name, spec)
+            for name, spec in mapping.get("collections", {}).items()
+        )
+
+    def is_simple(self, struct_data) -> bool:
+        """トップレベルがサービス名の、変換済みの形式か"""
+        if not isinstance(struct_data, dict):
+            return False
+        if not all(isinstance(v, (dict, int, float)) for v in struct_data.values()):
+            return False
+        return any(key.lower() in self.simple_services for key in struct_data)
+
+    def count(self, struct_data) -> Counter:
+        """リソースタイプごとの数を数える（structのリストは合算する）"""
+        counts = Counter()
+        if isinstance(struct_data, dict):
+            self._count_into(struct_data, counts)
+        elif isinstance(struct_data, list):
+            for struct in struct_data:
+                if isinstance(struct, dict):
+                    self._count_into(struct, counts)
+        return counts
+
+    def _count_into(self, struct: dict, counts: Counter):
+        for rule in self.rules:
+            if rule.name not in struct:
+                continue
+            value = struct[rule.name]
+            if rule.count == "presence":
+                counts[rule.resource] += 1
+            elif rule.count == "length":
+                if isinstance(value, (list, dict)) and value:
+                    counts[rule.resource] += len(value)
+            elif isinstance(value, list):
+                self._count_items(rule, value, counts)
+
+    @staticmethod
+    def _count_items(rule: CollectionRule, items: list, counts: Counter):
+        type_field = rule.type_field
+        default_type = rule.default_type
+        # 要素ごとのPythonループより、内包表記で集めてCounterに渡すほうが速い
+        counts.update([item.get(type_field, default_type) for item in items if type(item) is dict])
+        for field, resource in rule.derived:
+            derived_count = len([1 for item in items if type(item) is dict and field in item])
+            if derived_count:
+                counts[resource] += derived_count
+
+    def normalize(self, struct_data):
+        """
+        structを`{リソースタイプ: {"quantity": 数}}`に変換する。
+        変換済みの形式や、数えられるコレクションのないstructはそのまま返す。
+        """
+        if not struct_data:
+            return {}
+        if self.is_simple(struct_data):
+            return struct_data
+
+        counts = self.count(struct_data)
+        if not counts:
+            return struct_data
+        return {resource: {"quantity": count} for resource, count in counts.items()}
+
+
+def load_struct_mapping(path=None) -> dict:
+    """マッピング表のJSONを読み込む"""
+    with open(path or DEFAULT_MAPPING_PATH, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+@lru_cache()
+def get_struct_normalizer() -> StructNormalizer:
+    """設定のマッピング表から作った変換器（プロセスで1つ）"""
+    return StructNormalizer(load_struct_mapping(get_StructMappingSettings().MAPPING_PATH or None))
@@ -1,140 +1,56 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Response
+from fastapi.responses import StreamingResponse
 import models.play as play_models
-import boto3
-from boto3.dynamodb.conditions import Key, Attr
+from boto3.dynamodb.conditions import Key
 import uuid
 import json
 from decimal import Decimal
 from datetime import datetime
-from settings import get_BedrockSettings, get_DynamoDbSettings
-from routers.extractor import extract_user_id_without_verification
+from routers.extractor import extract_user_id, verify_admin_token
 from routers.costs import get_costs, calculate_final_cost
 from routers.helpers.service import scenario_service
-from typing import List
+from models.scenario import ScenarioSimulationResult
+from routers.helpers.dynamodb import FastReadTable
+from routers.helpers.pagination import decode_cursor, encode_cursor, iter_query_pages
+from routers.helpers.games import (
+    finish_game,
+    game_sk,
+    get_active_game,
+    get_game_item,
+    patch_game_struct,
+    put_new_game,
+    request_fingerprint,
+    set_game_scenario_id,
+    user_pk,
+    validate_idempotency_key,
+)
+from routers.helpers.aws_clients import get_bedrock_client, get_dynamodb_client, get_game_table
+from routers.helpers.bedrock import (
+    ADVICE_MODEL_ID,
+    ADVICE_PROMPT_VERSION,
+    estimate_invocation_cost,
+    invoke_advice,
+    stream_advice,
+)
+from routers.helpers.advice_cache import (
+    AdviceCache,
+    CachedAdvice,
+    DynamoAdviceStore,
+    advice_cache_key,
+    normalize_struct,
+)
+from routers.helpers.struct_codec import encode_struct_for_storage
+from routers.helpers.struct_normalizer import get_struct_normalizer
+from settings import get_AdviceCacheSettings
+from typing import List, Optional
 
 
 def convert_struct_for_cost_calculation(struct_data):
     """
-    複雑なstructデータをコスト計算しやすい形式に変換する
+    複雑なstructデータをコスト計算しやすい形式に変換する（マッピング表はstruct_normalizer.pyを参照）
     """
-    if not struct_data:
-        return {}
-
-    converted = {}
-
-    # 既にシンプルな形式の場合はそのまま返す
-    if all(
-        isinstance(v, (dict, int, float)) and not isinstance(v, list)
-        for v in struct_data.values()
-    ):
-        # トップレベルがサービス名の場合
-        if any(
-            key.lower()
-            in [
-                "ec2",
-                "rds",
-                "s3",
-                "lambda",
-                "vpc",
-                "nat_gateway",
-                "elastic_ip",
-                "dynamo_db",
-            ]
-            for key in struct_data.keys()
-        ):
-            return struct_data
-
-    # 複雑な構造の場合は変換処理を実行
     try:
-        # VPCの処理
-        if "vpc" in struct_data:
-            converted["vpc"] = {"quantity": 1}
-
-        # Availability Zonesの処理
-        if "availabilityZones" in struct_data:
-            az_count = len(struct_data["availabilityZones"])
-            if az_count > 0:
-                converted["availability_zone"] = {"quantity": az_count}
-
-        # Subnetsの処理
-        if "subnets" in struct_data:
-            subnet_types = {}
-            for subnet in struct_data["subnets"]:
-                subnet_type = subnet.get("type", "subnet")
-                if subnet_type in subnet_types:
-                    subnet_types[subnet_type] += 1
-                else:
-                    subnet_types[subnet_type] = 1
-
-            for subnet_type, count in subnet_types.items():
-                converted[subnet_type] = {"quantity": count}
-
-        # Networksの処理
-        if "networks" in struct_data:
-            network_types = {}
-            for network in struct_data["networks"]:
-                network_type = network.get("type", "network")
-                if network_type in network_types:
-                    network_types[network_type] += 1
-                else:
-                    network_types[network_type] = 1
-
-            for network_type, count in network_types.items():
-                converted[network_type] = {"quantity": count}
-
-        # Computesの処理
-        if "computes" in struct_data:
-            compute_types = {}
-            elastic_ip_count = 0
-
-            for compute in struct_data["computes"]:
-                compute_type = compute.get("type", "compute")
-                if compute_type in compute_types:
-                    compute_types[compute_type] += 1
-                else:
-                    compute_types[compute_type] = 1
-
-                # Elastic IPの数もカウント
-                if "elasticIpId" in compute:
-                    elastic_ip_count += 1
-
-            for compute_type, count in compute_types.items():
-                converted[compute_type] = {"quantity": count}
-
-            if elastic_ip_count > 0:
-                converted["elastic_ip"] = {"quantity": elastic_ip_count}
-
-        # Databasesの処理
-        if "databases" in struct_data:
-            database_types = {}
-            for database in struct_data["databases"]:
-                database_type = database.get("type", "database")
-                if database_type in database_types:
-                    database_types[database_type] += 1
-                else:
-                    database_types[database_type] = 1
-
-            for database_type, count in database_types.items():
-                converted[database_type] = {"quantity": count}
-
-        # 配列形式の場合の処理
-        if isinstance(struct_data, list):
-            for item in struct_data:
-                if isinstance(item, dict):
-                    sub_converted = convert_struct_for_cost_calculation(item)
-                    for key, value in sub_converted.items():
-                        if key in converted:
-                            if isinstance(converted[key], dict) and isinstance(
-                                value, dict
-                            ):
-                                converted[key]["quantity"] = converted[key].get(
-                                    "quantity", 0
-                                ) + value.get("quantity", 0)
-                        else:
-                            converted[key] = value
-
-        return converted if converted else struct_data
-
+        return get_struct_normalizer().normalize(struct_data)
     except Exception as e:
         print(f"struct変換エラー: {e}")
         # エラーが発生した場合は元のデータを返す
@@ -142,19 +58,9 @@ def convert_struct_for_cost_calculation(struct_data):
 
 
 play_router = APIRouter()
-bedrocksettings = get_BedrockSettings()
-dynamodbsettings = get_DynamoDbSettings()
-
-BEDROCK_REGION = bedrocksettings.BEDROCK_REGION
-REGION = dynamodbsettings.REGION
 
-
-region = "ap-northeast-1"
-
-dynamodb = boto3.resource("dynamodb", region_name=region)
-
-table_name = "game"
-table = dynamodb.Table(table_name)
+# 読み込みは低レベルクライアントで、Decimalを経由せずにPythonの値で受け取る
+table = FastReadTable(get_game_table(), get_dynamodb_client())
 
 
 @play_router.get("/play/test")
@@ -162,28 +68,92 @@ async def get_test():
     return table
 
 
+# 一覧表示に必要な属性だけを取得する（requestsは取得しない）
+SCENARIO_SUMMARY_QUERY = {
+    "KeyConditionExpression": Key("PK").eq("scenario"),
+    "ProjectionExpression": "scenario_id, #name, end_month, current_month, features, created_at",
+    "ExpressionAttributeNames": {"#name": "name"},
+}
+SCENARIO_STREAM_PAGE_SIZE = 100
+
+
+def to_scenario_summary(item: dict) -> play_models.ScenarioSummary:
+    """射影済みのシナリオアイテムをサマリーに変換"""
+    return play_models.ScenarioSummary(
+        scenario_id=item.get("scenario_id", ""),
+        name=item.get("name", ""),
+        end_month=item.get("end_month", 0),
+        current_month=item.get("current_month", 0),
+        feature_count=len(item.get("features") or []),
+        created_at=item.get("created_at", ""),
+    )
+
+
 @play_router.get("/play/scenarioes")
-async def get_scenarioes():
-    response = table.query(KeyConditionExpression=Key("PK").eq("scenario"))
-    response_items = response.get("Items", [])
-    return response_items
+async def get_scenarioes(
+    limit: int = Query(50, ge=1, le=100),
+    cursor: Optional[str] = None,
+) -> play_models.ScenarioSummaryPage:
+    """シナリオ一覧をページ単位で取得（次ページは`next_cursor`を`cursor`に指定）"""
+    query_kwargs = {**SCENARIO_SUMMARY_QUERY, "Limit": limit}
+    start_key = decode_cursor(cursor, partition_key="scenario")
+    if start_key:
+        query_kwargs["ExclusiveStartKey"] = start_key
+
+    response = await table.query(**query_kwargs)
+    return play_models.ScenarioSummaryPage(
+        items=[to_scenario_summary(item) for item in response.get("Items", [])],
+        next_cursor=encode_cursor(response.get("LastEvaluatedKey")),
+    )
+
+
+@play_router.get("/play/scenarioes/stream")
+async def stream_scenarioes():
+    """シナリオ一覧をNDJSON（1行1シナリオ）で、DynamoDBのページが届くたびに返す"""
+
+    async def generate():
+        async for response in iter_query_pages(
+            table, **SCENARIO_SUMMARY_QUERY, Limit=SCENARIO_STREAM_PAGE_SIZE
+        ):
+            lines = [
+                to_scenario_summary(item).model_dump_json() + "\n"
+                for item in response.get("Items", [])
+            ]
+            if lines:
+                yield "".join(lines)
+
+    return StreamingResponse(generate(), media_type="application/x-ndjson")
+
+
+@play_router.post("/play/scenarioes/{scenario_id}/simulate")
+async def simulate_scenario(
+    scenario_id: str, request: play_models.SimulateScenarioRequest
+) -> ScenarioSimulationResult:
+    """structでシナリオを最後まで進めた場合の月別コストと予算超過月を計算"""
+    return await scenario_service.simulate_scenario_cost(scenario_id, request.struct_data)
 
 
 @play_router.post("/play/create")
 async def create_game(
     request: play_models.CreateGameRequest,
-    user_id: str = Depends(extract_user_id_without_verification),
+    response: Response,
+    user_id: str = Depends(extract_user_id),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
 ) -> play_models.CreateGameResponse:
     scenarioes = request.scenarioes
     game_name = request.game_name
 
+    fingerprint = None
+    if idempotency_key is not None:
+        validate_idempotency_key(idempotency_key)
+        fingerprint = request_fingerprint(request.model_dump())
+
     game_id = str(uuid.uuid4())
     sandbox_id = str(uuid.uuid4())
-    user_id = "a3ewdsd"
 
     game_item = {
-        "PK": f"user#{user_id}",
-        "SK": f"game#{game_id}",
+        "PK": user_pk(user_id),
+        "SK": game_sk(game_id),
         "game_name": game_name,
         "struct": None,
         "funds": 0,
@@ -192,19 +162,20 @@ async def create_game(
         "is_finished": False,
         "created_at": datetime.now().isoformat(),
     }
-
-    table.put_item(Item=game_item)
+    # シナリオを読み込み済みならscenario_idも保存しておく（レポートで名前から探さずに済む）
+    scenario_index = scenario_service.repository.current_index
+    scenario_id = scenario_index.resolve_scenario_id(scenarioes) if scenario_index else None
+    if scenario_id:
+        game_item["scenario_id"] = scenario_id
 
     sandbox_item = {
-        "PK": f"user#{user_id}",
+        "PK": user_pk(user_id),
         "SK": f"sandbox#{sandbox_id}",
         "struct": None,
         "is_published": False,
         "created_at": datetime.now().isoformat(),
     }
 
-    table.put_item(Item=sandbox_item)
-
     formatted_response = {
         "user_id": user_id,
         "game_id": game_id,
@@ -217,21 +188,30 @@ async def create_game(
         "created_at": game_item["created_at"],
     }
 
-    return play_models.CreateGameResponse(**formatted_response)
+    # ゲーム・サンドボックス・ポインタ（・冪等キー）を1回の往復で書き込む。
+    # 同じIdempotency-Keyでの再試行は書き込みが条件で弾かれ、最初のレスポンスが返る
+    stored_response = await put_new_game(
+        table,
+        user_id,
+        game_item,
+        sandbox_item,
+        formatted_response,
+        idempotency_key=idempotency_key,
+        fingerprint=fingerprint,
+    )
+    if stored_response is not formatted_response:
+        response.headers["Idempotent-Replayed"] = "true"
+
+    return play_models.CreateGameResponse(**stored_response)
 
 
 @play_router.get("/play/games")
 async def get_game(
-    user_id: str = Depends(extract_user_id_without_verification),
+    user_id: str = Depends(extract_user_id),
 ) -> play_models.GetGameResponse:
-    formatted_user_id = f"user#{user_id}"
-
-    response = table.query(
-        KeyConditionExpression=Key("PK").eq(formatted_user_id)
-        & Key("SK").begins_with("game"),
-        FilterExpression=Attr("is_finished").eq(False),
-    )
-    game_data = response.get("Items", [{}])[0]
+    game_data = await get_active_game(table, user_id)
+    if game_data is None:
+        raise HTTPException(status_code=404, detail="進行中のゲームが見つかりません")
 
     formatted_response = {
         "user_id": game_data.get("PK", "").replace("user#", ""),
@@ -248,77 +228,28 @@ async def get_game(
 
 
 @play_router.post("/play/report/{game_id}")
-async def report_game(game_id: str, user_id: str = Depends(extract_user_id_without_verification)):
+async def report_game(game_id: str, user_id: str = Depends(extract_user_id)):
     """ゲームのレポートを生成"""
     try:
-        formatted_user_id = f"user#{user_id}"
-        formatted_game_id = f"game#{game_id}"
-
-        response = table.query(
-            KeyConditionExpression=Key("PK").eq(formatted_user_id)
-            & Key("SK").eq(formatted_game_id)
-        )
-
-        items = response.get("Items", [])
-        if not items:
+        game_data = await get_game_item(table, user_id, game_id)
+        if not game_data:
             raise HTTPException(status_code=404, detail="ゲームが見つかりません")
 
-        game_data = items[0]
         struct_data = game_data.get("struct", {})
         current_month = game_data.get("current_month", 0)
-        scenario_name = game_data.get("scenarioes", "")
         current_funds = game_data.get("funds", 0)
 
         # structデータをコスト計算用に変換
         converted_struct_data = convert_struct_for_cost_calculation(struct_data)
 
-        # シナリオ一覧を取得
-        scenarios = await get_scenarioes(user_id)
-
-        # シナリオ名に基づいて対応するシナリオを検索
-        target_scenario = None
-        for scenario in scenarios:
-            scenario_name_to_check = (
-                scenario.name if hasattr(scenario, "name") else scenario.get("name", "")
-            )
-            if (
-                scenario_name in scenario_name_to_check
-                or scenario_name_to_check in scenario_name
-            ):
-                target_scenario = scenario
-                break
-
-        if not target_scenario:
-            available_scenarios = [
-                s.name if hasattr(s, "name") else s.get("name", "Unknown")
-                for s in scenarios
-            ]
-            raise HTTPException(
-                status_code=404,
-                detail=f"シナリオが見つかりません: {scenario_name}. 利用可能: {available_scenarios}",
-            )
-
-        # シナリオの詳細データを取得（リクエスト情報を含む）
-        scenario_id = (
-            target_scenario.scenario_id
-            if hasattr(target_scenario, "scenario_id")
-            else target_scenario.get("scenario_id", "")
-        )
-        scenario_detail = await scenario_service.get_scenario_by_id(
-            scenario_id, include_requests=True
-        )
-
-        if not scenario_detail:
-            raise HTTPException(status_code=404, detail="シナリオ詳細が見つかりません")
+        # シナリオはゲームに保存したscenario_idで引く（導入前のゲームは名前から解決して書き足す）
+        scenario_id = game_data.get("scenario_id")
+        if not scenario_id:
+            scenario_id = await scenario_service.resolve_scenario_id(game_data.get("scenarioes", ""))
+            await set_game_scenario_id(table, user_id, game_id, scenario_id)
 
-        # 現在の月のリクエスト数を取得
-        month_requests = 0
-        for request_data in scenario_detail.requests:
-            if request_data.get("month") == current_month:
-                for feature in request_data.get("feature", []):
-                    if isinstance(feature, dict) and "request" in feature:
-                        month_requests += feature["request"]
-                break
+        # 現在の月のリクエスト数（シナリオ読み込み時に集計済み）
+        month_requests = await scenario_service.get_month_total_requests(scenario_id, current_month)
 
         # コストデータを取得
         costs_db = await get_costs()
@@ -386,88 +317,154 @@ async def report_game(game_id: str, user_id: str = Depends(extract_user_id_witho
         raise HTTPException(status_code=500, detail=f"レポート生成エラー: {str(e)}")
 
 
+advice_cache_settings = get_AdviceCacheSettings()
+advice_cache = AdviceCache(
+    max_entries=advice_cache_settings.MAX_ENTRIES,
+    ttl_seconds=advice_cache_settings.TTL_SECONDS,
+    store=(
+        DynamoAdviceStore(table, ttl_seconds=advice_cache_settings.TTL_SECONDS)
+        if advice_cache_settings.DYNAMODB_ENABLED
+        else None
+    ),
+)
+
+
+def get_advice_cache_key(struct: dict) -> str:
+    return advice_cache_key(struct, ADVICE_MODEL_ID, ADVICE_PROMPT_VERSION)
+
+
+@play_router.get("/play/ai/cache")
+async def get_advice_cache_stats():
+    """AIアドバイスキャッシュのヒット率とBedrockの節約額"""
+    return advice_cache.stats()
+
+
+@play_router.post("/play/ai/cache/invalidate", dependencies=[Depends(verify_admin_token)])
+async def invalidate_advice_cache():
+    """AIアドバイスキャッシュ（プロセス内）を破棄（プロンプトやモデルを変えたときなど）"""
+    advice_cache.invalidate()
+    return {"message": "Advice cache invalidated"}
+
+
+async def get_active_game_struct(user_id: str) -> dict:
+    """進行中のゲームのstructを取得"""
+    game = await get_active_game(table, user_id, projection="struct")
+    if game is None:
+        raise HTTPException(status_code=404, detail="進行中のゲームが見つかりません")
+
+    return game.get("struct") or {}
+
+
 @play_router.post("/play/ai/{game_id}")
 async def get_advice_from_ai(
-    game_id: str, user_id: str = Depends(extract_user_id_without_verification)
+    game_id: str, user_id: str = Depends(extract_user_id)
 ):
     """AIからのアドバイスを取得"""
-    formatted_user_id = f"user#{user_id}"
+    struct = await get_active_game_struct(user_id)
+
+    async def create() -> CachedAdvice:
+        # プロンプトは正規形から作る（キャッシュを共有する他のユーザーに元のIDを見せない）
+        result = await invoke_advice(get_bedrock_client(), normalize_struct(struct))
+        return CachedAdvice(
+            advice=result.text,
+            cost_usd=estimate_invocation_cost(result.input_tokens, result.output_tokens),
+        )
 
-    response = table.query(
-        KeyConditionExpression=Key("PK").eq(formatted_user_id)
-        & Key("SK").begins_with("game"),
-        FilterExpression=Attr("is_finished").eq(False),
-        ProjectionExpression="struct",
-    )
+    advice, cached = await advice_cache.get_or_create(get_advice_cache_key(struct), create)
+    return {"advice": advice.advice, "cached": cached}
 
-    items = response.get("Items", [])
-    if not items:
-        raise HTTPException(status_code=404, detail="進行中のゲームが見つかりません")
 
-    struct = items[0].get("struct", {})
+def format_sse(event: str, data: dict) -> str:
+    """Server-Sent Eventsの1イベント分の文字列"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
 
-    struct_json = json.dumps(struct, indent=2, ensure_ascii=False)
-    prompt = f"""
-        あなたはAWS Bedrockのマジエキスパートです。
-        今からマジで構造見せるから、ガチで“危機感持って”厳しくアドバイスをください：
 
-        {struct_json}
+async def advice_event_stream(struct: dict):
+    """アドバイスのトークンをSSEイベントとして返す（最後にdone、失敗時はerror）"""
+    key = get_advice_cache_key(struct)
+    cached = await advice_cache.get(key)
+    if cached is not None:
+        yield format_sse("token", {"text": cached.advice})
+        yield format_sse("done", {"cached": True})
+        return
 
-        - 無駄ってことない？
-        - この設計、お前最後に見直したのいつ？
-        - セキュリティとか可用性、甘く見てるんじゃない？
-        - レイテンシ最適化とか、Guardrails使ってる？
-        - リトリーバルやファインチューンの戦略、甘いって。
-        - ここ直さないとあとで地獄見るぞ。
+    texts = []
+    usage = {}
+    try:
+        async for text in stream_advice(get_bedrock_client(), normalize_struct(struct), usage):
+            texts.append(text)
+            yield format_sse("token", {"text": text})
+    except Exception as e:
+        yield format_sse("error", {"detail": f"AIアドバイス生成エラー: {str(e)}"})
+        return
 
-        親友としてガチで叱って、でも腹落ちするように助けてくれ。
-        ヤバいくらい“刺さる”口調で頼む。
-        """
+    # 最後まで受け取れたアドバイスだけをキャッシュする
+    await advice_cache.put(key, CachedAdvice(
+        advice="".join(texts),
+        cost_usd=estimate_invocation_cost(usage.get("input_tokens", 0), usage.get("output_tokens", 0)),
+    ))
+    yield format_sse("done", {"cached": False})
 
-    bedrock = boto3.client(
-        service_name="bedrock-runtime",
-        region_name=BEDROCK_REGION,
-    )
 
-    body = json.dumps(
-        {
-            "messages": [{"role": "user", "content": prompt}],
-            "max_tokens": 500,
-            "temperature": 0.1,
-            "top_p": 0.9,
-            "anthropic_version": "bedrock-2023-05-31",
-        }
+@play_router.post("/play/ai/{game_id}/stream")
+async def stream_advice_from_ai(
+    game_id: str, user_id: str = Depends(extract_user_id)
+):
+    """AIからのアドバイスをServer-Sent Eventsでトークンごとに返す"""
+    struct = await get_active_game_struct(user_id)
+    return StreamingResponse(
+        advice_event_stream(struct),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
     )
 
-    modelId = "us.anthropic.claude-sonnet-4-20250514-v1:0"
-    accept = "application/json"
-    contentType = "application/json"
-
-    response = bedrock.invoke_model(
-        body=body, modelId=modelId, accept=accept, contentType=contentType
-    )
 
-    response_body = json.loads(response.get("body").read())
-    answer = response_body["content"][0]["text"]
-    return {"advice": answer}
+@play_router.post("/play/{game_id}/finish")
+async def finish_active_game(
+    game_id: str, user_id: str = Depends(extract_user_id)
+):
+    """ゲームを終了する（進行中ゲームのポインタも同時に外す）"""
+    if not await finish_game(table, user_id, game_id):
+        raise HTTPException(status_code=404, detail="進行中のゲームが見つかりません")
+    return {"message": "Game finished successfully"}
 
 
 @play_router.put("/play/{game_id}")
 async def update_game(
-    game_id: str, request: play_models.UpdateGameRequest, user_id: str = Depends(extract_user_id_without_verification)
+    game_id: str, request: play_models.UpdateGameRequest, user_id: str = Depends(extract_user_id)
 ):
     """ゲームデータを更新"""
     try:
         pk = f"user#{user_id}"
         sk = f"game#{game_id}"
 
-        table.update_item(
+        await table.update_item(
             Key={"PK": pk, "SK": sk},
-            UpdateExpression="SET #struct = :data",
+            # PATCHの全体書き戻しが競合を検出できるよう、リビジョンも進める
+            UpdateExpression="SET #struct = :data ADD struct_revision :revision_step",
             ExpressionAttributeNames={"#struct": "struct"},
-            ExpressionAttributeValues={":data": request.data},
+            ExpressionAttributeValues={":data": encode_struct_for_storage(request.data), ":revision_step": 1},
         )
 
         return {"message": "Game data updated successfully"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"ゲーム更新エラー: {str(e)}")
+
+
+@play_router.patch("/play/{game_id}", response_model=play_models.PatchGameResponse)
+async def patch_game(
+    game_id: str,
+    operations: List[play_models.JsonPatchOperation],
+    user_id: str = Depends(extract_user_id),
+):
+    """
+    structをJSON Patch（RFC 6902、Content-Type: application/json-patch+json）で部分更新する。
+    変更箇所だけを書き換えられない操作を含む場合は、struct全体を書き戻す。
+    """
+    result = await patch_game_struct(
+        table,
+        user_id,
+        game_id,
+        [operation.model_dump(by_alias=True, exclude_unset=True) for operation in operations],
+    )
+    return play_models.PatchGameResponse(message="Game data patched successfully", **result)
@@ -1,4 +1,172 @@
-from fastapi import APIRouter, HTTPException, Depends
+import logging
+from fastapi import APIRouter, HTTPException, Depends, Header, Query, Response
+import models.share as share_models
+from typing import Optional
+from routers.extractor import extract_user_id
+from routers.costs import get_costs
+from routers.helpers.aws_clients import get_dynamodb_client, get_game_table
+from routers.helpers.dynamodb import FastReadTable
+from routers.helpers.share_feeds import FEED_RANKS, ShareFeeds, estimate_cost_per_feature
+from routers.helpers.share_gallery import (
+    copy_shared_structure,
+    get_shared_structure,
+    list_gallery,
+    publish_sandbox,
+    unpublish_sandbox,
+    update_sandbox_struct,
+)
+from settings import get_ShareSettings
+
+logger = logging.getLogger(__name__)
 
 share_router = APIRouter()
 
+# 読み込みは低レベルクライアントで、Decimalを経由せずにPythonの値で受け取る
+table = FastReadTable(get_game_table(), get_dynamodb_client())
+
+share_settings = get_ShareSettings()
+share_feeds = ShareFeeds(
+    table,
+    size=share_settings.FEED_SIZE,
+    refresh_seconds=share_settings.FEED_REFRESH_SECONDS,
+)
+
+
+def to_shared_structure(item: dict) -> share_models.SharedStructure:
+    return share_models.SharedStructure(
+        user_id=item["user_id"],
+        sandbox_id=item["sandbox_id"],
+        title=item.get("title", ""),
+        description=item.get("description"),
+        struct=item.get("struct") or {},
+        is_public=item.get("is_public", True),
+        published_at=item.get("published_at", ""),
+        created_at=item.get("created_at", ""),
+        copy_count=item.get("copy_count") or 0,
+        cost_per_feature=item.get("cost_per_feature"),
+    )
+
+
+async def estimate_struct_cost(struct: dict, sandbox_id: str) -> Optional[float]:
+    """公開する構成のリソース1つあたりの月額固定費（計算できなければNone）"""
+    try:
+        return estimate_cost_per_feature(struct, await get_costs())
+    except Exception:
+        # コストカタログが読めなくても公開・更新はできる（安い順のフィードに載らないだけ）
+        logger.exception("公開する構成のコストを計算できませんでした: %s", sandbox_id)
+        return None
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [candidate.strip() for candidate in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates or f"W/{etag}" in candidates
+
+
+@share_router.get("/share/gallery")
+async def get_gallery(
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = None,
+) -> share_models.SharedStructuresResponse:
+    """公開中の構成を新しい順に取得（次ページは`next_cursor`を`cursor`に指定）"""
+    page = await list_gallery(table, limit, cursor)
+    return share_models.SharedStructuresResponse(
+        structures=[share_models.SharedStructureSummary(**item) for item in page["items"]],
+        page_size=limit,
+        has_next=page["next_cursor"] is not None,
+        next_cursor=page["next_cursor"],
+    )
+
+
+@share_router.get("/share/feeds/stats")
+async def get_feed_stats():
+    """フィードの読み込み状況とバージョン"""
+    return share_feeds.stats()
+
+
+@share_router.get("/share/feeds/{feed}")
+async def get_feed(feed: str, if_none_match: Optional[str] = Header(None)):
+    """
+    フィード（recent / copied / cheapest）をメモリ上のスナップショットから返す。
+    `If-None-Match`がETagと一致すれば304。DynamoDBには問い合わせない。
+    """
+    if feed not in FEED_RANKS:
+        raise HTTPException(status_code=404, detail="フィードが見つかりません")
+    snapshot = share_feeds.get(feed)
+    if snapshot is None:
+        # 起動直後の読み込みが終わっていない（読み込みはバックグラウンドで進む）
+        raise HTTPException(status_code=503, detail="フィードを準備中です", headers={"Retry-After": "1"})
+
+    headers = {
+        "ETag": snapshot.etag,
+        "X-Feed-Version": str(snapshot.version),
+        "Cache-Control": f"public, max-age={share_settings.FEED_MAX_AGE_SECONDS}",
+    }
+    if etag_matches(if_none_match, snapshot.etag):
+        return Response(status_code=304, headers=headers)
+    return Response(snapshot.body, media_type="application/json", headers=headers)
+
+
+@share_router.get("/share/{user_id}/{sandbox_id}")
+async def get_shared(user_id: str, sandbox_id: str) -> share_models.SharedStructure:
+    """公開中の構成をstructごと取得"""
+    return to_shared_structure(await get_shared_structure(table, user_id, sandbox_id))
+
+
+@share_router.put("/share/{sandbox_id}")
+async def update_sandbox(
+    sandbox_id: str,
+    request: share_models.UpdateSharedStructureRequest,
+    user_id: str = Depends(extract_user_id),
+):
+    """サンドボックスのstructを更新（公開中ならギャラリーのサマリーとフィードにも反映する）"""
+    cost_per_feature = await estimate_struct_cost(request.struct, sandbox_id)
+    item = await update_sandbox_struct(table, user_id, sandbox_id, request.struct, cost_per_feature)
+    if item.get("is_published"):
+        share_feeds.on_published(item)
+    return {"message": "Sandbox updated successfully"}
+
+
+@share_router.post("/share/{sandbox_id}/publish")
+async def publish(
+    sandbox_id: str,
+    request: share_models.CreateSharedStructureRequest,
+    user_id: str = Depends(extract_user_id),
+) -> share_models.SharedStructure:
+    """サンドボックスを公開する（`is_public=false`ならギャラリーには載せず、リンクでだけ見られる）"""
+    if not request.title.strip():
+        raise HTTPException(status_code=422, detail="タイトルを入力してください")
+    cost_per_feature = await estimate_struct_cost(request.data, sandbox_id)
+    item = await publish_sandbox(
+        table,
+        user_id,
+        sandbox_id,
+        request.title,
+        request.data,
+        description=request.description,
+        is_public=request.is_public,
+        cost_per_feature=cost_per_feature,
+    )
+    share_feeds.on_published(item)
+    return to_shared_structure(item)
+
+
+@share_router.delete("/share/{sandbox_id}/publish")
+async def unpublish(sandbox_id: str, user_id: str = Depends(extract_user_id)):
+    """公開を取り消す"""
+    await unpublish_sandbox(table, user_id, sandbox_id)
+    share_feeds.on_unpublished(user_id, sandbox_id)
+    return {"message": "Sandbox unpublished successfully"}
+
+
+@share_router.post("/share/{owner_id}/{sandbox_id}/copy")
+async def copy_shared(
+    owner_id: str, sandbox_id: str, user_id: str = Depends(extract_user_id)
+) -> share_models.CopySharedStructureResponse:
+    """公開中の構成を自分の新しいサンドボックスにコピーする"""
+    source = await copy_shared_structure(table, owner_id, sandbox_id, user_id)
+    share_feeds.on_copied(source)
+    return share_models.CopySharedStructureResponse(
+        sandbox_id=source["copied_sandbox_id"], copied_from=f"{owner_id}/{sandbox_id}"
+    )
@@ -8,6 +8,90 @@ class BedrockSettings:
 class DynamoDbConnect:
     def __init__(self):
         self.REGION: str = os.getenv("REGION", "")
+        # DynamoDB呼び出しを実行するスレッドプールの上限
+        self.MAX_WORKERS: int = int(os.getenv("DYNAMODB_MAX_WORKERS", "32"))
+
+class AwsClientSettings:
+    def __init__(self):
+        # 1クライアントあたりのHTTPコネクションプール上限（DYNAMODB_MAX_WORKERS以上にする）
+        self.MAX_POOL_CONNECTIONS: int = int(os.getenv("AWS_MAX_POOL_CONNECTIONS", "32"))
+        self.RETRY_MODE: str = os.getenv("AWS_RETRY_MODE", "standard")
+        self.MAX_ATTEMPTS: int = int(os.getenv("AWS_MAX_ATTEMPTS", "3"))
+        self.CONNECT_TIMEOUT: float = float(os.getenv("AWS_CONNECT_TIMEOUT", "2"))
+        self.READ_TIMEOUT: float = float(os.getenv("AWS_READ_TIMEOUT", "10"))
+        # Bedrockは生成に時間がかかるので読み取りタイムアウトを別にする
+        self.BEDROCK_READ_TIMEOUT: float = float(os.getenv("BEDROCK_READ_TIMEOUT", "120"))
+
+class CostCacheSettings:
+    def __init__(self):
+        # この秒数まではキャッシュをそのまま返す
+        self.TTL_SECONDS: float = float(os.getenv("COST_CACHE_TTL_SECONDS", "300"))
+        # TTL切れ後、この秒数までは古い値を返しつつ裏で再取得する
+        self.STALE_SECONDS: float = float(os.getenv("COST_CACHE_STALE_SECONDS", "3600"))
+
+class ScenarioCacheSettings:
+    def __init__(self):
+        # シナリオの更新有無（バージョン）を確認する間隔
+        self.VERSION_CHECK_SECONDS: float = float(os.getenv("SCENARIO_VERSION_CHECK_SECONDS", "60"))
+
+class AdviceCacheSettings:
+    def __init__(self):
+        self.MAX_ENTRIES: int = int(os.getenv("ADVICE_CACHE_MAX_ENTRIES", "1024"))
+        self.TTL_SECONDS: float = float(os.getenv("ADVICE_CACHE_TTL_SECONDS", "86400"))
+        # trueならDynamoDB（PK=advice_cache）を2段目のキャッシュとして使う
+        self.DYNAMODB_ENABLED: bool = os.getenv("ADVICE_CACHE_DYNAMODB", "false").lower() == "true"
+        # 節約額の計算に使うBedrockの料金（USD / 1000トークン）
+        self.INPUT_PRICE_PER_1K: float = float(os.getenv("BEDROCK_INPUT_PRICE_PER_1K", "0.003"))
+        self.OUTPUT_PRICE_PER_1K: float = float(os.getenv("BEDROCK_OUTPUT_PRICE_PER_1K", "0.015"))
+
+class StructMappingSettings:
+    def __init__(self):
+        # structの変換に使うマッピング表のパス（未設定なら同梱のconfig/struct_mapping.json）
+        self.MAPPING_PATH: str = os.getenv("STRUCT_MAPPING_PATH", "")
+
+class StructStorageSettings:
+    def __init__(self):
+        # structの書き込み形式（map: DynamoDBのMap / zlib: 圧縮したBinary）。読み込みはどちらにも対応する
+        self.FORMAT: str = os.getenv("STRUCT_STORAGE_FORMAT", "map").lower()
+        self.COMPRESSION_LEVEL: int = int(os.getenv("STRUCT_COMPRESSION_LEVEL", "6"))
+
+class MetricsSettings:
+    def __init__(self):
+        # HTTPリクエストの記録と/metricsの公開（falseならミドルウェアを入れない）
+        self.ENABLED: bool = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+
+class ProfilingSettings:
+    def __init__(self):
+        # リクエスト単位のプロファイリング（falseならミドルウェアを入れない）
+        self.ENABLED: bool = os.getenv("PROFILING_ENABLED", "false").lower() == "true"
+        # sample: 統計的プロファイラ（折りたたみスタック） / cprofile: 決定的プロファイラ（pstats）
+        self.MODE: str = os.getenv("PROFILING_MODE", "sample").lower()
+        # PATH_PREFIXESに一致するリクエストをこの割合でプロファイルする（0ならX-Profileヘッダーのときだけ）
+        self.SAMPLE_RATE: float = float(os.getenv("PROFILING_SAMPLE_RATE", "0"))
+        self.PATH_PREFIXES: list = [
+            prefix.strip()
+            for prefix in os.getenv("PROFILING_PATH_PREFIXES", "/play/report/,/calculate").split(",")
+            if prefix.strip()
+        ]
+        self.INTERVAL_MS: float = float(os.getenv("PROFILING_INTERVAL_MS", "1"))
+        self.OUTPUT_DIR: str = os.getenv("PROFILING_OUTPUT_DIR", "/tmp/profiles")
+
+class ShareSettings:
+    def __init__(self):
+        # 公開中の構成を公開時刻順に引くGSI（PK=gallery_pk, SK=published_at）
+        self.GALLERY_INDEX_NAME: str = os.getenv("SHARE_GALLERY_INDEX_NAME", "gallery-index")
+        # フィード（新着・コピー数順・安い順）の件数と、GSIを読み直す間隔
+        self.FEED_SIZE: int = int(os.getenv("SHARE_FEED_SIZE", "50"))
+        self.FEED_REFRESH_SECONDS: float = float(os.getenv("SHARE_FEED_REFRESH_SECONDS", "300"))
+        # フィードのレスポンスのCache-Control: max-age（CDN・ブラウザでの再利用）
+        self.FEED_MAX_AGE_SECONDS: int = int(os.getenv("SHARE_FEED_MAX_AGE_SECONDS", "10"))
+
+class AdminSettings:
+    def __init__(self):
+        # 管理用エンドポイントで要求するトークン（未設定なら管理用エンドポイントは使えない）
+        self.ADMIN_TOKEN: str = os.getenv("ADMIN_TOKEN", "")
+        # ローカル開発用: ADMIN_TOKEN未設定のときにトークンなしで管理用エンドポイントを使えるようにする
+        self.ALLOW_UNAUTHENTICATED: bool = os.getenv("ADMIN_ALLOW_UNAUTHENTICATED", "false").lower() == "true"
 
 class LoadRegion:
     def __init__(self):
@@ -18,6 +102,14 @@ class CognitoSettings:
         self.REGION: str = os.getenv("REGION", "")
         self.USERPOOL_ID: str = os.getenv("USERPOOL_ID", "")
         self.APP_CLIENT_ID: str = os.getenv("APP_CLIENT_ID", "")
+        # 未設定ならユーザープールのJWKSのURL（ローカルの代替サーバーを使うときに指定）
+        self.JWKS_URL: str = os.getenv("COGNITO_JWKS_URL", "")
+        self.JWKS_REFRESH_SECONDS: float = float(os.getenv("COGNITO_JWKS_REFRESH_SECONDS", "3600"))
+        # 知らないkidのトークンでJWKSを取り直す最短間隔
+        self.JWKS_MIN_REFETCH_SECONDS: float = float(os.getenv("COGNITO_JWKS_MIN_REFETCH_SECONDS", "60"))
+        # 検証済みトークンを覚えておく件数（0で無効）
+        self.TOKEN_CACHE_SIZE: int = int(os.getenv("COGNITO_TOKEN_CACHE_SIZE", "10000"))
+        self.LEEWAY_SECONDS: float = float(os.getenv("COGNITO_LEEWAY_SECONDS", "0"))
 
 
 
@@ -30,3 +122,33 @@ def get_DynamoDbSettings() -> DynamoDbConnect:
 @lru_cache()
 def get_BedrockSettings() -> BedrockSettings:
     return BedrockSettings()
+@lru_cache()
+def get_AwsClientSettings() -> AwsClientSettings:
+    return AwsClientSettings()
+@lru_cache()
+def get_CostCacheSettings() -> CostCacheSettings:
+    return CostCacheSettings()
+@lru_cache()
+def get_ScenarioCacheSettings() -> ScenarioCacheSettings:
+    return ScenarioCacheSettings()
+@lru_cache()
+def get_AdviceCacheSettings() -> AdviceCacheSettings:
+    return AdviceCacheSettings()
+@lru_cache()
+def get_AdminSettings() -> AdminSettings:
+    return AdminSettings()
+@lru_cache()
+def get_StructMappingSettings() -> StructMappingSettings:
+    return StructMappingSettings()
+@lru_cache()
+def get_StructStorageSettings() -> StructStorageSettings:
+    return StructStorageSettings()
+@lru_cache()
+def get_MetricsSettings() -> MetricsSettings:
+    return MetricsSettings()
+@lru_cache()
+def get_ProfilingSettings() -> ProfilingSettings:
+    return ProfilingSettings()
+@lru_cache()
+def get_ShareSettings() -> ShareSettings:
+    return ShareSettings()
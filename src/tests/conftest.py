@@ -0,0 +1,118 @@
+import pytest
+import boto3
+import jwt
+from moto import mock_aws
+from routers.costs import cost_catalog
+from routers.helpers.dynamodb import FastReadTable
+from routers.play import advice_cache
+from routers.helpers.share_gallery import GALLERY_ATTRIBUTE_DEFINITIONS, gallery_index_definition
+
+
+@pytest.fixture(autouse=True)
+def reset_caches():
+    """テスト間でインプロセスキャッシュの内容を持ち越さないようにする"""
+    cost_catalog.invalidate()
+    advice_cache.invalidate()
+    yield
+
+
+@pytest.fixture
+def moto_game_table():
+    """motoのDynamoDBに作ったgameテーブル（boto3のTable、ギャラリー用GSIを含む）"""
+    with mock_aws():
+        dynamodb = boto3.resource("dynamodb", region_name="ap-northeast-1")
+        yield dynamodb.create_table(
+            TableName="game",
+            KeySchema=[
+                {"AttributeName": "PK", "KeyType": "HASH"},
+                {"AttributeName": "SK", "KeyType": "RANGE"},
+            ],
+            AttributeDefinitions=[
+                {"AttributeName": "PK", "AttributeType": "S"},
+                {"AttributeName": "SK", "AttributeType": "S"},
+                *GALLERY_ATTRIBUTE_DEFINITIONS,
+            ],
+            GlobalSecondaryIndexes=[gallery_index_definition()],
+            BillingMode="PAY_PER_REQUEST",
+        )
+
+
+class RecordingTable(FastReadTable):
+    """読み込み（query・get_item）の呼び出し順と、query・update_itemの引数・queryのレスポンスを記録するFastReadTable"""
+
+    def __init__(self, table):
+        super().__init__(table, boto3.client("dynamodb", region_name="ap-northeast-1"))
+        self.calls = []
+        self.queries = []
+        self.query_responses = []
+        self.updates = []
+
+    async def query(self, **kwargs):
+        self.calls.append("query")
+        self.queries.append(kwargs)
+        response = await super().query(**kwargs)
+        self.query_responses.append(response)
+        return response
+
+    async def get_item(self, **kwargs):
+        self.calls.append("get_item")
+        return await super().get_item(**kwargs)
+
+    async def update_item(self, **kwargs):
+        self.updates.append(kwargs)
+        return await super().update_item(**kwargs)
+
+
+@pytest.fixture
+def recording_table(moto_game_table):
+    """motoのgameテーブルを包んだRecordingTable（各テストでroutersのtableに差し替えて使う）"""
+    return RecordingTable(moto_game_table)
+
+
+@pytest.fixture
+def make_auth_headers():
+    """ユーザーIDからBearerトークンの認証ヘッダーを作る関数"""
+    # 署名は検証されないので任意の鍵で作ったトークンでよい
+    def make(user_id):
+        token = jwt.encode({"sub": user_id}, "test-secret-key-for-hs256-signing!", algorithm="HS256")
+        return {"Authorization": f"Bearer {token}"}
+    return make
+
+
+@pytest.fixture
+def auth_headers(make_auth_headers):
+    """user-1の認証ヘッダー"""
+    return make_auth_headers("user-1")
+
+
+@pytest.fixture
+def make_scenario_item():
+    """
+    月ごとのフィーチャー別リクエスト数からシナリオアイテムを作る関数。
+
+    `monthly_requests[月]`はその月のフィーチャー`f0, f1, ...`のリクエスト数のリスト。
+    """
+    def make(scenario_id, name, monthly_requests, features=(), description=""):
+        return {
+            "PK": "scenario",
+            "SK": scenario_id,
+            "scenario_id": scenario_id,
+            "name": name,
+            "end_month": len(monthly_requests),
+            "current_month": 0,
+            "features": list(features),
+            "requests": [
+                {
+                    "month": month,
+                    "feature": [
+                        {"feature_id": f"f{index}", "request": request} for index, request in enumerate(requests)
+                    ],
+                    "funds": 1000,
+                    "description": description,
+                }
+                for month, requests in enumerate(monthly_requests)
+            ],
+            "created_at": "2025-07-12T10:00:00",
+            "updated_at": "2025-07-12T10:00:00",
+        }
+    return make
@@ -0,0 +1,283 @@
+import pytest
+import asyncio
+import io
+import json
+from unittest.mock import AsyncMock, patch
+from fastapi.testclient import TestClient
+from main import app
+from routers.helpers.advice_cache import (
+    AdviceCache, CachedAdvice, DynamoAdviceStore, advice_cache_key, normalize_struct
+)
+
+client = TestClient(app)
+
+
+class FakeClock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+class FakeItemTable:
+    """get_item / put_item だけを再現するTableのスタブ"""
+
+    def __init__(self):
+        self.items = {}
+
+    async def get_item(self, Key):
+        item = self.items.get((Key["PK"], Key["SK"]))
+        return {"Item": item} if item else {}
+
+    async def put_item(self, Item):
+        self.items[(Item["PK"], Item["SK"])] = Item
+        return {}
+
+
+def make_struct(web_id="web-1", x=10, subnet_id="subnet-1"):
+    return {
+        "subnets": [{"id": subnet_id, "type": "public_subnet", "position": {"x": 0, "y": 0}}],
+        "computes": [
+            {"id": web_id, "type": "ec2", "subnetId": subnet_id, "x": x, "y": 20},
+            {"id": "db-1", "type": "rds", "subnetId": subnet_id, "x": 30, "y": 40},
+        ],
+    }
+
+
+class TestAdviceCacheKey:
+    """キャッシュキー（structの正規化）のテストクラス"""
+
+    def test_ids_positions_and_order_do_not_change_key(self):
+        """ID・座標・リストの並び順だけが違う構成は同じキーになる"""
+        struct = make_struct()
+        moved = make_struct(web_id="web-9", x=500, subnet_id="subnet-7")
+        moved["computes"].reverse()
+
+        assert advice_cache_key(struct, "model", "1") == advice_cache_key(moved, "model", "1")
+
+    def test_resource_changes_change_key(self):
+        """リソースの種類や参照の有無が違えば別のキーになる"""
+        struct = make_struct()
+        changed = make_struct()
+        changed["computes"][0]["type"] = "lambda"
+        detached = make_struct()
+        detached["computes"][0]["subnetId"] = None
+
+        keys = {advice_cache_key(s, "model", "1") for s in (struct, changed, detached)}
+        assert len(keys) == 3
+
+    def test_model_and_prompt_version_are_part_of_key(self):
+        """モデルIDやプロンプトのバージョンが変われば別のキーになる"""
+        struct = make_struct()
+        assert advice_cache_key(struct, "model-a", "1") != advice_cache_key(struct, "model-b", "1")
+        assert advice_cache_key(struct, "model-a", "1") != advice_cache_key(struct, "model-a", "2")
+
+    def test_normalize_struct(self):
+        """揮発フィールドを除き、IDと参照は正規のラベルに付け替える"""
+        assert normalize_struct({"id": "a", "type": "ec2", "subnetId": "s", "targetIds": ["x", "y"], "x": 1}) == {
+            "id": "ec2-1", "type": "ec2", "subnetId": "<external>", "targetIds": ["<external>", "<external>"]
+        }
+
+    def test_subnet_wiring_changes_key(self):
+        """参照先のサブネットだけが違う構成（パブリック / プライベートへの配置）は別のキーになる"""
+        def wired(web_subnet):
+            return {
+                "subnets": [
+                    {"id": "subnet-a", "type": "public_subnet"},
+                    {"id": "subnet-b", "type": "private_subnet"},
+                ],
+                "computes": [
+                    {"id": "web-1", "type": "ec2", "subnetId": web_subnet},
+                    {"id": "db-1", "type": "rds", "subnetId": "subnet-b"},
+                ],
+            }
+
+        public, private = wired("subnet-a"), wired("subnet-b")
+
+        assert advice_cache_key(public, "model", "1") != advice_cache_key(private, "model", "1")
+        assert normalize_struct(public) != normalize_struct(private)
+
+    def test_normalized_struct_has_no_original_ids(self):
+        """正規形（プロンプトの元）には元のIDが残らない"""
+        struct = make_struct(web_id="alice-web", subnet_id="alice-subnet")
+
+        normalized = json.dumps(normalize_struct(struct), ensure_ascii=False)
+
+        assert "alice" not in normalized
+        assert normalize_struct(struct) == normalize_struct(make_struct(web_id="bob-web", subnet_id="bob-subnet"))
+
+
+class TestAdviceCache:
+    """アドバイスキャッシュのテストクラス"""
+
+    def test_lru_eviction(self):
+        """上限を超えると最も使われていないものから追い出す"""
+        cache = AdviceCache(max_entries=2, ttl_seconds=60, clock=FakeClock())
+
+        async def run():
+            await cache.put("a", CachedAdvice("A", 0.01))
+            await cache.put("b", CachedAdvice("B", 0.01))
+            await cache.get("a")
+            await cache.put("c", CachedAdvice("C", 0.01))
+            return [await cache.get(key) for key in ("a", "b", "c")]
+
+        a, b, c = asyncio.run(run())
+        assert a.advice == "A"
+        assert b is None
+        assert c.advice == "C"
+        assert cache.stats()["evictions"] == 1
+
+    def test_ttl_expiry(self):
+        """TTLを過ぎたものは返さない"""
+        clock = FakeClock()
+        cache = AdviceCache(max_entries=10, ttl_seconds=60, clock=clock)
+
+        async def run():
+            await cache.put("a", CachedAdvice("A", 0.01))
+            clock.now += 59
+            fresh = await cache.get("a")
+            clock.now += 2
+            return fresh, await cache.get("a")
+
+        fresh, expired = asyncio.run(run())
+        assert fresh.advice == "A"
+        assert expired is None
+
+    def test_second_tier_survives_process_cache_loss(self):
+        """プロセス内のキャッシュがなくてもDynamoDBの2段目から返す"""
+        table = FakeItemTable()
+        store = DynamoAdviceStore(table, ttl_seconds=60, clock=FakeClock(5000.0))
+        first = AdviceCache(max_entries=10, ttl_seconds=60, store=store)
+        second = AdviceCache(max_entries=10, ttl_seconds=60, store=store)
+
+        async def run():
+            await first.put("key", CachedAdvice("共有される", 0.02))
+            return await second.get("key"), await second.get("key")
+
+        from_store, from_memory = asyncio.run(run())
+
+        assert from_store == CachedAdvice("共有される", 0.02)
+        assert from_memory == from_store
+        assert table.items[("advice_cache", "key")]["expires_at"] == 5060
+        stats = second.stats()
+        assert (stats["store_hits"], stats["memory_hits"]) == (1, 1)
+        assert stats["bedrock_spend_avoided_usd"] == pytest.approx(0.04)
+
+    def test_expired_second_tier_item_is_ignored(self):
+        """DynamoDBのTTL削除が遅れていても期限切れのアイテムは使わない"""
+        table = FakeItemTable()
+        clock = FakeClock(5000.0)
+        store = DynamoAdviceStore(table, ttl_seconds=60, clock=clock)
+
+        async def run():
+            await store.put("key", CachedAdvice("古い", 0.02))
+            clock.now += 61
+            return await store.get("key")
+
+        assert asyncio.run(run()) is None
+
+    def test_concurrent_misses_share_one_generation(self):
+        """同じキーの同時リクエストは1回の生成を共有する"""
+        cache = AdviceCache(max_entries=10, ttl_seconds=60)
+        calls = 0
+
+        async def create():
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.05)
+            return CachedAdvice("A", 0.01)
+
+        async def run():
+            return await asyncio.gather(*(cache.get_or_create("key", create) for _ in range(5)))
+
+        results = asyncio.run(run())
+
+        assert calls == 1
+        assert [cached for _, cached in results].count(False) == 1
+        assert cache.stats()["coalesced"] == 4
+        assert cache.stats()["bedrock_spend_avoided_usd"] == pytest.approx(0.04)
+
+    def test_failed_generation_is_not_cached(self):
+        """生成に失敗した場合は保存せず、次のリクエストで再度生成する"""
+        cache = AdviceCache(max_entries=10, ttl_seconds=60)
+
+        async def fail():
+            raise RuntimeError("throttled")
+
+        async def succeed():
+            return CachedAdvice("A", 0.01)
+
+        async def run():
+            with pytest.raises(RuntimeError):
+                await cache.get_or_create("key", fail)
+            return await cache.get_or_create("key", succeed)
+
+        assert asyncio.run(run()) == (CachedAdvice("A", 0.01), False)
+
+
+class FakeBedrock:
+    """invoke_modelのスタブ（呼ばれた回数を数える）"""
+
+    def __init__(self):
+        self.calls = 0
+
+    def invoke_model(self, **kwargs):
+        self.calls += 1
+        body = {
+            "content": [{"type": "text", "text": "見直せ"}],
+            "usage": {"input_tokens": 1000, "output_tokens": 500},
+        }
+        return {"body": io.BytesIO(json.dumps(body).encode("utf-8"))}
+
+
+@pytest.fixture
+def fresh_advice_cache():
+    """統計が他のテストの影響を受けないよう、空のキャッシュに差し替える"""
+    with patch("routers.play.advice_cache", AdviceCache(max_entries=10, ttl_seconds=60)) as cache:
+        yield cache
+
+
+@pytest.mark.usefixtures("fresh_advice_cache")
+class TestAdviceCacheAPI:
+    """AIアドバイスAPIのキャッシュのテストクラス"""
+
+    @patch("routers.play.get_active_game", new_callable=AsyncMock)
+    def test_identical_architecture_is_served_from_cache(self, mock_get_active_game, auth_headers):
+        """座標やIDだけが違う構成へのアドバイスはBedrockを呼ばずに返す"""
+        mock_get_active_game.side_effect = [
+            {"struct": make_struct()},
+            {"struct": make_struct(web_id="web-2", x=99)},
+        ]
+        fake = FakeBedrock()
+
+        with patch("routers.play.get_bedrock_client", return_value=fake):
+            first = client.post("/play/ai/game-1", headers=auth_headers).json()
+            second = client.post("/play/ai/game-1", headers=auth_headers).json()
+
+        assert first == {"advice": "見直せ", "cached": False}
+        assert second == {"advice": "見直せ", "cached": True}
+        assert fake.calls == 1
+
+        stats = client.get("/play/ai/cache").json()
+        assert stats["hit_rate"] == 0.5
+        # 1000入力トークン × $0.003/1K + 500出力トークン × $0.015/1K
+        assert stats["bedrock_spend_avoided_usd"] == pytest.approx(0.0105)
+
+    @patch("routers.play.get_active_game", new_callable=AsyncMock)
+    def test_streamed_advice_is_cached(self, mock_get_active_game, auth_headers):
+        """ストリーミングで最後まで生成したアドバイスも次回はキャッシュから返す"""
+        from tests.test_bedrock_stream import FakeBedrockClient
+
+        mock_get_active_game.return_value = {"struct": make_struct()}
+        fake = FakeBedrockClient(["直せ", "今すぐ"])
+
+        with patch("routers.play.get_bedrock_client", return_value=fake):
+            client.post("/play/ai/game-1/stream", headers=auth_headers)
+            response = client.post("/play/ai/game-1/stream", headers=auth_headers)
+
+        assert len(fake.streams) == 1
+        assert response.text == (
+            'event: token\ndata: {"text": "直せ今すぐ"}\n\n'
+            'event: done\ndata: {"cached": true}\n\n'
+        )
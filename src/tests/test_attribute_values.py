@@ -0,0 +1,102 @@
+import pytest
+import asyncio
+import boto3
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+from boto3.dynamodb.conditions import Attr, Key
+from boto3.dynamodb.types import Binary, TypeSerializer
+from models.scenario import Scenario
+from routers.helpers.attribute_values import decode_attribute_value, decode_item, serialize_value
+from routers.helpers.dynamodb import FastReadTable
+
+
+@pytest.fixture
+def fast_table(moto_game_table):
+    """motoのgameテーブルを読むFastReadTable"""
+    client = boto3.client("dynamodb", region_name="ap-northeast-1")
+    return FastReadTable(moto_game_table, client, ThreadPoolExecutor(max_workers=1))
+
+
+class TestAttributeValues:
+    """属性値の変換のテストクラス"""
+
+    def test_numbers_become_int_or_float(self):
+        """数値は整数ならint、小数ならfloatになる"""
+        wire = TypeSerializer().serialize({"a": Decimal(12), "b": Decimal("0.5"), "c": [Decimal("-3")]})
+
+        decoded = decode_attribute_value(wire)
+
+        assert decoded == {"a": 12, "b": 0.5, "c": [-3]}
+        assert (type(decoded["a"]), type(decoded["b"]), type(decoded["c"][0])) == (int, float, int)
+
+    def test_other_types(self):
+        """文字列・真偽値・null・バイナリ・セットも変換できる"""
+        item = {
+            "s": {"S": "x"}, "t": {"BOOL": True}, "n": {"NULL": True}, "b": {"B": b"\x01"},
+            "ss": {"SS": ["a", "b"]}, "ns": {"NS": ["1", "2.5"]},
+        }
+
+        assert decode_item(item) == {
+            "s": "x", "t": True, "n": None, "b": Binary(b"\x01"), "ss": {"a", "b"}, "ns": {1, 2.5},
+        }
+
+    def test_serialize_accepts_float(self):
+        """書き込み側はfloatも属性値にできる"""
+        assert serialize_value({"x": 0.5, "y": 2}) == {"M": {"x": {"N": "0.5"}, "y": {"N": "2"}}}
+
+
+class TestFastReadTable:
+    """低レベルクライアントで読み込むFastReadTableのテストクラス"""
+
+    def test_query_with_condition_objects(self, moto_game_table, fast_table):
+        """Tableと同じ条件オブジェクトで検索し、Pythonの値で受け取れる"""
+        for index in range(3):
+            moto_game_table.put_item(Item={"PK": "scenario", "SK": f"s{index}", "end_month": index, "rate": Decimal("1.5")})
+
+        response = asyncio.run(fast_table.query(
+            KeyConditionExpression=Key("PK").eq("scenario") & Key("SK").begins_with("s"),
+            FilterExpression=Attr("end_month").gte(1),
+        ))
+
+        assert [item["SK"] for item in response["Items"]] == ["s1", "s2"]
+        assert response["Items"][0] == {"PK": "scenario", "SK": "s1", "end_month": 1, "rate": 1.5}
+
+    def test_pagination_key_round_trips(self, moto_game_table, fast_table):
+        """LastEvaluatedKeyをそのまま次のExclusiveStartKeyに使える"""
+        for index in range(5):
+            moto_game_table.put_item(Item={"PK": "scenario", "SK": f"s{index}"})
+
+        keys = []
+        kwargs = {"KeyConditionExpression": Key("PK").eq("scenario"), "Limit": 2}
+        while True:
+            response = asyncio.run(fast_table.query(**kwargs))
+            keys.extend(item["SK"] for item in response["Items"])
+            if "LastEvaluatedKey" not in response:
+                break
+            kwargs["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+
+        assert keys == [f"s{index}" for index in range(5)]
+
+    def test_get_item_and_missing_item(self, moto_game_table, fast_table):
+        """get_itemはアイテムがあればPythonの値で、なければItemなしで返す"""
+        moto_game_table.put_item(Item={"PK": "user#u", "SK": "game#g", "funds": 1000, "struct": {"x": Decimal("0.25")}})
+
+        found = asyncio.run(fast_table.get_item(Key={"PK": "user#u", "SK": "game#g"}))
+        missing = asyncio.run(fast_table.get_item(Key={"PK": "user#u", "SK": "game#none"}))
+
+        assert found["Item"]["funds"] == 1000 and found["Item"]["struct"] == {"x": 0.25}
+        assert "Item" not in missing
+
+    def test_scenario_item_builds_model_directly(self, moto_game_table, fast_table):
+        """読んだシナリオアイテムはDecimalの変換なしでモデルにできる"""
+        moto_game_table.put_item(Item={
+            "PK": "scenario", "SK": "blog", "scenario_id": "blog", "name": "ブログ",
+            "end_month": 12, "current_month": 0, "features": [],
+            "requests": [{"month": 1, "feature": [], "funds": 100, "description": "開始"}],
+        })
+
+        item = asyncio.run(fast_table.get_item(Key={"PK": "scenario", "SK": "blog"}))["Item"]
+        scenario = Scenario(**item)
+
+        assert scenario.end_month == 12
+        assert scenario.requests[0].funds == 100
@@ -0,0 +1,59 @@
+import pytest
+from routers.helpers.aws_clients import (
+    build_client_config,
+    get_bedrock_client,
+    get_boto3_session,
+    get_dynamodb_client,
+    get_dynamodb_resource,
+    get_game_table,
+)
+
+
+class TestAwsClientRegistry:
+    """AWSクライアントレジストリのテストクラス"""
+
+    def test_clients_are_shared(self):
+        """クライアントが一度だけ作られ使い回されることのテスト"""
+        assert get_boto3_session() is get_boto3_session()
+        assert get_dynamodb_resource() is get_dynamodb_resource()
+        assert get_dynamodb_client() is get_dynamodb_client()
+        assert get_bedrock_client() is get_bedrock_client()
+        assert get_game_table() is get_game_table()
+
+    def test_routers_use_registry_table(self):
+        """全ルーターとサービスが同じTableを使うことのテスト"""
+        from routers import costs, play
+        from routers.helpers.service import scenario_service
+
+        assert costs.table.sync_table is get_game_table()
+        assert play.table.sync_table is get_game_table()
+        assert scenario_service.table.sync_table is get_game_table()
+
+    def test_loader_uses_registry_resource(self):
+        """loader.pyも共有リソースを使うことのテスト"""
+        from routers.helpers.loader import get_dynamodb_connection
+
+        assert get_dynamodb_connection() is get_dynamodb_resource()
+
+    def test_client_config(self):
+        """コネクションプール・keep-alive・リトライが設定されることのテスト"""
+        config = build_client_config()
+
+        assert config.max_pool_connections == 32
+        assert config.tcp_keepalive is True
+        assert config.retries == {"mode": "standard", "max_attempts": 3}
+
+        client_config = get_dynamodb_client().meta.config
+        assert client_config.max_pool_connections == 32
+        assert client_config.tcp_keepalive is True
+
+    def test_bedrock_client_has_longer_read_timeout(self):
+        """Bedrockクライアントの読み取りタイムアウトが長く設定されることのテスト"""
+        client = get_bedrock_client()
+
+        assert client.meta.service_model.service_name == "bedrock-runtime"
+        assert client.meta.config.read_timeout == 120
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
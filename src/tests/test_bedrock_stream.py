@@ -0,0 +1,204 @@
+import pytest
+import asyncio
+import io
+import json
+import threading
+import time
+from unittest.mock import AsyncMock, patch
+from fastapi.testclient import TestClient
+from main import app
+from routers.helpers.bedrock import extract_text_delta, invoke_advice, stream_advice
+from routers.play import advice_event_stream
+
+client = TestClient(app)
+
+
+def make_event(payload):
+    return {"chunk": {"bytes": json.dumps(payload).encode("utf-8")}}
+
+
+def text_event(text):
+    return make_event({"type": "content_block_delta", "index": 0, "delta": {"type": "text_delta", "text": text}})
+
+
+class FakeEventStream:
+    """Bedrockのレスポンスストリームを再現するスタブ（1イベントごとにdelay秒待つ）"""
+
+    def __init__(self, texts, delay):
+        self.texts = texts
+        self.delay = delay
+        self.closed = threading.Event()
+        self.sent = 0
+
+    def __iter__(self):
+        yield make_event({"type": "message_start", "message": {}})
+        for text in self.texts:
+            if self.closed.wait(self.delay):
+                # 閉じられたら読み取り中のスレッドは例外で抜ける
+                raise ConnectionError("stream closed")
+            self.sent += 1
+            yield text_event(text)
+        yield make_event({"type": "message_stop"})
+
+    def close(self):
+        self.closed.set()
+
+
+class FakeBedrockClient:
+    """invoke_model / invoke_model_with_response_stream のスタブ"""
+
+    def __init__(self, texts, delay=0.0, error=None):
+        self.texts = texts
+        self.delay = delay
+        self.error = error
+        self.streams = []
+
+    def invoke_model_with_response_stream(self, **kwargs):
+        if self.error:
+            raise self.error
+        stream = FakeEventStream(self.texts, self.delay)
+        self.streams.append(stream)
+        return {"body": stream}
+
+    def invoke_model(self, **kwargs):
+        time.sleep(self.delay * len(self.texts))
+        body = json.dumps({"content": [{"type": "text", "text": "".join(self.texts)}]})
+        return {"body": io.BytesIO(body.encode("utf-8"))}
+
+
+class TestStreamAdvice:
+    """Bedrockストリーミング呼び出しのテストクラス"""
+
+    def test_yields_text_deltas_in_order(self):
+        """テキスト差分だけを順番どおりに返す"""
+        fake = FakeBedrockClient(["危機感", "持って", "ください"])
+
+        async def run():
+            return [text async for text in stream_advice(fake, {"web": {"type": "ec2"}})]
+
+        assert asyncio.run(run()) == ["危機感", "持って", "ください"]
+
+    def test_time_to_first_byte_is_one_token(self):
+        """最初のトークンは全体の完了を待たずに届く"""
+        fake = FakeBedrockClient([f"t{i}" for i in range(10)], delay=0.05)
+
+        async def run():
+            started = time.perf_counter()
+            stream = stream_advice(fake, {})
+            first = await stream.__anext__()
+            first_at = time.perf_counter() - started
+            rest = [text async for text in stream]
+            return first, first_at, rest, time.perf_counter() - started
+
+        first, first_at, rest, total = asyncio.run(run())
+
+        assert first == "t0"
+        assert len(rest) == 9
+        assert first_at < 0.2
+        assert total >= 0.5
+
+        # 一括呼び出しは全トークン分待ってから返る
+        async def blocking():
+            started = time.perf_counter()
+            await invoke_advice(fake, {})
+            return time.perf_counter() - started
+
+        assert asyncio.run(blocking()) >= 0.5
+
+    def test_event_loop_is_not_blocked(self):
+        """ストリームの読み取り中もイベントループは他の処理を進められる"""
+        fake = FakeBedrockClient([f"t{i}" for i in range(5)], delay=0.05)
+
+        async def run():
+            ticks = 0
+
+            async def ticker():
+                nonlocal ticks
+                while True:
+                    await asyncio.sleep(0.01)
+                    ticks += 1
+
+            task = asyncio.create_task(ticker())
+            texts = [text async for text in stream_advice(fake, {})]
+            task.cancel()
+            return texts, ticks
+
+        texts, ticks = asyncio.run(run())
+        assert len(texts) == 5
+        assert ticks >= 10
+
+    def test_closing_consumer_cancels_upstream(self):
+        """途中で読むのをやめる（クライアント切断）と上流のストリームを閉じる"""
+        fake = FakeBedrockClient([f"t{i}" for i in range(100)], delay=0.02)
+
+        async def run():
+            stream = stream_advice(fake, {})
+            await stream.__anext__()
+            await stream.aclose()
+
+        asyncio.run(run())
+
+        upstream = fake.streams[0]
+        assert upstream.closed.is_set()
+        time.sleep(0.1)
+        assert upstream.sent < 100
+
+    def test_upstream_error_is_raised(self):
+        """呼び出しに失敗した場合は例外がそのまま伝わる"""
+        fake = FakeBedrockClient([], error=RuntimeError("throttled"))
+
+        async def run():
+            return [text async for text in stream_advice(fake, {})]
+
+        with pytest.raises(RuntimeError, match="throttled"):
+            asyncio.run(run())
+
+    def test_extract_text_delta_ignores_other_events(self):
+        """テキスト差分以外のイベントは空文字になる"""
+        assert extract_text_delta(make_event({"type": "message_start"})) == ""
+        assert extract_text_delta({"metadata": {}}) == ""
+        assert extract_text_delta(text_event("a")) == "a"
+
+
+class TestAdviceStreamAPI:
+    """AIアドバイスSSEエンドポイントのテストクラス"""
+
+    @patch("routers.play.get_active_game", new_callable=AsyncMock)
+    def test_streams_tokens_as_server_sent_events(self, mock_get_active_game, auth_headers):
+        """トークンごとのtokenイベントと最後のdoneイベントを返す"""
+        mock_get_active_game.return_value = {"struct": {"web": {"type": "ec2"}}}
+        fake = FakeBedrockClient(["直せ", "今すぐ"])
+
+        with patch("routers.play.get_bedrock_client", return_value=fake):
+            response = client.post("/play/ai/game-1/stream", headers=auth_headers)
+
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/event-stream")
+        assert response.text == (
+            'event: token\ndata: {"text": "直せ"}\n\n'
+            'event: token\ndata: {"text": "今すぐ"}\n\n'
+            'event: done\ndata: {"cached": false}\n\n'
+        )
+
+    @patch("routers.play.get_active_game", new_callable=AsyncMock)
+    def test_no_active_game_returns_404(self, mock_get_active_game, auth_headers):
+        """進行中のゲームがなければストリームを始めずに404"""
+        mock_get_active_game.return_value = None
+
+        response = client.post("/play/ai/game-1/stream", headers=auth_headers)
+
+        assert response.status_code == 404
+
+    def test_upstream_error_becomes_error_event(self):
+        """Bedrockの失敗はerrorイベントとしてクライアントに伝える"""
+        fake = FakeBedrockClient([], error=RuntimeError("throttled"))
+
+        async def run():
+            return [event async for event in advice_event_stream({})]
+
+        with patch("routers.play.get_bedrock_client", return_value=fake):
+            events = asyncio.run(run())
+
+        assert len(events) == 1
+        assert events[0].startswith("event: error\n")
+        assert "throttled" in events[0]
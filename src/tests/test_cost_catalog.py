@@ -0,0 +1,223 @@
+import pytest
+import asyncio
+from unittest.mock import AsyncMock, patch
+from fastapi.testclient import TestClient
+from main import app
+from routers.helpers.cost_catalog import CostCatalogCache
+from settings import AdminSettings
+
+client = TestClient(app)
+
+COSTS = {"ec2": {"cost": "10.00", "type": "per_month"}}
+
+
+class FakeClock:
+    """テスト用に進められる時計"""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class CountingFetch:
+    """呼び出し回数を数えるカタログ取得関数"""
+
+    def __init__(self, values, delay=0):
+        self.values = list(values)
+        self.delay = delay
+        self.calls = 0
+
+    async def __call__(self):
+        self.calls += 1
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        value = self.values[min(self.calls, len(self.values)) - 1]
+        if isinstance(value, Exception):
+            raise value
+        return value
+
+
+class TestCostCatalogCache:
+    """コストカタログキャッシュのテストクラス"""
+
+    def test_hit_within_ttl(self):
+        """TTL内はDynamoDBに問い合わせないことのテスト"""
+        fetch = CountingFetch([COSTS])
+        clock = FakeClock()
+        cache = CostCatalogCache(fetch, ttl_seconds=60, stale_seconds=0, clock=clock)
+
+        async def run():
+            first = await cache.get()
+            clock.now += 59
+            second = await cache.get()
+            return first, second
+
+        first, second = asyncio.run(run())
+
+        assert first == second == COSTS
+        assert fetch.calls == 1
+        stats = cache.stats()
+        assert stats["misses"] == 1
+        assert stats["hits"] == 1
+        assert stats["hit_rate"] == 0.5
+
+    def test_refetch_after_expiry(self):
+        """TTLと猶予期間を過ぎたら同期的に再取得することのテスト"""
+        updated = {"ec2": {"cost": "12.00", "type": "per_month"}}
+        fetch = CountingFetch([COSTS, updated])
+        clock = FakeClock()
+        cache = CostCatalogCache(fetch, ttl_seconds=60, stale_seconds=0, clock=clock)
+
+        async def run():
+            await cache.get()
+            clock.now += 61
+            return await cache.get()
+
+        assert asyncio.run(run()) == updated
+        assert fetch.calls == 2
+        assert cache.stats()["misses"] == 2
+
+    def test_stale_while_revalidate(self):
+        """猶予期間中は古い値を即座に返し、裏で更新することのテスト"""
+        updated = {"ec2": {"cost": "12.00", "type": "per_month"}}
+        fetch = CountingFetch([COSTS, updated])
+        clock = FakeClock()
+        cache = CostCatalogCache(fetch, ttl_seconds=60, stale_seconds=600, clock=clock)
+
+        async def run():
+            await cache.get()
+            clock.now += 120
+            stale = await cache.get()
+            # バックグラウンド更新を完了させる
+            await asyncio.sleep(0)
+            await asyncio.sleep(0)
+            fresh = await cache.get()
+            return stale, fresh
+
+        stale, fresh = asyncio.run(run())
+
+        assert stale == COSTS
+        assert fresh == updated
+        stats = cache.stats()
+        assert stats["stale_hits"] == 1
+        assert stats["refreshes"] == 2
+
+    def test_background_refresh_error_keeps_stale_value(self):
+        """裏での再取得に失敗しても古い値を使い続けることのテスト"""
+        fetch = CountingFetch([COSTS, RuntimeError("dynamodb down")])
+        clock = FakeClock()
+        cache = CostCatalogCache(fetch, ttl_seconds=60, stale_seconds=600, clock=clock)
+
+        async def run():
+            await cache.get()
+            clock.now += 120
+            await cache.get()
+            await asyncio.sleep(0)
+            await asyncio.sleep(0)
+            return await cache.get()
+
+        assert asyncio.run(run()) == COSTS
+        # 失敗中も古い値のまま応答し、ヒットのたびに1件ずつ再試行する
+        assert cache.stats()["refresh_errors"] == 2
+
+    def test_concurrent_misses_share_one_fetch(self):
+        """同時のミスは1回の取得にまとめられることのテスト"""
+        fetch = CountingFetch([COSTS], delay=0.05)
+        cache = CostCatalogCache(fetch, ttl_seconds=60, stale_seconds=0)
+
+        async def run():
+            return await asyncio.gather(*(cache.get() for _ in range(20)))
+
+        results = asyncio.run(run())
+
+        assert all(result == COSTS for result in results)
+        assert fetch.calls == 1
+
+    def test_invalidate_forces_refetch(self):
+        """invalidate()後は次回必ず再取得することのテスト"""
+        fetch = CountingFetch([COSTS, COSTS])
+        cache = CostCatalogCache(fetch, ttl_seconds=60, stale_seconds=0)
+
+        async def run():
+            await cache.get()
+            cache.invalidate()
+            await cache.get()
+
+        asyncio.run(run())
+
+        assert fetch.calls == 2
+        assert cache.stats()["invalidations"] == 1
+
+    def test_empty_catalog_is_not_cached(self):
+        """空のカタログはキャッシュしないことのテスト"""
+        fetch = CountingFetch([{}, COSTS])
+        cache = CostCatalogCache(fetch, ttl_seconds=60, stale_seconds=0)
+
+        async def run():
+            return await cache.get(), await cache.get()
+
+        assert asyncio.run(run()) == ({}, COSTS)
+        assert fetch.calls == 2
+
+
+class TestCostCacheAPI:
+    """コストキャッシュ関連APIのテストクラス"""
+
+    @patch('routers.costs.table', new_callable=AsyncMock)
+    def test_repeated_requests_query_once(self, mock_table):
+        """連続したリクエストでDynamoDBへの問い合わせが1回になることのテスト"""
+        mock_table.query.return_value = {"Items": [{"costs": COSTS}]}
+
+        for _ in range(3):
+            assert client.get("/costs").json() == COSTS
+        response = client.post("/calculate", json={"struct_data": {"type": "ec2"}})
+
+        assert response.status_code == 200
+        assert mock_table.query.call_count == 1
+
+        stats = client.get("/costs/cache").json()
+        assert stats["misses"] == 1
+        assert stats["hits"] == 3
+
+    @patch('routers.extractor.get_AdminSettings')
+    @patch('routers.costs.table', new_callable=AsyncMock)
+    def test_invalidate_endpoint(self, mock_table, mock_settings):
+        """破棄エンドポイントの後は再取得されることのテスト"""
+        mock_settings.return_value.ADMIN_TOKEN = "secret"
+        mock_table.query.return_value = {"Items": [{"costs": COSTS}]}
+
+        client.get("/costs")
+        response = client.post("/costs/cache/invalidate", headers={"X-Admin-Token": "secret"})
+        assert response.status_code == 200
+        client.get("/costs")
+
+        assert mock_table.query.call_count == 2
+
+    @patch('routers.extractor.get_AdminSettings')
+    def test_invalidate_endpoint_requires_admin_token(self, mock_settings):
+        """ADMIN_TOKEN設定時はトークンなしの破棄を拒否することのテスト"""
+        mock_settings.return_value.ADMIN_TOKEN = "secret"
+
+        assert client.post("/costs/cache/invalidate").status_code == 403
+        response = client.post(
+            "/costs/cache/invalidate", headers={"X-Admin-Token": "secret"}
+        )
+        assert response.status_code == 200
+
+    def test_invalidate_endpoint_is_closed_without_admin_token(self):
+        """ADMIN_TOKEN未設定時は破棄を拒否し、ローカル開発用のフラグがあれば許可することのテスト"""
+        settings = AdminSettings()
+        settings.ADMIN_TOKEN = ""
+        settings.ALLOW_UNAUTHENTICATED = False
+        with patch('routers.extractor.get_AdminSettings', return_value=settings):
+            assert client.post("/costs/cache/invalidate").status_code == 403
+            assert client.post("/costs/cache/invalidate", headers={"X-Admin-Token": ""}).status_code == 403
+
+            settings.ALLOW_UNAUTHENTICATED = True
+            assert client.post("/costs/cache/invalidate").status_code == 200
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -1,5 +1,5 @@
 import pytest
-from unittest.mock import Mock, patch
+from unittest.mock import AsyncMock, Mock, patch
 from routers.costs import calculate_final_cost, find_resource_types
 from fastapi.testclient import TestClient
 from main import app
@@ -105,7 +105,7 @@ class TestCostCalculation:
 class TestCostAPI:
     """コスト計算APIのテストクラス"""
     
-    @patch('routers.costs.table')
+    @patch('routers.costs.table', new_callable=AsyncMock)
     def test_get_costs_success(self, mock_table):
         """コスト情報取得APIの成功テスト"""
         mock_table.query.return_value = {
@@ -123,7 +123,7 @@ class TestCostAPI:
         assert "ec2" in data
         assert "lambda" in data
     
-    @patch('routers.costs.table')
+    @patch('routers.costs.table', new_callable=AsyncMock)
     def test_calculate_cost_success(self, mock_table):
         """コスト計算APIの成功テスト"""
         mock_table.query.return_value = {
@@ -157,7 +157,7 @@ class TestCostAPI:
         assert "ec2" in data["resource_types"]
         assert "lambda" in data["resource_types"]
     
-    @patch('routers.costs.table')
+    @patch('routers.costs.table', new_callable=AsyncMock)
     def test_calculate_cost_no_data(self, mock_table):
         """コストデータが見つからない場合のテスト"""
         mock_table.query.return_value = {"Items": []}
@@ -171,6 +171,87 @@ class TestCostAPI:
         assert response.status_code == 404
         assert "Cost data not found" in response.json()["detail"]
 
+class TestBatchCostAPI:
+    """一括コスト計算APIのテストクラス"""
+
+    costs = {
+        "ec2": {"cost": "15.00", "type": "per_month"},
+        "rds": {"cost": "25.00", "type": "per_month"},
+        "lambda": {"cost": "0.0002", "type": "per_request"},
+        "vpc": {"cost": "0", "type": "no_charge"},
+    }
+
+    structs = [
+        {"web": {"type": "ec2"}, "api": {"type": "lambda"}},
+        {"vpc": {"type": "vpc", "subnets": [{"type": "ec2"}, {"type": "ec2"}]}, "db": {"type": "rds"}},
+        {"unknown": {"type": "unknown_service"}},
+    ]
+
+    @patch('routers.costs.table', new_callable=AsyncMock)
+    def test_matrix_matches_single_calculation(self, mock_table):
+        """行列の各要素が単発の計算結果と一致することのテスト"""
+        mock_table.query.return_value = {"Items": [{"costs": self.costs}]}
+        volumes = [0, 1000, 2000, 50000]
+
+        response = client.post("/calculate/batch", json={
+            "structs": self.structs,
+            "num_requests": volumes,
+        })
+        assert response.status_code == 200
+
+        data = response.json()
+        assert data["num_requests"] == volumes
+        assert len(data["cost_matrix"]) == 3
+        for struct, row in zip(self.structs, data["cost_matrix"]):
+            assert len(row) == 4
+            for num_requests, cost in zip(volumes, row):
+                assert cost == pytest.approx(calculate_final_cost(struct, self.costs, num_requests))
+
+        assert data["breakdowns"][0] == {
+            "monthly_cost": 15.0,
+            "per_request_cost": pytest.approx(0.0002),
+            "resource_counts": {"ec2": 1, "lambda": 1},
+        }
+        assert data["breakdowns"][1]["monthly_cost"] == 55.0
+        assert data["breakdowns"][1]["resource_counts"] == {"vpc": 1, "ec2": 2, "rds": 1}
+        assert data["breakdowns"][2]["monthly_cost"] == 0.0
+
+    @patch('routers.costs.table', new_callable=AsyncMock)
+    def test_thousand_point_sweep_in_one_request(self, mock_table):
+        """1000点のスイープが1リクエストで計算できることのテスト"""
+        mock_table.query.return_value = {"Items": [{"costs": self.costs}]}
+        volumes = list(range(0, 1000000, 1000))
+
+        response = client.post("/calculate/batch", json={
+            "structs": self.structs[:1],
+            "num_requests": volumes,
+        })
+        assert response.status_code == 200
+
+        row = response.json()["cost_matrix"][0]
+        assert len(row) == 1000
+        assert row[0] == 15.0
+        assert row[-1] == pytest.approx(15.0 + 0.0002 * 999000)
+        assert mock_table.query.call_count == 1
+
+    @patch('routers.costs.table', new_callable=AsyncMock)
+    def test_rejects_empty_batch(self, mock_table):
+        """空のバッチは400になることのテスト"""
+        response = client.post("/calculate/batch", json={"structs": [], "num_requests": [1000]})
+        assert response.status_code == 400
+        mock_table.query.assert_not_called()
+
+    @patch('routers.costs.table', new_callable=AsyncMock)
+    def test_batch_no_cost_data(self, mock_table):
+        """コストデータが見つからない場合のテスト"""
+        mock_table.query.return_value = {"Items": []}
+
+        response = client.post("/calculate/batch", json={
+            "structs": self.structs,
+            "num_requests": [1000],
+        })
+        assert response.status_code == 404
+
 class TestEdgeCases:
     """エッジケースのテストクラス"""
     
@@ -1,6 +1,6 @@
 import pytest
 import json
-from unittest.mock import patch
+from unittest.mock import AsyncMock, patch
 from routers.costs import calculate_final_cost, find_resource_types
 from fastapi.testclient import TestClient
 from main import app
@@ -43,7 +43,7 @@ class TestCostIntegration:
         for expected_type in expected_types:
             assert expected_type in resource_types
     
-    @patch('routers.costs.table')
+    @patch('routers.costs.table', new_callable=AsyncMock)
     def test_calculate_blog_scenario_cost(self, mock_table):
         """個人ブログシナリオのコスト計算テスト"""
         # モックのコストデータ
@@ -143,7 +143,7 @@ class TestCostIntegration:
         # ec2が2回出現することを確認
         assert resource_types.count("ec2") == 2
     
-    @patch('routers.costs.table')
+    @patch('routers.costs.table', new_callable=AsyncMock)
     def test_cost_breakdown_accuracy(self, mock_table):
         """コスト内訳の正確性テスト"""
         mock_costs = {
@@ -2,6 +2,61 @@ import pytest
 import time
 from unittest.mock import patch
 from routers.costs import calculate_final_cost, find_resource_types
+from routers.helpers.cost_engine import collect_resource_types, compile_catalog
+
+
+def legacy_find_resource_types(data):
+    """従来の再帰ジェネレータ実装（比較用）"""
+    if isinstance(data, dict):
+        if "type" in data:
+            yield data["type"]
+        for value in data.values():
+            yield from legacy_find_resource_types(value)
+    elif isinstance(data, list):
+        for item in data:
+            yield from legacy_find_resource_types(item)
+
+
+def legacy_calculate_final_cost(struct_data, costs_db, num_requests):
+    """従来のノードごとにfloat()変換する実装（比較用）"""
+    monthly_cost = 0.0
+    per_request_cost = 0.0
+    for resource_type in legacy_find_resource_types(struct_data):
+        if resource_type in costs_db:
+            resource_info = costs_db[resource_type]
+            cost = float(resource_info.get("cost", 0))
+            billing_type = resource_info.get("type")
+            if billing_type == "per_month":
+                monthly_cost += cost
+            elif billing_type == "per_request":
+                per_request_cost += cost
+    return monthly_cost + (per_request_cost * num_requests)
+
+
+def build_huge_struct(resources=20000):
+    """1リソースあたり6ノード（計12万ノード以上）の大規模構造を生成"""
+    return {
+        "resources": [
+            {
+                "type": f"service_{i % 10}",
+                "config": {
+                    "network": {"type": "subnet", "tags": [{"key": "env"}]},
+                    "storage": {"volumes": [{"type": "ebs"}]},
+                },
+            }
+            for i in range(resources)
+        ]
+    }
+
+
+def best_of(func, *args, repeat=3):
+    """複数回実行して最短の所要時間を返す"""
+    timings = []
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        func(*args)
+        timings.append(time.perf_counter() - start_time)
+    return min(timings)
 
 class TestCostPerformance:
     """コスト計算のパフォーマンステスト"""
@@ -154,5 +209,73 @@ class TestCostPerformance:
             expected = 30.0  # ec2(10) + rds(20)
             assert result == expected
 
+
+class TestCompiledCostEnginePerformance:
+    """コンパイル済みコスト計算エンジンの大規模構造でのパフォーマンステスト"""
+
+    costs_db = {
+        **{f"service_{i}": {"cost": str(10.0 + i), "type": "per_month"} for i in range(5)},
+        **{f"service_{i}": {"cost": "0.0001", "type": "per_request"} for i in range(5, 10)},
+        "subnet": {"cost": "0", "type": "no_charge"},
+        "ebs": {"cost": "1.5", "type": "per_month"},
+    }
+
+    def test_collect_matches_legacy_on_100k_nodes(self):
+        """12万ノード超の構造で従来実装と同じ結果になることのテスト"""
+        huge_struct = build_huge_struct()
+
+        resource_types = collect_resource_types(huge_struct)
+
+        assert resource_types == list(legacy_find_resource_types(huge_struct))
+        assert len(resource_types) == 60000  # 20000 * 3 (main + subnet + ebs)
+
+    def test_collect_is_faster_than_legacy_walk(self):
+        """明示的なスタックでの走査が従来の再帰ジェネレータより速いことのテスト"""
+        huge_struct = build_huge_struct()
+
+        legacy_time = best_of(lambda data: list(legacy_find_resource_types(data)), huge_struct)
+        compiled_time = best_of(collect_resource_types, huge_struct)
+
+        assert compiled_time < legacy_time
+        assert compiled_time < 1.0
+
+    def test_calculate_final_cost_is_faster_than_legacy(self):
+        """コスト計算全体が従来実装より速く、結果が一致することのテスト"""
+        huge_struct = build_huge_struct()
+
+        expected = legacy_calculate_final_cost(huge_struct, self.costs_db, 10000)
+        result = calculate_final_cost(huge_struct, self.costs_db, 10000)
+        assert result == pytest.approx(expected)
+
+        legacy_time = best_of(legacy_calculate_final_cost, huge_struct, self.costs_db, 10000)
+        compiled_time = best_of(calculate_final_cost, huge_struct, self.costs_db, 10000)
+
+        assert compiled_time < legacy_time
+
+    def test_deep_nesting_100k_levels(self):
+        """再帰では扱えない深さの構造も走査できることのテスト"""
+        deep_struct = {"type": "root"}
+        current = deep_struct
+        for i in range(100000):
+            current["nested"] = {"type": "ebs"}
+            current = current["nested"]
+
+        start_time = time.perf_counter()
+        resource_types = collect_resource_types(deep_struct)
+        end_time = time.perf_counter()
+
+        assert len(resource_types) == 100001
+        assert (end_time - start_time) < 1.0
+
+    def test_catalog_is_compiled_once_per_cached_dict(self):
+        """同じカタログdictに対しては変換を使い回すことのテスト"""
+        first = compile_catalog(self.costs_db)
+        second = compile_catalog(self.costs_db)
+
+        assert first is second
+        assert first.rates["ebs"] == (1.5, 0.0)
+        assert first.rates["service_7"] == (0.0, 0.0001)
+        assert first.rates["subnet"] == (0.0, 0.0)
+
 if __name__ == "__main__":
     pytest.main([__file__, "-v"])
@@ -0,0 +1,95 @@
+import pytest
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from routers.helpers.dynamodb import AsyncTable
+
+
+class SlowTable:
+    """1回の呼び出しに一定時間かかる同期Tableのスタブ"""
+
+    name = "game"
+
+    def __init__(self, delay):
+        self.delay = delay
+        self.calls = []
+
+    def query(self, **kwargs):
+        time.sleep(self.delay)
+        self.calls.append(("query", kwargs))
+        return {"Items": [{"PK": "costs"}]}
+
+    def get_item(self, **kwargs):
+        time.sleep(self.delay)
+        self.calls.append(("get_item", kwargs))
+        return {"Item": kwargs["Key"]}
+
+    def put_item(self, **kwargs):
+        self.calls.append(("put_item", kwargs))
+        return {}
+
+
+class TestAsyncTable:
+    """DynamoDB非同期アクセス層のテストクラス"""
+
+    def test_passes_through_arguments_and_result(self):
+        """引数と戻り値がそのまま受け渡されることのテスト"""
+        sync_table = SlowTable(0)
+        table = AsyncTable(sync_table, ThreadPoolExecutor(max_workers=1))
+
+        result = asyncio.run(table.get_item(Key={"PK": "scenario", "SK": "s1"}))
+
+        assert result == {"Item": {"PK": "scenario", "SK": "s1"}}
+        assert sync_table.calls == [("get_item", {"Key": {"PK": "scenario", "SK": "s1"}})]
+        assert table.name == "game"
+        assert table.sync_table is sync_table
+
+    def test_concurrent_calls_overlap(self):
+        """並行リクエストのI/Oが重なって実行されることのテスト"""
+        table = AsyncTable(SlowTable(0.1), ThreadPoolExecutor(max_workers=10))
+
+        async def run():
+            return await asyncio.gather(*(table.query(Limit=1) for _ in range(10)))
+
+        start_time = time.time()
+        results = asyncio.run(run())
+        end_time = time.time()
+
+        assert len(results) == 10
+        # 直列なら1秒かかるところ、並行実行なら0.1秒強で終わる
+        assert (end_time - start_time) < 0.5
+
+    def test_event_loop_is_not_blocked(self):
+        """DynamoDB待ちの間もイベントループが他の処理を進められることのテスト"""
+        table = AsyncTable(SlowTable(0.2), ThreadPoolExecutor(max_workers=1))
+        ticks = []
+
+        async def ticker():
+            for _ in range(5):
+                ticks.append(time.time())
+                await asyncio.sleep(0.01)
+
+        async def run():
+            await asyncio.gather(table.query(Limit=1), ticker())
+
+        asyncio.run(run())
+
+        assert len(ticks) == 5
+        assert ticks[-1] - ticks[0] < 0.15
+
+    def test_executor_is_bounded(self):
+        """スレッドプールの上限を超える呼び出しは待たされることのテスト"""
+        table = AsyncTable(SlowTable(0.1), ThreadPoolExecutor(max_workers=2))
+
+        async def run():
+            await asyncio.gather(*(table.query(Limit=1) for _ in range(4)))
+
+        start_time = time.time()
+        asyncio.run(run())
+        end_time = time.time()
+
+        assert (end_time - start_time) >= 0.2
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,202 @@
+import pytest
+import asyncio
+from unittest.mock import AsyncMock, patch
+from botocore.exceptions import ClientError
+from fastapi.testclient import TestClient
+from main import app
+from routers.helpers.games import ACTIVE_GAME_SK, finish_game, get_active_game
+
+client = TestClient(app)
+
+
+def make_game(game_id, is_finished, struct=None):
+    return {
+        "PK": "user#user-1",
+        "SK": f"game#{game_id}",
+        "game_name": game_id,
+        "struct": struct or {"web": {"type": "ec2", "blob": "x" * 1000}},
+        "funds": 0,
+        "current_month": 0,
+        "scenarioes": "personal-blog",
+        "is_finished": is_finished,
+        "created_at": "2025-07-12T10:00:00",
+    }
+
+
+@pytest.fixture
+def game_table(recording_table):
+    """routers.play.tableをmotoのテーブルに差し替える"""
+    with patch("routers.play.table", recording_table):
+        yield recording_table
+
+
+class TestActiveGame:
+    """進行中ゲームのポインタのテストクラス"""
+
+    def test_create_then_get_uses_keyed_reads_only(self, game_table, auth_headers):
+        """作成したゲームはクエリなしのキー指定読み込みで取得できる"""
+        # 過去のゲームが大量にあってもコストは変わらない
+        with game_table.sync_table.batch_writer() as batch:
+            for index in range(50):
+                batch.put_item(Item=make_game(f"old-{index:02d}", is_finished=True))
+
+        created = client.post(
+            "/play/create", json={"scenarioes": "personal-blog", "game_name": "new"}, headers=auth_headers
+        ).json()
+        game_table.calls.clear()
+
+        response = client.get("/play/games", headers=auth_headers)
+
+        assert response.status_code == 200
+        assert response.json()["game_id"] == created["game_id"]
+        assert game_table.calls == ["get_item", "get_item"]
+
+    def test_create_uses_authenticated_user(self, game_table, auth_headers):
+        """作成したゲームは認証されたユーザーのものになる"""
+        created = client.post(
+            "/play/create", json={"scenarioes": "personal-blog"}, headers=auth_headers
+        ).json()
+
+        assert created["user_id"] == "user-1"
+        pointer = game_table.sync_table.get_item(Key={"PK": "user#user-1", "SK": ACTIVE_GAME_SK})["Item"]
+        assert pointer["game_id"] == created["game_id"]
+
+    def test_finish_clears_active_game(self, game_table, auth_headers):
+        """終了したゲームは進行中として返らず、以降もクエリは発生しない"""
+        created = client.post(
+            "/play/create", json={"scenarioes": "personal-blog"}, headers=auth_headers
+        ).json()
+
+        response = client.post(f"/play/{created['game_id']}/finish", headers=auth_headers)
+        assert response.status_code == 200
+
+        game_table.calls.clear()
+        assert client.get("/play/games", headers=auth_headers).status_code == 404
+        assert game_table.calls == ["get_item"]
+
+        game = game_table.sync_table.get_item(
+            Key={"PK": "user#user-1", "SK": f"game#{created['game_id']}"}
+        )["Item"]
+        assert game["is_finished"] is True
+
+        # 2回目の終了は404
+        assert client.post(f"/play/{created['game_id']}/finish", headers=auth_headers).status_code == 404
+
+    def test_finishing_older_game_keeps_pointer(self, game_table, auth_headers):
+        """ポインタが指していない古いゲームを終了してもポインタは残る"""
+        game_table.sync_table.put_item(Item=make_game("older", is_finished=False))
+        created = client.post(
+            "/play/create", json={"scenarioes": "personal-blog"}, headers=auth_headers
+        ).json()
+
+        assert client.post("/play/older/finish", headers=auth_headers).status_code == 200
+
+        response = client.get("/play/games", headers=auth_headers)
+        assert response.json()["game_id"] == created["game_id"]
+
+    def test_legacy_user_is_backfilled(self, game_table, auth_headers):
+        """ポインタのないユーザーは初回だけクエリで探し、ポインタを作る"""
+        with game_table.sync_table.batch_writer() as batch:
+            for index in range(5):
+                batch.put_item(Item=make_game(f"old-{index}", is_finished=True))
+            batch.put_item(Item=make_game("legacy", is_finished=False, struct={"db": {"type": "rds"}}))
+
+        first = client.get("/play/games", headers=auth_headers)
+        assert first.json()["game_id"] == "legacy"
+        assert "query" in game_table.calls
+
+        game_table.calls.clear()
+        async def read_struct():
+            return await get_active_game(game_table, "user-1", projection="struct")
+
+        game = asyncio.run(read_struct())
+        assert game["struct"] == {"db": {"type": "rds"}}
+        assert "game_name" not in game
+        assert game_table.calls == ["get_item", "get_item"]
+
+    def test_user_without_games_is_not_queried_twice(self, game_table, auth_headers):
+        """進行中のゲームがないユーザーも、2回目以降はクエリしない"""
+        assert client.get("/play/games", headers=auth_headers).status_code == 404
+        game_table.calls.clear()
+
+        assert client.get("/play/games", headers=auth_headers).status_code == 404
+        assert game_table.calls == ["get_item"]
+
+    def test_finish_unknown_game(self, game_table):
+        """存在しないゲームの終了はFalse"""
+        assert asyncio.run(finish_game(game_table, "user-1", "missing")) is False
+
+
+class TestCreateGame:
+    """ゲーム作成（トランザクション・冪等キー）のテストクラス"""
+
+    def items(self, game_table):
+        return game_table.sync_table.scan()["Items"]
+
+    def test_game_sandbox_and_pointer_are_written_together(self, game_table, auth_headers):
+        """ゲーム・サンドボックス・ポインタが1回の作成ですべて書き込まれる"""
+        created = client.post(
+            "/play/create", json={"scenarioes": "personal-blog"}, headers=auth_headers
+        ).json()
+
+        sort_keys = sorted(item["SK"] for item in self.items(game_table))
+        assert sort_keys[0] == ACTIVE_GAME_SK
+        assert sort_keys[1] == f"game#{created['game_id']}"
+        assert sort_keys[2].startswith("sandbox#")
+        assert len(sort_keys) == 3
+
+    def test_failed_transaction_leaves_nothing_behind(self, game_table, auth_headers):
+        """途中で失敗しても一部だけ作られたゲームは残らない"""
+        # サンドボックスのIDを既存アイテムと衝突させて条件チェックを失敗させる
+        game_table.sync_table.put_item(Item={"PK": "user#user-1", "SK": "sandbox#fixed"})
+        with patch("routers.play.uuid") as mock_uuid:
+            mock_uuid.uuid4.side_effect = ["game-fixed", "fixed"]
+            with pytest.raises(Exception):
+                client.post("/play/create", json={"scenarioes": "personal-blog"}, headers=auth_headers)
+
+        assert [item["SK"] for item in self.items(game_table)] == ["sandbox#fixed"]
+
+    def test_retry_with_same_key_returns_original_response(self, game_table, auth_headers):
+        """同じIdempotency-Keyの再試行は新しいゲームを作らず最初のレスポンスを返す"""
+        headers = {**auth_headers, "Idempotency-Key": "create-1"}
+        first = client.post("/play/create", json={"scenarioes": "personal-blog"}, headers=headers)
+        second = client.post("/play/create", json={"scenarioes": "personal-blog"}, headers=headers)
+
+        assert second.status_code == 200
+        assert second.json() == first.json()
+        assert second.headers["Idempotent-Replayed"] == "true"
+        assert "Idempotent-Replayed" not in first.headers
+        games = [item for item in self.items(game_table) if item["SK"].startswith("game#")]
+        assert len(games) == 1
+
+    @pytest.mark.parametrize("conflicting_index", [2, 3])
+    def test_concurrent_request_with_same_key_is_conflict(self, game_table, conflicting_index, auth_headers):
+        """同じIdempotency-Keyの並行リクエストとの競合（TransactionConflict）は409"""
+        reasons = [{"Code": "None"} for _ in range(4)]
+        reasons[conflicting_index] = {"Code": "TransactionConflict"}
+        error = ClientError(
+            {"Error": {"Code": "TransactionCanceledException"}, "CancellationReasons": reasons},
+            "TransactWriteItems",
+        )
+        headers = {**auth_headers, "Idempotency-Key": "create-1"}
+
+        with patch.object(game_table, "transact_write_items", AsyncMock(side_effect=error)):
+            response = client.post("/play/create", json={"scenarioes": "personal-blog"}, headers=headers)
+
+        assert response.status_code == 409
+        assert response.json()["detail"] == "同じIdempotency-Keyのリクエストを処理中です"
+
+    def test_same_key_with_different_body_is_rejected(self, game_table, auth_headers):
+        """同じIdempotency-Keyを別の内容で使うと422"""
+        headers = {**auth_headers, "Idempotency-Key": "create-1"}
+        client.post("/play/create", json={"scenarioes": "personal-blog"}, headers=headers)
+
+        response = client.post("/play/create", json={"scenarioes": "corporate-site"}, headers=headers)
+
+        assert response.status_code == 422
+
+    def test_invalid_key_is_rejected(self, game_table, auth_headers):
+        """長すぎるIdempotency-Keyは400"""
+        headers = {**auth_headers, "Idempotency-Key": "x" * 200}
+        response = client.post("/play/create", json={"scenarioes": "personal-blog"}, headers=headers)
+        assert response.status_code == 400
@@ -0,0 +1,177 @@
+import pytest
+from decimal import Decimal
+from unittest.mock import patch
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+from main import app
+from routers.helpers.json_patch import apply_patch, build_partial_update, parse_pointer
+
+client = TestClient(app)
+PATCH_CONTENT_TYPE = {"Content-Type": "application/json-patch+json"}
+
+
+def make_struct():
+    return {
+        "computes": [
+            {"id": "web-1", "type": "ec2", "position": {"x": 0, "y": 0}, "blob": "x" * 5000},
+            {"id": "web-2", "type": "ec2", "position": {"x": 10, "y": 0}},
+        ],
+        "databases": [{"id": "db-1", "type": "rds"}],
+        "meta": {"name": "構成", "a/b": 1},
+    }
+
+
+@pytest.fixture
+def game_table(moto_game_table, recording_table):
+    """structを持つゲームを1件入れ、routers.play.tableを差し替える"""
+    moto_game_table.put_item(Item={
+        "PK": "user#user-1", "SK": "game#game-1", "struct": make_struct(), "is_finished": False,
+    })
+    moto_game_table.put_item(Item={"PK": "user#user-1", "SK": "game#empty", "struct": None})
+    with patch("routers.play.table", recording_table):
+        yield recording_table
+
+
+@pytest.fixture
+def patch_game(auth_headers):
+    """user-1としてJSON PatchでPATCHする関数"""
+    def patch_game(operations, game_id="game-1"):
+        return client.patch(f"/play/{game_id}", json=operations, headers={**auth_headers, **PATCH_CONTENT_TYPE})
+    return patch_game
+
+
+def stored_struct(game_table, game_id="game-1"):
+    return game_table.sync_table.get_item(Key={"PK": "user#user-1", "SK": f"game#{game_id}"})["Item"]["struct"]
+
+
+class TestPatchGame:
+    """structのJSON Patch更新のテストクラス"""
+
+    def test_nested_change_is_written_as_targeted_update(self, game_table, patch_game):
+        """1項目の変更は、その値だけを送る部分更新になる"""
+        response = patch_game([
+            {"op": "test", "path": "/computes/1/id", "value": "web-2"},
+            {"op": "replace", "path": "/computes/1/position/x", "value": 42.5},
+            {"op": "add", "path": "/meta/owner", "value": "user-1"},
+        ])
+
+        assert response.status_code == 200
+        assert response.json() == {"message": "Game data patched successfully", "mode": "partial", "revision": 1}
+        assert "get_item" not in game_table.calls
+        # 送るのは変更した値だけで、struct全体（5000文字のblobなど）は含まない
+        values = game_table.updates[0]["ExpressionAttributeValues"]
+        assert "x" * 5000 not in str(values)
+
+        struct = stored_struct(game_table)
+        assert struct["computes"][1]["position"]["x"] == Decimal("42.5")
+        assert struct["meta"]["owner"] == "user-1"
+        assert struct["computes"][0]["blob"] == "x" * 5000
+
+    def test_append_and_remove(self, game_table, patch_game):
+        """配列末尾への追加と、配列要素・メンバーの削除"""
+        response = patch_game([
+            {"op": "add", "path": "/databases/-", "value": {"id": "db-2", "type": "dynamo_db"}},
+            {"op": "remove", "path": "/computes/0"},
+            {"op": "remove", "path": "/meta/a~1b"},
+        ])
+
+        assert response.json()["mode"] == "partial"
+        struct = stored_struct(game_table)
+        assert [db["id"] for db in struct["databases"]] == ["db-1", "db-2"]
+        assert [compute["id"] for compute in struct["computes"]] == ["web-2"]
+        assert struct["meta"] == {"name": "構成"}
+
+    def test_unsupported_operations_fall_back_to_full_write(self, game_table, patch_game):
+        """moveや配列の途中への挿入は全体を書き戻す"""
+        response = patch_game([
+            {"op": "move", "from": "/computes/0", "path": "/databases/0"},
+            {"op": "copy", "from": "/meta/name", "path": "/meta/title"},
+        ])
+
+        assert response.json() == {"message": "Game data patched successfully", "mode": "full", "revision": 1}
+        struct = stored_struct(game_table)
+        assert [db["id"] for db in struct["databases"]] == ["web-1", "db-1"]
+        assert struct["meta"]["title"] == "構成"
+
+    def test_null_struct_is_patched_as_empty_object(self, game_table, patch_game):
+        """作成直後（structがnull）のゲームにも追加できる"""
+        response = patch_game([{"op": "add", "path": "/computes", "value": []}], game_id="empty")
+
+        assert response.json()["mode"] == "full"
+        assert stored_struct(game_table, "empty") == {"computes": []}
+
+    def test_errors(self, game_table, patch_game):
+        """存在しないパスは422、testの不一致は409、存在しないゲームは404で、何も書き換えない"""
+        assert patch_game([{"op": "replace", "path": "/missing/x", "value": 1}]).status_code == 422
+        assert patch_game([
+            {"op": "test", "path": "/meta/name", "value": "別の名前"},
+            {"op": "replace", "path": "/meta/name", "value": "新しい名前"},
+        ]).status_code == 409
+        assert patch_game([{"op": "add", "path": "/a", "value": 1}], game_id="missing").status_code == 404
+        assert patch_game([{"op": "add", "path": "/a"}]).status_code == 422
+
+        assert stored_struct(game_table) == make_struct()
+
+    def test_revision_advances_with_put(self, game_table, auth_headers, patch_game):
+        """PUTでの全体更新もリビジョンを進める"""
+        client.put("/play/game-1", json={"data": {"computes": []}}, headers=auth_headers)
+        response = patch_game([{"op": "add", "path": "/computes/-", "value": {"id": "web-3"}}])
+
+        assert response.json()["revision"] == 2
+        assert stored_struct(game_table) == {"computes": [{"id": "web-3"}]}
+
+
+class TestJsonPatch:
+    """JSON Patchの適用と部分更新への変換のテストクラス"""
+
+    def test_apply_patch_follows_rfc_6902(self):
+        """RFC 6902の例どおりに適用し、元のドキュメントは変更しない"""
+        document = {"foo": ["bar", "baz"], "a/b": {"~": 1}}
+        result = apply_patch(document, [
+            {"op": "add", "path": "/foo/1", "value": "qux"},
+            {"op": "replace", "path": "/a~1b/~0", "value": 2},
+            {"op": "move", "from": "/foo/0", "path": "/first"},
+            {"op": "test", "path": "/foo", "value": ["qux", "baz"]},
+        ])
+
+        assert result == {"foo": ["qux", "baz"], "a/b": {"~": 2}, "first": "bar"}
+        assert document == {"foo": ["bar", "baz"], "a/b": {"~": 1}}
+
+    def test_invalid_operations_are_rejected(self):
+        """範囲外のインデックスや自分の子孫への移動は422"""
+        with pytest.raises(HTTPException) as error:
+            apply_patch({"foo": [1]}, [{"op": "add", "path": "/foo/3", "value": 1}])
+        assert error.value.status_code == 422
+        with pytest.raises(HTTPException):
+            apply_patch({"foo": {"bar": 1}}, [{"op": "move", "from": "/foo", "path": "/foo/bar/baz"}])
+        with pytest.raises(HTTPException):
+            parse_pointer("foo")
+
+    def test_partial_update_expression(self):
+        """変更箇所ごとのドキュメントパスと存在条件に変換する"""
+        update = build_partial_update([
+            {"op": "replace", "path": "/computes/1/position", "value": {"x": 1.5}},
+            {"op": "remove", "path": "/meta/name"},
+        ])
+
+        assert update["UpdateExpression"] == "SET #struct.#n0[1].#n1 = :v0 REMOVE #struct.#n2.#n3"
+        assert update["ConditionExpression"] == (
+            "attribute_exists(PK) AND attribute_exists(#struct.#n0[1].#n1) AND attribute_exists(#struct.#n2.#n3)"
+        )
+        assert update["ExpressionAttributeValues"] == {":v0": {"x": Decimal("1.5")}}
+
+    def test_untranslatable_operations(self):
+        """順序に依存する操作の組み合わせは部分更新にしない"""
+        # 重なり合うパス
+        assert build_partial_update([
+            {"op": "add", "path": "/meta", "value": {}},
+            {"op": "add", "path": "/meta/name", "value": "x"},
+        ]) is None
+        # 配列要素を削除した後、同じ配列を操作する（インデックスがずれる）
+        assert build_partial_update([
+            {"op": "remove", "path": "/computes/0"},
+            {"op": "replace", "path": "/computes/1/type", "value": "lambda"},
+        ]) is None
+        # 配列の途中への挿入・ドキュメント全体の置き換え
+        assert build_partial_update([{"op": "add", "path": "/computes/0", "value": {}}]) is None
+        assert build_partial_update([{"op": "replace", "path": "", "value": {}}]) is None
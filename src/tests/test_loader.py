@@ -0,0 +1,102 @@
+import json
+import pytest
+from pathlib import Path
+from routers.helpers.loader import load_directory_to_dynamodb
+
+HELPERS_DIR = Path(__file__).resolve().parent.parent / "routers" / "helpers"
+
+
+class CountingTable:
+    """batch_writerで書き込んだアイテム数を数えるTableのラッパー"""
+
+    def __init__(self, table):
+        self._table = table
+        self.written = []
+
+    def query(self, **kwargs):
+        return self._table.query(**kwargs)
+
+    def batch_writer(self, **kwargs):
+        writer = self._table.batch_writer(**kwargs)
+        original_put_item = writer.put_item
+
+        def put_item(Item):
+            self.written.append((Item["PK"], Item["SK"]))
+            return original_put_item(Item=Item)
+
+        writer.put_item = put_item
+        return writer
+
+
+@pytest.fixture
+def data_dir(tmp_path):
+    """同梱のシナリオ・コストJSONをコピーしたディレクトリ"""
+    for source in [*HELPERS_DIR.glob("scenarios/*.json"), *HELPERS_DIR.glob("costs/*.json")]:
+        target = tmp_path / source.parent.name / source.name
+        target.parent.mkdir(exist_ok=True)
+        target.write_text(source.read_text(encoding="utf-8"), encoding="utf-8")
+    return tmp_path
+
+
+class TestLoadDirectory:
+    """ディレクトリ一括読み込みのテストクラス"""
+
+    def test_loads_scenarios_and_costs(self, moto_game_table, data_dir):
+        """シナリオとコストをまとめて格納する"""
+        result = load_directory_to_dynamodb(data_dir, table=moto_game_table)
+
+        assert (result["files"], result["written"], result["skipped"]) == (3, 3, 0)
+        assert result["costs_changed"] is True
+        scenarios = moto_game_table.query(
+            KeyConditionExpression="PK = :pk", ExpressionAttributeValues={":pk": "scenario"}
+        )["Items"]
+        assert len(scenarios) == 2
+        assert all(item["content_hash"] and item["requests"] for item in scenarios)
+        assert "Item" in moto_game_table.get_item(Key={"PK": "costs", "SK": "metadata"})
+
+    def test_unchanged_items_are_not_rewritten(self, moto_game_table, data_dir):
+        """2回目の読み込みでは内容の変わったアイテムだけを書き込み、作成日時は引き継ぐ"""
+        load_directory_to_dynamodb(data_dir, table=moto_game_table)
+        before = moto_game_table.get_item(Key={"PK": "scenario", "SK": "personal-blog-001"})["Item"]
+
+        table = CountingTable(moto_game_table)
+        result = load_directory_to_dynamodb(data_dir, table=table)
+        assert (result["written"], result["skipped"]) == (0, 3)
+        assert result["costs_changed"] is False
+        assert table.written == []
+
+        scenario_file = data_dir / "scenarios" / "personal_blog_scenario.json"
+        scenario = json.loads(scenario_file.read_text(encoding="utf-8"))
+        scenario["name"] = "名前を変更"
+        scenario_file.write_text(json.dumps(scenario, ensure_ascii=False), encoding="utf-8")
+
+        result = load_directory_to_dynamodb(data_dir, table=table)
+
+        assert table.written == [("scenario", "personal-blog-001")]
+        after = moto_game_table.get_item(Key={"PK": "scenario", "SK": "personal-blog-001"})["Item"]
+        assert after["name"] == "名前を変更"
+        assert after["created_at"] == before["created_at"]
+        assert after["content_hash"] != before["content_hash"]
+
+    def test_broken_file_does_not_stop_others(self, moto_game_table, data_dir):
+        """解析できないファイルがあっても他のファイルは読み込む"""
+        (data_dir / "scenarios" / "broken.json").write_text("{", encoding="utf-8")
+
+        result = load_directory_to_dynamodb(data_dir, table=moto_game_table)
+
+        assert result["written"] == 3
+        assert len(result["failed"]) == 1
+
+    def test_files_are_parsed_in_worker_processes(self, moto_game_table, data_dir):
+        """複数プロセスで解析しても1プロセスと同じアイテムを格納し、使ったプロセス数を返す"""
+        (data_dir / "scenarios" / "broken.json").write_text("{", encoding="utf-8")
+
+        result = load_directory_to_dynamodb(data_dir, table=moto_game_table, max_workers=2)
+
+        assert result["workers"] == 2
+        assert (result["written"], len(result["failed"])) == (3, 1)
+        assert 0 < result["parse_seconds"] <= result["elapsed_seconds"]
+
+        result = load_directory_to_dynamodb(data_dir, table=moto_game_table, max_workers=1)
+        assert result["workers"] == 1
+        assert (result["written"], result["skipped"]) == (0, 3)
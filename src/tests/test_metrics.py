@@ -0,0 +1,169 @@
+import pytest
+import asyncio
+import io
+import json
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+from fastapi.testclient import TestClient
+from main import app
+from routers.helpers import metrics
+from routers.helpers.bedrock import invoke_advice, stream_advice
+from routers.helpers.dynamodb import AsyncTable
+from settings import AdminSettings
+
+client = TestClient(app)
+
+
+@pytest.fixture(autouse=True)
+def reset_metrics():
+    metrics.registry.reset()
+    yield
+    metrics.registry.reset()
+
+
+class FailingTable:
+    """queryは成功し、get_itemは失敗する同期Tableのスタブ"""
+
+    name = "game"
+
+    def query(self, **kwargs):
+        return {"Items": []}
+
+    def get_item(self, **kwargs):
+        raise RuntimeError("unavailable")
+
+
+class FakeBedrockClient:
+    """消費トークン数を返すinvoke_modelのスタブ"""
+
+    def invoke_model(self, **kwargs):
+        body = {"content": [{"type": "text", "text": "見直せ"}], "usage": {"input_tokens": 30, "output_tokens": 5}}
+        return {"body": io.BytesIO(json.dumps(body).encode("utf-8"))}
+
+    def invoke_model_with_response_stream(self, **kwargs):
+        raise ConnectionError("throttled")
+
+
+class TestMetricTypes:
+    """メトリクスの集計と整形のテストクラス"""
+
+    def test_histogram_renders_cumulative_buckets(self):
+        """ヒストグラムは累積のバケット・合計・件数を出力する"""
+        histogram = metrics.Histogram("latency_seconds", "説明", ("route",), buckets=(0.1, 1.0))
+        for value in (0.05, 0.1, 0.5, 3.0):
+            histogram.observe("/a", value=value)
+
+        assert histogram.render()[2:] == [
+            'latency_seconds_bucket{route="/a",le="0.1"} 2',
+            'latency_seconds_bucket{route="/a",le="1.0"} 3',
+            'latency_seconds_bucket{route="/a",le="+Inf"} 4',
+            'latency_seconds_sum{route="/a"} 3.65',
+            'latency_seconds_count{route="/a"} 4',
+        ]
+
+    def test_label_values_are_escaped(self):
+        """ラベルの値の引用符と改行はエスケープする"""
+        counter = metrics.Counter("events_total", "説明", ("name",))
+        counter.inc('a"b\nc')
+
+        assert counter.render()[2] == 'events_total{name="a\\"b\\nc"} 1'
+
+
+class TestMetricsMiddleware:
+    """HTTPリクエストの記録と/metricsのテストクラス"""
+
+    def test_requests_are_labeled_by_route_template(self, auth_headers):
+        """パスパラメータを含むリクエストはルートのテンプレートで記録する"""
+        in_flight = []
+
+        async def failing_patch(*args):
+            in_flight.append(metrics.http_requests_in_flight.value("PATCH", "/play/{game_id}"))
+            raise RuntimeError("boom")
+
+        client.get("/health")
+        client.get("/play/scenarioes/unknown-scenario/does-not-exist")
+        with patch("routers.play.patch_game_struct", failing_patch):
+            with pytest.raises(RuntimeError):
+                client.patch("/play/game-1", json=[], headers=auth_headers)
+
+        assert metrics.http_requests_total.value("GET", "/health", "200") == 1
+        assert metrics.http_requests_total.value("GET", metrics.UNMATCHED_ROUTE, "404") == 1
+        assert metrics.http_requests_total.value("PATCH", "/play/{game_id}", "500") == 1
+        assert metrics.http_request_duration_seconds.count("PATCH", "/play/{game_id}") == 1
+        assert in_flight == [1]
+        assert metrics.http_requests_in_flight.value("PATCH", "/play/{game_id}") == 0
+
+    def test_streaming_response_is_in_flight_until_body_is_sent(self):
+        """ストリーミングのレスポンスは本文を送っている間も処理中として数える"""
+        in_flight = []
+
+        async def pages(*args, **kwargs):
+            for index in range(2):
+                in_flight.append(metrics.http_requests_in_flight.value("GET", "/play/scenarioes/stream"))
+                yield {"Items": [{"scenario_id": f"s{index}", "name": "シナリオ"}]}
+
+        with patch("routers.play.iter_query_pages", pages):
+            response = client.get("/play/scenarioes/stream")
+
+        assert len(response.text.splitlines()) == 2
+        assert in_flight == [1, 1]
+        assert metrics.http_requests_in_flight.value("GET", "/play/scenarioes/stream") == 0
+
+    def test_metrics_endpoint_returns_text_format(self):
+        """/metricsはPrometheusのテキスト形式で返す"""
+        client.get("/health")
+        settings = AdminSettings()
+        settings.ADMIN_TOKEN = "secret"
+
+        with patch("routers.extractor.get_AdminSettings", return_value=settings):
+            response = client.get("/metrics", headers={"X-Admin-Token": "secret"})
+
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+        assert 'http_requests_total{method="GET",route="/health",status="200"} 1' in response.text
+        assert "# TYPE http_request_duration_seconds histogram" in response.text
+
+    def test_metrics_endpoint_requires_admin_token(self):
+        """/metricsにはトークンが必要で、ADMIN_TOKEN未設定なら誰も取得できない"""
+        settings = AdminSettings()
+        settings.ADMIN_TOKEN = "secret"
+        with patch("routers.extractor.get_AdminSettings", return_value=settings):
+            assert client.get("/metrics").status_code == 403
+            assert client.get("/metrics", headers={"X-Admin-Token": "secret"}).status_code == 200
+
+            settings.ADMIN_TOKEN = ""
+            settings.ALLOW_UNAUTHENTICATED = False
+            assert client.get("/metrics").status_code == 403
+
+
+class TestUpstreamMetrics:
+    """DynamoDB・Bedrockの呼び出しの記録のテストクラス"""
+
+    def test_dynamodb_operations_are_counted_by_outcome(self):
+        """DynamoDBのオペレーションは成功・失敗ごとに数え、所要時間を記録する"""
+        table = AsyncTable(FailingTable(), ThreadPoolExecutor(max_workers=1))
+
+        asyncio.run(table.query(KeyConditionExpression="PK = :pk"))
+        with pytest.raises(RuntimeError):
+            asyncio.run(table.get_item(Key={"PK": "x", "SK": "y"}))
+
+        assert metrics.dynamodb_operations_total.value("query", "success") == 1
+        assert metrics.dynamodb_operations_total.value("get_item", "error") == 1
+        assert metrics.dynamodb_operation_duration_seconds.count("query") == 1
+
+    def test_bedrock_invocations_and_tokens_are_counted(self):
+        """Bedrockの呼び出しは結果と消費トークン数を記録する"""
+        fake = FakeBedrockClient()
+
+        asyncio.run(invoke_advice(fake, {}))
+
+        async def consume_stream():
+            return [token async for token in stream_advice(fake, {})]
+
+        with pytest.raises(ConnectionError):
+            asyncio.run(consume_stream())
+
+        assert metrics.bedrock_invocations_total.value("invoke", "success") == 1
+        assert metrics.bedrock_tokens_total.value("invoke", "input") == 30
+        assert metrics.bedrock_tokens_total.value("invoke", "output") == 5
+        assert metrics.bedrock_invocations_total.value("stream", "error") == 1
@@ -0,0 +1,122 @@
+import pytest
+import json
+from unittest.mock import patch
+from fastapi.testclient import TestClient
+from main import app
+from routers.helpers.pagination import decode_cursor, encode_cursor
+
+client = TestClient(app)
+
+
+@pytest.fixture
+def scenario_table(moto_game_table, recording_table, make_scenario_item):
+    """motoのgameテーブルにrequestsを大きめに持つシナリオを25件入れ、routers.play.tableを差し替える"""
+    with moto_game_table.batch_writer() as batch:
+        for index in range(25):
+            batch.put_item(Item=make_scenario_item(
+                f"scenario-{index:03d}",
+                f"シナリオ {index}",
+                [[100]] * 12,
+                features=[{"id": f"feature-{index}", "type": "ec2", "feature": "web", "required": ["ec2"]}],
+                description="x" * 200,
+            ))
+        batch.put_item(Item={"PK": "costs", "SK": "metadata", "costs": {}})
+
+    with patch("routers.play.table", recording_table):
+        yield recording_table
+
+
+class TestScenarioListPagination:
+    """シナリオ一覧のページングのテストクラス"""
+
+    def test_pages_follow_cursor_until_end(self, scenario_table):
+        """カーソルをたどると全件を重複なく取得できる"""
+        scenario_ids = []
+        cursor = None
+        pages = 0
+        while True:
+            params = {"limit": 10}
+            if cursor:
+                params["cursor"] = cursor
+            response = client.get("/play/scenarioes", params=params)
+            assert response.status_code == 200
+            body = response.json()
+            scenario_ids.extend(item["scenario_id"] for item in body["items"])
+            pages += 1
+            cursor = body["next_cursor"]
+            if not cursor:
+                break
+
+        assert scenario_ids == [f"scenario-{index:03d}" for index in range(25)]
+        assert pages == 3
+
+    def test_only_summary_attributes_are_fetched(self, scenario_table):
+        """requestsは取得せず、サマリーに必要な属性だけを射影する"""
+        response = client.get("/play/scenarioes", params={"limit": 1})
+
+        item = response.json()["items"][0]
+        assert item == {
+            "scenario_id": "scenario-000",
+            "name": "シナリオ 0",
+            "end_month": 12,
+            "current_month": 0,
+            "feature_count": 1,
+            "created_at": "2025-07-12T10:00:00",
+        }
+        query = scenario_table.queries[-1]
+        assert "requests" not in query["ProjectionExpression"]
+        assert query["Limit"] == 1
+
+    def test_invalid_cursor_is_rejected(self, scenario_table):
+        """不正なカーソルや別パーティションのカーソルは400になる"""
+        assert client.get("/play/scenarioes", params={"cursor": "%%%"}).status_code == 400
+
+        foreign = encode_cursor({"PK": "user#someone", "SK": "game#1"})
+        response = client.get("/play/scenarioes", params={"cursor": foreign})
+        assert response.status_code == 400
+        assert scenario_table.queries == []
+
+    def test_cursor_with_mismatched_key_schema_is_rejected(self, scenario_table):
+        """テーブルのキー（PK・SK）と属性が過不足するカーソルはクエリせずに400になる"""
+        for key in ({"PK": "scenario"}, {"PK": "scenario", "SK": "s", "gallery_pk": "gallery"}):
+            response = client.get("/play/scenarioes", params={"cursor": encode_cursor(key)})
+            assert response.status_code == 400
+        assert scenario_table.queries == []
+
+    def test_limit_is_bounded(self, scenario_table):
+        """limitは1〜100の範囲に制限される"""
+        assert client.get("/play/scenarioes", params={"limit": 0}).status_code == 422
+        assert client.get("/play/scenarioes", params={"limit": 101}).status_code == 422
+
+
+class TestScenarioListStream:
+    """シナリオ一覧のNDJSONストリーミングのテストクラス"""
+
+    def test_streams_every_scenario_as_ndjson(self, scenario_table):
+        """全ページをたどって1行1シナリオで返す"""
+        with patch("routers.play.SCENARIO_STREAM_PAGE_SIZE", 7):
+            response = client.get("/play/scenarioes/stream")
+
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("application/x-ndjson")
+        lines = response.text.strip().split("\n")
+        assert [json.loads(line)["scenario_id"] for line in lines] == [
+            f"scenario-{index:03d}" for index in range(25)
+        ]
+        # 25件を7件ずつ読むので4ページ
+        assert len(scenario_table.queries) == 4
+        assert all("requests" not in query["ProjectionExpression"] for query in scenario_table.queries)
+
+
+class TestCursor:
+    """カーソル変換のテストクラス"""
+
+    def test_round_trip(self):
+        """エンコードしたカーソルは元のキーに戻る"""
+        key = {"PK": "scenario", "SK": "シナリオ/001"}
+        assert decode_cursor(encode_cursor(key), partition_key="scenario") == key
+
+    def test_last_page_has_no_cursor(self):
+        """LastEvaluatedKeyがなければカーソルもNone"""
+        assert encode_cursor(None) is None
+        assert decode_cursor(None, partition_key="scenario") is None
@@ -0,0 +1,120 @@
+import pytest
+import asyncio
+import os
+import pstats
+from unittest.mock import patch
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from routers.helpers.profiling import AWAITING_FRAME, ProfilingMiddleware
+from settings import AdminSettings, ProfilingSettings
+
+
+def busy_walk(size):
+    """CPU時間を使う処理（structの走査の代わり）"""
+    return sum(len(str(index)) for index in range(size))
+
+
+def make_client(tmp_path, **overrides):
+    """プロファイリングを有効にした小さなアプリのクライアント"""
+    settings = ProfilingSettings()
+    settings.OUTPUT_DIR = str(tmp_path)
+    settings.INTERVAL_MS = 0.5
+    for name, value in overrides.items():
+        setattr(settings, name, value)
+
+    app = FastAPI()
+
+    @app.post("/calculate")
+    async def calculate():
+        busy_walk(300_000)
+        # DynamoDB呼び出しのようにスレッドで待つ
+        await asyncio.to_thread(busy_walk, 300_000)
+        return {"ok": True}
+
+    @app.get("/health")
+    async def health():
+        return {"ok": True}
+
+    with patch("routers.helpers.profiling.get_ProfilingSettings", return_value=settings):
+        app.add_middleware(ProfilingMiddleware)
+        client = TestClient(app)
+        client.get("/health")
+    return client
+
+
+PROFILE_HEADERS = {"X-Profile": "1", "X-Admin-Token": "secret"}
+
+
+@pytest.fixture(autouse=True)
+def admin_settings():
+    """X-Admin-Tokenの検証に使う管理用の設定（トークンは"secret"）"""
+    settings = AdminSettings()
+    settings.ADMIN_TOKEN = "secret"
+    settings.ALLOW_UNAUTHENTICATED = False
+    with patch("routers.extractor.get_AdminSettings", return_value=settings):
+        yield settings
+
+
+def saved_files(tmp_path):
+    return sorted(os.path.splitext(name)[1] for name in os.listdir(tmp_path))
+
+
+class TestProfilingMiddleware:
+    """リクエスト単位のプロファイリングのテストクラス"""
+
+    def test_header_profiles_request_with_stack_samples(self, tmp_path):
+        """X-Profileヘッダーのリクエストは折りたたみスタックと集計を保存する"""
+        client = make_client(tmp_path)
+
+        response = client.post("/calculate", headers=PROFILE_HEADERS)
+
+        profile_id = response.headers["x-profile-id"]
+        assert saved_files(tmp_path) == [".folded", ".txt"]
+        with open(tmp_path / f"{profile_id}.folded", encoding="utf-8") as f:
+            lines = f.read().splitlines()
+        assert all(line.rsplit(" ", 1)[1].isdigit() for line in lines)
+        # 実行中のスタックとawait中のスタックの両方が、エンドポイントの関数から記録される
+        assert any("busy_walk" in line and "calculate" in line for line in lines)
+        assert any(AWAITING_FRAME in line and "calculate" in line for line in lines)
+        assert not any("_profile" in line.split(";")[0] for line in lines)
+
+    def test_requests_are_not_profiled_by_default(self, tmp_path):
+        """ヘッダーもサンプリングもなければプロファイルしない"""
+        client = make_client(tmp_path)
+
+        response = client.post("/calculate")
+
+        assert "x-profile-id" not in response.headers
+        assert saved_files(tmp_path) == []
+
+    def test_sampling_applies_only_to_configured_paths(self, tmp_path):
+        """サンプリングはPATH_PREFIXESに一致するリクエストだけが対象"""
+        client = make_client(tmp_path, SAMPLE_RATE=1.0, PATH_PREFIXES=["/calculate"])
+
+        assert "x-profile-id" not in client.get("/health").headers
+        assert "x-profile-id" in client.post("/calculate").headers
+
+    def test_header_requires_admin_token(self, tmp_path, admin_settings):
+        """X-Admin-Tokenがなければヘッダーを無視し、ADMIN_TOKEN未設定ならトークンがあっても無視する"""
+        client = make_client(tmp_path)
+
+        assert "x-profile-id" not in client.post("/calculate", headers={"X-Profile": "1"}).headers
+        assert "x-profile-id" in client.post("/calculate", headers=PROFILE_HEADERS).headers
+
+        admin_settings.ADMIN_TOKEN = ""
+        assert "x-profile-id" not in client.post("/calculate", headers=PROFILE_HEADERS).headers
+
+    def test_cprofile_mode_writes_pstats(self, tmp_path):
+        """cprofileモードはpstatsで読めるプロファイルを保存する"""
+        client = make_client(tmp_path, MODE="cprofile")
+
+        profile_id = client.post("/calculate", headers=PROFILE_HEADERS).headers["x-profile-id"]
+
+        assert saved_files(tmp_path) == [".prof", ".txt"]
+        stats = pstats.Stats(str(tmp_path / f"{profile_id}.prof"))
+        assert any(name == "busy_walk" for _, _, name in stats.stats)
+
+    def test_unknown_mode_is_rejected(self, tmp_path):
+        """未対応のモードは起動時にエラー"""
+        with pytest.raises(ValueError):
+            make_client(tmp_path, MODE="perf")
@@ -0,0 +1,122 @@
+import pytest
+import asyncio
+from decimal import Decimal
+from unittest.mock import AsyncMock, patch
+from fastapi.testclient import TestClient
+from main import app
+from routers.helpers.scenario_repository import ScenarioIndex, ScenarioRepository
+from routers.helpers.service import scenario_service
+
+client = TestClient(app)
+
+COSTS = {
+    "ec2": {"cost": "10.00", "type": "per_month"},
+    "lambda": {"cost": "0.01", "type": "per_request"},
+}
+
+
+def make_game_item(game_id, scenarioes, current_month=1, scenario_id=None):
+    item = {
+        "PK": "user#user-1", "SK": f"game#{game_id}", "scenarioes": scenarioes,
+        "struct": {"computes": [{"id": "web", "type": "ec2"}]},
+        "funds": Decimal(50), "current_month": current_month, "is_finished": False,
+    }
+    if scenario_id:
+        item["scenario_id"] = scenario_id
+    return item
+
+
+@pytest.fixture
+def report_table(moto_game_table, recording_table, make_scenario_item):
+    """シナリオ2件とゲームを入れ、play・シナリオサービスのテーブルを差し替える"""
+    moto_game_table.put_item(Item=make_scenario_item("personal-blog", "個人ブログ", [[100], [300, 200], [900]]))
+    moto_game_table.put_item(Item=make_scenario_item("corporate-site", "企業サイト", [[5000]]))
+    repository = ScenarioRepository(recording_table, check_interval_seconds=3600)
+    with patch("routers.play.table", recording_table), \
+            patch.object(scenario_service, "repository", repository), \
+            patch("routers.play.get_costs", AsyncMock(return_value=COSTS)):
+        yield moto_game_table, repository
+
+
+def stored_game(table, game_id):
+    return table.get_item(Key={"PK": "user#user-1", "SK": f"game#{game_id}"})["Item"]
+
+
+class TestScenarioIndexLookups:
+    """レポート用のシナリオインデックスのテストクラス"""
+
+    def test_month_totals_are_precomputed(self, make_scenario_item):
+        """月ごとのリクエスト数の合計を読み込み時に集計する"""
+        index = ScenarioIndex([make_scenario_item("blog", "個人ブログ", [[100], [300, 200]])], "v1")
+
+        assert index.month_requests == {("blog", 0): 100, ("blog", 1): 500}
+
+    def test_resolves_id_name_and_legacy_partial_name(self, make_scenario_item):
+        """IDと名前はキー指定で、それ以外は名前の部分一致で解決する"""
+        index = ScenarioIndex([
+            make_scenario_item("blog", "個人ブログ", [[1]]),
+            make_scenario_item("corp", "企業サイト", [[1]]),
+        ], "v1")
+
+        assert index.resolve_scenario_id("corp") == "corp"
+        assert index.resolve_scenario_id("個人ブログ") == "blog"
+        assert index.resolve_scenario_id("企業サイトシナリオ") == "corp"
+        assert index.resolve_scenario_id("ゲームサーバー") is None
+        assert index.resolve_scenario_id("") is None
+
+
+class TestReportGame:
+    """ゲームレポートのテストクラス"""
+
+    def test_create_stores_scenario_id_and_report_uses_it(self, report_table, auth_headers):
+        """作成時にscenario_idを保存し、レポートはそのIDと集計済みの月の合計で計算する"""
+        table, repository = report_table
+        asyncio.run(repository.load())
+
+        game_id = client.post("/play/create", json={"scenarioes": "個人ブログ"}, headers=auth_headers).json()["game_id"]
+        assert stored_game(table, game_id)["scenario_id"] == "personal-blog"
+
+        table.update_item(
+            Key={"PK": "user#user-1", "SK": f"game#{game_id}"},
+            UpdateExpression="SET #struct = :struct, current_month = :month, funds = :funds",
+            ExpressionAttributeNames={"#struct": "struct"},
+            ExpressionAttributeValues={
+                ":struct": {"computes": [{"id": "web", "type": "ec2"}]}, ":month": 1, ":funds": 50,
+            },
+        )
+        response = client.post(f"/play/report/{game_id}", headers=auth_headers)
+
+        assert response.status_code == 200, response.text
+        assert response.json()["total_cost"] == pytest.approx(10.0)
+        assert repository.loads == 1
+
+    def test_legacy_game_resolves_by_name_once(self, report_table, auth_headers):
+        """scenario_idのない導入前のゲームは名前から解決し、scenario_idを書き足す"""
+        table, _ = report_table
+        table.put_item(Item=make_game_item("legacy", "企業サイト"))
+
+        response = client.post("/play/report/legacy", headers=auth_headers)
+
+        assert response.status_code == 200
+        assert stored_game(table, "legacy")["scenario_id"] == "corporate-site"
+        # 月1はシナリオに定義がないのでリクエストは0、EC2の月額だけ
+        assert response.json()["total_cost"] == pytest.approx(10.0)
+
+    def test_per_request_cost_uses_month_total(self, report_table, auth_headers):
+        """従量課金はその月に定義されたリクエスト数の合計で計算する"""
+        table, _ = report_table
+        item = make_game_item("api", "personal-blog", current_month=1, scenario_id="personal-blog")
+        item["struct"] = {"computes": [{"id": "api", "type": "lambda"}]}
+        table.put_item(Item=item)
+
+        response = client.post("/play/report/api", headers=auth_headers)
+
+        assert response.json()["total_cost"] == pytest.approx(0.01 * 500)
+
+    def test_missing_game_and_scenario_are_404(self, report_table, auth_headers):
+        """ゲームやシナリオが見つからなければ404"""
+        table, _ = report_table
+        table.put_item(Item=make_game_item("unknown", "ゲームサーバー"))
+
+        assert client.post("/play/report/missing", headers=auth_headers).status_code == 404
+        assert client.post("/play/report/unknown", headers=auth_headers).status_code == 404
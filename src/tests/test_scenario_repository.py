@@ -0,0 +1,380 @@
+import pytest
+import asyncio
+from decimal import Decimal
+from unittest.mock import AsyncMock, patch
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+from main import app
+from routers.costs import calculate_final_cost
+from routers.helpers.scenario_repository import ScenarioRepository, build_monthly_series
+from routers.helpers.service import ScenarioService, scenario_service
+from models.scenario import Scenario
+
+client = TestClient(app)
+
+
+def make_scenario_item(scenario_id, features, months, updated_at="2025-07-12T10:00:00"):
+    """DynamoDBに格納されている形のシナリオアイテムを作る"""
+    return {
+        "PK": "scenario",
+        "SK": scenario_id,
+        "scenario_id": scenario_id,
+        "name": f"シナリオ {scenario_id}",
+        "end_month": Decimal(len(months)),
+        "current_month": Decimal(0),
+        "features": [
+            {"id": feature_id, "type": feature_type, "feature": feature_id, "required": [feature_type]}
+            for feature_id, feature_type in features
+        ],
+        "requests": [
+            {
+                "month": Decimal(month),
+                "feature": [
+                    {"feature_id": feature_id, "request": Decimal(request)}
+                    for feature_id, request in feature_requests
+                ],
+                "funds": Decimal(100 + month),
+                "description": f"{month}ヶ月目",
+            }
+            for month, feature_requests in enumerate(months)
+        ],
+        "created_at": "2025-07-12T10:00:00",
+        "updated_at": updated_at,
+    }
+
+
+class FakeScenarioTable:
+    """PK=scenarioのqueryだけを再現するTableのスタブ（1ページ1件）"""
+
+    def __init__(self, items):
+        self.items = items
+        self.queries = []
+
+    async def query(self, **kwargs):
+        self.queries.append(kwargs)
+        start = 0
+        if "ExclusiveStartKey" in kwargs:
+            start = [item["SK"] for item in self.items].index(kwargs["ExclusiveStartKey"]["SK"]) + 1
+        page = self.items[start:start + 1]
+        if "ProjectionExpression" in kwargs:
+            page = [{"SK": item["SK"], "updated_at": item["updated_at"]} for item in page]
+        response = {"Items": page}
+        if start + 1 < len(self.items):
+            response["LastEvaluatedKey"] = {"PK": "scenario", "SK": page[-1]["SK"]}
+        return response
+
+
+class FailingReloadTable(FakeScenarioTable):
+    """バージョン確認（射影付きのquery）は成功し、全件の読み込みだけ失敗するスタブ"""
+
+    def __init__(self, items):
+        super().__init__(items)
+        self.fail_full_reads = False
+
+    async def query(self, **kwargs):
+        if self.fail_full_reads and "ProjectionExpression" not in kwargs:
+            self.queries.append(kwargs)
+            raise RuntimeError("DynamoDB unavailable")
+        return await super().query(**kwargs)
+
+
+BLOG = make_scenario_item(
+    "blog-001",
+    [("blog-web", "ec2"), ("blog-db", "rds")],
+    [[("blog-web", 500)], [("blog-web", 1200), ("blog-db", 300)]],
+)
+CORP = make_scenario_item(
+    "corp-001",
+    [("corp-web", "ec2")],
+    [[("corp-web", 1000)]],
+)
+
+
+class TestScenarioRepository:
+    """シナリオリポジトリのテストクラス"""
+
+    def test_builds_indexes_across_pages(self):
+        """ページングして全件読み込み、各インデックスを構築することのテスト"""
+        table = FakeScenarioTable([BLOG, CORP])
+        repository = ScenarioRepository(table, check_interval_seconds=60)
+
+        index = asyncio.run(repository.load())
+
+        assert len(table.queries) == 2
+        assert set(index.scenarios) == {"blog-001", "corp-001"}
+        scenario, feature = index.features["blog-db"]
+        assert scenario.scenario_id == "blog-001"
+        assert feature.type == "rds"
+        month = index.months[("blog-001", 1)]
+        assert month.funds == 101
+        assert [f.request for f in month.feature] == [1200, 300]
+        assert [s.feature_count for s in index.summaries] == [2, 1]
+
+    def test_lookups_do_not_query_after_load(self):
+        """読み込み後の参照でDynamoDBを呼ばないことのテスト"""
+        table = FakeScenarioTable([BLOG, CORP])
+        repository = ScenarioRepository(table, check_interval_seconds=60)
+
+        async def run():
+            await repository.load()
+            query_count = len(table.queries)
+            for _ in range(100):
+                assert await repository.get_scenario("corp-001") is not None
+                assert await repository.get_feature("blog-web") is not None
+                assert await repository.get_month("blog-001", 0) is not None
+            assert await repository.get_month("blog-001", 99) is None
+            return query_count
+
+        query_count = asyncio.run(run())
+        assert len(table.queries) == query_count
+
+    def test_reloads_only_when_version_changes(self):
+        """バージョンが変わったときだけ全件を読み込み直すことのテスト"""
+        now = [0.0]
+        table = FakeScenarioTable([BLOG])
+        repository = ScenarioRepository(table, check_interval_seconds=10, clock=lambda: now[0])
+
+        async def settle():
+            await repository.get_index()
+            await asyncio.sleep(0)
+            await asyncio.sleep(0)
+            await asyncio.sleep(0)
+
+        async def run():
+            await repository.get_index()
+            assert repository.loads == 1
+
+            # 確認間隔を過ぎてもバージョンが同じなら読み込み直さない
+            now[0] = 11
+            await settle()
+            assert repository.version_checks == 1
+            assert repository.loads == 1
+
+            # シナリオが更新されたら読み込み直す
+            table.items = [dict(BLOG, updated_at="2025-08-01T00:00:00"), CORP]
+            now[0] = 22
+            await settle()
+            assert repository.version_checks == 2
+            assert repository.loads == 2
+            assert await repository.get_scenario("corp-001") is not None
+
+        asyncio.run(run())
+
+    def test_failed_reload_keeps_previous_index(self):
+        """再読み込みに失敗しても前のインデックスを使い続け、次の確認間隔まで読み直さないことのテスト"""
+        now = [0.0]
+        table = FailingReloadTable([BLOG])
+        repository = ScenarioRepository(table, check_interval_seconds=10, clock=lambda: now[0])
+
+        async def run():
+            await repository.get_index()
+            table.items = [dict(BLOG, updated_at="2025-08-01T00:00:00"), CORP]
+            table.fail_full_reads = True
+            now[0] = 11
+            query_count = len(table.queries)
+            for _ in range(20):
+                index = await repository.get_index()
+                # 裏の確認は例外を外に出さずに終わる
+                assert await repository._inflight is index
+            return index, len(table.queries) - query_count
+
+        index, queries = asyncio.run(run())
+        assert set(index.scenarios) == {"blog-001"}
+        assert repository.version_checks == 1
+        # バージョン確認の2ページと、失敗した読み込み1回だけ
+        assert queries == 3
+        assert repository.loads == 1
+
+    def test_invalidate_forces_reload(self):
+        """invalidate()後の参照で読み込み直すことのテスト"""
+        table = FakeScenarioTable([BLOG])
+        repository = ScenarioRepository(table, check_interval_seconds=60)
+
+        async def run():
+            await repository.get_index()
+            repository.invalidate()
+            await repository.get_index()
+
+        asyncio.run(run())
+        assert repository.loads == 2
+
+
+class TestScenarioService:
+    """リポジトリを使ったシナリオサービスのテストクラス"""
+
+    def make_service(self, items):
+        service = ScenarioService()
+        service.table = FakeScenarioTable(items)
+        service.repository = ScenarioRepository(service.table, check_interval_seconds=60)
+        return service
+
+    def test_get_scenario_and_month(self):
+        """シナリオ詳細と月データの取得テスト"""
+        service = self.make_service([BLOG, CORP])
+
+        async def run():
+            scenario = await service.get_scenario_by_id("blog-001")
+            without_requests = await service.get_scenario_by_id("blog-001", include_requests=False)
+            month = await service.get_month_data("blog-001", 1)
+            return scenario, without_requests, month
+
+        scenario, without_requests, month = asyncio.run(run())
+
+        assert len(scenario.requests) == 2
+        assert without_requests.requests == []
+        assert month.funds == 101
+        assert month.description == "1ヶ月目"
+
+    def test_not_found(self):
+        """存在しないシナリオ・月・フィーチャーは404になることのテスト"""
+        service = self.make_service([BLOG])
+
+        for call in (
+            service.get_scenario_by_id("missing"),
+            service.get_month_data("missing", 0),
+            service.get_month_data("blog-001", 99),
+            service.get_feature_by_id("missing"),
+        ):
+            with pytest.raises(HTTPException) as exc:
+                asyncio.run(call)
+            assert exc.value.status_code == 404
+
+    def test_feature_detail(self):
+        """フィーチャー詳細の取得テスト"""
+        service = self.make_service([BLOG, CORP])
+
+        detail = asyncio.run(service.get_feature_by_id("corp-web"))
+
+        assert detail.scenario_id == "corp-001"
+        assert detail.type == "ec2"
+        assert detail.created_at == "2025-07-12T10:00:00"
+
+    @patch('routers.costs.table', new_callable=AsyncMock)
+    def test_calculate_scenario_cost_without_per_feature_queries(self, mock_costs_table):
+        """月のフィーチャー数に関わらずシナリオの問い合わせが増えないことのテスト"""
+        mock_costs_table.query.return_value = {
+            "Items": [{"costs": {
+                "ec2": {"cost": "10.00", "type": "per_month"},
+                "rds": {"cost": "20.00", "type": "per_month"},
+            }}]
+        }
+        service = self.make_service([BLOG])
+
+        result = asyncio.run(service.calculate_scenario_cost("blog-001", 1))
+
+        # 初回読み込みの1回だけ
+        assert len(service.table.queries) == 1
+        assert result.calculated_cost == 30.0
+        assert result.total_requests == 1500
+        assert result.budget == 101
+        assert result.features_used == ["blog-web", "blog-db"]
+
+
+class TestScenarioSimulation:
+    """シナリオ全期間シミュレーションのテストクラス"""
+
+    costs = {
+        "ec2": {"cost": "10.00", "type": "per_month"},
+        "lambda": {"cost": "0.01", "type": "per_request"},
+    }
+    struct = {"web": {"type": "ec2"}, "api": {"type": "lambda"}}
+
+    def test_monthly_series_carries_forward_undefined_months(self):
+        """定義のない月は直前の月の値を引き継ぐことのテスト"""
+        scenario = Scenario(
+            scenario_id="sparse",
+            name="sparse",
+            end_month=6,
+            current_month=0,
+            features=[],
+            requests=[
+                {"month": 1, "feature": [{"feature_id": "a", "request": 10}, {"feature_id": "b"}], "funds": 50, "description": ""},
+                {"month": 4, "feature": [{"feature_id": "a", "request": 40}], "funds": 80, "description": ""},
+                {"month": 9, "feature": [{"feature_id": "a", "request": 90}], "funds": 90, "description": ""},
+            ],
+        )
+
+        series = build_monthly_series(scenario)
+
+        assert series.total_requests.tolist() == [0, 10, 10, 10, 40, 40]
+        assert series.funds.tolist() == [0, 50, 50, 50, 80, 80]
+        assert series.defined.tolist() == [False, True, False, False, True, False]
+
+    @patch('routers.costs.table', new_callable=AsyncMock)
+    def test_simulation_matches_per_month_calculation(self, mock_costs_table):
+        """全月の結果が月ごとの単発計算と一致することのテスト"""
+        mock_costs_table.query.return_value = {"Items": [{"costs": self.costs}]}
+        service = TestScenarioService().make_service([BLOG])
+
+        result = asyncio.run(service.simulate_scenario_cost("blog-001", self.struct))
+
+        assert result.end_month == 2
+        assert [m.total_requests for m in result.months] == [500, 1500]
+        for month in result.months:
+            expected = calculate_final_cost(self.struct, self.costs, month.total_requests)
+            assert month.calculated_cost == pytest.approx(expected)
+            assert month.budget_remaining == pytest.approx(month.budget - expected)
+        # 月0: 10 + 5 = 15 <= 100, 月1: 10 + 15 = 25 <= 101
+        assert result.first_over_budget_month is None
+        assert result.monthly_cost == 10.0
+        assert result.total_cost == pytest.approx(40.0)
+        assert len(service.table.queries) == 1
+
+    @patch('routers.costs.table', new_callable=AsyncMock)
+    def test_first_over_budget_month(self, mock_costs_table):
+        """最初に予算を超える月が返されることのテスト"""
+        mock_costs_table.query.return_value = {"Items": [{"costs": {
+            "ec2": {"cost": "10.00", "type": "per_month"},
+            "lambda": {"cost": "0.07", "type": "per_request"},
+        }}]}
+        service = TestScenarioService().make_service([BLOG])
+
+        result = asyncio.run(service.simulate_scenario_cost("blog-001", self.struct))
+
+        # 月0: 10 + 35 = 45 <= 100, 月1: 10 + 105 = 115 > 101
+        assert [m.is_over_budget for m in result.months] == [False, True]
+        assert result.first_over_budget_month == 1
+
+    @patch('routers.costs.table', new_callable=AsyncMock)
+    def test_long_projection_is_evaluated_at_once(self, mock_costs_table):
+        """120ヶ月のシナリオも1回の計算で評価できることのテスト"""
+        mock_costs_table.query.return_value = {"Items": [{"costs": {
+            "ec2": {"cost": "10.00", "type": "per_month"},
+            "lambda": {"cost": "0.02", "type": "per_request"},
+        }}]}
+        long_item = make_scenario_item(
+            "long-001",
+            [("long-web", "ec2")],
+            [[("long-web", 100 * (month + 1))] for month in range(120)],
+        )
+        service = TestScenarioService().make_service([long_item])
+
+        result = asyncio.run(service.simulate_scenario_cost("long-001", self.struct))
+
+        assert len(result.months) == 120
+        assert result.months[-1].total_requests == 12000
+        assert result.months[-1].calculated_cost == pytest.approx(10.0 + 0.02 * 12000)
+        # 月mのコストは 12 + 2m、予算は 100 + m なので月89で初めて超える
+        assert result.first_over_budget_month == 89
+
+    @patch('routers.costs.table', new_callable=AsyncMock)
+    def test_simulate_endpoint(self, mock_costs_table):
+        """シミュレーションAPIのテスト"""
+        mock_costs_table.query.return_value = {"Items": [{"costs": self.costs}]}
+        with patch.object(scenario_service, "repository", ScenarioRepository(FakeScenarioTable([BLOG]), 60)):
+            response = client.post(
+                "/play/scenarioes/blog-001/simulate", json={"struct_data": self.struct}
+            )
+            missing = client.post(
+                "/play/scenarioes/missing/simulate", json={"struct_data": self.struct}
+            )
+
+        assert response.status_code == 200
+        data = response.json()
+        assert data["scenario_id"] == "blog-001"
+        assert len(data["months"]) == 2
+        assert missing.status_code == 404
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,345 @@
+import pytest
+import asyncio
+from unittest.mock import AsyncMock, patch
+from fastapi.testclient import TestClient
+from main import app
+from routers.helpers.create_gallery_index import GalleryIndexProjectionError, create_gallery_index
+from routers.helpers.pagination import encode_cursor
+from routers.helpers.share_feeds import ShareFeeds
+
+client = TestClient(app)
+
+
+STRUCT = {"computes": [{"id": "web-1", "type": "ec2"}]}
+COSTS = {
+    "ec2": {"cost": "10.00", "type": "per_month"},
+    "rds": {"cost": "40.00", "type": "per_month"},
+}
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def share_table(moto_game_table, recording_table):
+    """user-1のサンドボックスを30件入れ、routers.share.tableを差し替える"""
+    with moto_game_table.batch_writer() as batch:
+        for index in range(30):
+            batch.put_item(Item={
+                "PK": "user#user-1", "SK": f"sandbox#box-{index:02d}", "struct": None,
+                "is_published": False, "created_at": "2025-07-12T10:00:00",
+            })
+    feeds = ShareFeeds(recording_table, size=3, refresh_seconds=300, clock=FakeClock())
+    with patch("routers.share.table", recording_table), \
+            patch("routers.share.share_feeds", feeds), \
+            patch("routers.share.get_costs", AsyncMock(return_value=COSTS)):
+        yield recording_table
+
+
+@pytest.fixture
+def publish(auth_headers):
+    """サンドボックスを公開する関数（ヘッダーを指定しなければuser-1として公開する）"""
+    def publish(sandbox_id, title="構成", is_public=True, headers=None, struct=STRUCT):
+        return client.post(
+            f"/share/{sandbox_id}/publish",
+            json={"title": title, "data": struct, "description": "説明", "is_public": is_public},
+            headers=headers or auth_headers,
+        )
+    return publish
+
+
+def walk_gallery(limit):
+    pages = []
+    cursor = None
+    while True:
+        params = {"limit": limit, **({"cursor": cursor} if cursor else {})}
+        body = client.get("/share/gallery", params=params).json()
+        pages.append(body["structures"])
+        cursor = body["next_cursor"]
+        if not body["has_next"]:
+            return pages
+
+
+class TestPublish:
+    """サンドボックスの公開のテストクラス"""
+
+    def test_publish_and_get(self, share_table, publish):
+        """公開した構成はstructごと取得でき、ギャラリーにはサマリーだけが載る"""
+        response = publish("box-00", title="3層構成")
+        assert response.status_code == 200
+        assert response.json()["struct"] == STRUCT
+
+        shared = client.get("/share/user-1/box-00").json()
+        assert (shared["title"], shared["struct"], shared["is_public"]) == ("3層構成", STRUCT, True)
+
+        gallery = client.get("/share/gallery").json()
+        assert gallery["structures"] == [{
+            "user_id": "user-1", "sandbox_id": "box-00", "title": "3層構成",
+            "description": "説明", "published_at": shared["published_at"],
+            "copy_count": 0, "cost_per_feature": 10.0,
+        }]
+        assert "struct" not in share_table.query_responses[-1]["Items"][0]
+
+    def test_publish_response_keeps_number_types(self, share_table, publish):
+        """公開のレスポンスの数値は取得時と同じくint・floatのまま（Decimalの文字列にならない）"""
+        struct = {"computes": [{"id": "web-1", "type": "ec2", "position": {"x": 10, "y": 2.5}}]}
+
+        published = publish("box-00", struct=struct).json()
+        shared = client.get("/share/user-1/box-00").json()
+
+        assert published["struct"] == shared["struct"] == struct
+        assert published["copy_count"] == 0
+        assert published["cost_per_feature"] == 10.0
+
+    def test_unlisted_is_not_in_gallery(self, share_table, publish):
+        """is_public=falseの構成はリンクでは見られるがギャラリーには載らない"""
+        publish("box-00")
+        publish("box-00", is_public=False)
+
+        assert client.get("/share/user-1/box-00").json()["is_public"] is False
+        assert client.get("/share/gallery").json()["structures"] == []
+
+    def test_unpublish_removes_from_gallery(self, share_table, auth_headers, publish):
+        """公開を取り消すと取得もギャラリーもできなくなる"""
+        publish("box-00")
+        assert client.delete("/share/box-00/publish", headers=auth_headers).status_code == 200
+
+        assert client.get("/share/user-1/box-00").status_code == 404
+        assert client.get("/share/gallery").json()["structures"] == []
+
+    def test_republish_keeps_published_at(self, share_table, publish):
+        """再公開してもギャラリー内の順番（published_at）は変わらない"""
+        first = publish("box-00", title="初版").json()
+        second = publish("box-00", title="改訂版").json()
+
+        assert second["title"] == "改訂版"
+        assert second["published_at"] == first["published_at"]
+
+    def test_update_struct_is_reflected(self, share_table, auth_headers, publish):
+        """サンドボックスのstructの更新は公開中の構成にも反映される"""
+        publish("box-00")
+        client.put("/share/box-00", json={"struct": {"computes": []}}, headers=auth_headers)
+
+        assert client.get("/share/user-1/box-00").json()["struct"] == {"computes": []}
+
+    def test_other_users_sandbox_is_not_found(self, share_table, make_auth_headers, publish):
+        """存在しない・他人のサンドボックスは公開できない"""
+        assert publish("missing").status_code == 404
+        assert publish("box-00", headers=make_auth_headers("user-2")).status_code == 404
+        assert client.get("/share/user-1/box-01").status_code == 404
+
+
+class TestGalleryPagination:
+    """ギャラリーのカーソルページングのテストクラス"""
+
+    def test_pages_cover_all_items_newest_first(self, share_table, publish):
+        """カーソルをたどると全件を新しい順に重複なく読める"""
+        for index in range(25):
+            publish(f"box-{index:02d}")
+
+        pages = walk_gallery(limit=10)
+        items = [item for page in pages for item in page]
+
+        assert [len(page) for page in pages[:3]] == [10, 10, 5]
+        assert len({item["sandbox_id"] for item in items}) == 25
+        published = [item["published_at"] for item in items]
+        assert published == sorted(published, reverse=True)
+
+    def test_deep_page_reads_only_page_size(self, share_table, publish):
+        """後ろのページでも読み込むのはそのページの件数分だけ"""
+        for index in range(25):
+            publish(f"box-{index:02d}")
+
+        walk_gallery(limit=5)
+
+        assert [response["ScannedCount"] for response in share_table.query_responses[:5]] == [5] * 5
+
+    def test_foreign_cursor_is_rejected(self, share_table):
+        """ギャラリー以外のパーティションのカーソルは400"""
+        cursor = encode_cursor({"gallery_pk": "other", "published_at": "x", "PK": "user#user-1", "SK": "sandbox#a"})
+
+        assert client.get("/share/gallery", params={"cursor": cursor}).status_code == 400
+        assert client.get("/share/gallery", params={"cursor": "%%%"}).status_code == 400
+
+    def test_cursor_with_mismatched_key_schema_is_rejected(self, share_table):
+        """GSIのキースキーマと属性が過不足するカーソルはクエリせずに400"""
+        missing = encode_cursor({"gallery_pk": "gallery", "PK": "user#user-1", "SK": "sandbox#a"})
+        extra = encode_cursor(
+            {"gallery_pk": "gallery", "published_at": "x", "PK": "user#user-1", "SK": "sandbox#a", "name": "x"}
+        )
+
+        assert client.get("/share/gallery", params={"cursor": missing}).status_code == 400
+        assert client.get("/share/gallery", params={"cursor": extra}).status_code == 400
+        assert share_table.query_responses == []
+
+
+def computes(*types):
+    return {"computes": [{"id": f"c{index}", "type": resource_type} for index, resource_type in enumerate(types)]}
+
+
+def feed_ids(name, **headers):
+    return [item["sandbox_id"] for item in client.get(f"/share/feeds/{name}", headers=headers).json()["items"]]
+
+
+@pytest.fixture
+def feeds(share_table):
+    """読み込み済みの空のフィード（件数は3件）"""
+    from routers import share
+
+    asyncio.run(share.share_feeds.load())
+    return share.share_feeds
+
+
+class TestShareFeeds:
+    """フィードのテストクラス"""
+
+    def test_feeds_are_ordered_and_served_from_memory(self, share_table, feeds, make_auth_headers, publish):
+        """各フィードの並び順が正しく、読み込みではDynamoDBに問い合わせない"""
+        publish("box-00", struct=computes("ec2"))         # 10/リソース
+        publish("box-01", struct=computes("ec2", "rds"))  # 25/リソース
+        publish("box-02", struct=computes())               # リソースなし
+        client.post("/share/user-1/box-01/copy", headers=make_auth_headers("user-2"))
+        queries = len(share_table.query_responses)
+
+        assert feed_ids("recent") == ["box-02", "box-01", "box-00"]
+        assert feed_ids("copied") == ["box-01", "box-02", "box-00"]
+        assert feed_ids("cheapest") == ["box-00", "box-01"]
+        assert len(share_table.query_responses) == queries
+
+    def test_etag_is_versioned(self, share_table, feeds, publish):
+        """同じ内容なら304、変更後はETagとバージョンが変わる"""
+        publish("box-00")
+        first = client.get("/share/feeds/recent")
+        assert client.get("/share/feeds/recent", headers={"If-None-Match": first.headers["ETag"]}).status_code == 304
+
+        publish("box-01")
+        second = client.get("/share/feeds/recent", headers={"If-None-Match": first.headers["ETag"]})
+        assert second.status_code == 200
+        assert second.headers["ETag"] != first.headers["ETag"]
+        assert int(second.headers["X-Feed-Version"]) == int(first.headers["X-Feed-Version"]) + 1
+
+    def test_unpublish_backfills_from_memory(self, share_table, feeds, auth_headers, publish):
+        """上位から外れた分は手元の全件から補う"""
+        for index in range(4):
+            publish(f"box-{index:02d}")
+        assert feed_ids("recent") == ["box-03", "box-02", "box-01"]
+
+        client.delete("/share/box-02/publish", headers=auth_headers)
+        publish("box-01", is_public=False)
+
+        assert feed_ids("recent") == ["box-03", "box-00"]
+
+    def test_copies_move_into_copied_feed(self, share_table, feeds, make_auth_headers, publish):
+        """上位の外の構成もコピーされれば順位に入る"""
+        for index in range(4):
+            publish(f"box-{index:02d}")
+        client.post("/share/user-1/box-00/copy", headers=make_auth_headers("user-2"))
+
+        assert feed_ids("copied")[0] == "box-00"
+        copied = client.get("/share/user-1/box-00").json()
+        assert copied["copy_count"] == 1
+
+    def test_update_struct_recomputes_cost_and_feeds(self, share_table, feeds, auth_headers, publish):
+        """公開中の構成のstructを更新すると、コストがサマリーと安い順のフィードにも反映される"""
+        publish("box-00", struct=computes("ec2"))         # 10/リソース
+        publish("box-01", struct=computes("ec2", "rds"))  # 25/リソース
+        assert feed_ids("cheapest") == ["box-00", "box-01"]
+
+        client.put("/share/box-00", json={"struct": computes("rds")}, headers=auth_headers)  # 40/リソース
+
+        assert feed_ids("cheapest") == ["box-01", "box-00"]
+        gallery = {item["sandbox_id"]: item for item in client.get("/share/gallery").json()["structures"]}
+        assert gallery["box-00"]["cost_per_feature"] == 40.0
+        assert client.get("/share/user-1/box-00").json()["cost_per_feature"] == 40.0
+
+    def test_refresh_picks_up_other_instances(self, share_table, feeds, publish):
+        """読み直しの時期を過ぎると、他のプロセスでの公開をバックグラウンドで取り込む"""
+        publish("box-00")
+        # 他のプロセスでの公開（このプロセスのフィードには反映されていない）
+        share_table.sync_table.update_item(
+            Key={"PK": "user#user-1", "SK": "sandbox#box-05"},
+            UpdateExpression="SET gallery_pk = :g, published_at = :p, user_id = :u, sandbox_id = :s, "
+                             "title = :t, copy_count = :c, is_published = :true",
+            ExpressionAttributeValues={
+                ":g": "gallery", ":p": "9999-01-01T00:00:00", ":u": "user-1", ":s": "box-05",
+                ":t": "他のプロセス", ":c": 0, ":true": True,
+            },
+        )
+        assert feed_ids("recent") == ["box-00"]
+
+        async def read_after_refresh():
+            feeds._clock.now = 301
+            feeds.get("recent")
+            await feeds._inflight
+            return feeds.get("recent")
+
+        snapshot = asyncio.run(read_after_refresh())
+        assert b"box-05" in snapshot.body
+        assert feed_ids("recent") == ["box-05", "box-00"]
+
+    def test_not_loaded_and_unknown_feed(self, share_table):
+        """読み込み前は503（読み込みはバックグラウンドで始まる）、未知のフィードは404"""
+        assert client.get("/share/feeds/recent").status_code == 503
+        assert client.get("/share/feeds/popular").status_code == 404
+
+    def test_copy_of_unpublished_is_not_found(self, share_table, feeds, make_auth_headers):
+        """公開されていない構成はコピーできない"""
+        response = client.post("/share/user-1/box-00/copy", headers=make_auth_headers("user-2"))
+
+        assert response.status_code == 404
+
+
+class DescribeOnlyClient:
+    """describe_tableだけを返し、update_tableの呼び出しを記録するクライアントのスタブ"""
+
+    def __init__(self, indexes):
+        self.indexes = indexes
+        self.updates = []
+
+    def describe_table(self, TableName):
+        return {"Table": {"TableName": TableName, "GlobalSecondaryIndexes": self.indexes}}
+
+    def update_table(self, **kwargs):
+        self.updates.append(kwargs)
+
+
+def gallery_index(non_key_attributes):
+    return {
+        "IndexName": "gallery-index",
+        "Projection": {"ProjectionType": "INCLUDE", "NonKeyAttributes": non_key_attributes},
+    }
+
+
+class TestCreateGalleryIndex:
+    """ギャラリー用GSIの追加スクリプトのテストクラス"""
+
+    def test_creates_missing_index(self):
+        """GSIがなければ作成する"""
+        client = DescribeOnlyClient([])
+
+        assert create_gallery_index(client) is True
+        assert client.updates[0]["GlobalSecondaryIndexUpdates"][0]["Create"]["IndexName"] == "gallery-index"
+
+    def test_existing_index_with_same_projection(self):
+        """同じ射影のGSIが作成済みなら何もしない"""
+        client = DescribeOnlyClient([gallery_index(
+            ["user_id", "sandbox_id", "title", "description", "copy_count", "cost_per_feature"]
+        )])
+
+        assert create_gallery_index(client) is False
+        assert client.updates == []
+
+    def test_outdated_projection_is_rejected(self):
+        """copy_count・cost_per_featureを射影していない古いGSIは作成済みとみなさない"""
+        client = DescribeOnlyClient([gallery_index(["user_id", "sandbox_id", "title", "description"])])
+
+        with pytest.raises(GalleryIndexProjectionError) as error:
+            create_gallery_index(client)
+
+        assert error.value.missing == ["copy_count", "cost_per_feature"]
+        assert client.updates == []
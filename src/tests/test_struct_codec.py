@@ -0,0 +1,157 @@
+import pytest
+from decimal import Decimal
+from unittest.mock import patch
+from boto3.dynamodb.types import Binary
+from fastapi.testclient import TestClient
+from main import app
+from routers.helpers.advice_cache import normalize_struct
+from routers.helpers.bedrock import AdviceResult
+from routers.helpers.dynamodb import AsyncTable
+from routers.helpers.migrate_struct_format import migrate_struct_format
+from routers.helpers.struct_codec import (
+    FORMAT_VERSION_ZLIB_JSON, decode_struct, encode_struct, estimate_attribute_size
+)
+from settings import StructStorageSettings
+
+client = TestClient(app)
+
+STRUCT = {
+    "computes": [{"id": f"web-{i}", "type": "ec2", "position": {"x": Decimal(i), "y": Decimal("0.5")}} for i in range(50)],
+    "meta": {"name": "構成", "enabled": True, "note": None},
+}
+
+
+def storage_settings(storage_format):
+    settings = StructStorageSettings()
+    settings.FORMAT = storage_format
+    return settings
+
+
+@pytest.fixture
+def zlib_storage():
+    """書き込みを圧縮形式にする"""
+    settings = storage_settings("zlib")
+    with patch("routers.helpers.struct_codec.get_StructStorageSettings", return_value=settings), \
+            patch("routers.helpers.games.get_StructStorageSettings", return_value=settings):
+        yield
+
+
+@pytest.fixture
+def game_table(moto_game_table):
+    """Map形式のstructを持つ進行中のゲームを入れ、routers.play.tableを差し替える"""
+    moto_game_table.put_item(Item={
+        "PK": "user#user-1", "SK": "game#game-1", "struct": STRUCT, "funds": 0, "current_month": 0,
+        "scenarioes": "personal-blog", "is_finished": False, "created_at": "2025-07-12T10:00:00",
+    })
+    moto_game_table.put_item(Item={"PK": "user#user-1", "SK": "active_game", "game_id": "game-1"})
+    with patch("routers.play.table", AsyncTable(moto_game_table)):
+        yield moto_game_table
+
+
+def stored_struct(game_table):
+    return game_table.get_item(Key={"PK": "user#user-1", "SK": "game#game-1"})["Item"]["struct"]
+
+
+class TestStructCodec:
+    """structの圧縮形式のテストクラス"""
+
+    def test_round_trip_matches_map_encoding(self):
+        """圧縮形式から戻した値はMap形式で読んだ値（数値はint・float）と同じ"""
+        encoded = encode_struct(STRUCT)
+
+        assert encoded[0] == FORMAT_VERSION_ZLIB_JSON
+        assert decode_struct(Binary(encoded)) == STRUCT
+        position = decode_struct(encoded)["computes"][1]["position"]
+        assert (type(position["x"]), type(position["y"])) == (int, float)
+        assert estimate_attribute_size(Binary(encoded)) < estimate_attribute_size(STRUCT) / 3
+
+    def test_map_and_null_pass_through(self):
+        """Map形式やnullはそのまま返す"""
+        assert decode_struct(STRUCT) is STRUCT
+        assert decode_struct(None) is None
+
+    def test_unknown_version_is_rejected(self):
+        """未知の形式バージョンはエラー"""
+        with pytest.raises(ValueError):
+            decode_struct(Binary(b"\x09" + encode_struct(STRUCT)[1:]))
+
+
+@pytest.mark.usefixtures("zlib_storage")
+class TestCompressedStorage:
+    """圧縮形式での読み書きのテストクラス"""
+
+    def test_put_writes_binary_and_get_reads_it(self, game_table, auth_headers):
+        """PUTは圧縮形式で書き込み、GETは元のstructを返す"""
+        client.put("/play/game-1", json={"data": {"computes": [{"id": "web-1", "type": "ec2"}]}}, headers=auth_headers)
+
+        assert isinstance(stored_struct(game_table), Binary)
+        response = client.get("/play/games", headers=auth_headers)
+        assert response.json()["struct"] == {"computes": [{"id": "web-1", "type": "ec2"}]}
+
+    def test_patch_rewrites_compressed_struct(self, game_table, auth_headers):
+        """圧縮形式のstructへのJSON Patchは全体を書き戻す"""
+        response = client.patch(
+            "/play/game-1",
+            json=[{"op": "replace", "path": "/meta/name", "value": "新しい構成"}],
+            headers={**auth_headers, "Content-Type": "application/json-patch+json"},
+        )
+
+        assert response.json()["mode"] == "full"
+        struct = decode_struct(stored_struct(game_table))
+        assert struct["meta"]["name"] == "新しい構成"
+        assert struct["computes"] == STRUCT["computes"]
+
+    @patch("routers.play.get_bedrock_client")
+    def test_advice_reads_compressed_struct(self, mock_get_bedrock_client, game_table, auth_headers):
+        """AIアドバイスも圧縮形式のstructを元に戻して使う"""
+        migrate_struct_format(game_table, "zlib")
+
+        with patch("routers.play.invoke_advice") as mock_invoke_advice:
+            mock_invoke_advice.return_value = AdviceResult("見直せ", 10, 10)
+            client.post("/play/ai/game-1", headers=auth_headers)
+
+        # プロンプトには元に戻したstructの正規形を渡す
+        assert mock_invoke_advice.call_args.args[1] == normalize_struct(STRUCT)
+
+
+class TestMigrateStructFormat:
+    """保存形式の移行スクリプトのテストクラス"""
+
+    def test_migrates_and_rolls_back(self, game_table):
+        """Map形式から圧縮形式へ変換し、元に戻せる"""
+        game_table.put_item(Item={"PK": "user#user-1", "SK": "sandbox#1", "struct": None})
+
+        dry_run = migrate_struct_format(game_table, "zlib", dry_run=True)
+        assert dry_run["converted"] == 1
+        assert stored_struct(game_table) == STRUCT
+
+        stats = migrate_struct_format(game_table, "zlib")
+        assert (stats["scanned"], stats["converted"], stats["unchanged"]) == (2, 1, 1)
+        assert stats["bytes_after"] < stats["bytes_before"]
+        assert isinstance(stored_struct(game_table), Binary)
+        assert migrate_struct_format(game_table, "zlib")["converted"] == 0
+
+        migrate_struct_format(game_table, "map")
+        assert stored_struct(game_table) == STRUCT
+
+    def test_concurrently_updated_item_is_skipped(self, game_table):
+        """読み込み後にstructが更新されたアイテムは上書きしない"""
+        from routers.helpers import migrate_struct_format as module
+
+        original = module.iter_struct_items
+
+        def iter_then_update(table):
+            for item in original(table):
+                table.update_item(
+                    Key={"PK": item["PK"], "SK": item["SK"]},
+                    UpdateExpression="SET #struct = :struct ADD struct_revision :one",
+                    ExpressionAttributeNames={"#struct": "struct"},
+                    ExpressionAttributeValues={":struct": {"computes": []}, ":one": 1},
+                )
+                yield item
+
+        with patch.object(module, "iter_struct_items", iter_then_update):
+            stats = migrate_struct_format(game_table, "zlib")
+
+        assert stats["conflicts"] == 1
+        assert stored_struct(game_table) == {"computes": []}
@@ -0,0 +1,98 @@
+import json
+import pytest
+from routers.helpers.struct_normalizer import StructNormalizer, get_struct_normalizer, load_struct_mapping
+from routers.play import convert_struct_for_cost_calculation
+
+
+def make_struct():
+    return {
+        "vpc": {"id": "vpc-1"},
+        "availabilityZones": [{"id": "az-a"}, {"id": "az-c"}],
+        "subnets": [
+            {"id": "subnet-1", "type": "public_subnet"},
+            {"id": "subnet-2", "type": "private_subnet"},
+            {"id": "subnet-3", "type": "private_subnet"},
+        ],
+        "networks": [{"id": "nat-1", "type": "nat_gateway"}],
+        "computes": [
+            {"id": "web-1", "type": "ec2", "elasticIpId": "eip-1"},
+            {"id": "web-2", "type": "ec2"},
+            {"id": "fn-1", "type": "lambda"},
+            {"id": "unknown"},
+        ],
+        "databases": [{"id": "db-1", "type": "rds"}],
+    }
+
+
+class TestStructNormalizer:
+    """マッピング表によるstruct変換のテストクラス"""
+
+    def test_counts_every_collection(self):
+        """同梱のマッピング表で各コレクションと派生リソースを数える"""
+        assert convert_struct_for_cost_calculation(make_struct()) == {
+            "vpc": {"quantity": 1},
+            "availability_zone": {"quantity": 2},
+            "public_subnet": {"quantity": 1},
+            "private_subnet": {"quantity": 2},
+            "nat_gateway": {"quantity": 1},
+            "ec2": {"quantity": 2},
+            "lambda": {"quantity": 1},
+            "compute": {"quantity": 1},
+            "elastic_ip": {"quantity": 1},
+            "rds": {"quantity": 1},
+        }
+
+    def test_simple_and_empty_structs(self):
+        """変換済みの形式はそのまま、空のstructは空のdictを返す"""
+        simple = {"ec2": {"quantity": 2}, "s3": 1}
+        assert convert_struct_for_cost_calculation(simple) is simple
+        assert convert_struct_for_cost_calculation({}) == {}
+        assert convert_struct_for_cost_calculation(None) == {}
+        # 数えられるコレクションがなければ元のstructを返す
+        assert convert_struct_for_cost_calculation({"web": {"type": "ec2"}}) == {"web": {"type": "ec2"}}
+
+    def test_list_of_structs_is_summed(self):
+        """structのリストは合算する"""
+        result = get_struct_normalizer().normalize([make_struct(), make_struct()])
+        assert result["ec2"] == {"quantity": 4}
+        assert result["vpc"] == {"quantity": 2}
+
+    def test_new_collection_without_code_change(self):
+        """マッピング表に書き足すだけで新しいコレクションと派生リソースを数えられる"""
+        mapping = load_struct_mapping()
+        mapping["collections"]["storages"] = {
+            "default_type": "s3",
+            "derived": {"cdnId": "cloudfront"},
+        }
+        normalizer = StructNormalizer(mapping)
+
+        result = normalizer.normalize({
+            "storages": [{"id": "a", "cdnId": "cdn-1"}, {"id": "b", "type": "efs"}, "壊れた要素"],
+        })
+
+        assert result == {"s3": {"quantity": 1}, "efs": {"quantity": 1}, "cloudfront": {"quantity": 1}}
+
+    def test_invalid_mapping_is_rejected(self):
+        """数え方が不正なマッピング表は読み込み時にエラー"""
+        with pytest.raises(ValueError):
+            StructNormalizer({"collections": {"vpc": {"count": "presence"}}})
+        with pytest.raises(ValueError):
+            StructNormalizer({"collections": {"vpc": {"count": "unknown", "resource": "vpc"}}})
+
+    def test_mapping_path_from_settings(self, tmp_path, monkeypatch):
+        """STRUCT_MAPPING_PATHでマッピング表を差し替えられる"""
+        mapping_file = tmp_path / "mapping.json"
+        mapping_file.write_text(json.dumps({
+            "collections": {"queues": {"default_type": "sqs"}},
+        }), encoding="utf-8")
+        monkeypatch.setenv("STRUCT_MAPPING_PATH", str(mapping_file))
+
+        from settings import get_StructMappingSettings
+        get_StructMappingSettings.cache_clear()
+        get_struct_normalizer.cache_clear()
+        try:
+            assert get_struct_normalizer().normalize({"queues": [{}, {}]}) == {"sqs": {"quantity": 2}}
+        finally:
+            monkeypatch.delenv("STRUCT_MAPPING_PATH")
+            get_StructMappingSettings.cache_clear()
+            get_struct_normalizer.cache_clear()
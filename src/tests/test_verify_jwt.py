@@ -1,237 +1,227 @@
-# import pytest
-# import boto3
-# from moto import mock_aws
-# import jwt
-# from jwt import PyJWKClient
-# from fastapi import Request, HTTPException
-# from unittest.mock import MagicMock
-# import json
-# import base64
-# import os
-# from datetime import datetime, timezone
-
-# # settings はテスト用モック
-# class MockCognitoSettings:
-#     REGION = "ap-northeast-1"
-#     USERPOOL_ID = "ap-northeast-1_xxxxxxxxx"
-#     APP_CLIENT_ID = "yyyyyyyyyyyyyy"
-
-# settings = MockCognitoSettings()
-
-# REGION = settings.REGION
-# USERPOOL_ID = settings.USERPOOL_ID
-# APP_CLIENT_ID = settings.APP_CLIENT_ID
-# JWKS_URL = (
-#     f"https://cognito-idp.{REGION}.amazonaws.com/{USERPOOL_ID}/.well-known/jwks.json"
-# )
-
-# jwks_client = PyJWKClient(JWKS_URL)
-
-# def get_token_from_header(request: Request) -> str:
-#     auth_header = request.headers.get("Authorization")
-#     if not auth_header:
-#         raise HTTPException(status_code=401, detail="Authorization header missing")
-#     parts = auth_header.split()
-#     if parts[0].lower() != "bearer" or len(parts) == 1:
-#         raise HTTPException(status_code=401, detail="Invalid Authorization header")
-#     return parts[1]
-
-# def verify_cognito_jwt(token: str) -> dict:
-#     try:
-#         signing_key = jwks_client.get_signing_key_from_jwt(token)
-#         data = jwt.decode(
-#             token,
-#             signing_key.key,
-#             algorithms=["RS256"],
-#             audience=APP_CLIENT_ID,
-#             issuer=f"https://cognito-idp.{REGION}.amazonaws.com/{USERPOOL_ID}",
-#             options={"require": ["exp", "iat", "iss", "sub"], "verify_aud": True},
-#         )
-#         return data
-#     except jwt.ExpiredSignatureError:
-#         raise HTTPException(status_code=401, detail="Token has expired")
-#     except jwt.InvalidTokenError:
-#         raise HTTPException(status_code=401, detail="Invalid token")
-#     except Exception as e:
-#         raise HTTPException(
-#             status_code=401, detail=f"Token validation failed: {str(e)}"
-#         )
-
-# def extract_user_id_from_token(request: Request) -> str:
-#     token = get_token_from_header(request)
-#     user_data = verify_cognito_jwt(token)
-#     return user_data.get("sub")
-
-# # --- 修正済み UTC 関数例（必要に応じて使用可能） ---
-# def current_utc_time() -> datetime:
-#     return datetime.now(timezone.utc)
-
-# def datetime_from_ts(ts: float) -> datetime:
-#     return datetime.fromtimestamp(ts, timezone.utc)
-
-# # 以下、テストコード（変更なし）
-
-# @pytest.fixture(scope="module")
-# def aws_credentials():
-#     os.environ["AWS_ACCESS_KEY_ID"] = "testing"
-#     os.environ["AWS_SECRET_ACCESS_KEY"] = "testing"
-#     os.environ["AWS_SECURITY_TOKEN"] = "testing"
-#     os.environ["AWS_SESSION_TOKEN"] = "testing"
-#     os.environ["AWS_DEFAULT_REGION"] = REGION
-
-# @pytest.fixture
-# def cognito_setup(aws_credentials):
-#     with mock_aws():
-#         client = boto3.client("cognito-idp", region_name=REGION)
-#         user_pool_response = client.create_user_pool(
-#             PoolName="TestUserPool",
-#             Policies={"PasswordPolicy": {"MinimumLength": 8,"RequireUppercase": False,"RequireLowercase": False,"RequireNumbers": False,"RequireSymbols": False}}
-#         )
-#         user_pool_id = user_pool_response["UserPool"]["Id"]
-#         app_client_response = client.create_user_pool_client(
-#             UserPoolId=user_pool_id,
-#             ClientName="TestAppClient",
-#             ExplicitAuthFlows=["ADMIN_NO_SRP_AUTH","USER_PASSWORD_AUTH"],
-#             PreventUserExistenceErrors="ENABLED",
-#         )
-#         app_client_id = app_client_response["UserPoolClient"]["ClientId"]
-#         username = "testuser"
-#         password = "TestPassword123!"
-#         email = "test@example.com"
-#         client.admin_create_user(
-#             UserPoolId=user_pool_id,
-#             Username=username,
-#             UserAttributes=[{"Name": "email","Value": email},{"Name": "email_verified","Value": "true"}],
-#             MessageAction="SUPPRESS",
-#         )
-#         client.admin_set_user_password(
-#             UserPoolId=user_pool_id, Username=username,
-#             Password=password, Permanent=True
-#         )
-#         auth_response = client.admin_initiate_auth(
-#             UserPoolId=user_pool_id, ClientId=app_client_id,
-#             AuthFlow="ADMIN_NO_SRP_AUTH",
-#             AuthParameters={"USERNAME": username, "PASSWORD": password},
-#         )
-#         id_token = auth_response["AuthenticationResult"]["IdToken"]
-#         access_token = auth_response["AuthenticationResult"]["AccessToken"]
-#         global USERPOOL_ID, APP_CLIENT_ID, JWKS_URL, jwks_client
-#         orig = (USERPOOL_ID, APP_CLIENT_ID, JWKS_URL, jwks_client)
-#         USERPOOL_ID, APP_CLIENT_ID = user_pool_id, app_client_id
-#         JWKS_URL = f"https://cognito-idp.{REGION}.amazonaws.com/{USERPOOL_ID}/.well-known/jwks.json"
-#         jwks_client = PyJWKClient(JWKS_URL)
-#         yield {"client": client, "user_pool_id": user_pool_id, "app_client_id": app_client_id,
-#                "username": username, "password": password,
-#                "id_token": id_token, "access_token": access_token}
-#         USERPOOL_ID, APP_CLIENT_ID, JWKS_URL, jwks_client = orig
-
-# def test_get_token_from_header():
-#     request = MagicMock(spec=Request)
-#     request.headers.get.return_value = "Bearer my_test_token"
-#     assert get_token_from_header(request) == "my_test_token"
-#     request.headers.get.return_value = None
-#     with pytest.raises(HTTPException) as exc:
-#         get_token_from_header(request)
-#     assert exc.value.status_code == 401 and exc.value.detail == "Authorization header missing"
-#     request.headers.get.return_value = "InvalidToken my_test_token"
-#     with pytest.raises(HTTPException):
-#         get_token_from_header(request)
-#     request.headers.get.return_value = "Bearer"
-#     with pytest.raises(HTTPException):
-#         get_token_from_header(request)
-
-# def test_cognito_integration_with_moto(cognito_setup):
-#     setup = cognito_setup
-#     unverified_payload = jwt.decode(setup["id_token"], options={"verify_signature": False})
-#     assert "sub" in unverified_payload
-#     assert unverified_payload["aud"] == setup["app_client_id"]
-#     assert setup["user_pool_id"] in unverified_payload["iss"]
-
-# def test_cognito_user_management_with_boto3(cognito_setup):
-#     client, username = cognito_setup["client"], cognito_setup["username"]
-#     info = client.admin_get_user(UserPoolId=cognito_setup["user_pool_id"], Username=username)
-#     assert info["Username"] == username and info["UserStatus"] == "CONFIRMED"
-#     attrs = {a["Name"]: a["Value"] for a in info["UserAttributes"]}
-#     assert attrs.get("email") == "test@example.com"
-
-# def test_cognito_authentication_flow(cognito_setup):
-#     client = cognito_setup["client"]
-#     auth = client.admin_initiate_auth(
-#         UserPoolId=cognito_setup["user_pool_id"],
-#         ClientId=cognito_setup["app_client_id"],
-#         AuthFlow="ADMIN_NO_SRP_AUTH",
-#         AuthParameters={"USERNAME": cognito_setup["username"], "PASSWORD": cognito_setup["password"]},
-#     )
-#     assert "AuthenticationResult" in auth
-#     with pytest.raises(Exception):
-#         client.admin_initiate_auth(
-#             UserPoolId=cognito_setup["user_pool_id"],
-#             ClientId=cognito_setup["app_client_id"],
-#             AuthFlow="ADMIN_NO_SRP_AUTH",
-#             AuthParameters={"USERNAME": cognito_setup["username"], "PASSWORD": "wrong"},
-#         )
-
-# def test_jwt_token_structure(cognito_setup):
-#     parts = cognito_setup["id_token"].split('.')
-#     assert len(parts) == 3
-#     header = json.loads(base64.b64decode(parts[0] + '=='))
-#     assert header["alg"] == "RS256" and header["typ"] == "JWT"
-#     payload = json.loads(base64.b64decode(parts[1] + '=='))
-#     assert "sub" in payload and "aud" in payload and ("auth_time" in payload or "iat" in payload)
-
-# def test_extract_user_id_from_real_token(cognito_setup):
-#     request = MagicMock(spec=Request)
-#     request.headers.get.return_value = f"Bearer {cognito_setup['id_token']}"
-#     token = get_token_from_header(request)
-#     assert len(token.split('.')) == 3
-#     payload = json.loads(base64.b64decode(token.split('.')[1] + '=='))
-#     assert "sub" in payload
-
-# def test_cognito_user_pool_operations(cognito_setup):
-#     client = cognito_setup["client"]
-#     uid = cognito_setup["user_pool_id"]
-#     pool = client.describe_user_pool(UserPoolId=uid)
-#     assert pool["UserPool"]["Id"] == uid
-#     users = client.list_users(UserPoolId=uid)["Users"]
-#     assert any(u["Username"] == "testuser" for u in users)
-#     client.admin_create_user(UserPoolId=uid, Username="newuser",
-#                               UserAttributes=[{"Name": "email","Value": "newuser@example.com"}],
-#                               MessageAction="SUPPRESS")
-#     client.admin_set_user_password(UserPoolId=uid, Username="newuser", Password="NewPassword123!", Permanent=True)
-#     new_auth = client.admin_initiate_auth(UserPoolId=uid, ClientId=cognito_setup["app_client_id"],
-#                                           AuthFlow="ADMIN_NO_SRP_AUTH",
-#                                           AuthParameters={"USERNAME": "newuser", "PASSWORD": "NewPassword123!"})
-#     new_payload = jwt.decode(new_auth["AuthenticationResult"]["IdToken"], options={"verify_signature": False})
-#     assert new_payload["aud"] == cognito_setup["app_client_id"]
-
-# def test_invalid_authentication_scenarios(cognito_setup):
-#     with pytest.raises(Exception):
-#         boto3.client("cognito-idp", region_name=REGION).admin_initiate_auth(
-#             UserPoolId=cognito_setup["user_pool_id"],
-#             ClientId=cognito_setup["app_client_id"],
-#             AuthFlow="ADMIN_NO_SRP_AUTH",
-#             AuthParameters={"USERNAME": "nonexistent","PASSWORD": "pw"}
-#         )
-#     with pytest.raises(Exception):
-#         boto3.client("cognito-idp", region_name=REGION).admin_initiate_auth(
-#             UserPoolId=cognito_setup["user_pool_id"],
-#             ClientId=cognito_setup["app_client_id"],
-#             AuthFlow="ADMIN_NO_SRP_AUTH",
-#             AuthParameters={"USERNAME": cognito_setup["username"], "PASSWORD": "wrong"}
-#         )
-
-# def test_app_functions_with_invalid_tokens():
-#     for bad in ["invalid.token.here", "", "not.a.valid.jwt.token"]:
-#         with pytest.raises(HTTPException) as exc:
-#             verify_cognito_jwt(bad)
-#         assert exc.value.status_code == 401
-
-# def test_get_token_from_header_comprehensive():
-#     r = MagicMock(spec=Request)
-#     for hdr in ["Bearer valid_token_123", "BEARER valid_token_123", "bearer valid_token_123", "Bearer  valid_token_123"]:
-#         r.headers.get.return_value = hdr
-#         assert get_token_from_header(r) == "valid_token_123"
-#     for hdr in [None, "Token valid_token_123", "Bearer", ""]:
-#         r.headers.get.return_value = hdr
-#         with pytest.raises(HTTPException):
-#             get_token_from_header(r)
+import pytest
+import json
+import threading
+import time
+import jwt
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import patch
+from cryptography.hazmat.primitives.asymmetric import rsa
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+from jwt.algorithms import RSAAlgorithm
+from main import app
+from routers.helpers.jwt_verifier import CognitoJwtVerifier, JwksCache, VerifiedTokenCache, fetch_jwks
+
+REGION = "ap-northeast-1"
+USERPOOL_ID = "ap-northeast-1_testpool"
+APP_CLIENT_ID = "test-app-client"
+ISSUER = f"https://cognito-idp.{REGION}.amazonaws.com/{USERPOOL_ID}"
+
+
+class SigningKey:
+    """テスト用のRSA鍵（kid付き）"""
+
+    def __init__(self, kid):
+        self.kid = kid
+        self.private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+
+    def jwk(self):
+        return dict(RSAAlgorithm.to_jwk(self.private_key.public_key(), as_dict=True), kid=self.kid, alg="RS256", use="sig")
+
+    def sign(self, **overrides):
+        now = int(time.time())
+        claims = {
+            "sub": "user-1", "iss": ISSUER, "aud": APP_CLIENT_ID, "token_use": "id",
+            "iat": now, "exp": now + 3600,
+        }
+        claims.update(overrides)
+        claims = {name: value for name, value in claims.items() if value is not None}
+        return jwt.encode(claims, self.private_key, algorithm="RS256", headers={"kid": self.kid})
+
+
+class JwksServer:
+    """ユーザープールのJWKSの代わりに鍵を返すローカルHTTPサーバー"""
+
+    def __init__(self, keys):
+        self.keys = list(keys)
+        self.requests = 0
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                server.requests += 1
+                body = json.dumps({"keys": [key.jwk() for key in server.keys]}).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.httpd.server_port}/{USERPOOL_ID}/.well-known/jwks.json"
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+class Clock:
+    """進めることのできる時計"""
+
+    def __init__(self, now):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture(scope="module")
+def signing_keys():
+    return {"key-1": SigningKey("key-1"), "key-2": SigningKey("key-2")}
+
+
+@pytest.fixture
+def jwks_server(signing_keys):
+    server = JwksServer([signing_keys["key-1"]])
+    yield server
+    server.close()
+
+
+def make_verifier(jwks_server, token_clock=time.time, jwks_clock=time.monotonic, **jwks_options):
+    jwks = JwksCache(jwks_server.url, clock=jwks_clock, **jwks_options)
+    return CognitoJwtVerifier(ISSUER, APP_CLIENT_ID, jwks, VerifiedTokenCache(100, clock=token_clock))
+
+
+def status_of(verifier, token):
+    with pytest.raises(HTTPException) as exc:
+        verifier.verify(token)
+    return exc.value.status_code, exc.value.detail
+
+
+class TestCognitoJwtVerifier:
+    """Cognitoトークン検証のテストクラス"""
+
+    def test_valid_id_and_access_tokens(self, jwks_server, signing_keys):
+        """IDトークン（aud）とアクセストークン（client_id）を検証できる"""
+        verifier = make_verifier(jwks_server)
+        key = signing_keys["key-1"]
+
+        assert verifier.verify(key.sign())["sub"] == "user-1"
+        access_token = key.sign(aud=None, token_use="access", client_id=APP_CLIENT_ID, sub="user-2")
+        assert verifier.verify(access_token)["sub"] == "user-2"
+        assert jwks_server.requests == 1
+
+    @pytest.mark.parametrize("overrides, detail", [
+        ({"exp": int(time.time()) - 10}, "Token has expired"),
+        ({"iss": "https://cognito-idp.us-east-1.amazonaws.com/other"}, "Invalid token"),
+        ({"aud": "other-client"}, "Invalid token audience"),
+        ({"token_use": "refresh"}, "Invalid token audience"),
+        ({"sub": None}, "Invalid token"),
+    ])
+    def test_invalid_claims_are_rejected(self, jwks_server, signing_keys, overrides, detail):
+        """期限切れ・発行者違い・クライアント違いのトークンは401"""
+        verifier = make_verifier(jwks_server)
+
+        assert status_of(verifier, signing_keys["key-1"].sign(**overrides)) == (401, detail)
+
+    def test_forged_signature_and_hs256_are_rejected(self, jwks_server, signing_keys):
+        """別の鍵で署名したトークンや、これまでの共通鍵のトークンは401"""
+        verifier = make_verifier(jwks_server)
+        forged = SigningKey("key-1").sign()
+        hs256 = jwt.encode({"sub": "user-1"}, "test-secret-key-for-hs256-signing!", algorithm="HS256")
+
+        assert status_of(verifier, forged) == (401, "Invalid token")
+        assert status_of(verifier, hs256) == (401, "Unknown signing key")
+        assert status_of(verifier, "not-a-jwt") == (401, "Invalid JWT format")
+
+    def test_repeat_token_skips_signature_check_until_exp(self, jwks_server, signing_keys):
+        """検証済みトークンはexpまで署名を検証し直さない"""
+        clock = Clock(time.time())
+        verifier = make_verifier(jwks_server, token_clock=clock)
+        token = signing_keys["key-1"].sign(exp=int(clock.now) + 60)
+        verifier.verify(token)
+
+        with patch("routers.helpers.jwt_verifier.jwt.decode") as mock_decode:
+            assert verifier.verify(token)["sub"] == "user-1"
+            mock_decode.assert_not_called()
+
+        # expを過ぎたらキャッシュを使わず、検証し直す
+        clock.now += 61
+        with patch("routers.helpers.jwt_verifier.jwt.decode", side_effect=jwt.ExpiredSignatureError):
+            assert status_of(verifier, token) == (401, "Token has expired")
+        assert len(verifier.token_cache) == 0
+
+    def test_token_cache_is_bounded(self):
+        """LRUの上限を超えたら最も古いトークンから捨てる"""
+        cache = VerifiedTokenCache(max_entries=2)
+        exp = time.time() + 60
+        for name in ("a", "b"):
+            cache.put(name, {"sub": name, "exp": exp})
+        cache.get("a")
+        cache.put("c", {"sub": "c", "exp": exp})
+
+        assert (cache.get("a"), cache.get("b")) == ({"sub": "a", "exp": exp}, None)
+        assert len(cache) == 2
+
+
+class TestJwksCache:
+    """JWKSキャッシュのテストクラス"""
+
+    def test_unknown_kid_refetches_once_per_interval(self, jwks_server, signing_keys):
+        """知らないkidはその場で取り直すが、最短間隔の間は取り直さない"""
+        clock = Clock(1000.0)
+        verifier = make_verifier(jwks_server, jwks_clock=clock, min_refetch_seconds=60)
+        verifier.verify(signing_keys["key-1"].sign())
+
+        # 鍵のローテーション直後: 取り直して新しい鍵で検証できる
+        jwks_server.keys.append(signing_keys["key-2"])
+        clock.now += 60
+        assert verifier.verify(signing_keys["key-2"].sign(sub="user-3"))["sub"] == "user-3"
+        assert jwks_server.requests == 2
+
+        # でたらめなkidが続いても、最短間隔の間は取りに行かない
+        for _ in range(5):
+            assert status_of(verifier, SigningKey("random").sign()) == (401, "Unknown signing key")
+        assert jwks_server.requests == 2
+
+    def test_expired_keys_refresh_in_background(self, jwks_server, signing_keys):
+        """期限を過ぎた鍵は手元の鍵で検証を続けながらバックグラウンドで取り直す"""
+        clock = Clock(1000.0)
+        jwks = JwksCache(jwks_server.url, refresh_seconds=300, clock=clock)
+        assert jwks.get_key("key-1") is not None
+
+        jwks_server.keys = [signing_keys["key-2"]]
+        clock.now += 300
+        assert jwks.get_key("key-1") is not None
+
+        deadline = time.time() + 5
+        while jwks.fetch_count < 2 and time.time() < deadline:
+            time.sleep(0.01)
+        assert jwks.get_key("key-2") is not None
+        assert jwks_server.requests == 2
+
+    def test_fetch_jwks_reads_local_server(self, jwks_server, signing_keys):
+        """JWKSをHTTPで取得できる"""
+        assert fetch_jwks(jwks_server.url)["keys"][0]["kid"] == "key-1"
+
+
+class TestVerifiedEndpoints:
+    """検証を有効にしたAPIのテストクラス"""
+
+    def test_endpoint_accepts_only_verified_tokens(self, jwks_server, signing_keys):
+        """USERPOOL_ID設定時は署名を検証したトークンだけを受け付ける"""
+        verifier = make_verifier(jwks_server)
+        client = TestClient(app)
+        hs256 = jwt.encode({"sub": "user-1"}, "test-secret-key-for-hs256-signing!", algorithm="HS256")
+
+        with patch("routers.extractor.get_jwt_verifier", return_value=verifier), \
+                patch("routers.play.get_active_game", return_value=None):
+            verified = client.get("/play/games", headers={"Authorization": f"Bearer {signing_keys['key-1'].sign()}"})
+            rejected = client.get("/play/games", headers={"Authorization": f"Bearer {hs256}"})
+
+        assert verified.status_code == 404
+        assert rejected.status_code == 401